@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Cache de banners renderizados
+Reaproveita banners idênticos (mesmo template + mesmos produtos/unidade/datas)
+sem renderizar novamente no Chromium nem reenviar ao Cloudinary
+"""
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime
+
+BANNER_CACHE_FOLDER = 'cache_banners'
+BANNER_CACHE_FILE = os.path.join(BANNER_CACHE_FOLDER, 'banner-cache.json')
+# Incrementar quando o HTML/renderização mudar de forma que banners antigos não sirvam mais
+BANNER_CACHE_VERSION = 1
+
+
+def _stable_json(data):
+    """Serializa em JSON determinístico (chaves ordenadas) para uso em hash"""
+    return json.dumps(data, sort_keys=True, ensure_ascii=False, default=str, separators=(',', ':'))
+
+
+def hash_template(template_config):
+    """Gera hash SHA-256 do template de banner
+
+    Args:
+        template_config: Dicionário do banner-template.json
+
+    Returns:
+        str: Hash hexadecimal do template
+    """
+    return hashlib.sha256(_stable_json(template_config or {}).encode('utf-8')).hexdigest()
+
+
+def _normalize_text(value):
+    """Normaliza texto (None/NaN viram string vazia)"""
+    if value is None:
+        return ''
+    text = str(value).strip()
+    return '' if text.lower() == 'nan' else text
+
+
+def _normalize_price(value):
+    """Normaliza preço com 2 casas decimais"""
+    try:
+        return f'{float(value):.2f}'
+    except (TypeError, ValueError):
+        return _normalize_text(value)
+
+
+def normalize_banner_inputs(produtos, unidade, nome_empresa='', data_inicio='', data_fim=''):
+    """Normaliza as entradas de um banner para compor a chave do cache
+
+    Apenas os campos que aparecem no banner entram na chave. A ordem dos
+    produtos é mantida porque define a posição de cada um no layout.
+
+    Args:
+        produtos: Lista de dicts (linhas do CSV) do banner
+        unidade: Nome da unidade
+        nome_empresa: Nome da empresa exibido no rodapé
+        data_inicio: Data de início (já formatada)
+        data_fim: Data de fim (já formatada)
+
+    Returns:
+        dict: Entradas normalizadas
+    """
+    produtos_normalizados = []
+    for produto in produtos:
+        try:
+            codigo = int(produto.get('Código'))
+        except (TypeError, ValueError):
+            codigo = _normalize_text(produto.get('Código'))
+        produtos_normalizados.append({
+            'codigo': codigo,
+            'nome': _normalize_text(produto.get('Nome')),
+            'preco_comercial': _normalize_price(produto.get('Preço Comercial')),
+            'preco_promocional': _normalize_price(produto.get('Preço Promocional')),
+            'unidade_medida': _normalize_text(produto.get('Unidade de Medida')),
+            'bandeira': _normalize_text(produto.get('Bandeira'))
+        })
+
+    return {
+        'produtos': produtos_normalizados,
+        'unidade': _normalize_text(unidade),
+        'nome_empresa': _normalize_text(nome_empresa),
+        'data_inicio': _normalize_text(data_inicio),
+        'data_fim': _normalize_text(data_fim)
+    }
+
+
+class BannerRenderCache:
+    """Cache endereçado por conteúdo dos banners renderizados
+
+    Cada entrada guarda o caminho do JPEG gerado e a URL do Cloudinary.
+    O índice é persistido em JSON para sobreviver a reinícios/quedas.
+    As alterações ficam em memória até flush() (chamado ao fim de cada
+    unidade), evitando regravar o índice inteiro a cada banner.
+    """
+
+    def __init__(self, cache_file=BANNER_CACHE_FILE):
+        """Inicializa o cache
+
+        Args:
+            cache_file: Caminho do arquivo JSON do índice
+        """
+        self.cache_file = cache_file
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def _load(self):
+        """Carrega o índice do disco"""
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, dict) and data.get('version') == BANNER_CACHE_VERSION:
+                self.entries = data.get('entries', {}) or {}
+                print(f'✓ Cache de banners carregado: {len(self.entries)} banner(s)')
+            else:
+                print('⚠ Cache de banners com versão diferente. Ignorando entradas antigas.')
+        except Exception as e:
+            print(f'⚠ Erro ao carregar cache de banners: {e}')
+            self.entries = {}
+
+    def _save(self):
+        """Salva o índice no disco (escrita atômica). Deve ser chamado com o lock adquirido"""
+        try:
+            folder = os.path.dirname(self.cache_file)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            temp_file = self.cache_file + '.tmp'
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump({'version': BANNER_CACHE_VERSION, 'entries': self.entries}, f, ensure_ascii=False, indent=2)
+            os.replace(temp_file, self.cache_file)
+            self.dirty = False
+        except Exception as e:
+            print(f'⚠ Erro ao salvar cache de banners: {e}')
+
+    def make_key(self, template_hash, produtos, unidade, nome_empresa='', data_inicio='', data_fim='', extra=None):
+        """Calcula a chave do banner
+
+        Args:
+            template_hash: Hash do template (hash_template)
+            produtos: Lista de produtos do banner
+            unidade: Nome da unidade
+            nome_empresa: Nome da empresa
+            data_inicio: Data de início formatada
+            data_fim: Data de fim formatada
+            extra: Dados adicionais que alteram o resultado (ex: assinatura dos assets, dimensões)
+
+        Returns:
+            str: Chave SHA-256
+        """
+        payload = {
+            'version': BANNER_CACHE_VERSION,
+            'template': template_hash,
+            'inputs': normalize_banner_inputs(produtos, unidade, nome_empresa, data_inicio, data_fim),
+            'extra': extra or {}
+        }
+        return hashlib.sha256(_stable_json(payload).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Busca um banner no cache
+
+        A entrada só é considerada válida se o arquivo local ainda existir
+        ou se houver URL do Cloudinary para baixá-lo novamente.
+
+        Args:
+            key: Chave calculada por make_key()
+
+        Returns:
+            dict: Entrada {'path', 'url', 'unidade', 'created_at'} ou None
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry:
+                path = entry.get('path')
+                if (path and os.path.exists(path)) or entry.get('url'):
+                    self.hits += 1
+                    return dict(entry)
+                # Arquivo sumiu e não há URL: entrada inútil
+                del self.entries[key]
+                self.dirty = True
+            self.misses += 1
+            return None
+
+    def put(self, key, path=None, url=None, unidade=None):
+        """Registra (ou atualiza) um banner no cache
+
+        A entrada só vai para o disco no próximo flush().
+
+        Args:
+            key: Chave calculada por make_key()
+            path: Caminho local do JPEG
+            url: URL do banner no Cloudinary
+            unidade: Unidade do banner (informativo)
+        """
+        with self.lock:
+            entry = self.entries.get(key, {})
+            if path:
+                entry['path'] = path
+            if url:
+                entry['url'] = url
+            if unidade:
+                entry['unidade'] = unidade
+            entry.setdefault('created_at', datetime.now().isoformat())
+            entry['updated_at'] = datetime.now().isoformat()
+            self.entries[key] = entry
+            self.dirty = True
+
+    def flush(self):
+        """Grava o índice no disco se houver alterações pendentes"""
+        with self.lock:
+            if self.dirty:
+                self._save()
+
+    def invalidate(self, key):
+        """Remove uma entrada do cache"""
+        with self.lock:
+            if self.entries.pop(key, None) is not None:
+                self._save()
+
+    def clear(self):
+        """Remove todas as entradas do cache"""
+        with self.lock:
+            self.entries = {}
+            self._save()
+
+    def get_stats(self):
+        """Retorna estatísticas do cache"""
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses
+            }
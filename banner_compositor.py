@@ -0,0 +1,1195 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compositor de banners em Pillow (caminho rápido, sem navegador)
+Desenha diretamente as mesmas chaves do banner-template.json usadas pelo HTML
+renderizado no Chromium: fundo, logos, produtos (imagem, base, selo de desconto,
+bandeira, nome, código e preços), separadores, frase de impulsionamento e rodapé.
+
+Assets fixos (fundo, logos, base do produto, bandeiras) são decodificados e
+redimensionados uma única vez; as fontes Goldplay/GoldplayAlt da pasta Fontes
+são carregadas via ImageFont com cache por família/peso/tamanho.
+
+Selecionado com BANNER_RENDERER=pillow. A paridade com o Chromium é verificada
+pelo script testar-compositor-pillow.py (diferença pixel a pixel).
+"""
+import io
+import os
+import re
+import math
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from html import unescape
+
+import requests
+from PIL import Image, ImageDraw, ImageFont, ImageFilter, ImageColor
+
+FONTS_FOLDER = 'Fontes'
+COMPOSITOR_IMAGE_CACHE_SIZE = int(os.getenv('COMPOSITOR_IMAGE_CACHE_SIZE', '256'))
+
+# font-weight CSS -> sufixo do arquivo da fonte
+FONT_WEIGHT_NAMES = {
+    '100': 'Thin', '200': 'Thin', 'lighter': 'Light', '300': 'Light',
+    'normal': 'Regular', '400': 'Regular', '500': 'Medium', '600': 'SemiBold',
+    'bold': 'Bold', '700': 'Bold', 'bolder': 'Black', '800': 'Black', '900': 'Black'
+}
+# Ordem de busca quando o peso pedido não existe na pasta Fontes
+FONT_WEIGHT_FALLBACK = ['Regular', 'Medium', 'SemiBold', 'Bold', 'Black', 'Light', 'Thin']
+
+_warned_families = set()
+
+
+def font_family_name(css_family):
+    """Converte um font-family CSS na família local (Goldplay ou GoldplayAlt)
+
+    Fontes do Google Fonts (Montserrat, Roboto...) não existem localmente e
+    são substituídas pela Goldplay no mesmo peso.
+    """
+    family = str(css_family or '')
+    if 'GoldplayAlt' in family:
+        return 'GoldplayAlt'
+    if 'Goldplay' not in family:
+        nome = family.split(',')[0].strip().strip('\'"') or 'padrão'
+        if nome not in _warned_families:
+            _warned_families.add(nome)
+            print(f'  ⚠ Fonte "{nome}" não disponível em {FONTS_FOLDER}/. Compositor usando Goldplay.')
+    return 'Goldplay'
+
+
+def font_weight_name(css_weight):
+    """Converte font-weight CSS ('bold', 700...) no sufixo do arquivo ('Bold')"""
+    return FONT_WEIGHT_NAMES.get(str(css_weight or 'normal').strip().lower(), 'Regular')
+
+
+def resolve_font_file(family, weight_name, italic):
+    """Localiza o .ttf mais próximo do peso/estilo pedido
+
+    Returns:
+        str: Caminho do arquivo ou None
+    """
+    weights = [weight_name] + [w for w in FONT_WEIGHT_FALLBACK if w != weight_name]
+    suffixes = ['It', ''] if italic else ['', 'It']
+    for weight in weights:
+        for suffix in suffixes:
+            path = os.path.join(FONTS_FOLDER, f'{family}-{weight}{suffix}.ttf')
+            if os.path.exists(path):
+                return path
+    return None
+
+
+@lru_cache(maxsize=256)
+def load_font(family, weight_name, italic, size):
+    """Carrega a fonte uma única vez por (família, peso, estilo, tamanho)"""
+    size = max(1, int(size))
+    path = resolve_font_file(family, weight_name, italic)
+    if path:
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError as e:
+            print(f'  ⚠ Erro ao carregar fonte {path}: {e}')
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:  # Pillow < 10.1
+        return ImageFont.load_default()
+
+
+def parse_px(value, default=None):
+    """'12px' / 12 / '12' -> 12.0; 'auto' ou inválido -> default"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value or '').strip().lower()
+    if not text or text == 'auto' or text.endswith('%'):
+        return default
+    try:
+        return float(text.replace('px', '').replace(',', '.'))
+    except ValueError:
+        return default
+
+
+def parse_length(value, reference, default=None):
+    """Como parse_px, resolvendo percentuais em relação a reference"""
+    text = str(value or '').strip()
+    if text.endswith('%'):
+        try:
+            return reference * float(text[:-1].replace(',', '.')) / 100.0
+        except ValueError:
+            return default
+    return parse_px(value, default)
+
+
+def parse_opacity(value, default=1.0):
+    """Opacidade 0-1 (aceita 0-100 como no template)"""
+    try:
+        opacity = float(str(value).replace(',', '.'))
+    except (TypeError, ValueError):
+        return default
+    return opacity / 100.0 if opacity > 1 else opacity
+
+
+def parse_color(value, default=(255, 255, 255, 255)):
+    """Converte cor CSS (#hex, nome, rgb(), rgba(), transparent) em RGBA"""
+    text = str(value or '').strip()
+    if not text:
+        return default
+    if text.lower() == 'transparent':
+        return (0, 0, 0, 0)
+    match = re.match(r'rgba?\(\s*([\d.]+)\s*,\s*([\d.]+)\s*,\s*([\d.]+)\s*(?:,\s*([\d.]+)\s*)?\)', text, re.I)
+    if match:
+        r, g, b = (int(float(match.group(i))) for i in (1, 2, 3))
+        alpha = float(match.group(4)) if match.group(4) is not None else 1.0
+        alpha = alpha / 255.0 if alpha > 1 else alpha
+        return (r, g, b, int(round(alpha * 255)))
+    try:
+        color = ImageColor.getrgb(text)
+    except ValueError:
+        return default
+    return color if len(color) == 4 else color + (255,)
+
+
+def decode_image_source(source, session=None):
+    """Obtém os bytes de uma imagem a partir de data URL, base64 puro ou URL HTTP
+
+    Returns:
+        bytes: Conteúdo da imagem ou None (ex: placeholder SVG)
+    """
+    if not source:
+        return None
+    source = str(source)
+    if source.startswith('data:'):
+        header, _, payload = source.partition(',')
+        if ';base64' not in header:
+            return None  # SVG inline (placeholder) - Pillow não rasteriza
+        return base64.b64decode(payload)
+    if source.startswith(('http://', 'https://')):
+        response = (session or requests).get(source, timeout=15)
+        if response.status_code != 200:
+            return None
+        return response.content
+    return base64.b64decode(source)
+
+
+def wrap_text(text, font, max_width, letter_spacing=0):
+    """Quebra o texto em linhas que cabem em max_width (word-break: break-word)"""
+    def measure(value):
+        return font.getlength(value) + letter_spacing * len(value)
+
+    def split_long(word):
+        partes, atual = [], ''
+        for char in word:
+            if atual and measure(atual + char) > max_width:
+                partes.append(atual)
+                atual = char
+            else:
+                atual += char
+        return partes + [atual]
+
+    lines = []
+    for paragraph in str(text).split('\n'):
+        words = paragraph.split()
+        if not words:
+            lines.append('')
+            continue
+        line = ''
+        for word in words:
+            candidate = f'{line} {word}' if line else word
+            if measure(candidate) <= max_width:
+                line = candidate
+                continue
+            if line:
+                lines.append(line)
+            if measure(word) > max_width:
+                partes = split_long(word)
+                lines.extend(partes[:-1])
+                line = partes[-1]
+            else:
+                line = word
+        lines.append(line)
+    return lines
+
+
+class TextRun:
+    """Trecho de texto posicionado pela linha de base (anchor 'ls')"""
+
+    def __init__(self, x, baseline, text, font, fill, letter_spacing=0):
+        self.x = x
+        self.baseline = baseline
+        self.text = text
+        self.font = font
+        self.fill = fill
+        self.letter_spacing = letter_spacing
+
+    @property
+    def width(self):
+        return self.font.getlength(self.text) + self.letter_spacing * len(self.text)
+
+    def bbox(self):
+        ascent, descent = self.font.getmetrics()
+        return (self.x, self.baseline - ascent, self.x + self.width, self.baseline + descent)
+
+    def draw(self, draw, dx=0, dy=0, fill=None):
+        fill = self.fill if fill is None else fill
+        x, y = self.x + dx, self.baseline + dy
+        if not self.letter_spacing:
+            draw.text((x, y), self.text, font=self.font, fill=fill, anchor='ls')
+            return
+        for char in self.text:
+            draw.text((x, y), char, font=self.font, fill=fill, anchor='ls')
+            x += self.font.getlength(char) + self.letter_spacing
+
+
+class BannerCompositor:
+    """Renderizador de banners em Pillow, equivalente ao generate_html_banner()
+
+    Os valores do template são lidos pelos mesmos helpers do BannerGenerator
+    (get_template_value/format_css_value), então alterações no editor de template
+    valem para os dois renderizadores.
+    """
+
+    def __init__(self, generator, width, height):
+        """Inicializa o compositor
+
+        Args:
+            generator: BannerGenerator (template, pasta de imagens e image_to_base64)
+            width: Largura do banner em pixels
+            height: Altura do banner em pixels
+        """
+        self.generator = generator
+        self.width = width
+        self.height = height
+        self.lock = threading.Lock()
+        self.assets = {}  # Assets fixos decodificados: chave -> Image RGBA (ou None)
+        self.images = OrderedDict()  # LRU de imagens de produto decodificadas
+        self.layers = OrderedDict()  # LRU de camadas redimensionadas
+        self.assets_signature = None
+        self.session = requests.Session()
+
+    # ------------------------------------------------------------------
+    # Cache de camadas
+    # ------------------------------------------------------------------
+    def clear(self):
+        """Descarta todas as camadas decodificadas/redimensionadas"""
+        with self.lock:
+            self.assets.clear()
+            self.images.clear()
+            self.layers.clear()
+
+    def sync_assets(self, signature):
+        """Limpa o cache se os arquivos de imagens/fontes mudaram
+
+        Args:
+            signature: Assinatura dos assets (BannerGenerator.get_assets_signature)
+        """
+        if signature != self.assets_signature:
+            if self.assets_signature is not None:
+                print('  🔄 Assets alterados: cache de camadas do compositor descartado')
+            self.clear()
+            self.assets_signature = signature
+
+    def _lru_get(self, cache, key):
+        with self.lock:
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+        return None
+
+    def _lru_put(self, cache, key, value):
+        with self.lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            while len(cache) > COMPOSITOR_IMAGE_CACHE_SIZE:
+                cache.popitem(last=False)
+
+    @staticmethod
+    def _decode(data):
+        img = Image.open(io.BytesIO(data))
+        img = img.convert('RGBA')
+        img.load()
+        return img
+
+    def _asset(self, *paths):
+        """Carrega (uma vez) o primeiro asset disponível da lista
+
+        Usa image_to_base64 do gerador (Cloudinary ou arquivo local).
+
+        Returns:
+            tuple: (chave, Image RGBA) ou (None, None)
+        """
+        for path in paths:
+            key = ('asset', path)
+            with self.lock:
+                cached = self.assets.get(key, False)
+            if cached is False:
+                b64 = self.generator.image_to_base64(path)
+                try:
+                    cached = self._decode(base64.b64decode(b64)) if b64 else None
+                except Exception as e:
+                    print(f'  ⚠ Compositor: erro ao decodificar {path}: {e}')
+                    cached = None
+                with self.lock:
+                    self.assets[key] = cached
+            if cached is not None:
+                return key, cached
+        return None, None
+
+    def _image_asset(self, *names):
+        folder = self.generator.images_folder
+        return self._asset(*[os.path.join(folder, name) for name in names])
+
+    def _product_image(self, source):
+        """Decodifica a imagem do produto (data URL/URL), com cache LRU
+
+        Returns:
+            tuple: (chave, Image RGBA) ou (None, None) para placeholders
+        """
+        key = ('produto', hashlib.sha1(str(source).encode('utf-8')).hexdigest())
+        img = self._lru_get(self.images, key)
+        if img is None:
+            try:
+                data = decode_image_source(source, self.session)
+                img = self._decode(data) if data else None
+            except Exception as e:
+                print(f'  ⚠ Compositor: erro ao carregar imagem do produto: {e}')
+                img = None
+            if img is None:
+                return None, None
+            self._lru_put(self.images, key, img)
+        return key, img
+
+    def _fit(self, key, img, box_w, box_h, mode='contain'):
+        """Redimensiona para a caixa (object-fit contain/cover), com cache
+
+        Returns:
+            tuple: (camada, dx, dy) - deslocamento da camada dentro da caixa
+        """
+        box_w, box_h = max(1, int(round(box_w))), max(1, int(round(box_h)))
+        cache_key = (key, box_w, box_h, mode)
+        cached = self._lru_get(self.layers, cache_key)
+        if cached is not None:
+            return cached
+
+        if mode == 'cover':
+            scale = max(box_w / img.width, box_h / img.height)
+        else:
+            scale = min(box_w / img.width, box_h / img.height)
+        new_w, new_h = max(1, int(round(img.width * scale))), max(1, int(round(img.height * scale)))
+        layer = img.resize((new_w, new_h), Image.LANCZOS) if (new_w, new_h) != img.size else img
+        if mode == 'cover':
+            left, top = (new_w - box_w) // 2, (new_h - box_h) // 2
+            layer = layer.crop((left, top, left + box_w, top + box_h))
+            result = (layer, 0, 0)
+        else:
+            result = (layer, (box_w - new_w) / 2.0, (box_h - new_h) / 2.0)
+        self._lru_put(self.layers, cache_key, result)
+        return result
+
+    def _with_drop_shadow(self, key, layer, dx, dy, blur, color):
+        """Camada com drop-shadow (filter: drop-shadow), com cache
+
+        Returns:
+            tuple: (camada, margem) - a camada cresce 'margem' pixels em cada lado
+        """
+        cache_key = (key, layer.size, 'drop-shadow', dx, dy, blur)
+        cached = self._lru_get(self.layers, cache_key)
+        if cached is not None:
+            return cached
+        margin = int(math.ceil(blur * 2 + max(abs(dx), abs(dy))))
+        size = (layer.width + margin * 2, layer.height + margin * 2)
+        alpha = Image.new('L', size, 0)
+        alpha.paste(layer.getchannel('A'), (margin + dx, margin + dy))
+        if blur:
+            alpha = alpha.filter(ImageFilter.GaussianBlur(blur / 2.0))
+        shadow = Image.new('RGBA', size, color[:3] + (0,))
+        shadow.putalpha(alpha.point(lambda a: a * color[3] // 255))
+        shadow.alpha_composite(layer, (margin, margin))
+        result = (shadow, margin)
+        self._lru_put(self.layers, cache_key, result)
+        return result
+
+    # ------------------------------------------------------------------
+    # Primitivas de desenho
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _paste(canvas, layer, x, y, opacity=1.0):
+        """Compõe a camada no canvas (recorta o que ficar fora dos limites)"""
+        x, y = int(round(x)), int(round(y))
+        if opacity < 1:
+            layer = layer.copy()
+            layer.putalpha(layer.getchannel('A').point(lambda a: int(a * opacity)))
+        left, top = max(0, -x), max(0, -y)
+        right = min(layer.width, canvas.width - x)
+        bottom = min(layer.height, canvas.height - y)
+        if right <= left or bottom <= top:
+            return
+        if (left, top, right, bottom) != (0, 0, layer.width, layer.height):
+            layer = layer.crop((left, top, right, bottom))
+        canvas.alpha_composite(layer, (x + left, y + top))
+
+    def _draw_runs(self, canvas, runs, shadow=None):
+        """Desenha trechos de texto, com text-shadow opcional (dx, dy, blur, RGBA)"""
+        runs = [run for run in runs if run.text]
+        if not runs:
+            return
+        if shadow:
+            dx, dy, blur, color = shadow
+            boxes = [run.bbox() for run in runs]
+            pad = int(math.ceil(blur * 2)) + 2
+            x0 = int(min(b[0] for b in boxes)) + min(dx, 0) - pad
+            y0 = int(min(b[1] for b in boxes)) + min(dy, 0) - pad
+            x1 = int(max(b[2] for b in boxes)) + max(dx, 0) + pad
+            y1 = int(max(b[3] for b in boxes)) + max(dy, 0) + pad
+            mask = Image.new('L', (max(1, x1 - x0), max(1, y1 - y0)), 0)
+            mask_draw = ImageDraw.Draw(mask)
+            for run in runs:
+                run.draw(mask_draw, dx - x0, dy - y0, fill=255)
+            if blur:
+                mask = mask.filter(ImageFilter.GaussianBlur(blur / 2.0))
+            layer = Image.new('RGBA', mask.size, color[:3] + (0,))
+            layer.putalpha(mask.point(lambda a: a * color[3] // 255))
+            self._paste(canvas, layer, x0, y0)
+        draw = ImageDraw.Draw(canvas)
+        for run in runs:
+            run.draw(draw)
+
+    @staticmethod
+    def _baseline(font, top, line_height=None):
+        """Linha de base do texto dentro de uma linha (line-height centraliza o glifo)"""
+        ascent, descent = font.getmetrics()
+        if line_height is None:
+            return top + ascent
+        return top + (line_height - (ascent + descent)) / 2.0 + ascent
+
+    @staticmethod
+    def _line_height(font):
+        """line-height: normal (ascent + descent da fonte)"""
+        ascent, descent = font.getmetrics()
+        return ascent + descent
+
+    def _font(self, family, weight='normal', style='normal', size=16):
+        italic = str(style or '').strip().lower() in ('italic', 'oblique')
+        return load_font(font_family_name(family), font_weight_name(weight), italic, int(round(size)))
+
+    # ------------------------------------------------------------------
+    # Acesso ao template (mesmos helpers do HTML)
+    # ------------------------------------------------------------------
+    def _value(self, key, default):
+        return self.generator.get_template_value(key, default)
+
+    def _css(self, key, default):
+        return self.generator.format_css_value(key, self._value(key, default))
+
+    def _int(self, key, default):
+        return self.generator._safe_int_convert(self._value(key, default), default)
+
+    def _font_size(self, key, default):
+        return parse_px(self._css(key, default), float(default))
+
+    # ------------------------------------------------------------------
+    # Renderização
+    # ------------------------------------------------------------------
+    def render(self, produtos, unidade, nome_empresa=None, data_inicio='', data_fim=''):
+        """Renderiza o banner
+
+        Args:
+            produtos: Lista de produtos (mesmo formato de generate_html_banner)
+            unidade: Nome da unidade
+            nome_empresa: Nome exibido no rodapé
+            data_inicio: Data de início formatada
+            data_fim: Data de fim formatada
+
+        Returns:
+            Image: Banner RGB (width x height)
+        """
+        canvas = self._background()
+
+        # (z-index, função de desenho) na ordem do DOM; sorted() é estável
+        paints = []
+        self._layout_logos_superiores(paints)
+        self._layout_produtos(paints, produtos)
+        self._layout_unidade(paints, unidade)
+        self._layout_impulsionamento(paints)
+        self._layout_logos_inferiores(paints)
+        self._layout_footer(paints, unidade, nome_empresa, data_inicio, data_fim)
+
+        for _, paint in sorted(paints, key=lambda item: item[0]):
+            paint(canvas)
+        return canvas.convert('RGB')
+
+    def _background(self):
+        """Fundo.png/jpg (background-size: cover) ou o gradiente padrão"""
+        key, fundo = self._image_asset('Fundo.png', 'Fundo.jpg', 'fundo.png', 'fundo.jpg')
+        if fundo is not None:
+            layer, _, _ = self._fit(key, fundo, self.width, self.height, 'cover')
+            canvas = Image.new('RGBA', (self.width, self.height), (0, 0, 0, 255))
+            canvas.alpha_composite(layer)
+            return canvas
+
+        cache_key = ('gradiente', self.width, self.height)
+        gradient = self._lru_get(self.layers, cache_key)
+        if gradient is None:
+            # linear-gradient(180deg, #0a1628 0%, #1a3a5a 50%, #2d5a7a 100%)
+            stops = [(0.0, (10, 22, 40)), (0.5, (26, 58, 90)), (1.0, (45, 90, 122))]
+            column = Image.new('RGBA', (1, self.height))
+            for y in range(self.height):
+                t = y / max(1, self.height - 1)
+                (t0, c0), (t1, c1) = (stops[0], stops[1]) if t <= 0.5 else (stops[1], stops[2])
+                f = (t - t0) / (t1 - t0)
+                column.putpixel((0, y), tuple(int(round(a + (b - a) * f)) for a, b in zip(c0, c1)) + (255,))
+            gradient = column.resize((self.width, self.height))
+            self._lru_put(self.layers, cache_key, gradient)
+        return gradient.copy()
+
+    def _image_box_paint(self, key, img, x, y, box_w, box_h, mode='contain', opacity=1.0):
+        """Função de desenho de uma imagem em caixa (object-fit)"""
+        def paint(canvas):
+            layer, dx, dy = self._fit(key, img, box_w, box_h, mode)
+            self._paste(canvas, layer, x + dx, y + dy, opacity)
+        return paint
+
+    def _box_size(self, img, width, height):
+        """Resolve width/height CSS ('auto' = None) mantendo a proporção"""
+        if width is None and height is None:
+            return float(img.width), float(img.height)
+        if width is None:
+            return height * img.width / img.height, height
+        if height is None:
+            return width, width * img.height / img.width
+        return width, height
+
+    def _layout_logos_superiores(self, paints):
+        """Logo superior (top/right) e logo de ofertas (centralizada)"""
+        key, logo = self._image_asset('Logo.png')
+        if logo is not None:
+            w, h = self._box_size(logo, parse_px(self._css('logo-superior-width', 150)),
+                                  parse_px(self._css('logo-superior-height', 0)))
+            top = parse_px(self._css('logo-superior-top', 20), 0)
+            right = parse_px(self._css('logo-superior-right', 20), 0)
+            paints.append((10, self._image_box_paint(key, logo, self.width - right - w, top, w, h)))
+
+        key, ofertas = self._image_asset('logo ofertas.png')
+        if ofertas is not None:
+            w, h = self._box_size(ofertas, parse_px(self._css('logo-ofertas-width', 450)),
+                                  parse_px(self._css('logo-ofertas-height', 450)))
+            top = parse_px(self._css('logo-ofertas-top', 50), 0)
+            paints.append((10, self._image_box_paint(key, ofertas, self.width / 2.0 - w / 2.0, top, w, h)))
+
+    def _layout_logos_inferiores(self, paints):
+        """Call Action e logo inferior (centralizadas por left % + translateX(-50%))"""
+        key, call_action = self._image_asset('Call Action.png')
+        if call_action is not None:
+            w, h = self._box_size(call_action, parse_px(self._css('call-action-width', 500)),
+                                  parse_px(self._css('call-action-height', 100)))
+            left = parse_length(self._css('call-action-left', 50), self.width, self.width / 2.0)
+            top = parse_px(self._css('call-action-top', 0))
+            bottom = parse_px(self._css('call-action-bottom', 120))
+            if top is not None:  # top prevalece quando os dois estão definidos
+                y = top
+            elif bottom is not None:
+                y = self.height - bottom - h
+            else:
+                y = 0
+            paints.append((20, self._image_box_paint(key, call_action, left - w / 2.0, y, w, h)))
+
+        key, logo_inferior = self._image_asset('Logo Inferior.png', 'Logo Inferior.jpg',
+                                               'logo inferior.png', 'logo inferior.jpg')
+        if logo_inferior is not None:
+            w, h = self._box_size(logo_inferior, parse_px(self._css('logo-inferior-width', 350)),
+                                  parse_px(self._css('logo-inferior-height', 80)))
+            left = parse_length(self._css('logo-inferior-left', 50), self.width, self.width / 2.0)
+            bottom = parse_px(self._css('logo-inferior-bottom', 20), 0)
+            paints.append((10, self._image_box_paint(key, logo_inferior, left - w / 2.0,
+                                                     self.height - bottom - h, w, h)))
+
+    # ------------------------------------------------------------------
+    # Produtos
+    # ------------------------------------------------------------------
+    def _layout_produtos(self, paints, produtos):
+        """Linha de produtos (flex: 1 com max-width, centralizada) e separadores"""
+        if not produtos:
+            return
+        total = len(produtos)
+        gap = parse_px(self._css('produtos-container-gap', 20), 0)
+        item_max_width = parse_px(self._css('produto-item-max-width', 320), 320)
+        container_top = parse_px(self._css('produtos-container-top', 650), 0)
+
+        # .produto-item: padding 15px 12px 35px 12px, flex: 1, max-width no conteúdo
+        item_padding_x = 24
+        item_w = (self.width - gap * (total - 1) - item_padding_x * total) / total
+        item_w = max(0.0, min(item_w, item_max_width))
+        row_width = total * (item_w + item_padding_x) + gap * (total - 1)
+        x = (self.width - row_width) / 2.0
+
+        for index, produto in enumerate(produtos):
+            self._layout_produto(paints, produto, x + 12, container_top + 15, item_w)
+            x += item_w + item_padding_x + gap
+
+            if index < total - 1:
+                if total == 3:
+                    position_percent = 33.333 * (index + 1)
+                elif total == 2:
+                    position_percent = 50.0
+                else:
+                    position_percent = (100.0 / total) * (index + 1)
+                self._layout_separador(paints, position_percent, container_top)
+
+    def _layout_separador(self, paints, position_percent, container_top):
+        """Separador posicionado em % da largura do container de produtos"""
+        color = parse_color(self._value('separador-color', '#CCCCCC'), (204, 204, 204, 255))
+        width = self._int('separador-width', 2)
+        height = self._int('separador-height', 100)
+        top = self._int('separador-top', 0)
+        left = self._int('separador-left', 0)
+        # O container tem width: 100% + padding 0 20px e está deslocado 20px para a esquerda
+        container_width = self.width + 40
+        x = -20 + container_width * position_percent / 100.0 + left - width / 2.0
+        y = container_top + top
+
+        def paint(canvas):
+            if width > 0 and height > 0:
+                self._paste(canvas, Image.new('RGBA', (width, height), color), x, y)
+        paints.append((15, paint))
+
+    def _layout_produto(self, paints, produto, item_x, item_y, item_w):
+        """Um produto: container, imagem, base, selo, bandeira, nome, código e preços"""
+        codigo = int(produto['Código'])
+        nome = str(produto['Nome'])
+        preco_comercial = float(produto['Preço Comercial'])
+        preco_promocional = float(produto['Preço Promocional'])
+        desconto_pct = self.generator.calculate_discount_percentage(preco_comercial, preco_promocional)
+        unidade_medida = str(produto.get('Unidade de Medida', '') or '').strip()
+        bandeira = str(produto.get('Bandeira', '') or '').strip()
+        if unidade_medida.lower() == 'nan':
+            unidade_medida = ''
+        if bandeira.lower() == 'nan':
+            bandeira = ''
+        if '_imagem_url_processada' in produto:
+            imagem_url = produto['_imagem_url_processada']
+        else:
+            imagem_url = self.generator.get_product_image_with_background_removed(codigo)
+
+        # .produto-container
+        padding = parse_px(self._css('produto-container-padding', 15), 0)
+        ic_x, ic_y = item_x + padding, item_y + padding
+        ic_w = item_w - padding * 2
+        ic_h = parse_px(self._css('produto-imagem-container-height', 420), 420) + 50  # padding 25px
+        margin_bottom = parse_px(self._css('produto-imagem-container-margin-bottom', 30), 0)
+        info_x, info_y = ic_x, ic_y + ic_h + margin_bottom
+
+        info_paints, info_height = self._layout_produto_info(codigo, nome, preco_comercial, preco_promocional,
+                                                             unidade_medida, info_x, info_y, ic_w)
+
+        container_color = self._container_color()
+        if container_color[3] > 0:
+            radius = parse_px(self._css('produto-container-border-radius', 15), 0)
+            height = padding * 2 + ic_h + margin_bottom + info_height
+            paints.append((-1, self._rounded_rect_paint(item_x, item_y, item_w, height, radius, container_color,
+                                                        shadow=(0, 2, 8, (0, 0, 0, 26)))))
+
+        imagem_bg = parse_color(self.generator.get_imagem_container_bg_color(), (0, 0, 0, 0))
+        if imagem_bg[3] > 0:
+            paints.append((0, self._rounded_rect_paint(ic_x, ic_y, ic_w, ic_h, 15, imagem_bg)))
+
+        self._layout_produto_imagem(paints, imagem_url, codigo, ic_x, ic_y, ic_w)
+        badge = self._layout_badge(paints, desconto_pct, ic_x, ic_y, ic_w, ic_h)
+        if bandeira:
+            self._layout_bandeira(paints, bandeira, badge, ic_x, ic_y, ic_w, ic_h)
+        self._layout_base(paints, ic_x, ic_y, ic_w, ic_h)
+        paints.extend(info_paints)
+
+    def _container_color(self):
+        color = self._value('produto-container-bg-color', '#FFFFFF')
+        opacity = parse_opacity(self._value('produto-container-bg-opacity', 90), 0.9)
+        r, g, b, _ = parse_color(color)
+        return (r, g, b, int(round(opacity * 255)))
+
+    def _rounded_rect_paint(self, x, y, w, h, radius, color, shadow=None):
+        def paint(canvas):
+            size = (max(1, int(round(w))), max(1, int(round(h))))
+            mask = Image.new('L', size, 0)
+            ImageDraw.Draw(mask).rounded_rectangle((0, 0, size[0] - 1, size[1] - 1),
+                                                   radius=int(min(radius, size[0] / 2, size[1] / 2)), fill=255)
+            layer = Image.new('RGBA', size, color[:3] + (0,))
+            layer.putalpha(mask.point(lambda a: a * color[3] // 255))
+            if shadow:
+                dx, dy, blur, shadow_color = shadow
+                layer, margin = self._with_drop_shadow(('rect', size, color, radius), layer, dx, dy, blur, shadow_color)
+                self._paste(canvas, layer, x - margin, y - margin)
+            else:
+                self._paste(canvas, layer, x, y)
+        return paint
+
+    def _layout_produto_imagem(self, paints, imagem_url, codigo, ic_x, ic_y, ic_w):
+        """Imagem do produto (left % + translateX(-50%), object-fit: contain)"""
+        key, img = self._product_image(imagem_url)
+        top = parse_px(self._css('produto-imagem-top', 20), 0)
+        left = parse_length(self._css('produto-imagem-left', 50), ic_w, ic_w / 2.0)
+        width = parse_length(self._css('produto-imagem-width', 80), ic_w)
+        max_width = parse_length(self._css('produto-imagem-max-width', 200), ic_w)
+        height = parse_px(self._css('produto-imagem-height', 0))
+        max_height = parse_px(self._css('produto-imagem-max-height', 240))
+
+        if img is None:
+            # Placeholder equivalente ao SVG de get_product_image_url (200x180)
+            img = Image.new('RGBA', (200, 180), (221, 221, 221, 255))
+            run = TextRun(0, 0, f'Produto {codigo}', self._font('Goldplay', 'normal', 'normal', 16), (153, 153, 153, 255))
+            run.x, run.baseline = (200 - run.width) / 2.0, 96
+            run.draw(ImageDraw.Draw(img))
+            key = ('placeholder', codigo)
+
+        w, h = self._box_size(img, width, height)
+        if max_width is not None and w > max_width:
+            w = max_width
+            if height is None:
+                h = w * img.height / img.width
+        if max_height is not None and h > max_height:
+            h = max_height
+        paints.append((2, self._image_box_paint(key, img, ic_x + left - w / 2.0, ic_y + top, w, h)))
+
+    def _layout_base(self, paints, ic_x, ic_y, ic_w, ic_h):
+        """Base do produto (bottom, left % + translateX(-50%), opacidade e drop-shadow)"""
+        key, base = self._image_asset('Base do Produto.png')
+        if base is None:
+            return
+        bottom_raw = self._value('base-produto-bottom', -100)
+        if isinstance(bottom_raw, str) and bottom_raw.strip() == '0':
+            bottom_raw = 0
+        bottom = parse_px(self.generator.format_css_value('base-produto-bottom', bottom_raw), 0)
+        left = parse_length(self._css('base-produto-left', 50), ic_w, ic_w / 2.0)
+        width = parse_length(self._css('base-produto-width', 200), ic_w)
+        max_width = parse_length(self._css('base-produto-max-width', 500), ic_w)
+        height = parse_px(self._css('base-produto-height', 0))
+        opacity = parse_opacity(self._value('base-produto-opacity', 90), 0.9)
+
+        w, h = self._box_size(base, width, height)
+        if max_width is not None and w > max_width:
+            w = max_width
+            if height is None:
+                h = w * base.height / base.width
+        x, y = ic_x + left - w / 2.0, ic_y + ic_h - bottom - h
+
+        def paint(canvas):
+            layer, dx, dy = self._fit(key, base, w, h, 'contain')
+            # .base-produto { filter: drop-shadow(0 4px 6px rgba(0,0,0,0.3)) }
+            layer, margin = self._with_drop_shadow(key + (layer.size,), layer, 0, 4, 6, (0, 0, 0, 77))
+            self._paste(canvas, layer, x + dx - margin, y + dy - margin, opacity)
+        paints.append((1, paint))
+
+    def _layout_badge(self, paints, desconto_pct, ic_x, ic_y, ic_w, ic_h):
+        """Selo de desconto (pill, circle ou starburst)
+
+        Returns:
+            dict: Valores CSS do selo usados no posicionamento da bandeira
+        """
+        badge = {
+            'top': self._css('desconto-badge-top', 8),
+            'right': self._css('desconto-badge-right', 8),
+            'bottom': self._css('desconto-badge-bottom', 0),
+            'left': self._css('desconto-badge-left', 0),
+            'width': self._css('desconto-badge-width', 0),
+            'height': self._css('desconto-badge-height', 0),
+            'font_size': self._css('desconto-badge-font-size', 16)
+        }
+        if desconto_pct <= 5:
+            return badge
+
+        font_size = parse_px(badge['font_size'], 16)
+        font_pct = self._font('Goldplay', 'bold', 'normal', font_size)
+        font_off = self._font('Goldplay', 'normal', 'normal', font_size * 0.65)
+        text_pct, text_off = f'{desconto_pct:.0f}%', 'OFF'
+        try:
+            border_width = int(float(str(self._value('desconto-badge-border-width', 0)).strip().lower().replace('px', '').replace(',', '.')))
+        except (ValueError, TypeError):
+            border_width = 0
+        border_color = parse_color(self._value('desconto-badge-border-color', '#FFFFFF'))
+        bg_color = parse_color(self._value('desconto-badge-bg-color', '#FF0000'), (255, 0, 0, 255))
+        text_color = parse_color(self._value('desconto-badge-color', '#FFFFFF'))
+        shape = str(self._value('desconto-badge-shape', 'pill')).lower()
+
+        # box-sizing: border-box; padding 8px 16px; min-width: fit-content
+        content_w = max(font_pct.getlength(text_pct), font_off.getlength(text_off))
+        content_h = font_size + 2 + font_size * 0.65
+        fit_w = content_w + 32 + border_width * 2
+        w = max(parse_px(badge['width'], 0), fit_w)
+        h = parse_px(badge['height'], content_h + 16 + border_width * 2)
+
+        if badge['bottom'] == 'auto' and badge['top'] != 'auto':
+            y = parse_px(badge['top'], 0)
+        elif badge['bottom'] != 'auto':
+            y = ic_h - parse_px(badge['bottom'], 0) - h
+        else:
+            y = 25
+        if badge['left'] != 'auto':
+            x = parse_px(badge['left'], 0)
+        elif badge['right'] != 'auto':
+            x = ic_w - parse_px(badge['right'], 0) - w
+        else:
+            x = (ic_w - w) / 2.0
+        x, y = ic_x + x, ic_y + y
+
+        def paint(canvas):
+            size = (max(1, int(round(w))), max(1, int(round(h))))
+            mask = Image.new('L', size, 0)
+            mask_draw = ImageDraw.Draw(mask)
+            if shape == 'starburst':
+                points = []
+                for i in range(48):  # 24 raios, alternando raio externo (50%) e interno (44%)
+                    angle = i * (2 * math.pi / 24) / 2
+                    radius = 50 if i % 2 == 0 else 44
+                    points.append((size[0] * (50 + radius * math.sin(angle)) / 100.0,
+                                   size[1] * (50 - radius * math.cos(angle)) / 100.0))
+                mask_draw.polygon(points, fill=255)
+            elif shape == 'circle':
+                mask_draw.ellipse((0, 0, size[0] - 1, size[1] - 1), fill=255)
+            else:
+                mask_draw.rounded_rectangle((0, 0, size[0] - 1, size[1] - 1),
+                                            radius=int(min(18, size[0] / 2, size[1] / 2)), fill=255)
+
+            layer = Image.new('RGBA', size, bg_color[:3] + (0,))
+            layer.putalpha(mask.point(lambda a: a * bg_color[3] // 255))
+            if border_width > 0:
+                # Borda: fundo da cor da borda e interior reduzido por border_width
+                inner = Image.new('L', size, 0)
+                inner_draw = ImageDraw.Draw(inner)
+                inset = (border_width, border_width, size[0] - 1 - border_width, size[1] - 1 - border_width)
+                if shape == 'starburst':
+                    inner = mask.filter(ImageFilter.MinFilter(border_width * 2 + 1))
+                elif shape == 'circle':
+                    inner_draw.ellipse(inset, fill=255)
+                else:
+                    inner_draw.rounded_rectangle(inset, radius=int(max(0, min(18, size[0] / 2, size[1] / 2) - border_width)), fill=255)
+                border_layer = Image.new('RGBA', size, border_color[:3] + (0,))
+                border_layer.putalpha(mask.point(lambda a: a * border_color[3] // 255))
+                fill_layer = Image.new('RGBA', size, bg_color[:3] + (0,))
+                fill_layer.putalpha(inner.point(lambda a: a * bg_color[3] // 255))
+                border_layer.alpha_composite(fill_layer)
+                layer = border_layer
+
+            # O clip-path da estrela também recorta o box-shadow
+            if shape == 'starburst':
+                self._paste(canvas, layer, x, y)
+            else:
+                layer, margin = self._with_drop_shadow(('badge', shape, size, bg_color, border_width), layer,
+                                                       0, 4, 12, (0, 0, 0, 64))
+                self._paste(canvas, layer, x - margin, y - margin)
+
+            # Texto centralizado: "NN%" (line-height 1) + "OFF" (0.65em, margin-top 2px)
+            top = y + (h - content_h) / 2.0
+            run_pct = TextRun(0, self._baseline(font_pct, top, font_size), text_pct, font_pct, text_color)
+            run_off = TextRun(0, self._baseline(font_off, top + font_size + 2, font_size * 0.65), text_off, font_off, text_color)
+            for run in (run_pct, run_off):
+                run.x = x + (w - run.width) / 2.0
+            self._draw_runs(canvas, [run_pct, run_off])
+        paints.append((60, paint))
+        return badge
+
+    def _layout_bandeira(self, paints, bandeira, badge, ic_x, ic_y, ic_w, ic_h):
+        """Bandeira abaixo do selo (mesma regra de posicionamento do HTML)"""
+        paths = [os.path.join('Bandeira', f'{bandeira}{ext}') for ext in ['.png', '.jpg', '.jpeg', '.PNG', '.JPG', '.JPEG']]
+        key, img = self._asset(*paths)
+        if img is None:
+            return
+
+        def is_unset(value):
+            return value in (0, '0') or (isinstance(value, str) and value.lower() == 'auto')
+
+        width_raw = self._value('bandeira-width', 0)
+        height_raw = self._value('bandeira-height', 0)
+        top_raw = self._value('bandeira-top', 'auto')
+        right_raw = self._value('bandeira-right', 'auto')
+        bottom_raw = self._value('bandeira-bottom', 0)
+        left_raw = self._value('bandeira-left', 'auto')
+
+        width = badge['width'] if is_unset(width_raw) else self.generator.format_css_value('bandeira-width', width_raw)
+        height = badge['height'] if is_unset(height_raw) else self.generator.format_css_value('bandeira-height', height_raw)
+        right = badge['right'] if is_unset(right_raw) else self.generator.format_css_value('bandeira-right', right_raw)
+        left = badge['left'] if is_unset(left_raw) else self.generator.format_css_value('bandeira-left', left_raw)
+
+        badge_top = parse_px(badge['top'], 8) if badge['top'] != 'auto' else 8
+        if badge['height'] != 'auto':
+            badge_height = parse_px(badge['height'], 60)
+        else:
+            badge_height = parse_px(badge['font_size'], 22) * 2 + 16
+        bandeira_height = parse_px(height, badge_height) if height != 'auto' else badge_height
+
+        def top_with_minimum(minimum):
+            # Valores do editor abaixo do mínimo são empurrados para baixo do selo
+            if not is_unset(top_raw):
+                value = parse_px(top_raw)
+                if value is not None:
+                    return max(int(value), minimum)
+            return minimum
+
+        top, bottom = None, None
+        if badge['bottom'] == 'auto' and badge['top'] != 'auto':
+            top = top_with_minimum(int(badge_top + badge_height + 5))
+        elif badge['bottom'] != 'auto':
+            container_height = parse_px(self._value('produto-imagem-container-height', 420), 420)
+            badge_bottom = parse_px(badge['bottom'], 0)
+            minimum = int(container_height - badge_bottom - badge_height + badge_height + 5)
+            if 0 < minimum < container_height:
+                if not is_unset(top_raw):
+                    top = top_with_minimum(minimum)
+                elif not is_unset(bottom_raw) and parse_px(bottom_raw) is not None:
+                    bandeira_bottom = parse_px(bottom_raw)
+                    if container_height - bandeira_bottom - bandeira_height < minimum:
+                        top = minimum
+                    else:
+                        bottom = bandeira_bottom
+                else:
+                    top = minimum
+            else:
+                top = int(badge_top + badge_height + 5)
+        else:
+            top = top_with_minimum(int(badge_top + badge_height + 5))
+
+        w, h = self._box_size(img, parse_px(width), parse_px(height))
+        y = top if top is not None else ic_h - bottom - h
+        if left != 'auto':
+            x = parse_px(left, 0)
+        elif right != 'auto':
+            x = ic_w - parse_px(right, 0) - w
+        else:
+            x = 0
+        paints.append((2, self._image_box_paint(key, img, ic_x + x, ic_y + y, w, h, 'cover')))
+
+    def _layout_produto_info(self, codigo, nome, preco_comercial, preco_promocional, unidade_medida,
+                             info_x, info_y, info_w):
+        """Nome, código e preços (.produto-info com padding 10px 5px)
+
+        Returns:
+            tuple: (lista de (z, função de desenho), altura do bloco)
+        """
+        paints = []
+        content_x, content_y, content_w = info_x + 5, info_y + 10, info_w - 10
+
+        nome_family = self._value('produto-nome-font-family', "'Montserrat', sans-serif")
+        nome_weight = self._value('produto-nome-font-weight', 'bold')
+        nome_style = self._value('produto-nome-font-style', 'normal')
+        nome_color = parse_color(self._value('produto-nome-color', '#1a1a1a'))
+        nome_size = self._font_size('produto-nome-font-size', 16)
+
+        # Nome: até 3 linhas, fonte reduzida em até 40% até caber (mesmo ajuste do script do HTML)
+        item_max_width = parse_px(self._css('produto-item-max-width', 320), 320)
+        nome_box_w = item_max_width - 40
+        nome_box_h = nome_size * 1.2 * 3
+        nome_x = info_x + self._int('produto-nome-left', 0)
+        nome_y = info_y + self._int('produto-nome-top', 0)
+        size = nome_size
+        while True:
+            font = self._font(nome_family, nome_weight, nome_style, size)
+            lines = wrap_text(nome, font, nome_box_w - 10)
+            if len(lines) * size * 1.2 <= nome_box_h or size <= nome_size * 0.6:
+                break
+            size = max(nome_size * 0.6, size - 1)
+        if len(lines) > 3:
+            lines = lines[:3]
+            while lines[2] and font.getlength(lines[2] + '…') > nome_box_w - 10:
+                lines[2] = lines[2][:-1]
+            lines[2] = lines[2].rstrip() + '…'
+        line_height = size * 1.2
+        top = nome_y + (nome_box_h - len(lines) * line_height) / 2.0
+        nome_runs = []
+        for i, line in enumerate(lines):
+            run = TextRun(0, self._baseline(font, top + i * line_height, line_height), line, font, nome_color)
+            run.x = nome_x + 5 + (nome_box_w - 10 - run.width) / 2.0
+            nome_runs.append(run)
+        paints.append((1, lambda canvas: self._draw_runs(canvas, nome_runs)))
+
+        # Código (inline-block com deslocamento relativo e margin-bottom 8px)
+        codigo_font = self._font(self._value('produto-codigo-font-family', "'Roboto', sans-serif"),
+                                 self._value('produto-codigo-font-weight', 'normal'),
+                                 self._value('produto-codigo-font-style', 'normal'),
+                                 self._font_size('produto-codigo-font-size', 14))
+        codigo_color = parse_color(self._value('produto-codigo-color', '#666666'))
+        codigo_line = self._line_height(codigo_font)
+        runs = [TextRun(content_x + self._int('produto-codigo-left', 0),
+                        self._baseline(codigo_font, content_y + self._int('produto-codigo-top', 0)),
+                        f'COD. {codigo}', codigo_font, codigo_color)]
+        y = content_y + codigo_line + 8
+
+        # Linha DE / preço comercial / POR (flex, gap 16px, alinhada pela base)
+        comercial_family = self._value('preco-comercial-font-family', "'Roboto', sans-serif")
+        comercial_weight = self._value('preco-comercial-font-weight', 'normal')
+        comercial_style = self._value('preco-comercial-font-style', 'normal')
+        comercial_size = self._font_size('preco-comercial-font-size', 14)
+        comercial_color = parse_color(self._value('preco-comercial-color', '#e53935'))
+        comercial_font = self._font(comercial_family, comercial_weight, comercial_style, comercial_size)
+        comercial_rs_font = self._font(comercial_family, comercial_weight, comercial_style, comercial_size * 0.6)
+        de_font = self._font(nome_family, nome_weight, nome_style,
+                             parse_px(self._css('preco-de-font-size', self._value('preco-de-font-size', nome_size)), nome_size))
+        por_font = self._font(nome_family, nome_weight, nome_style,
+                              parse_px(self._css('preco-por-font-size', self._value('preco-por-font-size', nome_size)), nome_size))
+
+        comercial_text = f'{preco_comercial:.2f}'.replace('.', ',')
+        linha = [
+            ('DE', [('DE', de_font, nome_color)], 'preco-de'),
+            ('comercial', [('R$', comercial_rs_font, comercial_color), (comercial_text, comercial_font, comercial_color)], 'preco-comercial'),
+            ('POR', [('POR', por_font, nome_color)], 'preco-por')
+        ]
+        fonts = [font for _, partes, _ in linha for _, font, _ in partes]
+        ascent = max(font.getmetrics()[0] for font in fonts)
+        descent = max(font.getmetrics()[1] for font in fonts)
+        widths = [sum(font.getlength(texto) for texto, font, _ in partes) for _, partes, _ in linha]
+        x = content_x + (content_w - (sum(widths) + 16 * (len(linha) - 1))) / 2.0
+        baseline = y + ascent
+        for (_, partes, chave), largura in zip(linha, widths):
+            run_x = x + self._int(f'{chave}-left', 0)
+            run_baseline = baseline + self._int(f'{chave}-top', 0)
+            for texto, font, color in partes:
+                runs.append(TextRun(run_x, run_baseline, texto, font, color))
+                run_x += font.getlength(texto)
+            x += largura + 16
+        y += ascent + descent + 6
+
+        # Preço promocional: R$ (menor), inteiro, vírgula e centavos (line-height: 1, flex-start)
+        promo_family = self._value('preco-promocional-font-family', "'Montserrat', sans-serif")
+        promo_weight = self._value('preco-promocional-font-weight', 'bold')
+        promo_style = self._value('preco-promocional-font-style', 'normal')
+        promo_size = self._font_size('preco-promocional-font-size', 28)
+        promo_color = parse_color(self._value('preco-promocional-color', '#FF6B00'))
+        rs_size = promo_size * self._em_value('preco-rs-font-size', 0.5)
+        decimal_size = promo_size * self._em_value('preco-decimal-font-size', 0.65)
+        rs_color = parse_color(self._value('preco-rs-color', '#FF6B00'))
+        decimal_color = parse_color(self._value('preco-decimal-color', '#FF6B00'))
+        rs_align = str(self._value('preco-rs-vertical-align', 'center')).lower()
+
+        promo_font = self._font(promo_family, promo_weight, promo_style, promo_size)
+        rs_font = self._font(promo_family, promo_weight, promo_style, rs_size)
+        decimal_font = self._font(promo_family, promo_weight, promo_style, decimal_size)
+        integer_part, decimal_part = f'{preco_promocional:.2f}'.split('.')
+
+        y += self._int('preco-promocional-top', 0)
+        if rs_align in ('top', 'flex-start', 'start'):
+            rs_top = y
+        elif rs_align in ('bottom', 'flex-end', 'end'):
+            rs_top = y + promo_size - rs_size
+        else:
+            rs_top = y + (promo_size - rs_size) / 2.0
+        partes = [
+            ('R$', rs_font, rs_color, self._baseline(rs_font, rs_top, rs_size), 5),
+            (integer_part, promo_font, promo_color, self._baseline(promo_font, y, promo_size), 0),
+            (',', decimal_font, decimal_color, self._baseline(decimal_font, y, decimal_size), 0),
+            (decimal_part, decimal_font, decimal_color, self._baseline(decimal_font, y, decimal_size), 0)
+        ]
+        if rs_align == 'baseline':
+            partes[0] = partes[0][:3] + (partes[1][3], 5)
+        total_w = sum(font.getlength(texto) + margem for texto, font, _, _, margem in partes)
+        x = content_x + (content_w - total_w) / 2.0 + self._int('preco-promocional-left', 0)
+        for texto, font, color, run_baseline, margem in partes:
+            runs.append(TextRun(x, run_baseline, texto, font, color))
+            x += font.getlength(texto) + margem
+        y += promo_size
+
+        # Linha "POR <unidade de medida>"
+        if unidade_medida:
+            y += 6 + self._int('preco-por-unidade-top', 0)
+            unidade_font = self._font(nome_family, nome_weight, nome_style,
+                                      parse_px(self._css('preco-por-unidade-font-size',
+                                                         self._value('preco-por-unidade-font-size', nome_size)), nome_size))
+            run = TextRun(0, self._baseline(unidade_font, y), f'POR {unidade_medida}', unidade_font, nome_color)
+            run.x = content_x + (content_w - run.width) / 2.0 + self._int('preco-por-unidade-left', 0)
+            runs.append(run)
+            y += self._line_height(unidade_font)
+
+        paints.append((0, lambda canvas: self._draw_runs(canvas, runs)))
+        height = (y - info_y) + 8 + 10  # margin-bottom dos preços + padding inferior
+        return paints, height
+
+    def _em_value(self, key, default):
+        """Tamanho relativo (em) do template: 0.5 ou '0.5em'"""
+        try:
+            return float(str(self._value(key, default)).replace('em', '').replace(',', '.'))
+        except ValueError:
+            return default
+
+    # ------------------------------------------------------------------
+    # Textos do banner
+    # ------------------------------------------------------------------
+    def _layout_unidade(self, paints, unidade):
+        """Nome da unidade no topo (.unidade-text)"""
+        font = self._font("'Montserrat', sans-serif", 'bold', 'normal', 42)
+        run = TextRun(40, self._baseline(font, 30), str(unidade).upper(), font, (255, 255, 255, 255), letter_spacing=2)
+        paints.append((30, lambda canvas: self._draw_runs(canvas, [run], shadow=(0, 3, 6, (0, 0, 0, 115)))))
+
+    def _layout_impulsionamento(self, paints):
+        """Frase de impulsionamento (formatação inline do editor é desenhada como texto simples)"""
+        texto = self._value('impulsionamento-text', '')
+        if not texto:
+            return
+        texto = re.sub(r'<br\s*/?>|</p>|</div>', '\n', str(texto), flags=re.I)
+        texto = unescape(re.sub(r'<[^>]+>', '', texto)).strip()
+        if not texto or 'Digite sua frase' in texto:
+            return
+
+        font_size = self._int('impulsionamento-font-size', 32)
+        font = self._font(self._value('impulsionamento-font-family', "'Bebas Neue', sans-serif"), 'normal', 'normal', font_size)
+        color = parse_color(self._value('impulsionamento-color', '#FFFFFF'))
+        width = self._int('impulsionamento-width', 800)
+        top = self._int('impulsionamento-top', 0)
+        bottom = self._int('impulsionamento-bottom', 0)
+        left = self._int('impulsionamento-left', 540)
+        right = self._int('impulsionamento-right', 0)
+
+        lines = wrap_text(texto, font, width)
+        line_height = self._line_height(font)
+        block_height = self._int('impulsionamento-height', 0) or line_height * len(lines)
+        y = self.height - bottom - block_height if bottom > 0 else top
+        x = self.width - right - width if right > 0 else left
+        runs = []
+        for i, line in enumerate(lines):
+            run = TextRun(0, self._baseline(font, y + i * line_height), line, font, color)
+            run.x = x + (width - run.width) / 2.0
+            runs.append(run)
+        paints.append((40, lambda canvas: self._draw_runs(canvas, runs, shadow=(0, 2, 4, (0, 0, 0, 128)))))
+
+    def _layout_footer(self, paints, unidade, nome_empresa, data_inicio, data_fim):
+        """Rodapé com as condições da promoção (horizontal ou vertical)"""
+        line1, line2 = self.generator.build_footer_lines(unidade, nome_empresa, data_inicio, data_fim)
+        texto = f'{line1} {line2}' if line2 else line1
+
+        font_size = parse_px(self._css('footer-font-size', 26), 26.0)
+        font = self._font("'Montserrat', sans-serif", '500', 'normal', font_size)
+        color = parse_color(self._value('footer-color', '#FFFFFF'))
+        width = parse_px(self._css('footer-width', 900), 900)
+        left = parse_length(self._css('footer-left', 50), self.width, self.width / 2.0)
+
+        def css_zero_aware(key, default):
+            raw = self._value(key, default)
+            if isinstance(raw, str) and raw.strip() == '0':
+                raw = 0
+            return parse_px(self.generator.format_css_value(key, raw))
+
+        top = css_zero_aware('footer-top', 0)
+        bottom = css_zero_aware('footer-bottom', 5)
+        vertical = str(self._value('footer-rotation', 'horizontal')).lower() == 'vertical'
+
+        lines = wrap_text(texto, font, width)
+        line_height = font_size * 1.2
+        height = line_height * len(lines)
+        if top is not None:
+            y = top
+        elif bottom is not None:
+            y = self.height - bottom - height
+        else:
+            y = self.height - height
+        x = left - width / 2.0
+
+        def paint(canvas):
+            # Desenha em camada própria para permitir rotate(-90deg) em torno do centro
+            margin = 8
+            layer = Image.new('RGBA', (int(width) + margin * 2, int(math.ceil(height)) + margin * 2), (0, 0, 0, 0))
+            runs = []
+            for i, line in enumerate(lines):
+                run = TextRun(0, self._baseline(font, margin + i * line_height, line_height), line, font, color)
+                run.x = margin + (width - run.width) / 2.0
+                runs.append(run)
+            self._draw_runs(layer, runs, shadow=(0, 2, 4, (0, 0, 0, 153)))
+            if vertical:
+                center_x, center_y = x + width / 2.0, y + height / 2.0
+                layer = layer.rotate(90, expand=True, resample=Image.BICUBIC)
+                self._paste(canvas, layer, center_x - layer.width / 2.0, center_y - layer.height / 2.0)
+            else:
+                self._paste(canvas, layer, x - margin, y - margin)
+        paints.append((25, paint))
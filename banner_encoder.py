@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Estágio de codificação dos banners
+Recebe o screenshot bruto do Chromium (bytes PNG) e gera a imagem final
+em JPEG progressivo otimizado, WebP ou AVIF, com limite de tamanho opcional
+(ex: < 300 KB para o WhatsApp) e versões em outras resoluções.
+"""
+import io
+import os
+import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, features
+
+# Configuração (variáveis de ambiente)
+BANNER_OUTPUT_FORMAT = os.getenv('BANNER_OUTPUT_FORMAT', 'jpeg').lower()  # jpeg | webp | avif
+BANNER_OUTPUT_QUALITY = int(os.getenv('BANNER_OUTPUT_QUALITY', '90'))
+BANNER_MIN_QUALITY = int(os.getenv('BANNER_MIN_QUALITY', '50'))
+BANNER_MAX_BYTES = int(os.getenv('BANNER_MAX_BYTES', '0'))  # 0 = sem limite (ex: 300000 para WhatsApp)
+BANNER_EXTRA_WIDTHS = os.getenv('BANNER_EXTRA_WIDTHS', '')  # ex: "540,720" (versões reduzidas)
+BANNER_ENCODER_WORKERS = int(os.getenv('BANNER_ENCODER_WORKERS', '2'))
+
+# formato -> (formato Pillow, extensão, MIME)
+OUTPUT_FORMATS = {
+    'jpeg': ('JPEG', '.jpg', 'image/jpeg'),
+    'jpg': ('JPEG', '.jpg', 'image/jpeg'),
+    'webp': ('WEBP', '.webp', 'image/webp'),
+    'avif': ('AVIF', '.avif', 'image/avif')
+}
+
+
+def parse_widths(value):
+    """Converte "540,720" em [540, 720] (ignora valores inválidos)"""
+    widths = []
+    for item in str(value or '').split(','):
+        item = item.strip()
+        if item.isdigit() and int(item) > 0:
+            widths.append(int(item))
+    return sorted(set(widths), reverse=True)
+
+
+def is_format_supported(output_format):
+    """Verifica se o Pillow instalado consegue gravar o formato"""
+    output_format = output_format.lower()
+    if output_format in ('jpeg', 'jpg'):
+        return True
+    if output_format == 'webp':
+        return features.check('webp')
+    if output_format == 'avif':
+        try:
+            if features.check('avif'):
+                return True
+        except Exception:
+            pass
+        # Pillow < 11.3 precisa do plugin pillow-avif-plugin
+        try:
+            import pillow_avif  # noqa: F401
+            return True
+        except ImportError:
+            return False
+    return False
+
+
+class EncodedImage:
+    """Imagem codificada em memória"""
+
+    def __init__(self, data, output_format, quality, width, height):
+        self.data = data
+        self.output_format = output_format
+        self.quality = quality
+        self.width = width
+        self.height = height
+        _, self.extension, self.mime_type = OUTPUT_FORMATS[output_format]
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return f'<EncodedImage {self.output_format} {self.width}x{self.height} q={self.quality} {self.size / 1024:.0f}KB>'
+
+
+class RenderedBanner:
+    """Banner final em memória
+
+    O mesmo objeto é compartilhado entre upload ao Cloudinary, fila do WhatsApp,
+    Telegram e gravação em disco, evitando reler o arquivo a cada destino.
+    """
+
+    def __init__(self, filename, data, mime_type='image/jpeg', path=None, url=None, variants=None):
+        """
+        Args:
+            filename: Nome do arquivo (ex: Unidade-01-01-2025-001-10-00-00.jpg)
+            data: Bytes da imagem codificada
+            mime_type: Tipo MIME da imagem
+            path: Caminho local se o banner foi gravado em disco
+            url: URL pública no Cloudinary
+            variants: {largura: EncodedImage} com versões reduzidas
+        """
+        self.filename = filename
+        self.data = data
+        self.mime_type = mime_type
+        self.path = path
+        self.url = url
+        self.variants = variants or {}
+        self._base64 = None
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    @property
+    def base64(self):
+        """Conteúdo em base64 (calculado uma única vez, usado no envio ao WhatsApp)"""
+        with self._lock:
+            if self._base64 is None:
+                self._base64 = base64.b64encode(self.data).decode('ascii')
+            return self._base64
+
+    @property
+    def location(self):
+        """Melhor referência do banner: caminho local, URL ou nome do arquivo"""
+        return self.path or self.url or self.filename
+
+    @classmethod
+    def from_file(cls, path, url=None):
+        """Carrega um banner já gravado em disco (uma leitura)"""
+        with open(path, 'rb') as f:
+            data = f.read()
+        mime_type = next((info[2] for info in OUTPUT_FORMATS.values() if path.lower().endswith(info[1])), 'image/jpeg')
+        return cls(os.path.basename(path), data, mime_type, path=path, url=url)
+
+    def __repr__(self):
+        return f'<RenderedBanner {self.filename} {self.size / 1024:.0f}KB>'
+
+
+class BannerEncoder:
+    """Codificador de banners com pool de threads
+
+    O Pillow libera o GIL durante a compressão, então a versão principal e as
+    versões reduzidas são codificadas em paralelo.
+    """
+
+    def __init__(self, output_format=None, quality=None, max_bytes=None, min_quality=None,
+                 extra_widths=None, max_workers=None):
+        """Inicializa o codificador
+
+        Args:
+            output_format: 'jpeg', 'webp' ou 'avif' (padrão: BANNER_OUTPUT_FORMAT)
+            quality: Qualidade inicial/máxima (padrão: BANNER_OUTPUT_QUALITY)
+            max_bytes: Tamanho máximo em bytes (0/None = sem limite)
+            min_quality: Qualidade mínima aceita na busca pelo tamanho alvo
+            extra_widths: Lista de larguras adicionais (ex: [720, 540])
+            max_workers: Threads do pool de codificação
+        """
+        output_format = (output_format or BANNER_OUTPUT_FORMAT).lower()
+        if output_format not in OUTPUT_FORMATS:
+            print(f'⚠ Formato de saída inválido "{output_format}". Usando JPEG.')
+            output_format = 'jpeg'
+        if output_format == 'jpg':
+            output_format = 'jpeg'
+        if not is_format_supported(output_format):
+            fallback = 'webp' if output_format == 'avif' and is_format_supported('webp') else 'jpeg'
+            print(f'⚠ Formato {output_format.upper()} não suportado pelo Pillow instalado. Usando {fallback.upper()}.')
+            output_format = fallback
+
+        self.output_format = output_format
+        self.quality = quality or BANNER_OUTPUT_QUALITY
+        self.max_bytes = BANNER_MAX_BYTES if max_bytes is None else max_bytes
+        self.min_quality = min(min_quality or BANNER_MIN_QUALITY, self.quality)
+        self.extra_widths = parse_widths(BANNER_EXTRA_WIDTHS) if extra_widths is None else sorted(set(extra_widths), reverse=True)
+        self.max_workers = max_workers or BANNER_ENCODER_WORKERS
+        self.executor = None
+        self.executor_lock = threading.Lock()
+
+    @property
+    def extension(self):
+        """Extensão do arquivo principal ('.jpg', '.webp', '.avif')"""
+        return OUTPUT_FORMATS[self.output_format][1]
+
+    def _get_executor(self):
+        with self.executor_lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='banner-encoder')
+            return self.executor
+
+    def _save(self, img, quality):
+        """Codifica a imagem na qualidade informada e retorna os bytes"""
+        buffer = io.BytesIO()
+        pil_format = OUTPUT_FORMATS[self.output_format][0]
+        if pil_format == 'JPEG':
+            img.save(buffer, format='JPEG', quality=quality, optimize=True, progressive=True, subsampling='4:2:0')
+        elif pil_format == 'WEBP':
+            img.save(buffer, format='WEBP', quality=quality, method=4)
+        else:
+            img.save(buffer, format='AVIF', quality=quality)
+        return buffer.getvalue()
+
+    def _encode_image(self, img):
+        """Codifica respeitando o tamanho máximo (busca binária na qualidade)
+
+        Retorna a maior qualidade cujo resultado cabe em max_bytes. Se nem a
+        qualidade mínima couber, retorna a versão na qualidade mínima.
+        """
+        data = self._save(img, self.quality)
+        if not self.max_bytes or len(data) <= self.max_bytes:
+            return EncodedImage(data, self.output_format, self.quality, img.width, img.height)
+
+        best_data, best_quality = None, None
+        low, high = self.min_quality, self.quality - 1
+        while low <= high:
+            mid = (low + high) // 2
+            candidate = self._save(img, mid)
+            if len(candidate) <= self.max_bytes:
+                best_data, best_quality = candidate, mid
+                low = mid + 1
+            else:
+                high = mid - 1
+
+        if best_data is None:
+            best_quality = self.min_quality
+            best_data = self._save(img, best_quality)
+            print(f'  ⚠ Banner com {len(best_data) / 1024:.0f}KB mesmo na qualidade mínima ({best_quality}); limite: {self.max_bytes / 1024:.0f}KB')
+
+        return EncodedImage(best_data, self.output_format, best_quality, img.width, img.height)
+
+    def _encode_width(self, img, width):
+        """Redimensiona (mantendo proporção) e codifica"""
+        if width and width < img.width:
+            height = round(img.height * width / img.width)
+            img = img.resize((width, height), Image.LANCZOS)
+        return self._encode_image(img)
+
+    def encode(self, raw_bytes):
+        """Codifica o screenshot bruto na versão principal e nas versões reduzidas
+
+        A decodificação acontece na thread chamadora; as compressões rodam no pool.
+        Não chamar de dentro de uma thread do próprio pool.
+
+        Args:
+            raw_bytes: Bytes do screenshot (PNG) retornados por page.screenshot()
+
+        Returns:
+            dict: {'main': EncodedImage, <largura>: EncodedImage, ...}
+        """
+        return self.encode_image(Image.open(io.BytesIO(raw_bytes)))
+
+    def encode_image(self, img):
+        """Codifica uma imagem já em memória (ex: banner do compositor Pillow)
+
+        Mesmo fluxo de encode(), sem a ida e volta por PNG.
+
+        Args:
+            img: PIL.Image do banner
+
+        Returns:
+            dict: {'main': EncodedImage, <largura>: EncodedImage, ...}
+        """
+        img = img.convert('RGB')  # Decodifica uma vez; JPEG/WebP sem alfa
+
+        executor = self._get_executor()
+        futures = {'main': executor.submit(self._encode_image, img)}
+        for width in self.extra_widths:
+            if width < img.width:
+                futures[width] = executor.submit(self._encode_width, img, width)
+        return {key: future.result() for key, future in futures.items()}
+
+    def output_path_for(self, output_path, width=None):
+        """Caminho do arquivo com a extensão do formato (e sufixo da largura, se houver)
+
+        Ex: banners/x.jpg -> banners/x.webp ou banners/x-540w.webp
+        """
+        base, _ = os.path.splitext(output_path)
+        if width:
+            base = f'{base}-{width}w'
+        return base + self.extension
+
+    def write(self, encoded, output_path):
+        """Grava a versão principal e as versões reduzidas em disco
+
+        Args:
+            encoded: Resultado de encode()
+            output_path: Caminho base do banner
+
+        Returns:
+            str: Caminho do arquivo principal gravado
+        """
+        main_path = None
+        for key, image in encoded.items():
+            width = None if key == 'main' else key
+            path = self.output_path_for(output_path, width)
+            with open(path, 'wb') as f:
+                f.write(image.data)
+            if key == 'main':
+                main_path = path
+        return main_path
+
+    def to_banner(self, encoded, output_path):
+        """Cria o RenderedBanner (em memória) a partir do resultado de encode()
+
+        Args:
+            encoded: Resultado de encode()
+            output_path: Caminho base do banner (define o nome do arquivo)
+
+        Returns:
+            RenderedBanner: Banner ainda não gravado em disco (path=None)
+        """
+        principal = encoded['main']
+        variants = {key: image for key, image in encoded.items() if key != 'main'}
+        filename = os.path.basename(self.output_path_for(output_path))
+        return RenderedBanner(filename, principal.data, principal.mime_type, variants=variants)
+
+    def write_banner(self, banner, output_path):
+        """Grava o banner (e as versões reduzidas) em disco uma única vez
+
+        Args:
+            banner: RenderedBanner
+            output_path: Caminho base do banner
+
+        Returns:
+            str: Caminho do arquivo principal gravado
+        """
+        main_path = self.output_path_for(output_path)
+        with open(main_path, 'wb') as f:
+            f.write(banner.data)
+        for width, image in banner.variants.items():
+            with open(self.output_path_for(output_path, width), 'wb') as f:
+                f.write(image.data)
+        banner.path = main_path
+        return main_path
+
+    def shutdown(self):
+        """Finaliza o pool de threads"""
+        with self.executor_lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=True)
+                self.executor = None
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark do acesso ao banco de e-mails (EmailDatabase)
+
+Cria uma tabela emails com N linhas (padrão: 100.000) em um diretório
+temporário e mede a latência por chamada das operações usadas pelo monitor
+de e-mails em dois modos:
+  - antes: uma conexão nova por chamada, journal_mode=DELETE (padrão do SQLite)
+  - depois: SQLitePool (conexões reaproveitadas, WAL, synchronous=NORMAL)
+
+Também mede leituras concorrentes (threads) enquanto uma thread escreve.
+
+Uso:
+    python benchmark_email_database.py [--linhas 100000] [--chamadas 2000] [--threads 4]
+"""
+import io
+import os
+import sys
+import time
+import contextlib
+import random
+import sqlite3
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+# Adicionar o diretório atual ao path para importar email_database
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from email_database import EmailDatabase, normalize_received_date
+
+
+class ConexaoPorChamada:
+    """Comportamento anterior ao pool: abre e fecha uma conexão a cada chamada"""
+
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+
+    def acquire(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def release(self, conn):
+        conn.close()
+
+    def close_all(self):
+        pass
+
+
+def parse_args(argv):
+    """Lê --linhas, --chamadas e --threads da linha de comando"""
+    args = {'linhas': 100000, 'chamadas': 2000, 'threads': 4}
+    for i, arg in enumerate(argv):
+        if arg.startswith('--') and arg[2:] in args and i + 1 < len(argv):
+            args[arg[2:]] = int(argv[i + 1])
+    return args
+
+
+def popular(db_path, linhas):
+    """Cria o banco com o esquema atual e insere `linhas` e-mails sintéticos
+
+    Returns:
+        list: (message_id, code, phone) de todas as linhas
+    """
+    EmailDatabase(db_path).pool.close_all()
+    inicio = datetime.now() - timedelta(days=90)
+    registros = []
+    chaves = []
+    for i in range(linhas):
+        message_id = f'msg{i:08d}'
+        code = str(1000 + i % 5000)
+        phone = f'88{9000000 + i % 20000:07d}'
+        date_received = (inicio + timedelta(seconds=i * 77)).strftime('%a, %d %b %Y %H:%M:%S -0300')
+        received_at, received_day = normalize_received_date(date_received)
+        registros.append((message_id, f't{i}', 'Erro de Login Whatsapp', 'monitor@exemplo.com', date_received,
+                          received_at, received_day, 'corpo ' * 40, code, phone, '5588999990000',
+                          'mensagem', 'https://exemplo.com', i % 3 == 0))
+        chaves.append((message_id, code, phone))
+
+    conn = sqlite3.connect(str(db_path))
+    conn.executemany('''
+        INSERT INTO emails (message_id, thread_id, subject, from_email, date_received,
+                            received_at, received_day, email_body, code, phone, telefone_vendedor,
+                            whatsapp_message, authorization_link, enviado_whatsapp)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', registros)
+    conn.commit()
+    conn.close()
+    return chaves
+
+
+def abrir(db_path, antes):
+    """EmailDatabase no modo antes (conexão por chamada, DELETE) ou depois (pool, WAL)"""
+    db = EmailDatabase(db_path)
+    db.pool.close_all()
+    if antes:
+        conn = sqlite3.connect(str(db_path))
+        conn.execute('PRAGMA journal_mode = DELETE')
+        conn.close()
+        db.pool = ConexaoPorChamada(db_path)
+    return db
+
+
+def medir(nome, funcao, chamadas):
+    """Executa a função `chamadas` vezes e retorna a latência média/p95 em ms"""
+    tempos = []
+    for i in range(chamadas):
+        inicio = time.perf_counter()
+        funcao(i)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    return nome, sum(tempos) / len(tempos), tempos[int(len(tempos) * 0.95) - 1]
+
+
+def executar(db, chaves, chamadas, threads):
+    """Mede as operações do monitor e a leitura concorrente com escrita"""
+    amostra = random.Random(42).sample(chaves, chamadas)
+    resultados = [
+        medir('get_email_by_message_id', lambda i: db.get_email_by_message_id(amostra[i][0]), chamadas),
+        medir('check_already_sent (code+phone)',
+              lambda i: db.check_already_sent_by_client_and_phone(amostra[i][1], amostra[i][2], amostra[i][0]), chamadas),
+        medir('claim_email + release_email', lambda i: (db.claim_email(amostra[i][0], 'benchmark'),
+                                                        db.release_email(amostra[i][0], 'benchmark')), chamadas),
+        medir('save_email (novo)', lambda i: db.save_email(
+            f'novo{i:08d}', 't', 'Erro de Login Whatsapp', 'monitor@exemplo.com', datetime.now().isoformat(),
+            'corpo', {'code': '1', 'phone': '2', 'telefone_vendedor': '3'}, 'mensagem', 'link'), chamadas)
+    ]
+
+    # Leituras em várias threads com uma thread gravando ao mesmo tempo
+    parar = threading.Event()
+    erros = []
+
+    def escritor():
+        i = 0
+        while not parar.is_set():
+            try:
+                db.claim_email(amostra[i % len(amostra)][0], 'benchmark')
+                db.release_email(amostra[i % len(amostra)][0], 'benchmark')
+            except Exception as e:
+                erros.append(str(e))
+            i += 1
+
+    def leitor(indice, total):
+        for i in range(indice, chamadas, total):
+            try:
+                db.get_email_by_message_id(amostra[i][0])
+            except Exception as e:
+                erros.append(str(e))
+
+    thread_escrita = threading.Thread(target=escritor)
+    thread_escrita.start()
+    inicio = time.perf_counter()
+    leitores = [threading.Thread(target=leitor, args=(n, threads)) for n in range(threads)]
+    for thread in leitores:
+        thread.start()
+    for thread in leitores:
+        thread.join()
+    duracao = time.perf_counter() - inicio
+    parar.set()
+    thread_escrita.join()
+    resultados.append((f'leituras concorrentes ({threads} threads + 1 escrita)', duracao * 1000 / chamadas, None))
+    return resultados, erros
+
+
+if __name__ == '__main__':
+    args = parse_args(sys.argv[1:])
+    pasta = tempfile.mkdtemp(prefix='benchmark-emails-')
+    try:
+        print('=' * 70)
+        print(f'BENCHMARK EmailDatabase: {args["linhas"]} linhas, {args["chamadas"]} chamadas por operação')
+        print('=' * 70)
+
+        base = os.path.join(pasta, 'base.db')
+        inicio = time.time()
+        chaves = popular(base, args['linhas'])
+        print(f'📦 Banco populado em {time.time() - inicio:.1f}s')
+
+        medicoes = {}
+        for modo, antes in (('antes', True), ('depois', False)):
+            db_path = os.path.join(pasta, f'{modo}.db')
+            shutil.copy(base, db_path)
+            db = abrir(db_path, antes)
+            # Os logs das consultas (duplicatas, marcações) não entram na medição
+            with contextlib.redirect_stdout(io.StringIO()):
+                medicoes[modo], erros = executar(db, chaves, args['chamadas'], args['threads'])
+            db.pool.close_all()
+            if erros:
+                print(f'⚠️ {modo}: {len(erros)} erro(s) na execução concorrente (ex: {erros[0]})')
+
+        print()
+        print(f'{"operação":<48} {"antes (ms)":>10} {"depois (ms)":>11} {"ganho":>7}')
+        print('-' * 80)
+        for (nome, media_antes, p95_antes), (_, media_depois, p95_depois) in zip(medicoes['antes'], medicoes['depois']):
+            ganho = media_antes / media_depois if media_depois else 0
+            print(f'{nome:<48} {media_antes:>10.3f} {media_depois:>11.3f} {ganho:>6.1f}x')
+            if p95_antes is not None:
+                print(f'{"  p95":<48} {p95_antes:>10.3f} {p95_depois:>11.3f}')
+        print('-' * 80)
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark da extração de informações dos e-mails "Erro de Login Whatsapp"
+
+Gera um corpus de corpos de e-mail representativos (texto puro e texto vindo
+de HTML, com e sem nome da assistente, telefones de 8 e 9 dígitos, campos
+ausentes, corpos com rodapé longo) e compara:
+  - antes: sete re.search independentes sobre o corpo inteiro
+  - padrão único: uma alternativa por campo, uma passada com finditer
+    (alternativa avaliada e descartada; mantida aqui como referência)
+  - depois: extract_email_info (padrões pré-compilados no módulo)
+  - depois + cache: extract_email_info com message_id (segunda extração do mesmo e-mail)
+
+Também confere que as duas implementações retornam o mesmo resultado em todo o corpus.
+
+Uso:
+    python benchmark_email_processor.py [--emails 2000] [--repeticoes 5]
+"""
+import os
+import re
+import sys
+import time
+import random
+
+# Adicionar o diretório atual ao path para importar email_processor
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from email_processor import extract_email_info, EXTRACT_CACHE_SIZE
+
+NOMES = ['JOAO CARLOS SILVA', 'MARIA DE FATIMA SOUSA', 'ANTÔNIO CONCEIÇÃO', 'JOSÉ RIBAMAR', 'ANA PAULA LIMA']
+ASSISTENTES = ['Patiocanoagrill', 'Mercadinho São José', 'Casa de Carnes Boi Gordo', '', 'Churrascaria do Zé']
+EMPRESAS = ['PATIO GRILL', 'MERCADINHO SAO JOSE LTDA', 'CASA DE CARNES BOI GORDO', 'ACOUGUE DO POVO ME']
+RODAPE = ('Esta mensagem pode conter informação confidencial e/ou privilegiada. Se você não for o '
+          'destinatário ou a pessoa autorizada a receber esta mensagem, não pode usar, copiar ou '
+          'divulgar as informações nela contidas ou tomar qualquer ação baseada nessas informações. ')
+
+
+def extract_email_info_antes(email_body):
+    """Extração anterior: um re.search por campo (padrões compilados a cada chamada pelo cache do re)"""
+    result = {
+        'vendedor_nome_completo': '', 'vendedor_primeiro_nome': '', 'name': '', 'code': '', 'phone': '',
+        'empresa': '', 'cnpj': '', 'telefone_formatado': '', 'telefone_vendedor': ''
+    }
+    vendedor_match = re.search(r'Prezado,\s*([A-ZÁÉÍÓÚÇÃÕÂÊÔ\s]+)', email_body, re.IGNORECASE)
+    if vendedor_match:
+        nome_completo = vendedor_match.group(1).strip()
+        result['vendedor_nome_completo'] = nome_completo
+        result['vendedor_primeiro_nome'] = nome_completo.split()[0] if nome_completo.split() else nome_completo
+    name_match = re.search(r'O\(A\)\s+(.*?)\s+Cliente:', email_body, re.IGNORECASE | re.DOTALL)
+    extracted_name = name_match.group(1).strip() if name_match else ''
+    if extracted_name:
+        result['name'] = extracted_name.replace('\n', ' ').replace('\r', ' ').strip()[:100]
+    else:
+        result['name'] = '-'
+    empresa_match = re.search(r'Cliente:\s*([^-]+?)\s*-\s*CNPJ:', email_body, re.IGNORECASE)
+    if empresa_match:
+        result['empresa'] = empresa_match.group(1).strip()
+    cnpj_match = re.search(r'CNPJ:\s*([0-9./-]+)', email_body)
+    if cnpj_match:
+        result['cnpj'] = cnpj_match.group(1).strip()
+    code_match = re.search(r'Cod\s+Cliente:\s*(\d+)', email_body, re.IGNORECASE)
+    if code_match:
+        result['code'] = code_match.group(1).strip()
+    telefone_match = re.search(r'Telefone\s+utilizado:\s*\(?(\d{2})\)?\s*(\d{4,5})-?(\d{4})', email_body, re.IGNORECASE)
+    if telefone_match:
+        ddd, parte1, parte2 = telefone_match.groups()
+        result['phone'] = f"{ddd}{parte1}{parte2}"
+        result['telefone_formatado'] = f"({ddd}) {parte1}-{parte2}"
+    telefone_vendedor_match = re.search(r'Telefone\s+do\s+Vendedor:\s*\(?(\d{2})\)?\s*(\d{4,5})-?(\d{4})',
+                                        email_body, re.IGNORECASE)
+    if telefone_vendedor_match:
+        result['telefone_vendedor'] = '55' + ''.join(telefone_vendedor_match.groups())
+    return result
+
+
+# Uma passada: cada alternativa consome só a palavra-chave e captura o valor em um lookahead
+PADRAO_UNICO = re.compile(r"""
+    Prezado,(?=\s*(?P<vendedor>[A-ZÁÉÍÓÚÇÃÕÂÊÔ\s]+))
+  | O\(A\)(?=\s+(?P<name>(?s:.*?))\s+Cliente:)
+  | Cliente:(?=\s*(?P<empresa>[^-]+?)\s*-\s*CNPJ:)
+  | (?-i:CNPJ:)(?=\s*(?P<cnpj>[0-9./-]+))
+  | Cod(?=\s+Cliente:\s*(?P<code>\d+))
+  | Telefone(?=\s+utilizado:\s*\(?(?P<tel>\d{2})\)?\s*\d{4,5}-?\d{4})
+  | Telefone(?=\s+do\s+Vendedor:\s*\(?(?P<vend>\d{2})\)?\s*\d{4,5}-?\d{4})
+""", re.IGNORECASE | re.VERBOSE)
+CAMPOS_PADRAO_UNICO = ('vendedor', 'name', 'empresa', 'cnpj', 'code', 'tel', 'vend')
+
+
+def extrair_padrao_unico(email_body):
+    """Só a varredura do padrão único (primeiro acerto de cada campo), sem montar o resultado"""
+    encontrados = {}
+    for match in PADRAO_UNICO.finditer(email_body):
+        for campo in CAMPOS_PADRAO_UNICO:
+            if campo not in encontrados and match.group(campo) is not None:
+                encontrados[campo] = match
+                break
+        if len(encontrados) == len(CAMPOS_PADRAO_UNICO):
+            break
+    return encontrados
+
+
+def gerar_corpus(quantidade, seed=42):
+    """
+    Gera corpos de e-mail no formato do README_GMAIL_MONITOR.md com variações reais
+
+    Returns:
+        list: (message_id, corpo)
+    """
+    rnd = random.Random(seed)
+    corpus = []
+    for i in range(quantidade):
+        nome = rnd.choice(NOMES)
+        assistente = rnd.choice(ASSISTENTES)
+        empresa = rnd.choice(EMPRESAS)
+        cnpj = f'{rnd.randint(10, 99)}.{rnd.randint(100, 999)}.{rnd.randint(100, 999)}/0001-{rnd.randint(10, 99)}'
+        code = rnd.randint(1000000, 9999999)
+        numero = f'9{rnd.randint(1000, 9999)}-{rnd.randint(1000, 9999)}' if rnd.random() < 0.8 else \
+            f'{rnd.randint(3000, 3999)}-{rnd.randint(1000, 9999)}'
+        telefone = f'({rnd.randint(11, 99)}) {numero}'
+        telefone_vendedor = f'({rnd.randint(11, 99)}) 9{rnd.randint(1000, 9999)}-{rnd.randint(1000, 9999)}'
+        virgula = ',' if rnd.random() < 0.7 else ''
+        quebra = '\n' if rnd.random() < 0.3 else ' '  # corpo vindo de HTML quebra a linha do O(A)
+
+        corpo = (f'Prezado, {nome}{virgula}\n\n'
+                 f'O(A) {assistente}{quebra}Cliente: {empresa} - CNPJ: {cnpj} - Cod Cliente: {code} - '
+                 f'Telefone utilizado: {telefone}\n\n'
+                 'Encaminhe esse e-mail para vendermais@friboi.com.br com sua autorização para que possamos '
+                 'te ajudar com o ajuste do telefone\n\n')
+        if rnd.random() < 0.95:
+            corpo += f'Telefone do Vendedor: {telefone_vendedor}\n\n'
+        corpo += RODAPE * rnd.randint(1, 6)
+        if rnd.random() < 0.1:
+            corpo = corpo.upper()
+        corpus.append((f'msg{i:06d}', corpo))
+    return corpus
+
+
+def parse_args(argv):
+    """Lê --emails e --repeticoes da linha de comando"""
+    args = {'emails': 2000, 'repeticoes': 5}
+    for i, arg in enumerate(argv):
+        if arg.startswith('--') and arg[2:] in args and i + 1 < len(argv):
+            args[arg[2:]] = int(argv[i + 1])
+    return args
+
+
+def medir(funcao, corpus, repeticoes):
+    """Melhor tempo (s) entre as repetições para extrair o corpus inteiro"""
+    melhor = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        for message_id, corpo in corpus:
+            funcao(message_id, corpo)
+        duracao = time.perf_counter() - inicio
+        melhor = duracao if melhor is None else min(melhor, duracao)
+    return melhor
+
+
+if __name__ == '__main__':
+    args = parse_args(sys.argv[1:])
+    corpus = gerar_corpus(args['emails'])
+    tamanho_medio = sum(len(corpo) for _, corpo in corpus) / len(corpus)
+
+    print('=' * 70)
+    print(f'BENCHMARK extract_email_info: {len(corpus)} e-mails (média {tamanho_medio:.0f} caracteres)')
+    print('=' * 70)
+
+    divergencias = [message_id for message_id, corpo in corpus
+                    if extract_email_info(corpo) != extract_email_info_antes(corpo)]
+    if divergencias:
+        print(f'❌ {len(divergencias)} e-mail(s) com resultado diferente (ex: {divergencias[0]})')
+        sys.exit(1)
+    print('✅ Mesmo resultado nas duas implementações em todo o corpus')
+
+    # Cache preenchido por uma primeira extração (triagem de duplicatas), como em ingest_message;
+    # só os últimos EXTRACT_CACHE_SIZE e-mails cabem no cache
+    recentes = corpus[-EXTRACT_CACHE_SIZE:]
+    for message_id, corpo in recentes:
+        extract_email_info(corpo, message_id=message_id)
+
+    resultados = [
+        ('antes (7 x re.search)', medir(lambda _id, corpo: extract_email_info_antes(corpo), corpus, args['repeticoes'])),
+        ('padrão único (só varredura)', medir(lambda _id, corpo: extrair_padrao_unico(corpo), corpus, args['repeticoes'])),
+        ('depois (pré-compilado)', medir(lambda _id, corpo: extract_email_info(corpo), corpus, args['repeticoes'])),
+    ]
+    # Normalizado pelo tamanho do corpus para comparar com as linhas acima
+    duracao_cache = medir(lambda _id, corpo: extract_email_info(corpo, message_id=_id), recentes, args['repeticoes'])
+    resultados.append(('depois, 2ª extração (cache)', duracao_cache * len(corpus) / len(recentes)))
+
+    print()
+    print(f'{"implementação":<32} {"e-mails/s":>12} {"µs/e-mail":>10} {"ganho":>7}')
+    print('-' * 64)
+    base = resultados[0][1]
+    for nome, duracao in resultados:
+        print(f'{nome:<32} {len(corpus) / duracao:>12,.0f} {duracao * 1e6 / len(corpus):>10.1f} {base / duracao:>6.1f}x')
+    print('-' * 64)
@@ -5,6 +5,7 @@ import os
 import cloudinary
 import cloudinary.uploader
 from cloudinary.utils import cloudinary_url
+import io
 import requests
 import base64
 from pathlib import Path
@@ -59,6 +60,40 @@ def upload_image_to_cloudinary(file_path, folder='imagens', public_id=None, reso
         print(f'❌ Erro ao fazer upload de {file_path}: {e}')
         return None
 
+def upload_image_bytes_to_cloudinary(image_bytes, folder='imagens', public_id=None, resource_type='image'):
+    """
+    Upload imagem em memória (bytes) para Cloudinary, sem arquivo temporário
+    
+    Args:
+        image_bytes: Conteúdo da imagem
+        folder: Pasta no Cloudinary
+        public_id: ID público (nome do arquivo sem extensão)
+        resource_type: Tipo de recurso ('image', 'raw' para outros arquivos)
+    
+    Returns:
+        URL pública da imagem ou None se erro
+    """
+    try:
+        if not image_bytes:
+            print(f'⚠️ Imagem vazia, upload ignorado: {public_id}')
+            return None
+        
+        result = cloudinary.uploader.upload(
+            io.BytesIO(image_bytes),
+            folder=folder,
+            public_id=public_id,
+            resource_type=resource_type,
+            overwrite=True  # Sobrescrever se já existir
+        )
+        
+        url = result.get('secure_url') or result.get('url')
+        print(f'✅ Upload (memória): {public_id} → {url}')
+        return url
+        
+    except Exception as e:
+        print(f'❌ Erro ao fazer upload de {public_id}: {e}')
+        return None
+
 def upload_file_to_cloudinary(file_path, folder='files', public_id=None):
     """
     Upload arquivo genérico (CSV, Excel, JSON) para Cloudinary como 'raw'
@@ -194,6 +229,26 @@ def upload_banner_to_cloudinary(banner_path, unidade, data_atual, sequencia):
         public_id=public_id
     )
 
+def upload_banner_bytes_to_cloudinary(image_bytes, unidade, data_atual, sequencia):
+    """
+    Upload banner gerado em memória para Cloudinary (sem ler do disco)
+    
+    Args:
+        image_bytes: Bytes do banner codificado
+        unidade: Nome da unidade
+        data_atual: Data no formato DD-MM-YYYY
+        sequencia: Número sequencial do banner
+    
+    Returns:
+        URL pública do banner ou None se erro
+    """
+    public_id = f'{unidade}-{data_atual}-{sequencia:03d}'
+    return upload_image_bytes_to_cloudinary(
+        image_bytes,
+        folder='banners',
+        public_id=public_id
+    )
+
 def download_file_from_cloudinary(public_id, folder='files', save_path=None):
     """
     Download arquivo do Cloudinary (raw files como CSV, Excel, etc)
@@ -364,29 +419,16 @@ def upload_cache_image_to_cloudinary(codigo, image_bytes):
         URL pública da imagem ou None se erro
     """
     try:
-        import io
-        import tempfile
-        
-        # Criar arquivo temporário
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmp_file:
-            tmp_file.write(image_bytes)
-            tmp_path = tmp_file.name
-        
-        try:
-            # Upload para Cloudinary
-            result = cloudinary.uploader.upload(
-                tmp_path,
-                folder='cache',
-                public_id=str(codigo),
-                resource_type='image',
-                overwrite=True
-            )
-            url = result.get('secure_url') or result.get('url')
-            return url
-        finally:
-            # Limpar arquivo temporário
-            if os.path.exists(tmp_path):
-                os.remove(tmp_path)
+        # Upload direto da memória (sem arquivo temporário)
+        result = cloudinary.uploader.upload(
+            io.BytesIO(image_bytes),
+            folder='cache',
+            public_id=str(codigo),
+            resource_type='image',
+            overwrite=True
+        )
+        url = result.get('secure_url') or result.get('url')
+        return url
                 
     except Exception as e:
         print(f'❌ Erro ao fazer upload de cache para Cloudinary: {e}')
@@ -0,0 +1,397 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Outbox persistente (SQLite) dos envios de banners ao WhatsApp e Telegram
+Cada envio é registrado antes de ser despachado, então banners que estavam
+na fila quando o processo caiu (ou que falharam) podem ser reenviados sem
+renderizar de novo: python main.py --resume-outbox ou POST /outbox/resume.
+"""
+import os
+import uuid
+import socket
+import hashlib
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import requests
+
+from banner_encoder import RenderedBanner
+from sqlite_pool import SQLitePool
+
+OUTBOX_DB_PATH = Path(os.getenv('OUTBOX_DB_PATH', 'delivery_outbox.db'))
+# Tempo após o qual um envio em andamento ('sending') é considerado abandonado
+OUTBOX_LEASE_SECONDS = int(os.getenv('OUTBOX_LEASE_SECONDS', '900'))
+OUTBOX_RETENTION_DAYS = int(os.getenv('OUTBOX_RETENTION_DAYS', '7'))
+
+STATUS_PENDING = 'pending'
+STATUS_SENDING = 'sending'
+STATUS_SENT = 'sent'
+STATUS_FAILED = 'failed'
+
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+class DeliveryOutbox:
+    """Outbox de envios: (banner, destino, status, tentativas, último erro)
+
+    Os bytes de cada banner são guardados uma única vez (endereçados pelo
+    SHA-1 do conteúdo) e descartados quando não há mais envios pendentes.
+    """
+
+    def __init__(self, db_path=None, owner=None):
+        """
+        Inicializa o outbox
+
+        Args:
+            db_path: Caminho do arquivo SQLite (padrão: delivery_outbox.db)
+            owner: Dono das reservas feitas por esta instância (padrão: host-pid-aleatório)
+        """
+        self.db_path = Path(db_path) if db_path else OUTBOX_DB_PATH
+        self.owner = owner or f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self.pool = SQLitePool(self.db_path)
+        self.init_database()
+
+    def init_database(self):
+        """Cria as tabelas se não existirem"""
+        conn = self.pool.acquire()
+        try:
+            self._create_tables(conn.cursor())
+            conn.commit()
+        finally:
+            self.pool.release(conn)
+
+    def _create_tables(self, cursor):
+        """Cria tabelas e índices (e a coluna claimed_by em bancos antigos)"""
+        # Conteúdo dos banners (um registro por imagem distinta)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS outbox_banners (
+                banner_hash TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                mime_type TEXT,
+                data BLOB,
+                path TEXT,
+                url TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # Envios (um registro por banner x destino)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS outbox_deliveries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                banner_hash TEXT NOT NULL,
+                filename TEXT,
+                destination TEXT NOT NULL,
+                target TEXT NOT NULL,
+                unidade TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER DEFAULT 0,
+                last_error TEXT,
+                lease_until TEXT,
+                claimed_by TEXT,
+                created_at TEXT,
+                updated_at TEXT,
+                sent_at TEXT
+            )
+        ''')
+
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox_deliveries(status, destination)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_outbox_banner ON outbox_deliveries(banner_hash)')
+
+        columns = {row[1] for row in cursor.execute('PRAGMA table_info(outbox_deliveries)')}
+        if 'claimed_by' not in columns:
+            cursor.execute('ALTER TABLE outbox_deliveries ADD COLUMN claimed_by TEXT')
+
+    def add(self, banner, destination, target, unidade=None, dispatching=True):
+        """
+        Registra um envio
+
+        Args:
+            banner: RenderedBanner (bytes guardados no outbox) ou caminho do arquivo
+            destination: 'whatsapp' ou 'telegram'
+            target: ID do grupo do WhatsApp ou chat do Telegram
+            unidade: Unidade do banner (informativo)
+            dispatching: True se o envio já vai ser feito por este processo
+                         (fica 'sending' com prazo e reservado a self.owner; senão fica 'pending')
+
+        Returns:
+            int: ID do envio
+        """
+        if isinstance(banner, RenderedBanner):
+            banner_hash = hashlib.sha1(banner.data).hexdigest()
+            filename, mime_type, data = banner.filename, banner.mime_type, banner.data
+            path, url = banner.path, banner.url
+        else:
+            path = os.path.abspath(str(banner))
+            banner_hash = hashlib.sha1(path.encode('utf-8')).hexdigest()
+            filename, mime_type, data, url = os.path.basename(path), None, None, None
+
+        now = _now()
+        status = STATUS_SENDING if dispatching else STATUS_PENDING
+        lease_until = (datetime.now() + timedelta(seconds=OUTBOX_LEASE_SECONDS)).isoformat(timespec='seconds') if dispatching else None
+        claimed_by = self.owner if dispatching else None
+
+        conn = self.pool.acquire()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('''
+                INSERT OR IGNORE INTO outbox_banners (banner_hash, filename, mime_type, data, path, url)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (banner_hash, filename, mime_type, data, path, url))
+            if cursor.rowcount == 0 and data is not None:
+                # Banner já conhecido: restaurar os bytes caso tenham sido descartados
+                cursor.execute('UPDATE outbox_banners SET data = ? WHERE banner_hash = ? AND data IS NULL',
+                               (data, banner_hash))
+            cursor.execute('''
+                INSERT INTO outbox_deliveries (
+                    banner_hash, filename, destination, target, unidade, status,
+                    lease_until, claimed_by, created_at, updated_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (banner_hash, filename, destination, str(target), unidade, status, lease_until, claimed_by, now, now))
+            delivery_id = cursor.lastrowid
+            conn.commit()
+            return delivery_id
+        finally:
+            self.pool.release(conn)
+
+    def attach_location(self, banner, path=None, url=None):
+        """Registra caminho local e/ou URL do Cloudinary de um banner já no outbox"""
+        if not isinstance(banner, RenderedBanner) or not (path or url):
+            return
+        banner_hash = hashlib.sha1(banner.data).hexdigest()
+        conn = self.pool.acquire()
+        try:
+            conn.execute('''
+                UPDATE outbox_banners SET path = COALESCE(?, path), url = COALESCE(?, url)
+                WHERE banner_hash = ?
+            ''', (path, url, banner_hash))
+            conn.commit()
+        finally:
+            self.pool.release(conn)
+
+    def mark_sent(self, delivery_id, attempts=1):
+        """
+        Marca um envio como concluído
+
+        Só vale enquanto o envio estiver 'sending' e reservado por esta instância:
+        se a reserva expirou e o envio foi retomado por outro processo, o
+        resultado é ignorado.
+
+        Returns:
+            bool: False se o envio não estava mais reservado por esta instância
+        """
+        now = _now()
+        conn = self.pool.acquire()
+        try:
+            cursor = conn.execute('''
+                UPDATE outbox_deliveries
+                SET status = ?, attempts = attempts + ?, last_error = NULL,
+                    lease_until = NULL, claimed_by = NULL, sent_at = ?, updated_at = ?
+                WHERE id = ? AND status = ? AND claimed_by = ?
+            ''', (STATUS_SENT, attempts, now, now, delivery_id, STATUS_SENDING, self.owner))
+            conn.commit()
+            return cursor.rowcount > 0
+        finally:
+            self.pool.release(conn)
+
+    def mark_failed(self, delivery_id, error=None, attempts=1, final=True):
+        """
+        Registra uma falha de envio
+
+        Args:
+            delivery_id: ID do envio
+            error: Mensagem de erro
+            attempts: Tentativas feitas nesta rodada
+            final: True = 'failed' (só volta com requeue_failed); False = volta para 'pending'
+
+        Returns:
+            bool: False se o envio não estava mais reservado por esta instância (ver mark_sent)
+        """
+        conn = self.pool.acquire()
+        try:
+            cursor = conn.execute('''
+                UPDATE outbox_deliveries
+                SET status = ?, attempts = attempts + ?, last_error = ?, lease_until = NULL,
+                    claimed_by = NULL, updated_at = ?
+                WHERE id = ? AND status = ? AND claimed_by = ?
+            ''', (STATUS_FAILED if final else STATUS_PENDING, attempts, (error or '')[:500], _now(),
+                  delivery_id, STATUS_SENDING, self.owner))
+            conn.commit()
+            return cursor.rowcount > 0
+        finally:
+            self.pool.release(conn)
+
+    def claim(self, destinations=None, limit=100):
+        """
+        Reserva envios pendentes (ou abandonados) para reenvio
+
+        A seleção e a reserva acontecem na mesma transação, então dois
+        processos nunca pegam o mesmo envio. A reserva fica em nome de self.owner.
+
+        Args:
+            destinations: Lista de destinos ('whatsapp', 'telegram') ou None para todos
+            limit: Quantidade máxima de envios
+
+        Returns:
+            list: Envios reservados (dicts com id, destination, target, filename...)
+        """
+        now = _now()
+        lease_until = (datetime.now() + timedelta(seconds=OUTBOX_LEASE_SECONDS)).isoformat(timespec='seconds')
+        query = '''
+            SELECT d.id, d.banner_hash, d.filename, d.destination, d.target, d.unidade, d.attempts
+            FROM outbox_deliveries d
+            WHERE (d.status = ? OR (d.status = ? AND d.lease_until < ?))
+        '''
+        params = [STATUS_PENDING, STATUS_SENDING, now]
+        if destinations:
+            query += f' AND d.destination IN ({",".join("?" * len(destinations))})'
+            params.extend(destinations)
+        query += ' ORDER BY d.id LIMIT ?'
+        params.append(limit)
+
+        conn = self.pool.acquire()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            rows = [dict(row) for row in conn.execute(query, params).fetchall()]
+            if rows:
+                conn.executemany('''
+                    UPDATE outbox_deliveries SET status = ?, lease_until = ?, claimed_by = ?, updated_at = ?
+                    WHERE id = ?
+                ''', [(STATUS_SENDING, lease_until, self.owner, now, row['id']) for row in rows])
+            conn.commit()
+            return rows
+        finally:
+            self.pool.release(conn)
+
+    def requeue_failed(self, destinations=None):
+        """Volta envios com falha definitiva para 'pending'
+
+        Returns:
+            int: Quantidade de envios reabertos
+        """
+        query = 'UPDATE outbox_deliveries SET status = ?, updated_at = ? WHERE status = ?'
+        params = [STATUS_PENDING, _now(), STATUS_FAILED]
+        if destinations:
+            query += f' AND destination IN ({",".join("?" * len(destinations))})'
+            params.extend(destinations)
+        conn = self.pool.acquire()
+        try:
+            cursor = conn.execute(query, params)
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            self.pool.release(conn)
+
+    def load_banner(self, delivery):
+        """
+        Reconstrói o banner de um envio (bytes do outbox, arquivo local ou Cloudinary)
+
+        Args:
+            delivery: Dict retornado por claim()
+
+        Returns:
+            RenderedBanner ou None se o conteúdo não estiver mais disponível
+        """
+        conn = self.pool.acquire()
+        try:
+            row = conn.execute('SELECT * FROM outbox_banners WHERE banner_hash = ?',
+                               (delivery['banner_hash'],)).fetchone()
+        finally:
+            self.pool.release(conn)
+        if row is None:
+            return None
+        if row['data'] is not None:
+            return RenderedBanner(row['filename'], row['data'], row['mime_type'] or 'image/jpeg',
+                                  path=row['path'], url=row['url'])
+        if row['path'] and os.path.exists(row['path']):
+            return RenderedBanner.from_file(row['path'], url=row['url'])
+        if row['url']:
+            response = requests.get(row['url'], timeout=30)
+            if response.status_code == 200:
+                mime_type = response.headers.get('Content-Type', row['mime_type'] or 'image/jpeg')
+                return RenderedBanner(row['filename'], response.content, mime_type, url=row['url'])
+        return None
+
+    def purge(self, retention_days=None):
+        """
+        Remove envios concluídos antigos e descarta bytes de banners sem envios em aberto
+
+        Returns:
+            dict: {'deliveries': removidos, 'banners': bytes descartados}
+        """
+        retention_days = OUTBOX_RETENTION_DAYS if retention_days is None else retention_days
+        cutoff = (datetime.now() - timedelta(days=retention_days)).isoformat(timespec='seconds')
+        conn = self.pool.acquire()
+        try:
+            cursor = conn.execute('DELETE FROM outbox_deliveries WHERE status = ? AND sent_at < ?', (STATUS_SENT, cutoff))
+            removidos = cursor.rowcount
+            # Bytes só são necessários enquanto houver envio pendente, em andamento ou com falha
+            cursor = conn.execute('''
+                UPDATE outbox_banners SET data = NULL
+                WHERE data IS NOT NULL AND banner_hash NOT IN (
+                    SELECT banner_hash FROM outbox_deliveries WHERE status != ?
+                )
+            ''', (STATUS_SENT,))
+            descartados = cursor.rowcount
+            conn.execute('''
+                DELETE FROM outbox_banners
+                WHERE banner_hash NOT IN (SELECT banner_hash FROM outbox_deliveries)
+            ''')
+            conn.commit()
+            return {'deliveries': removidos, 'banners': descartados}
+        finally:
+            self.pool.release(conn)
+
+    def get_metrics(self):
+        """
+        Retorna métricas do outbox
+
+        Returns:
+            dict: Contagem por destino/status, envio pendente mais antigo e últimos erros
+        """
+        conn = self.pool.acquire()
+        try:
+            por_destino = {}
+            for row in conn.execute('''
+                SELECT destination, status, COUNT(*) AS total, SUM(attempts) AS tentativas
+                FROM outbox_deliveries GROUP BY destination, status
+            '''):
+                destino = por_destino.setdefault(row['destination'], {'tentativas': 0})
+                destino[row['status']] = row['total']
+                destino['tentativas'] += row['tentativas'] or 0
+
+            oldest = conn.execute('SELECT MIN(created_at) FROM outbox_deliveries WHERE status IN (?, ?)',
+                                  (STATUS_PENDING, STATUS_SENDING)).fetchone()[0]
+            idade = None
+            if oldest:
+                try:
+                    idade = int((datetime.now() - datetime.fromisoformat(oldest)).total_seconds())
+                except ValueError:
+                    pass
+
+            erros = [dict(row) for row in conn.execute('''
+                SELECT id, filename, destination, target, attempts, last_error, updated_at
+                FROM outbox_deliveries WHERE status = ? ORDER BY updated_at DESC LIMIT 10
+            ''', (STATUS_FAILED,))]
+
+            banners = conn.execute('''
+                SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM outbox_banners WHERE data IS NOT NULL
+            ''').fetchone()
+
+            totais = {status: 0 for status in (STATUS_PENDING, STATUS_SENDING, STATUS_SENT, STATUS_FAILED)}
+            for destino in por_destino.values():
+                for status in totais:
+                    totais[status] += destino.get(status, 0)
+
+            return {
+                'totais': totais,
+                'por_destino': por_destino,
+                'pendente_mais_antigo_segundos': idade,
+                'banners_em_memoria': banners[0],
+                'bytes_armazenados': banners[1],
+                'ultimas_falhas': erros
+            }
+        finally:
+            self.pool.release(conn)
@@ -3,13 +3,109 @@
 """
 Gerenciamento de Banco de Dados SQLite para E-mails Processados
 """
+import os
+import gzip
 import sqlite3
 import json
-from datetime import datetime, timedelta
+import base64
+import threading
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from email.utils import parsedate_to_datetime
 
+from sqlite_pool import SQLitePool
+
 DB_PATH = Path('emails_sent.db')
+SCHEMA_VERSION = 4  # PRAGMA user_version após as migrações
+
+# Condição de "e-mail livre para envio": pendente, com tentativas disponíveis, dados completos,
+# sem reserva ativa (lease) e sem outro e-mail do mesmo cliente (code + phone) enviado hoje
+# ou reservado por outro worker. Usada na reserva atômica (claim).
+_CLAIMABLE_CONDITION = '''
+    e.enviado_whatsapp = 0
+    AND e.tentativas < :max_attempts
+    AND (e.lease_until IS NULL OR e.lease_until < datetime('now'))
+    AND COALESCE(e.telefone_vendedor, '') != ''
+    AND COALESCE(e.whatsapp_message, '') != ''
+    AND (COALESCE(e.code, '') = '' OR COALESCE(e.phone, '') = '' OR NOT EXISTS (
+        SELECT 1 FROM emails o
+        WHERE o.code = e.code AND o.phone = e.phone AND o.id != e.id
+          AND ((o.enviado_whatsapp = 1 AND o.received_day = :today)
+               OR (o.enviado_whatsapp = 0 AND o.claimed_by IS NOT NULL AND o.lease_until >= datetime('now')))
+    ))
+'''
+
+# Retenção: e-mails mais antigos que isso têm o conteúdo movido para arquivos .jsonl.gz mensais
+EMAIL_RETENTION_DAYS = int(os.getenv('EMAIL_RETENTION_DAYS', '30'))  # 0 = não arquivar
+EMAIL_ARCHIVE_DIR = Path(os.getenv('EMAIL_ARCHIVE_DIR', 'email_archive'))
+EMAIL_ARCHIVE_BATCH = 500
+# Colunas pesadas removidas do banco após o arquivamento (o restante, incluindo as chaves
+# de duplicidade message_id/code/phone/received_day, continua na tabela)
+ARCHIVED_COLUMNS = ('email_body', 'whatsapp_message', 'authorization_link')
+
+# Colunas da listagem (histórico): sem email_body e whatsapp_message, que ficam no detalhe
+LIST_COLUMNS = (
+    'id', 'message_id', 'subject', 'from_email', 'date_received', 'received_at',
+    'vendedor_nome', 'vendedor_primeiro_nome', 'name', 'code', 'phone', 'empresa',
+    'telefone_vendedor', 'enviado_whatsapp', 'data_envio', 'tentativas', 'erro'
+)
+
+def normalize_received_date(date_received):
+    """
+    Normaliza a data de recebimento do e-mail (ISO ou RFC 2822)
+    
+    Args:
+        date_received: Data como veio do Gmail/banco (ex: "Thu, 27 Nov 2025 16:49:26 -0300")
+        
+    Returns:
+        tuple: (received_at em UTC ISO 8601, received_day 'YYYY-MM-DD' no fuso local) ou (None, None)
+    """
+    if not date_received:
+        return None, None
+    
+    value = str(date_received).strip()
+    parsed = None
+    try:
+        if value[:4].isdigit():
+            # ISO (YYYY-MM-DD, YYYY-MM-DDTHH:MM:SS[.ffffff][+HH:MM])
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        else:
+            # RFC 2822 (Thu, 27 Nov 2025 16:49:26 -0300)
+            parsed = parsedate_to_datetime(value)
+    except (ValueError, TypeError):
+        try:
+            parsed = datetime.strptime(value[:25], '%a, %d %b %Y %H:%M:%S')
+        except ValueError:
+            return None, None
+    
+    # Datas sem fuso foram gravadas no horário local do servidor
+    if parsed.tzinfo is None:
+        parsed = parsed.astimezone()
+    received_at = parsed.astimezone(timezone.utc).replace(microsecond=0).isoformat()
+    # "Mesmo dia" é o dia do calendário local (o mesmo de datetime.now().date())
+    received_day = parsed.astimezone().date().isoformat()
+    return received_at, received_day
+
+def encode_cursor(received_at, row_id):
+    """Cursor opaco da paginação do histórico (posição do último e-mail da página)"""
+    return base64.urlsafe_b64encode(f'{received_at}|{row_id}'.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    Decodifica o cursor de encode_cursor
+    
+    Returns:
+        tuple: (received_at, id)
+        
+    Raises:
+        ValueError: Cursor inválido
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        received_at, row_id = raw.rsplit('|', 1)
+        return received_at, int(row_id)
+    except (ValueError, UnicodeDecodeError, TypeError):
+        raise ValueError('Cursor inválido')
 
 class EmailDatabase:
     def __init__(self, db_path=None):
@@ -20,51 +116,213 @@ class EmailDatabase:
             db_path: Caminho do arquivo SQLite (padrão: emails_sent.db)
         """
         self.db_path = Path(db_path) if db_path else DB_PATH
+        # Conexões reaproveitadas (WAL, busy_timeout) entre monitor, worker de entrega e rotas Flask
+        self.pool = SQLitePool(self.db_path)
         self.init_database()
+        
+        # Índice em memória dos message_ids salvos (enviados ou pendentes) para filtrar
+        # mensagens antes de baixá-las do Gmail. A restrição UNIQUE do banco continua
+        # decidindo em caso de corrida (save_email usa INSERT OR IGNORE).
+        self._known_lock = threading.Lock()
+        self._known_ids = set()
+        self.reload_known_ids()
     
     def init_database(self):
         """Cria as tabelas se não existirem"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.pool.acquire()
+        try:
+            cursor = conn.cursor()
+        
+            # Tabela de e-mails processados
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS emails (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    message_id TEXT UNIQUE NOT NULL,
+                    thread_id TEXT,
+                    subject TEXT,
+                    from_email TEXT,
+                    date_received TEXT,
+                    email_body TEXT,
+                    vendedor_nome TEXT,
+                    vendedor_primeiro_nome TEXT,
+                    name TEXT,
+                    code TEXT,
+                    phone TEXT,
+                    empresa TEXT,
+                    cnpj TEXT,
+                    telefone_vendedor TEXT,
+                    whatsapp_message TEXT,
+                    authorization_link TEXT,
+                    enviado_whatsapp INTEGER DEFAULT 0,
+                    data_envio TEXT,
+                    tentativas INTEGER DEFAULT 0,
+                    erro TEXT,
+                    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+        
+            # Índices: criados em _migrate (message_id já é indexado pela restrição UNIQUE)
+        
+            # Cache de resolução de telefones (número do e-mail -> variante válida no WhatsApp)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS phone_resolution (
+                    phone TEXT PRIMARY KEY,
+                    valid_numbers TEXT NOT NULL,
+                    chat_ids TEXT,
+                    method TEXT,
+                    resolved_at TEXT NOT NULL
+                )
+            ''')
+        
+            # Estado da sincronização com o Gmail (ex: historyId da última sincronização)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT,
+                    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+        
+            self._migrate(conn)
+        
+            conn.commit()
+        finally:
+            self.pool.release(conn)
+    
+    def _migrate(self, conn):
+        """
+        Aplica as migrações pendentes conforme PRAGMA user_version
+        
+        Versão 1: colunas received_at (UTC) e received_day (dia local) preenchidas a partir
+        de date_received, com índice composto para a verificação de duplicatas do mesmo dia
+        Versão 2: reserva de envio (claimed_by, lease_until)
+        Versão 3: received_at sempre preenchido (paginação por cursor) e contadores
+        mantidos por triggers (estatísticas sem COUNT(*) na tabela inteira)
+        Versão 4: coluna archived_at (retenção) e remoção dos índices redundantes
+        """
         cursor = conn.cursor()
+        version = cursor.execute('PRAGMA user_version').fetchone()[0]
+        
+        if version < 1:
+            columns = {row[1] for row in cursor.execute('PRAGMA table_info(emails)')}
+            if 'received_at' not in columns:
+                cursor.execute('ALTER TABLE emails ADD COLUMN received_at TEXT')
+            if 'received_day' not in columns:
+                cursor.execute('ALTER TABLE emails ADD COLUMN received_day TEXT')
+            
+            rows = cursor.execute('SELECT id, date_received FROM emails WHERE received_day IS NULL').fetchall()
+            updates = []
+            for row_id, date_received in rows:
+                received_at, received_day = normalize_received_date(date_received)
+                if received_day:
+                    updates.append((received_at, received_day, row_id))
+            cursor.executemany('UPDATE emails SET received_at = ?, received_day = ? WHERE id = ?', updates)
+            if rows:
+                print(f"🔄 Migração do banco: {len(updates)} de {len(rows)} e-mail(s) com data normalizada")
+            
+            # Substitui o índice por date_received (texto em formatos variados)
+            cursor.execute('DROP INDEX IF EXISTS idx_code_phone_date')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_code_phone_day ON emails(code, phone, received_day, enviado_whatsapp)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_received_at ON emails(received_at)')
+        
+        if version < 2:
+            # Reserva (lease) de envio: substitui a heurística de updated_at recente
+            columns = {row[1] for row in cursor.execute('PRAGMA table_info(emails)')}
+            if 'claimed_by' not in columns:
+                cursor.execute('ALTER TABLE emails ADD COLUMN claimed_by TEXT')
+            if 'lease_until' not in columns:
+                cursor.execute('ALTER TABLE emails ADD COLUMN lease_until TEXT')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_pending_lease ON emails(enviado_whatsapp, lease_until)')
         
-        # Tabela de e-mails processados
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS emails (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                message_id TEXT UNIQUE NOT NULL,
-                thread_id TEXT,
-                subject TEXT,
-                from_email TEXT,
-                date_received TEXT,
-                email_body TEXT,
-                vendedor_nome TEXT,
-                vendedor_primeiro_nome TEXT,
-                name TEXT,
-                code TEXT,
-                phone TEXT,
-                empresa TEXT,
-                cnpj TEXT,
-                telefone_vendedor TEXT,
-                whatsapp_message TEXT,
-                authorization_link TEXT,
-                enviado_whatsapp INTEGER DEFAULT 0,
-                data_envio TEXT,
-                tentativas INTEGER DEFAULT 0,
-                erro TEXT,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                updated_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Índices para melhor performance
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_message_id ON emails(message_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_enviado ON emails(enviado_whatsapp)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_date_received ON emails(date_received)')
-        # Índice composto para verificação de duplicatas por cliente (code + phone - telefone do cliente)
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_code_phone_date ON emails(code, phone, date_received, enviado_whatsapp)')
-        
-        conn.commit()
-        conn.close()
+        if version < 3:
+            # Datas que não puderam ser interpretadas: usar o horário em que o e-mail foi salvo
+            cursor.execute('''
+                UPDATE emails SET received_at = strftime('%Y-%m-%dT%H:%M:%S+00:00', created_at)
+                WHERE received_at IS NULL
+            ''')
+            
+            # Contadores do histórico (uma linha), atualizados na mesma transação de cada escrita
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS email_stats (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    total INTEGER NOT NULL,
+                    enviados INTEGER NOT NULL
+                )
+            ''')
+            cursor.execute('''
+                INSERT OR REPLACE INTO email_stats (id, total, enviados)
+                SELECT 1, COUNT(*), COALESCE(SUM(enviado_whatsapp = 1), 0) FROM emails
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS trg_email_stats_insert AFTER INSERT ON emails
+                BEGIN
+                    UPDATE email_stats SET total = total + 1,
+                                           enviados = enviados + (NEW.enviado_whatsapp = 1)
+                    WHERE id = 1;
+                END
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS trg_email_stats_delete AFTER DELETE ON emails
+                BEGIN
+                    UPDATE email_stats SET total = total - 1,
+                                           enviados = enviados - (OLD.enviado_whatsapp = 1)
+                    WHERE id = 1;
+                END
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS trg_email_stats_update AFTER UPDATE OF enviado_whatsapp ON emails
+                WHEN (OLD.enviado_whatsapp = 1) != (NEW.enviado_whatsapp = 1)
+                BEGIN
+                    UPDATE email_stats SET enviados = enviados + (NEW.enviado_whatsapp = 1) - (OLD.enviado_whatsapp = 1)
+                    WHERE id = 1;
+                END
+            ''')
+        
+        if version < 4:
+            columns = {row[1] for row in cursor.execute('PRAGMA table_info(emails)')}
+            if 'archived_at' not in columns:
+                cursor.execute('ALTER TABLE emails ADD COLUMN archived_at TEXT')
+            # idx_message_id duplica o índice do UNIQUE, idx_enviado é prefixo de idx_pending_lease
+            # e date_received não é mais usado em ordenação (received_at)
+            cursor.execute('DROP INDEX IF EXISTS idx_message_id')
+            cursor.execute('DROP INDEX IF EXISTS idx_enviado')
+            cursor.execute('DROP INDEX IF EXISTS idx_date_received')
+        
+        if version < SCHEMA_VERSION:
+            cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    
+    def reload_known_ids(self):
+        """
+        Recarrega do banco o índice em memória de message_ids
+        
+        Returns:
+            int: Quantidade de IDs no índice
+        """
+        conn = self.pool.acquire()
+        try:
+            cursor = conn.cursor()
+        
+            cursor.execute('SELECT message_id FROM emails')
+            known_ids = {row[0] for row in cursor.fetchall()}
+        finally:
+            self.pool.release(conn)
+        with self._known_lock:
+            self._known_ids = known_ids
+        return len(known_ids)
+    
+    def is_known_message_id(self, message_id):
+        """
+        Verifica no índice em memória se o e-mail já foi salvo (sem acessar o banco)
+        
+        Args:
+            message_id: ID da mensagem
+            
+        Returns:
+            bool: True se o e-mail já está no banco
+        """
+        with self._known_lock:
+            return message_id in self._known_ids
     
     def save_email(self, message_id, thread_id, subject, from_email, date_received, 
                    email_body, extracted_info, whatsapp_message, authorization_link):
@@ -85,19 +343,26 @@ class EmailDatabase:
         Returns:
             int: ID do registro inserido
         """
-        conn = sqlite3.connect(self.db_path)
+        received_at, received_day = normalize_received_date(date_received)
+        if not received_at:
+            # Data ilegível: ordenar o histórico pelo momento em que foi salvo
+            received_at = datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+        
+        conn = self.pool.acquire()
         cursor = conn.cursor()
         
         try:
             cursor.execute('''
                 INSERT OR IGNORE INTO emails (
                     message_id, thread_id, subject, from_email, date_received,
+                    received_at, received_day,
                     email_body, vendedor_nome, vendedor_primeiro_nome,
                     name, code, phone, empresa, cnpj, telefone_vendedor,
                     whatsapp_message, authorization_link
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
                 message_id, thread_id, subject, from_email, date_received,
+                received_at, received_day,
                 email_body, 
                 extracted_info.get('vendedor_nome_completo', ''),
                 extracted_info.get('vendedor_primeiro_nome', ''),
@@ -111,23 +376,26 @@ class EmailDatabase:
                 authorization_link
             ))
             
-            conn.commit()
-            email_id = cursor.lastrowid
-            
-            # Se não inseriu (já existe), buscar o ID existente
-            if email_id == 0:
+            if cursor.rowcount:
+                email_id = cursor.lastrowid
+            else:
+                # Já existe (INSERT ignorado): lastrowid seria o do último insert desta conexão do pool
                 cursor.execute('SELECT id FROM emails WHERE message_id = ?', (message_id,))
                 result = cursor.fetchone()
                 email_id = result[0] if result else None
             
+            conn.commit()
+            with self._known_lock:
+                self._known_ids.add(message_id)
+            
             return email_id
         except sqlite3.Error as e:
             conn.rollback()
             raise Exception(f"Erro ao salvar e-mail: {e}")
         finally:
-            conn.close()
+            self.pool.release(conn)
     
-    def mark_as_sent(self, message_id, success=True, error=None):
+    def mark_as_sent(self, message_id, success=True, error=None, retry_in=None, worker_id=None):
         """
         Marca um e-mail como enviado
         
@@ -138,11 +406,14 @@ class EmailDatabase:
             message_id: ID da mensagem
             success: Se foi enviado com sucesso
             error: Mensagem de erro (se houver)
+            retry_in: Segundos até o e-mail poder ser reservado de novo após a falha (None = imediatamente)
+            worker_id: Worker que reservou o e-mail; a marcação só vale se a reserva ainda
+                       for dele (ou se o e-mail não estiver reservado)
             
         Returns:
-            bool: True se atualizado com sucesso, False caso contrário
+            bool: True se atualizado com sucesso, False caso contrário (inclusive reserva perdida)
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = self.pool.acquire()
         cursor = conn.cursor()
         
         try:
@@ -151,25 +422,29 @@ class EmailDatabase:
                     UPDATE emails 
                     SET enviado_whatsapp = 1,
                         data_envio = ?,
+                        claimed_by = NULL,
+                        lease_until = NULL,
                         updated_at = CURRENT_TIMESTAMP
-                    WHERE message_id = ?
-                ''', (datetime.now().isoformat(), message_id))
-                
-                # Verificar se realmente atualizou
-                rows_updated = cursor.rowcount
-                if rows_updated == 0:
-                    print(f"⚠️ ATENÇÃO: Nenhuma linha atualizada para message_id={message_id}")
-                    print(f"   O e-mail pode não existir no banco de dados")
-                    conn.rollback()
-                    return False
+                    WHERE message_id = ? AND (claimed_by IS NULL OR claimed_by = ?)
+                ''', (datetime.now().isoformat(), message_id, worker_id))
             else:
+                # Libera a reserva; com retry_in o lease vira o horário da próxima tentativa
                 cursor.execute('''
                     UPDATE emails 
                     SET tentativas = tentativas + 1,
                         erro = ?,
+                        claimed_by = NULL,
+                        lease_until = CASE WHEN ? IS NULL THEN NULL ELSE datetime('now', ?) END,
                         updated_at = CURRENT_TIMESTAMP
-                    WHERE message_id = ?
-                ''', (error, message_id))
+                    WHERE message_id = ? AND (claimed_by IS NULL OR claimed_by = ?)
+                ''', (error, retry_in, f'+{int(retry_in or 0)} seconds', message_id, worker_id))
+            
+            # Verificar se realmente atualizou
+            if cursor.rowcount == 0:
+                print(f"⚠️ ATENÇÃO: Nenhuma linha atualizada para message_id={message_id}")
+                print(f"   O e-mail não existe no banco ou a reserva expirou e está com outro worker")
+                conn.rollback()
+                return False
             
             # COMMIT IMEDIATO para garantir persistência
             conn.commit()
@@ -194,32 +469,167 @@ class EmailDatabase:
             print(traceback.format_exc())
             raise Exception(f"Erro ao atualizar e-mail: {e}")
         finally:
-            conn.close()
+            self.pool.release(conn)
     
-    def mark_as_processing(self, message_id):
+    def claim_next_email(self, worker_id, lease_seconds=300, max_attempts=5, skip_contacts=None):
         """
-        Marca um e-mail como sendo processado (atualiza updated_at para indicar processamento recente)
-        Isso ajuda a identificar e-mails que estão sendo processados simultaneamente
+        Reserva atomicamente o próximo e-mail livre para envio (UPDATE ... RETURNING)
+        
+        Vários workers (inclusive em processos diferentes) podem drenar a fila ao mesmo
+        tempo: a seleção e a reserva são um único comando, então cada e-mail é entregue
+        a um worker só, e e-mails do mesmo cliente (code + phone) nunca ficam reservados
+        ao mesmo tempo nem são reservados se outro já foi enviado hoje.
         
         Args:
-            message_id: ID da mensagem
+            worker_id: Identificação do worker (gravada em claimed_by)
+            lease_seconds: Duração da reserva; depois disso outro worker pode assumir o e-mail
+            max_attempts: Número máximo de tentativas de envio por e-mail
+            skip_contacts: Telefones de vendedor a pular (ex: ainda no intervalo entre mensagens)
+            
+        Returns:
+            dict: E-mail reservado ou None se a fila está vazia
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        params = {
+            'worker_id': worker_id,
+            'lease': f'+{int(lease_seconds)} seconds',
+            'max_attempts': max_attempts,
+            'today': datetime.now().date().isoformat()
+        }
+        condition = _CLAIMABLE_CONDITION
+        if skip_contacts:
+            names = [f'skip{i}' for i in range(len(skip_contacts))]
+            params.update(zip(names, skip_contacts))
+            condition += f" AND e.telefone_vendedor NOT IN ({', '.join(':' + n for n in names)})"
         
+        conn = self.pool.acquire()
         try:
-            cursor.execute('''
-                UPDATE emails 
-                SET updated_at = CURRENT_TIMESTAMP
+            if sqlite3.sqlite_version_info >= (3, 35, 0):
+                row = conn.execute(f'''
+                    UPDATE emails
+                    SET claimed_by = :worker_id,
+                        lease_until = datetime('now', :lease),
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE id = (
+                        SELECT e.id FROM emails e
+                        WHERE {condition}
+                        ORDER BY e.received_at ASC, e.id ASC
+                        LIMIT 1
+                    )
+                    RETURNING *
+                ''', params).fetchone()
+            else:
+                # SQLite sem RETURNING: seleção e reserva na mesma transação de escrita
+                conn.execute('BEGIN IMMEDIATE')
+                row = conn.execute(f'''
+                    SELECT e.id FROM emails e
+                    WHERE {condition}
+                    ORDER BY e.received_at ASC, e.id ASC
+                    LIMIT 1
+                ''', params).fetchone()
+                if row:
+                    conn.execute('''
+                        UPDATE emails
+                        SET claimed_by = :worker_id, lease_until = datetime('now', :lease), updated_at = CURRENT_TIMESTAMP
+                        WHERE id = :id
+                    ''', {**params, 'id': row['id']})
+                    row = conn.execute('SELECT * FROM emails WHERE id = ?', (row['id'],)).fetchone()
+            conn.commit()
+            return dict(row) if row else None
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(f"⚠️ Erro ao reservar e-mail para envio: {e}")
+            return None
+        finally:
+            self.pool.release(conn)
+    
+    def claim_email(self, message_id, worker_id, lease_seconds=300):
+        """
+        Reserva um e-mail específico para envio (ex: reprocessamento manual)
+        
+        Args:
+            message_id: ID da mensagem
+            worker_id: Identificação de quem reserva
+            lease_seconds: Duração da reserva
+            
+        Returns:
+            bool: True se reservado; False se já enviado ou reservado por outro worker
+        """
+        conn = self.pool.acquire()
+        try:
+            cursor = conn.execute('''
+                UPDATE emails
+                SET claimed_by = ?, lease_until = datetime('now', ?), updated_at = CURRENT_TIMESTAMP
                 WHERE message_id = ?
-            ''', (message_id,))
+                  AND enviado_whatsapp = 0
+                  AND (claimed_by IS NULL OR lease_until IS NULL OR lease_until < datetime('now'))
+            ''', (worker_id, f'+{int(lease_seconds)} seconds', message_id))
             conn.commit()
+            return cursor.rowcount > 0
         except sqlite3.Error as e:
             conn.rollback()
-            # Não levantar exceção aqui, apenas logar
-            print(f"⚠️ Erro ao marcar e-mail como processando: {e}")
+            print(f"⚠️ Erro ao reservar e-mail: {e}")
+            return False
         finally:
-            conn.close()
+            self.pool.release(conn)
+    
+    def claim_emails(self, message_ids, worker_id, lease_seconds=300):
+        """
+        Reserva vários e-mails de uma vez (envio consolidado por vendedor)
+        
+        Args:
+            message_ids: Lista de IDs de mensagens
+            worker_id: Identificação de quem reserva
+            lease_seconds: Duração da reserva
+            
+        Returns:
+            list: IDs efetivamente reservados (os demais já foram enviados ou estão com outro worker)
+        """
+        if not message_ids:
+            return []
+        
+        conn = self.pool.acquire()
+        try:
+            placeholders = ','.join(['?'] * len(message_ids))
+            # Seleção e reserva na mesma transação de escrita
+            conn.execute('BEGIN IMMEDIATE')
+            claimed = {row[0] for row in conn.execute(f'''
+                SELECT message_id FROM emails
+                WHERE message_id IN ({placeholders})
+                  AND enviado_whatsapp = 0
+                  AND (claimed_by IS NULL OR lease_until IS NULL OR lease_until < datetime('now'))
+            ''', list(message_ids))}
+            if claimed:
+                conn.execute(f'''
+                    UPDATE emails
+                    SET claimed_by = ?, lease_until = datetime('now', ?), updated_at = CURRENT_TIMESTAMP
+                    WHERE message_id IN ({','.join(['?'] * len(claimed))})
+                ''', [worker_id, f'+{int(lease_seconds)} seconds'] + list(claimed))
+            conn.commit()
+            return [message_id for message_id in message_ids if message_id in claimed]
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(f"⚠️ Erro ao reservar e-mails: {e}")
+            return []
+        finally:
+            self.pool.release(conn)
+    
+    def release_email(self, message_id, worker_id):
+        """
+        Libera a reserva sem registrar tentativa (envio não chegou a ser feito)
+        
+        Args:
+            message_id: ID da mensagem
+            worker_id: Identificação de quem reservou
+        """
+        conn = self.pool.acquire()
+        try:
+            conn.execute('''
+                UPDATE emails SET claimed_by = NULL, lease_until = NULL
+                WHERE message_id = ? AND claimed_by = ?
+            ''', (message_id, worker_id))
+            conn.commit()
+        finally:
+            self.pool.release(conn)
     
     def get_pending_emails(self):
         """
@@ -228,20 +638,20 @@ class EmailDatabase:
         Returns:
             list: Lista de dicionários com e-mails pendentes
         """
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM emails 
-            WHERE enviado_whatsapp = 0
-            ORDER BY date_received ASC
-        ''')
+        conn = self.pool.acquire()
+        try:
+            cursor = conn.cursor()
         
-        rows = cursor.fetchall()
-        emails = [dict(row) for row in rows]
+            cursor.execute('''
+                SELECT * FROM emails 
+                WHERE enviado_whatsapp = 0
+                ORDER BY received_at ASC, id ASC
+            ''')
         
-        conn.close()
+            rows = cursor.fetchall()
+            emails = [dict(row) for row in rows]
+        finally:
+            self.pool.release(conn)
         return emails
     
     def get_email_by_message_id(self, message_id):
@@ -254,19 +664,34 @@ class EmailDatabase:
         Returns:
             dict: Dados do e-mail ou None
         """
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM emails WHERE message_id = ?', (message_id,))
-        row = cursor.fetchone()
+        conn = self.pool.acquire()
+        try:
+            cursor = conn.cursor()
         
-        conn.close()
+            cursor.execute('SELECT * FROM emails WHERE message_id = ?', (message_id,))
+            row = cursor.fetchone()
+        finally:
+            self.pool.release(conn)
         return dict(row) if row else None
     
+    def get_known_message_ids(self, message_ids):
+        """
+        Retorna quais dos message_ids já estão no banco (consulta ao índice em memória)
+        
+        Args:
+            message_ids: Lista de IDs de mensagens
+            
+        Returns:
+            set: IDs já salvos
+        """
+        with self._known_lock:
+            return {message_id for message_id in message_ids if message_id in self._known_ids}
+    
     def get_all_emails(self, limit=100, offset=0):
         """
-        Retorna todos os e-mails (com paginação)
+        Retorna todos os e-mails (com paginação por offset, registros completos)
+        
+        Para o histórico use get_email_history (cursor, sem os corpos).
         
         Args:
             limit: Número máximo de registros
@@ -275,22 +700,72 @@ class EmailDatabase:
         Returns:
             list: Lista de dicionários com e-mails
         """
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM emails 
-            ORDER BY date_received DESC
-            LIMIT ? OFFSET ?
-        ''', (limit, offset))
+        conn = self.pool.acquire()
+        try:
+            cursor = conn.cursor()
         
-        rows = cursor.fetchall()
-        emails = [dict(row) for row in rows]
+            cursor.execute('''
+                SELECT * FROM emails 
+                ORDER BY received_at DESC, id DESC
+                LIMIT ? OFFSET ?
+            ''', (limit, offset))
         
-        conn.close()
+            rows = cursor.fetchall()
+            emails = [dict(row) for row in rows]
+        finally:
+            self.pool.release(conn)
         return emails
     
+    def get_email_history(self, limit=50, cursor=None, status=None):
+        """
+        Página do histórico, do mais recente para o mais antigo (paginação por cursor)
+        
+        Cada página continua a partir de (received_at, id) do último e-mail da anterior,
+        usando o índice de received_at, sem OFFSET. Os corpos (email_body, whatsapp_message)
+        não são lidos; use get_email_by_message_id para o detalhe.
+        
+        Args:
+            limit: Número máximo de registros
+            cursor: next_cursor da página anterior (None = primeira página)
+            status: 'enviado', 'pendente' ou None (todos)
+            
+        Returns:
+            tuple: (lista de e-mails, next_cursor ou None se for a última página)
+            
+        Raises:
+            ValueError: Cursor inválido
+        """
+        conditions = []
+        params = []
+        if cursor:
+            received_at, row_id = decode_cursor(cursor)
+            # Comparação por row value: o SQLite faz a busca direto no índice (sem varrer)
+            conditions.append('(received_at, id) < (?, ?)')
+            params.extend([received_at, row_id])
+        if status == 'enviado':
+            conditions.append('enviado_whatsapp = 1')
+        elif status == 'pendente':
+            conditions.append('enviado_whatsapp = 0')
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        
+        conn = self.pool.acquire()
+        try:
+            # Uma linha a mais indica se existe próxima página
+            rows = conn.execute(f'''
+                SELECT {', '.join(LIST_COLUMNS)} FROM emails
+                {where}
+                ORDER BY received_at DESC, id DESC
+                LIMIT ?
+            ''', params + [limit + 1]).fetchall()
+        finally:
+            self.pool.release(conn)
+        
+        emails = [dict(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit and emails:
+            next_cursor = encode_cursor(emails[-1]['received_at'], emails[-1]['id'])
+        return emails, next_cursor
+    
     def delete_email(self, message_id):
         """
         Deleta um e-mail do banco de dados
@@ -301,19 +776,21 @@ class EmailDatabase:
         Returns:
             bool: True se deletado com sucesso
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = self.pool.acquire()
         cursor = conn.cursor()
         
         try:
             cursor.execute('DELETE FROM emails WHERE message_id = ?', (message_id,))
             conn.commit()
             deleted = cursor.rowcount > 0
+            with self._known_lock:
+                self._known_ids.discard(message_id)
             return deleted
         except sqlite3.Error as e:
             conn.rollback()
             raise Exception(f"Erro ao deletar e-mail: {e}")
         finally:
-            conn.close()
+            self.pool.release(conn)
     
     def delete_multiple_emails(self, message_ids):
         """
@@ -328,7 +805,7 @@ class EmailDatabase:
         if not message_ids:
             return 0
         
-        conn = sqlite3.connect(self.db_path)
+        conn = self.pool.acquire()
         cursor = conn.cursor()
         
         try:
@@ -336,38 +813,33 @@ class EmailDatabase:
             cursor.execute(f'DELETE FROM emails WHERE message_id IN ({placeholders})', message_ids)
             conn.commit()
             deleted_count = cursor.rowcount
+            with self._known_lock:
+                self._known_ids.difference_update(message_ids)
             return deleted_count
         except sqlite3.Error as e:
             conn.rollback()
             raise Exception(f"Erro ao deletar e-mails: {e}")
         finally:
-            conn.close()
+            self.pool.release(conn)
     
     def get_statistics(self):
         """
-        Retorna estatísticas do banco de dados
+        Retorna estatísticas do banco de dados (contadores mantidos por triggers)
         
         Returns:
             dict: Estatísticas (total, enviados, pendentes)
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT COUNT(*) FROM emails')
-        total = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM emails WHERE enviado_whatsapp = 1')
-        enviados = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM emails WHERE enviado_whatsapp = 0')
-        pendentes = cursor.fetchone()[0]
-        
-        conn.close()
+        conn = self.pool.acquire()
+        try:
+            row = conn.execute('SELECT total, enviados FROM email_stats WHERE id = 1').fetchone()
+        finally:
+            self.pool.release(conn)
         
+        total, enviados = (row[0], row[1]) if row else (0, 0)
         return {
             'total': total,
             'enviados': enviados,
-            'pendentes': pendentes
+            'pendentes': total - enviados
         }
     
     def delete_all_pending_emails(self):
@@ -377,7 +849,7 @@ class EmailDatabase:
         Returns:
             int: Número de e-mails deletados
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = self.pool.acquire()
         cursor = conn.cursor()
         
         try:
@@ -390,12 +862,14 @@ class EmailDatabase:
             conn.commit()
             
             deleted_count = cursor.rowcount
+            # IDs removidos saem do índice em memória
+            self.reload_known_ids()
             return deleted_count
         except sqlite3.Error as e:
             conn.rollback()
             raise Exception(f"Erro ao deletar e-mails pendentes: {e}")
         finally:
-            conn.close()
+            self.pool.release(conn)
     
     def check_already_sent_by_client_and_phone(self, code, phone, exclude_message_id=None):
         """
@@ -406,7 +880,7 @@ class EmailDatabase:
         - A validação é válida apenas para o mesmo dia (data atual)
         - Se foi enviado hoje, não envia novamente hoje
         - Se for amanhã, pode enviar novamente
-        - Também verifica e-mails que estão sendo processados/enviados (updated_at recente)
+        - Também verifica e-mails do mesmo cliente com reserva de envio ativa (claimed_by/lease_until)
         
         Args:
             code: Código do cliente
@@ -419,79 +893,35 @@ class EmailDatabase:
         if not code or not phone:
             return None
         
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        conn = self.pool.acquire()
         cursor = conn.cursor()
         
         try:
-            # Obter data atual (apenas dia, sem hora)
-            today = datetime.now().date()
-            today_str = today.strftime('%Y-%m-%d')
-            
-            base_params = [code, phone]
+            # Dia atual no mesmo calendário de received_day (local)
+            today_str = datetime.now().date().isoformat()
             
             # Excluir o próprio e-mail se fornecido
             exclude_clause = ''
             if exclude_message_id:
                 exclude_clause = ' AND message_id != ?'
-                base_params.append(exclude_message_id)
             
             # PRIORIDADE 1: Verificar e-mails já enviados com sucesso (enviado_whatsapp = 1) NO MESMO DIA
-            # Comparar apenas a data, ignorando a hora
-            # date_received pode estar em diferentes formatos:
-            # - ISO format: "2025-11-27T16:49:26"
-            # - RFC 2822: "Thu, 27 Nov 2025 16:49:26 -0300"
-            # - Outros formatos
-            # Vamos usar uma função auxiliar para extrair a data
+            # Consulta pontual no índice (code, phone, received_day, enviado_whatsapp)
             query_sent = f'''
                 SELECT * FROM emails 
                 WHERE code = ? 
                   AND phone = ?
+                  AND received_day = ?
                   AND enviado_whatsapp = 1
                   {exclude_clause}
-                ORDER BY date_received DESC
+                LIMIT 1
             '''
             
-            cursor.execute(query_sent, base_params)
-            rows = cursor.fetchall()
+            sent_params = [code, phone, today_str]
+            if exclude_message_id:
+                sent_params.append(exclude_message_id)
             
-            # Verificar cada resultado para ver se foi enviado no mesmo dia
-            for row in rows:
-                result = dict(row)
-                date_received_str = result.get('date_received', '')
-                
-                if not date_received_str:
-                    continue
-                
-                # Tentar extrair a data do date_received
-                email_date = None
-                try:
-                    # Tentar formato ISO (YYYY-MM-DD ou YYYY-MM-DDTHH:MM:SS)
-                    if 'T' in date_received_str:
-                        email_date = datetime.fromisoformat(date_received_str.replace('Z', '+00:00')).date()
-                    elif date_received_str.startswith('20'):  # Provavelmente formato ISO
-                        email_date = datetime.strptime(date_received_str[:10], '%Y-%m-%d').date()
-                    else:
-                        # Tentar parsear formato RFC 2822 (Thu, 27 Nov 2025 16:49:26 -0300)
-                        try:
-                            email_date = parsedate_to_datetime(date_received_str).date()
-                        except:
-                            # Se falhar, tentar outros formatos
-                            try:
-                                email_date = datetime.strptime(date_received_str[:19], '%a, %d %b %Y %H:%M:%S').date()
-                            except:
-                                pass
-                except Exception as e:
-                    print(f"⚠️ Erro ao parsear data: {date_received_str}, erro: {e}")
-                    continue
-                
-                # Se conseguiu extrair a data e é o mesmo dia, retornar como duplicata
-                if email_date and email_date == today:
-                    print(f"🔍 DUPLICATA ENCONTRADA (JÁ ENVIADO HOJE): code={code}, phone={phone} (telefone do cliente)")
-                    print(f"   E-mail já enviado HOJE: message_id={result.get('message_id')}, date={date_received_str}")
-                    print(f"   Data extraída: {email_date}, Data atual: {today}")
-                    print(f"   Status: enviado_whatsapp={result.get('enviado_whatsapp')} (confirmado)")
-                    return result
+            cursor.execute(query_sent, sent_params)
             row = cursor.fetchone()
             
             if row:
@@ -501,23 +931,19 @@ class EmailDatabase:
                 print(f"   Status: enviado_whatsapp={result.get('enviado_whatsapp')} (confirmado)")
                 return result
             
-            # PRIORIDADE 2: Verificar e-mails que estão sendo processados/enviados (updated_at recente)
-            # Isso evita que dois e-mails sejam enviados simultaneamente
-            # Considerar apenas e-mails atualizados nos últimos 10 minutos (tempo suficiente para envio + ACK)
-            recent_threshold = datetime.now() - timedelta(minutes=10)
-            recent_threshold_str = recent_threshold.strftime('%Y-%m-%d %H:%M:%S')
-            
+            # PRIORIDADE 2: Verificar e-mails do mesmo cliente reservados para envio agora (lease ativo)
             query_processing = f'''
                 SELECT * FROM emails 
                 WHERE code = ? 
                   AND phone = ?
                   AND enviado_whatsapp = 0
-                  AND updated_at >= ?
+                  AND claimed_by IS NOT NULL
+                  AND lease_until >= datetime('now')
                   {exclude_clause}
-                ORDER BY date_received DESC LIMIT 1
+                LIMIT 1
             '''
             
-            processing_params = [code, phone, recent_threshold_str]
+            processing_params = [code, phone]
             if exclude_message_id:
                 processing_params.append(exclude_message_id)
             
@@ -527,7 +953,7 @@ class EmailDatabase:
             if row:
                 result = dict(row)
                 print(f"🔍 DUPLICATA ENCONTRADA (EM PROCESSAMENTO): code={code}, phone={phone} (telefone do cliente)")
-                print(f"   E-mail em processamento: message_id={result.get('message_id')}, updated_at={result.get('updated_at')}")
+                print(f"   E-mail em processamento: message_id={result.get('message_id')}, claimed_by={result.get('claimed_by')}, lease_until={result.get('lease_until')}")
                 print(f"   ⚠️ Este e-mail está sendo processado/enviado, ignorando novo e-mail para evitar duplicata")
                 return result
             
@@ -538,5 +964,297 @@ class EmailDatabase:
             print(traceback.format_exc())
             return None
         finally:
-            conn.close()
-
+            self.pool.release(conn)
+    
+    def get_phone_resolution(self, phone, ttl_hours=168):
+        """
+        Busca a resolução em cache de um telefone
+        
+        Args:
+            phone: Telefone normalizado (55 + DDD + número)
+            ttl_hours: Validade do cache em horas
+            
+        Returns:
+            dict: {'valid_numbers': [...], 'chat_ids': {...}, 'method': ..., 'resolved_at': ...} ou None
+        """
+        if not phone:
+            return None
+        
+        conn = self.pool.acquire()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('SELECT * FROM phone_resolution WHERE phone = ?', (phone,))
+            row = cursor.fetchone()
+            if not row:
+                return None
+            
+            resolved_at = datetime.fromisoformat(row['resolved_at'])
+            if datetime.now() - resolved_at > timedelta(hours=ttl_hours):
+                return None
+            
+            return {
+                'valid_numbers': json.loads(row['valid_numbers']),
+                'chat_ids': json.loads(row['chat_ids'] or '{}'),
+                'method': row['method'],
+                'resolved_at': row['resolved_at']
+            }
+        except (ValueError, TypeError) as e:
+            print(f"⚠️ Cache de telefone inválido para {phone}: {e}")
+            return None
+        finally:
+            self.pool.release(conn)
+    
+    def save_phone_resolution(self, phone, valid_numbers, chat_ids=None, method=None):
+        """
+        Salva (ou atualiza) a resolução de um telefone
+        
+        Args:
+            phone: Telefone normalizado (55 + DDD + número)
+            valid_numbers: Variantes válidas em ordem de prioridade
+            chat_ids: Dict {número: chatId} retornado pelo /prepare-contacts
+            method: Variante principal (sem_9, com_9, original)
+        """
+        if not phone or not valid_numbers:
+            return
+        
+        conn = self.pool.acquire()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('''
+                INSERT OR REPLACE INTO phone_resolution (phone, valid_numbers, chat_ids, method, resolved_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (phone, json.dumps(list(valid_numbers)), json.dumps(chat_ids or {}), method,
+                  datetime.now().isoformat(timespec='seconds')))
+            conn.commit()
+        finally:
+            self.pool.release(conn)
+    
+    def invalidate_phone_resolution(self, phone):
+        """Remove a resolução em cache de um telefone (ex: envio falhou com o número em cache)"""
+        conn = self.pool.acquire()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('DELETE FROM phone_resolution WHERE phone = ?', (phone,))
+            conn.commit()
+        finally:
+            self.pool.release(conn)
+    
+    def get_sync_state(self, key):
+        """
+        Lê um valor do estado de sincronização
+        
+        Args:
+            key: Chave (ex: 'gmail_history_id')
+            
+        Returns:
+            str: Valor salvo ou None
+        """
+        conn = self.pool.acquire()
+        try:
+            cursor = conn.cursor()
+        
+            cursor.execute('SELECT value FROM sync_state WHERE key = ?', (key,))
+            row = cursor.fetchone()
+        finally:
+            self.pool.release(conn)
+        return row[0] if row else None
+    
+    def set_sync_state(self, key, value):
+        """
+        Salva um valor do estado de sincronização (None remove a chave)
+        
+        Args:
+            key: Chave (ex: 'gmail_history_id')
+            value: Valor a salvar
+        """
+        conn = self.pool.acquire()
+        cursor = conn.cursor()
+        
+        try:
+            if value is None:
+                cursor.execute('DELETE FROM sync_state WHERE key = ?', (key,))
+            else:
+                cursor.execute('''
+                    INSERT OR REPLACE INTO sync_state (key, value, updated_at)
+                    VALUES (?, ?, CURRENT_TIMESTAMP)
+                ''', (key, str(value)))
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            raise Exception(f"Erro ao salvar estado de sincronização: {e}")
+        finally:
+            self.pool.release(conn)
+    
+    def archive_old_emails(self, retention_days=None, archive_dir=None, max_attempts=None):
+        """
+        Move o conteúdo dos e-mails antigos para arquivos mensais compactados
+        
+        Cada e-mail recebido antes da janela de retenção é gravado por completo em
+        <archive_dir>/emails-AAAA-MM.jsonl.gz (uma linha JSON por e-mail) e, depois,
+        tem as colunas pesadas (ARCHIVED_COLUMNS) apagadas no banco. A linha continua
+        na tabela com as chaves de duplicidade e o status, então o e-mail não é
+        baixado de novo do Gmail nem some das estatísticas. Só são arquivados e-mails
+        já enviados ou com as tentativas esgotadas: pendentes precisam da mensagem do
+        WhatsApp para serem enviados. E-mails reservados por um worker ficam para a
+        próxima execução.
+        
+        Args:
+            retention_days: Dias mantidos completos (padrão: EMAIL_RETENTION_DAYS; 0 = não arquivar)
+            archive_dir: Pasta dos arquivos (padrão: EMAIL_ARCHIVE_DIR)
+            max_attempts: Tentativas de envio a partir das quais um pendente não sai mais
+                          (None = arquivar só os enviados)
+            
+        Returns:
+            dict: {'arquivados': quantidade, 'arquivos': nomes dos arquivos alterados}
+        """
+        retention_days = EMAIL_RETENTION_DAYS if retention_days is None else retention_days
+        if retention_days <= 0:
+            return {'arquivados': 0, 'arquivos': []}
+        archive_dir = Path(archive_dir) if archive_dir else EMAIL_ARCHIVE_DIR
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=retention_days)).replace(microsecond=0).isoformat()
+        
+        arquivados = 0
+        arquivos = set()
+        conn = self.pool.acquire()
+        try:
+            while True:
+                rows = conn.execute('''
+                    SELECT * FROM emails
+                    WHERE received_at < ? AND archived_at IS NULL
+                      AND (enviado_whatsapp = 1 OR (? IS NOT NULL AND tentativas >= ?))
+                      AND (claimed_by IS NULL OR lease_until < datetime('now'))
+                    ORDER BY received_at
+                    LIMIT ?
+                ''', (cutoff, max_attempts, max_attempts, EMAIL_ARCHIVE_BATCH)).fetchall()
+                if not rows:
+                    break
+                
+                # Arquivo antes do banco: se o processo cair no meio, a próxima execução
+                # grava o lote de novo (linha repetida no arquivo, nunca conteúdo perdido)
+                por_mes = {}
+                for row in rows:
+                    por_mes.setdefault(row['received_at'][:7], []).append(dict(row))
+                archive_dir.mkdir(parents=True, exist_ok=True)
+                for mes, emails in por_mes.items():
+                    nome = f'emails-{mes}.jsonl.gz'
+                    with gzip.open(archive_dir / nome, 'at', encoding='utf-8') as arquivo:
+                        for email in emails:
+                            arquivo.write(json.dumps(email, ensure_ascii=False) + '\n')
+                    arquivos.add(nome)
+                
+                ids = [row['id'] for row in rows]
+                placeholders = ','.join(['?'] * len(ids))
+                limpar = ', '.join(f'{coluna} = NULL' for coluna in ARCHIVED_COLUMNS)
+                conn.execute(f'''
+                    UPDATE emails SET {limpar}, archived_at = CURRENT_TIMESTAMP
+                    WHERE id IN ({placeholders})
+                ''', ids)
+                conn.commit()
+                arquivados += len(ids)
+        except (sqlite3.Error, OSError) as e:
+            conn.rollback()
+            raise Exception(f"Erro ao arquivar e-mails: {e}")
+        finally:
+            self.pool.release(conn)
+        
+        if arquivados:
+            print(f"📦 {arquivados} e-mail(s) arquivado(s) em {archive_dir} ({', '.join(sorted(arquivos))})")
+        return {'arquivados': arquivados, 'arquivos': sorted(arquivos)}
+    
+    def compact(self):
+        """
+        Devolve ao disco o espaço liberado e atualiza as estatísticas do planejador
+        
+        Na primeira execução converte o banco para auto_vacuum=INCREMENTAL (exige um
+        VACUUM completo, uma única vez); nas seguintes só libera as páginas vazias
+        (incremental_vacuum), roda ANALYZE e trunca o arquivo WAL.
+        
+        Returns:
+            dict: Páginas liberadas e tamanho do arquivo antes/depois (bytes)
+        """
+        antes = self._file_size()
+        conn = self.pool.acquire()
+        try:
+            livres = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+                print("🧹 Convertendo banco para auto_vacuum incremental (VACUUM completo)...")
+                conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+                conn.execute('VACUUM')
+            else:
+                conn.execute('PRAGMA incremental_vacuum').fetchall()
+            # analysis_limit: ANALYZE por amostragem, rápido mesmo com a tabela grande
+            conn.execute('PRAGMA analysis_limit = 1000')
+            conn.execute('ANALYZE')
+            conn.commit()
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+        except sqlite3.Error as e:
+            raise Exception(f"Erro ao compactar banco: {e}")
+        finally:
+            self.pool.release(conn)
+        
+        return {'paginas_liberadas': livres, 'bytes_antes': antes, 'bytes_depois': self._file_size()}
+    
+    def _file_size(self):
+        """Tamanho do banco em disco (arquivo principal + WAL)"""
+        total = 0
+        for sufixo in ('', '-wal'):
+            try:
+                total += os.path.getsize(f'{self.db_path}{sufixo}')
+            except OSError:
+                pass
+        return total
+    
+    def get_storage_stats(self):
+        """
+        Retorna o uso de disco do banco, por tabela e índice, e dos arquivos de arquivamento
+        
+        Returns:
+            dict: Tamanhos em bytes, páginas, e-mails arquivados e configuração de retenção
+        """
+        conn = self.pool.acquire()
+        try:
+            page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+            page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+            freelist = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            auto_vacuum = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+            arquivados = conn.execute('SELECT COUNT(*) FROM emails WHERE archived_at IS NOT NULL').fetchone()[0]
+            
+            objetos = {}
+            try:
+                # dbstat: tamanho real de cada tabela/índice (extensão presente na maioria das builds)
+                for row in conn.execute('''
+                    SELECT s.name, m.type, m.tbl_name, SUM(s.pgsize) AS bytes, COUNT(*) AS paginas
+                    FROM dbstat s LEFT JOIN sqlite_master m ON m.name = s.name
+                    GROUP BY s.name ORDER BY bytes DESC
+                '''):
+                    objetos[row['name']] = {
+                        'tipo': row['type'] or 'index',
+                        'tabela': row['tbl_name'],
+                        'bytes': row['bytes'],
+                        'paginas': row['paginas']
+                    }
+            except sqlite3.OperationalError:
+                for row in conn.execute("SELECT name, type, tbl_name FROM sqlite_master WHERE type IN ('table', 'index')"):
+                    objetos[row['name']] = {'tipo': row['type'], 'tabela': row['tbl_name']}
+        finally:
+            self.pool.release(conn)
+        
+        arquivos = {}
+        if EMAIL_ARCHIVE_DIR.exists():
+            for arquivo in sorted(EMAIL_ARCHIVE_DIR.glob('emails-*.jsonl.gz')):
+                arquivos[arquivo.name] = arquivo.stat().st_size
+        
+        return {
+            'arquivo_bytes': self._file_size(),
+            'page_size': page_size,
+            'paginas': page_count,
+            'paginas_livres': freelist,
+            'auto_vacuum': {0: 'none', 1: 'full', 2: 'incremental'}.get(auto_vacuum, auto_vacuum),
+            'objetos': objetos,
+            'emails': dict(self.get_statistics(), arquivados=arquivados),
+            'retencao_dias': EMAIL_RETENTION_DAYS,
+            'arquivamento': {'pasta': str(EMAIL_ARCHIVE_DIR), 'arquivos': arquivos}
+        }
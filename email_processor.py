@@ -4,18 +4,45 @@
 Processador de E-mails - Extrai informações do corpo do e-mail
 """
 import re
+import threading
+from collections import OrderedDict
 from urllib.parse import quote
 
-def extract_email_info(email_body):
+# Padrões compilados uma vez (antes: re.search com o padrão em texto a cada chamada).
+# Um padrão único com uma alternativa por campo foi medido ~4x mais lento no re do CPython:
+# alternativas perdem a busca rápida pelo prefixo literal ("Prezado,", "CNPJ:", ...) que
+# cada padrão isolado tem. Ver benchmark_email_processor.py.
+_VENDEDOR_PATTERN = re.compile(r'Prezado,\s*([A-ZÁÉÍÓÚÇÃÕÂÊÔ\s]+)', re.IGNORECASE)
+_NAME_PATTERN = re.compile(r'O\(A\)\s+(.*?)\s+Cliente:', re.IGNORECASE | re.DOTALL)
+_EMPRESA_PATTERN = re.compile(r'Cliente:\s*([^-]+?)\s*-\s*CNPJ:', re.IGNORECASE)
+_CNPJ_PATTERN = re.compile(r'CNPJ:\s*([0-9./-]+)')
+_CODE_PATTERN = re.compile(r'Cod\s+Cliente:\s*(\d+)', re.IGNORECASE)
+_TELEFONE_PATTERN = re.compile(r'Telefone\s+utilizado:\s*\(?(\d{2})\)?\s*(\d{4,5})-?(\d{4})', re.IGNORECASE)
+_TELEFONE_VENDEDOR_PATTERN = re.compile(r'Telefone\s+do\s+Vendedor:\s*\(?(\d{2})\)?\s*(\d{4,5})-?(\d{4})', re.IGNORECASE)
+
+# Resultados por message_id (o mesmo e-mail é extraído na triagem de duplicatas e no processamento)
+EXTRACT_CACHE_SIZE = 1024
+_extract_cache = OrderedDict()
+_extract_cache_lock = threading.Lock()
+
+def extract_email_info(email_body, message_id=None):
     """
     Extrai informações do corpo do e-mail e formata para WhatsApp
     
     Args:
         email_body: Texto completo do corpo do e-mail
+        message_id: ID da mensagem do Gmail (opcional; reaproveita a extração já feita)
         
     Returns:
         dict: Dicionário com informações extraídas
     """
+    if message_id:
+        with _extract_cache_lock:
+            cached = _extract_cache.get(message_id)
+            if cached is not None:
+                _extract_cache.move_to_end(message_id)
+                return dict(cached)
+    
     result = {
         'vendedor_nome_completo': '',
         'vendedor_primeiro_nome': '',
@@ -29,7 +56,7 @@ def extract_email_info(email_body):
     }
     
     # 1. Extrair nome do vendedor (primeira linha após "Prezado,")
-    vendedor_match = re.search(r'Prezado,\s*([A-ZÁÉÍÓÚÇÃÕÂÊÔ\s]+)', email_body, re.IGNORECASE)
+    vendedor_match = _VENDEDOR_PATTERN.search(email_body)
     if vendedor_match:
         nome_completo = vendedor_match.group(1).strip()
         result['vendedor_nome_completo'] = nome_completo
@@ -37,60 +64,53 @@ def extract_email_info(email_body):
         primeiro_nome = nome_completo.split()[0] if nome_completo.split() else nome_completo
         result['vendedor_primeiro_nome'] = primeiro_nome
     
-    # 2. Extrair "name" (Patiocanoagrill) - vem de "O(A) Patiocanoagrill Cliente:"
-    # Capturar tudo que está entre "O(A)" e "Cliente:"
-    name_match = re.search(r'O\(A\)\s+(.*?)\s+Cliente:', email_body, re.IGNORECASE | re.DOTALL)
-    
-    if name_match:
-        extracted_name = name_match.group(1).strip()
-        # Se estiver vazio ou contiver apenas espaços, usar "-"
-        if not extracted_name or extracted_name == '':
-            result['name'] = '-'
-        else:
-            # Limitar tamanho e remover quebras de linha
-            extracted_name = extracted_name.replace('\n', ' ').replace('\r', ' ').strip()
-            if len(extracted_name) > 100:
-                extracted_name = extracted_name[:100]
-            result['name'] = extracted_name
+    # 2. Extrair "name" (Patiocanoagrill) - tudo entre "O(A)" e "Cliente:"; sem o padrão, usar "-"
+    name_match = _NAME_PATTERN.search(email_body)
+    extracted_name = name_match.group(1).strip() if name_match else ''
+    if extracted_name:
+        # Limitar tamanho e remover quebras de linha
+        extracted_name = extracted_name.replace('\n', ' ').replace('\r', ' ').strip()
+        result['name'] = extracted_name[:100]
     else:
-        # Se não encontrar o padrão, usar "-"
         result['name'] = '-'
     
-    # 3. Extrair "empresa" (PATIO GRILL) - vem de "Cliente: PATIO GRILL"
-    empresa_match = re.search(r'Cliente:\s*([^-]+?)\s*-\s*CNPJ:', email_body, re.IGNORECASE)
+    # 3. Extrair "empresa" (PATIO GRILL) - vem de "Cliente: PATIO GRILL - CNPJ:"
+    empresa_match = _EMPRESA_PATTERN.search(email_body)
     if empresa_match:
         result['empresa'] = empresa_match.group(1).strip()
     
     # 4. Extrair CNPJ
-    cnpj_match = re.search(r'CNPJ:\s*([0-9./-]+)', email_body)
+    cnpj_match = _CNPJ_PATTERN.search(email_body)
     if cnpj_match:
         result['cnpj'] = cnpj_match.group(1).strip()
     
     # 5. Extrair "code" (código do cliente) - vem de "Cod Cliente: 3051288"
-    code_match = re.search(r'Cod\s+Cliente:\s*(\d+)', email_body, re.IGNORECASE)
+    code_match = _CODE_PATTERN.search(email_body)
     if code_match:
         result['code'] = code_match.group(1).strip()
     
     # 6. Extrair telefone utilizado - vem de "Telefone utilizado: (88) 9779-7542"
-    telefone_match = re.search(r'Telefone\s+utilizado:\s*\(?(\d{2})\)?\s*(\d{4,5})-?(\d{4})', email_body, re.IGNORECASE)
+    telefone_match = _TELEFONE_PATTERN.search(email_body)
     if telefone_match:
-        ddd = telefone_match.group(1)
-        parte1 = telefone_match.group(2)
-        parte2 = telefone_match.group(3)
+        ddd, parte1, parte2 = telefone_match.groups()
         # Formatar telefone completo (sem espaços, parênteses, hífens)
         result['phone'] = f"{ddd}{parte1}{parte2}"
         # Telefone formatado para exibição
         result['telefone_formatado'] = f"({ddd}) {parte1}-{parte2}"
     
     # 7. Extrair telefone do vendedor - vem de "Telefone do Vendedor: (85) 98162-2927"
-    telefone_vendedor_match = re.search(r'Telefone\s+do\s+Vendedor:\s*\(?(\d{2})\)?\s*(\d{4,5})-?(\d{4})', email_body, re.IGNORECASE)
+    telefone_vendedor_match = _TELEFONE_VENDEDOR_PATTERN.search(email_body)
     if telefone_vendedor_match:
-        ddd_v = telefone_vendedor_match.group(1)
-        parte1_v = telefone_vendedor_match.group(2)
-        parte2_v = telefone_vendedor_match.group(3)
+        ddd_v, parte1_v, parte2_v = telefone_vendedor_match.groups()
         # Formatar para WhatsApp: 55 + DDD + número (sem formatação)
         result['telefone_vendedor'] = f"55{ddd_v}{parte1_v}{parte2_v}"
     
+    if message_id:
+        with _extract_cache_lock:
+            _extract_cache[message_id] = dict(result)
+            if len(_extract_cache) > EXTRACT_CACHE_SIZE:
+                _extract_cache.popitem(last=False)
+    
     return result
 
 def format_whatsapp_message(email_body, extracted_info):
@@ -131,6 +151,37 @@ Clique no Link Abaixo para autorizar ou recusar o Acesso desse cliente com esse
     
     return mensagem
 
+def format_consolidated_whatsapp_message(emails):
+    """
+    Formata uma única mensagem para o vendedor com todas as solicitações pendentes dele
+    
+    Args:
+        emails: Registros do banco do mesmo telefone_vendedor (ordem de recebimento)
+        
+    Returns:
+        str: Mensagem formatada para WhatsApp (um e-mail: a mensagem já salva dele)
+    """
+    if len(emails) == 1:
+        return emails[0].get('whatsapp_message') or ''
+    
+    vendedor = next((e.get('vendedor_primeiro_nome') for e in emails if e.get('vendedor_primeiro_nome')), '')
+    partes = [f"""Prezado, {vendedor}
+
+{len(emails)} clientes tentaram acessar a conta na Assistente Virtual WhatsApp com telefones que não estão cadastrados no sistema.
+
+Clique no link de cada solicitação para autorizar ou recusar o acesso desse cliente com esse número."""]
+    
+    for numero, email in enumerate(emails, 1):
+        phone = email.get('phone') or ''
+        telefone = f"({phone[:2]}) {phone[2:-4]}-{phone[-4:]}" if len(phone) >= 10 else phone
+        name = email.get('name') or '-'
+        quem = '' if name == '-' else f"O(A) {name} - "
+        partes.append(f"""{numero}. {quem}Cliente: {email.get('code', '')} - {email.get('empresa', '')} - CNPJ: {email.get('cnpj', '')}
+Telefone: {telefone}
+{email.get('authorization_link') or generate_authorization_link(email)}""")
+    
+    return '\n\n'.join(partes)
+
 def generate_authorization_link(extracted_info):
     """
     Gera o link de autorização com as variáveis formatadas
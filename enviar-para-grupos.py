@@ -9,8 +9,11 @@ import os
 import sys
 from pathlib import Path
 
+from whatsapp_batch import WhatsAppBatchClient
+
 WHATSAPP_API_URL = 'http://localhost:3001'
 GROUPS_FILE = 'whatsapp-groups.json'
+CAPTION = 'Compre no WhatsApp - wa.me/551151944697?text=oi'
 
 def print_header(text):
     print('\n' + '=' * 60)
@@ -60,7 +63,7 @@ def send_to_group(image_path, group_id):
     
     try:
         abs_path = os.path.abspath(image_path)
-        caption = f'Compre no WhatsApp - wa.me/551151944697?text=oi'
+        caption = CAPTION
         
         print_info(f'Enviando {os.path.basename(image_path)} para grupo...')
         response = requests.post(
@@ -168,14 +171,24 @@ def main():
         print_info('Operação cancelada.')
         return
     
-    # Enviar para cada grupo
-    success_count = 0
-    for group in selected_groups:
-        group_id = group.get('id')
-        group_name = group.get('name', 'Grupo')
-        print(f'\n📤 Enviando para: {group_name}...')
-        if send_to_group(image_path, group_id):
-            success_count += 1
+    # Enviar para todos os grupos em um único lote (/send-batch): a imagem é carregada uma vez
+    if len(selected_groups) == 1:
+        group = selected_groups[0]
+        print(f'\n📤 Enviando para: {group.get("name", "Grupo")}...')
+        success_count = 1 if send_to_group(image_path, group.get('id')) else 0
+    else:
+        print_info(f'Enviando {os.path.basename(image_path)} em lote para {len(selected_groups)} grupo(s)...')
+        client = WhatsAppBatchClient(WHATSAPP_API_URL)
+        resultados = client.send(image_path, [group.get('id') for group in selected_groups], CAPTION)
+        success_count = 0
+        for group in selected_groups:
+            group_name = group.get('name', 'Grupo')
+            sucesso, erro = resultados.get(group.get('id'), (False, 'sem resultado'))
+            if sucesso:
+                success_count += 1
+                print_success(f'Enviado ao grupo "{group_name}" com sucesso!')
+            else:
+                print_error(f'Falha ao enviar para "{group_name}": {erro}')
     
     # Resumo
     print_header('RESUMO')
@@ -5,15 +5,21 @@ API Flask para Monitoramento de E-mails Gmail
 """
 import os
 import re
+import json
+import base64
+import socket
 import threading
 import time
-import random
-from datetime import datetime
-from flask import Flask, request, jsonify
+from datetime import datetime, timedelta
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-from gmail_service import GmailService
-from email_processor import extract_email_info, format_whatsapp_message, generate_authorization_link, validate_extracted_info
+from gmail_service import GmailService, MessageFetchError
+from email_processor import (extract_email_info, format_whatsapp_message, format_consolidated_whatsapp_message,
+                             generate_authorization_link, validate_extracted_info)
 from email_database import EmailDatabase
+from send_pacer import SendPacer
 import requests
 
 app = Flask(__name__)
@@ -48,41 +54,113 @@ def handle_exception(e):
 WHATSAPP_API_URL = os.environ.get('WHATSAPP_API_URL', 'http://localhost:3001')
 GMAIL_MONITOR_PORT = 5001  # Porta padrão (será sobrescrita por PORT em produção)
 CHECK_INTERVAL = 60  # 1 minuto em segundos
+GMAIL_INCREMENTAL_SYNC = os.environ.get('GMAIL_INCREMENTAL_SYNC', 'true').lower() == 'true'  # users.history.list a partir do historyId salvo
+GMAIL_HISTORY_KEY = 'gmail_history_id'  # Chave do historyId na tabela sync_state
+GMAIL_PUSH_TOPIC = os.environ.get('GMAIL_PUSH_TOPIC', '')  # projects/<projeto>/topics/<tópico> para users.watch (vazio = sem registro)
+GMAIL_PUSH_TOKEN = os.environ.get('GMAIL_PUSH_TOKEN', '')  # Segredo exigido em /gmail/push?token=... (vazio = sem verificação)
+GMAIL_PUSH_FALLBACK_INTERVAL = int(os.environ.get('GMAIL_PUSH_FALLBACK_INTERVAL', '1800'))  # Consulta de segurança com push ativo (segundos)
+GMAIL_PUSH_IDLE_SECONDS = 24 * 3600  # Sem watch e sem notificação há mais que isso: volta ao intervalo normal
+EMAIL_SUBJECT_FILTER = 'Erro de Login Whatsapp'  # Assunto dos e-mails monitorados
+EMAIL_MAINTENANCE_INTERVAL_HOURS = float(os.environ.get('EMAIL_MAINTENANCE_INTERVAL_HOURS', '24'))  # Arquivamento + compactação (0 = só manual)
+MAINTENANCE_KEY = 'maintenance_at'  # Chave do horário da última manutenção na tabela sync_state
+PHONE_CACHE_TTL_HOURS = int(os.environ.get('PHONE_CACHE_TTL_HOURS', '168'))  # Validade do cache de telefones (7 dias)
 
-# Configurações de Simulação Humana (mesmas do Mensager)
-HUMAN_DELAY_FIRST_MIN = 25  # Segundos - primeira mensagem
-HUMAN_DELAY_FIRST_MAX = 35  # Segundos - primeira mensagem
-HUMAN_DELAY_SUBSEQUENT_MIN = 30  # Segundos - mensagens subsequentes
-HUMAN_DELAY_SUBSEQUENT_MAX = 45  # Segundos - mensagens subsequentes
+# Configurações de Simulação Humana (mesmas do Mensager) - ritmo calculado pelo SendPacer
+HUMAN_DELAY_SUBSEQUENT_MIN = 30  # Segundos - intervalo mínimo entre mensagens
+HUMAN_DELAY_SUBSEQUENT_MAX = 45  # Segundos - intervalo máximo entre mensagens (sem falhas/ACK lento)
+EMAIL_DELIVERY_RATE_PER_MINUTE = float(os.environ.get('EMAIL_DELIVERY_RATE_PER_MINUTE', '0'))  # Limite global extra (0 = só o intervalo humano)
+EMAIL_DELIVERY_CONTACT_INTERVAL = float(os.environ.get('EMAIL_DELIVERY_CONTACT_INTERVAL', '60'))  # Segundos entre mensagens ao mesmo vendedor
+
+# Configurações do worker de entrega (fila de e-mails pendentes)
+EMAIL_DELIVERY_MAX_ATTEMPTS = int(os.environ.get('EMAIL_DELIVERY_MAX_ATTEMPTS', '5'))  # Tentativas por e-mail
+EMAIL_DELIVERY_RETRY_BACKOFF = int(os.environ.get('EMAIL_DELIVERY_RETRY_BACKOFF', '120'))  # Segundos antes da 1ª nova tentativa (dobra a cada falha)
+EMAIL_DELIVERY_LEASE_SECONDS = int(os.environ.get('EMAIL_DELIVERY_LEASE_SECONDS', '300'))  # Reserva do e-mail durante espera + envio
+EMAIL_DELIVERY_IDLE_INTERVAL = 15  # Segundos entre consultas à fila vazia
+DELIVERY_WORKER_ID = f'{socket.gethostname()}-{os.getpid()}'  # Gravado em claimed_by (único entre processos)
+BULK_WORKER_ID = f'{DELIVERY_WORKER_ID}-bulk'  # Reservas do reprocessamento em lote (separadas das do worker de entrega)
+EMAIL_BULK_VALIDATION_WORKERS = int(os.environ.get('EMAIL_BULK_VALIDATION_WORKERS', '4'))  # Validações de telefone em paralelo no reprocessamento em lote
 
 # Instâncias globais
 gmail_service = GmailService()
 email_db = EmailDatabase()
 monitor_thread = None
+delivery_thread = None
 monitor_running = False
 last_check_time = None
-email_send_count = 0  # Contador para simulação humana (primeira vs subsequentes)
 
-# Lock e set para evitar processamento simultâneo do mesmo e-mail
-processing_lock = threading.Lock()
-emails_being_processed = set()  # Set de message_ids sendo processados
+# Estado do worker de entrega
+delivery_wakeup = threading.Event()  # Sinalizado pela ingestão quando há e-mail novo na fila
+delivery_thread_lock = threading.Lock()  # Início/fim da thread de entrega (monitor e /gmail/process-pending)
+delivery_state = {'enviados': 0, 'falhas': 0}
+# Horário de cada envio (worker, reprocessamento e lote compartilham o mesmo ritmo)
+delivery_pacer = SendPacer(rate_per_minute=EMAIL_DELIVERY_RATE_PER_MINUTE,
+                           min_gap=HUMAN_DELAY_SUBSEQUENT_MIN,
+                           jitter=HUMAN_DELAY_SUBSEQUENT_MAX - HUMAN_DELAY_SUBSEQUENT_MIN,
+                           destination_interval=EMAIL_DELIVERY_CONTACT_INTERVAL,
+                           name='gmail-monitor')
+bulk_lock = threading.Lock()  # Um reprocessamento em lote por vez
+
+# Ingestão por push: notificações do Gmail (Pub/Sub) acordam o monitor na hora
+sync_wakeup = threading.Event()
+push_state = {'watch_expiration': None, 'last_notification_at': None, 'last_history_id': None,
+              'notifications': 0, 'syncs_triggered': 0}
 
-def get_human_delay(is_first_message=False):
+def prepare_whatsapp_contacts(numbers):
     """
-    Gera um delay aleatório para simulação humana
+    Prepara vários contatos no WhatsApp em uma única chamada ao /prepare-contacts
     
     Args:
-        is_first_message: Se é a primeira mensagem da sessão
+        numbers: Lista de números (formato: 55XXXXXXXXXXX)
         
     Returns:
-        int: Delay em segundos
+        tuple: (resultados, error_message) onde resultados é um dict
+               {número: {'valid', 'chatId', 'method', 'error'}} com todos os números pedidos
     """
-    if is_first_message:
-        delay = random.uniform(HUMAN_DELAY_FIRST_MIN, HUMAN_DELAY_FIRST_MAX)
-    else:
-        delay = random.uniform(HUMAN_DELAY_SUBSEQUENT_MIN, HUMAN_DELAY_SUBSEQUENT_MAX)
+    clean_numbers = [n.replace('@c.us', '').replace('@g.us', '') for n in numbers]
+    
+    try:
+        response = requests.post(
+            f"{WHATSAPP_API_URL}/prepare-contacts",
+            json={
+                'numbers': clean_numbers
+            },
+            timeout=15 + 10 * len(clean_numbers)  # Servidor processa em sequência (~0,5s entre números)
+        )
+    except requests.exceptions.RequestException as e:
+        return {}, str(e)
     
-    return int(delay)
+    try:
+        result = response.json()
+    except ValueError:
+        result = {}
+    
+    if response.status_code != 200 or not result.get('success'):
+        return {}, result.get('error', f'Erro HTTP {response.status_code}')
+    
+    resultados = {}
+    for prepared in result.get('results', {}).get('prepared', []):
+        resultados[str(prepared.get('number'))] = {
+            'valid': True,
+            'chatId': prepared.get('chatId'),
+            'method': prepared.get('method'),
+            'error': None
+        }
+    for failed in result.get('results', {}).get('failed', []):
+        number = str(failed.get('number', '')).replace('@c.us', '').replace('@g.us', '')
+        resultados.setdefault(number, {
+            'valid': False,
+            'chatId': None,
+            'method': None,
+            'error': failed.get('error', 'Falha ao preparar')
+        })
+    for number in clean_numbers:
+        resultados.setdefault(number, {
+            'valid': False,
+            'chatId': None,
+            'method': None,
+            'error': 'Número não encontrado no WhatsApp'
+        })
+    return resultados, None
 
 def prepare_whatsapp_contact(contact_id):
     """
@@ -94,34 +172,12 @@ def prepare_whatsapp_contact(contact_id):
     Returns:
         tuple: (success, error_message)
     """
-    try:
-        # Remover @c.us se existir
-        clean_number = contact_id.replace('@c.us', '').replace('@g.us', '')
-        
-        response = requests.post(
-            f"{WHATSAPP_API_URL}/prepare-contacts",
-            json={
-                'numbers': [clean_number]
-            },
-            timeout=30
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            if result.get('success'):
-                prepared = result.get('results', {}).get('prepared', [])
-                if prepared:
-                    return True, None
-                else:
-                    failed = result.get('results', {}).get('failed', [])
-                    error_msg = failed[0].get('error', 'Falha ao preparar contato') if failed else 'Contato não preparado'
-                    return False, error_msg
-            return False, result.get('error', 'Falha ao preparar contato')
-        else:
-            error_msg = response.json().get('error', 'Erro desconhecido')
-            return False, error_msg
-    except requests.exceptions.RequestException as e:
-        return False, str(e)
+    clean_number = contact_id.replace('@c.us', '').replace('@g.us', '')
+    resultados, error = prepare_whatsapp_contacts([clean_number])
+    if error:
+        return False, error
+    info = resultados[clean_number]
+    return (True, None) if info['valid'] else (False, info['error'] or 'Contato não preparado')
 
 def normalize_phone_number(phone_text):
     """
@@ -235,79 +291,50 @@ def validate_phone_with_whatsapp(phone_text):
         'method': None
     }
     
-    # Testar cada candidato usando /prepare-contacts
+    # Números que já resolveram antes (mesmo vendedor) dispensam a validação
+    cached = email_db.get_phone_resolution(base_number, PHONE_CACHE_TTL_HOURS)
+    if cached:
+        valid_numbers = cached['valid_numbers']
+        validation_info['valid'] = valid_numbers[0]
+        validation_info['method'] = cached.get('method') or 'cache'
+        validation_info['cached'] = True
+        validation_info['prepared'] = list(valid_numbers)
+        validation_info['candidates'] = [
+            {'number': n, 'type': 'cache', 'valid': True, 'error': None, 'chatId': cached['chat_ids'].get(n)}
+            for n in valid_numbers
+        ]
+        if len(valid_numbers) > 1:
+            validation_info['all_valid'] = list(valid_numbers)
+        print(f"♻️ Número em cache ({cached['resolved_at']}): {valid_numbers}")
+        return valid_numbers[0], validation_info
+    
+    # Validar todos os candidatos em uma única chamada ao /prepare-contacts
+    candidate_numbers = [number for number, _ in candidates]
+    print(f"🔍 Validando {len(candidate_numbers)} candidato(s): {candidate_numbers}")
+    resultados, request_error = prepare_whatsapp_contacts(candidate_numbers)
+    
     for candidate_number, candidate_type in candidates:
-        try:
-            print(f"🔍 Validando candidato {candidate_type}: {candidate_number}")
-            
-            # Chamar /prepare-contacts para validar
-            response = requests.post(
-                f"{WHATSAPP_API_URL}/prepare-contacts",
-                json={
-                    'numbers': [candidate_number]
-                },
-                timeout=30
-            )
-            
-            candidate_info = {
-                'number': candidate_number,
-                'type': candidate_type,
-                'valid': False,
-                'error': None
-            }
-            
-            if response.status_code == 200:
-                result = response.json()
-                if result.get('success'):
-                    prepared = result.get('results', {}).get('prepared', [])
-                    failed = result.get('results', {}).get('failed', [])
-                    
-                    # Verificar se foi preparado com sucesso
-                    if prepared:
-                        prepared_info = prepared[0]
-                        candidate_info['valid'] = True
-                        candidate_info['chatId'] = prepared_info.get('chatId')
-                        candidate_info['method'] = prepared_info.get('method')
-                        
-                        validation_info['candidates'].append(candidate_info)
-                        
-                        # Se encontrou um válido, usar esse (prioridade ao primeiro válido)
-                        if validation_info['valid'] is None:
-                            validation_info['valid'] = candidate_number
-                            validation_info['method'] = candidate_type
-                            print(f"✅ Número válido encontrado: {candidate_number} ({candidate_type})")
-                            # Não retornar ainda - testar todos para ter informações completas
-                    else:
-                        # Nenhum preparado, verificar se falhou
-                        if failed:
-                            error_msg = failed[0].get('error', 'Falha ao preparar')
-                            candidate_info['error'] = error_msg
-                            print(f"❌ Candidato {candidate_type} inválido: {error_msg}")
-                        else:
-                            candidate_info['error'] = 'Número não encontrado no WhatsApp'
-                            print(f"❌ Candidato {candidate_type} não encontrado no WhatsApp")
-                        
-                        validation_info['candidates'].append(candidate_info)
-                else:
-                    error_msg = result.get('error', 'Erro desconhecido')
-                    candidate_info['error'] = error_msg
-                    validation_info['candidates'].append(candidate_info)
-                    print(f"❌ Erro ao validar candidato {candidate_type}: {error_msg}")
-            else:
-                error_msg = response.json().get('error', 'Erro HTTP')
-                candidate_info['error'] = error_msg
-                validation_info['candidates'].append(candidate_info)
-                print(f"❌ Erro HTTP ao validar candidato {candidate_type}: {error_msg}")
-        
-        except requests.exceptions.RequestException as e:
-            candidate_info = {
-                'number': candidate_number,
-                'type': candidate_type,
-                'valid': False,
-                'error': str(e)
-            }
-            validation_info['candidates'].append(candidate_info)
-            print(f"❌ Exceção ao validar candidato {candidate_type}: {e}")
+        candidate_info = {
+            'number': candidate_number,
+            'type': candidate_type,
+            'valid': False,
+            'error': request_error
+        }
+        resultado = resultados.get(candidate_number)
+        if resultado and resultado['valid']:
+            candidate_info['valid'] = True
+            candidate_info['chatId'] = resultado.get('chatId')
+            candidate_info['method'] = resultado.get('method')
+            print(f"✅ Candidato {candidate_type} válido: {candidate_number}")
+        elif resultado:
+            candidate_info['error'] = resultado.get('error')
+            print(f"❌ Candidato {candidate_type} inválido: {candidate_info['error']}")
+        else:
+            print(f"❌ Erro ao validar candidato {candidate_type}: {request_error}")
+        validation_info['candidates'].append(candidate_info)
+    
+    # Candidatos validados já foram preparados pelo /prepare-contacts (chat/LID criado)
+    validation_info['prepared'] = [c['number'] for c in validation_info['candidates'] if c['valid']]
     
     # Coletar todos os candidatos válidos, mantendo a ordem original dos candidatos
     # Criar um dicionário para mapear número -> info
@@ -335,6 +362,17 @@ def validate_phone_with_whatsapp(phone_text):
             print(f"   Ordem de tentativa: 1º {valid_candidates[0]['number']} ({valid_candidates[0]['type']}), 2º {valid_candidates[1]['number']} ({valid_candidates[1]['type']})")
             print(f"   Testando ambos no envio na ordem acima...")
         
+        # Guardar resolução para os próximos e-mails do mesmo vendedor
+        try:
+            email_db.save_phone_resolution(
+                base_number,
+                [c['number'] for c in valid_candidates],
+                {c['number']: c.get('chatId') for c in valid_candidates},
+                validation_info['method']
+            )
+        except Exception as e:
+            print(f"⚠️ Erro ao salvar cache do telefone: {e}")
+        
         return validation_info['valid'], validation_info
     else:
         # Se nenhum for válido, retornar o primeiro candidato (original) para tentar mesmo assim
@@ -343,7 +381,29 @@ def validate_phone_with_whatsapp(phone_text):
         validation_info['method'] = 'fallback_original'
         return candidates[0][0], validation_info
 
-def send_to_whatsapp(contact_id, message):
+def remember_delivered_number(validation_info, delivered_number, valid_numbers):
+    """
+    Atualiza o cache do telefone colocando a variante que recebeu a mensagem em primeiro
+    
+    Args:
+        validation_info: Informações retornadas por validate_phone_with_whatsapp
+        delivered_number: Número que recebeu a mensagem
+        valid_numbers: Variantes válidas na ordem tentada
+    """
+    base_number = validation_info.get('normalized')
+    if not base_number:
+        return
+    if validation_info.get('cached') and valid_numbers and valid_numbers[0] == delivered_number:
+        return  # Cache já está correto
+    ordered = [delivered_number] + [n for n in valid_numbers if n != delivered_number]
+    chat_ids = {c['number']: c.get('chatId') for c in validation_info.get('candidates', []) if c.get('valid')}
+    method = next((c['type'] for c in validation_info.get('candidates', []) if c['number'] == delivered_number), None)
+    try:
+        email_db.save_phone_resolution(base_number, ordered, chat_ids, method)
+    except Exception as e:
+        print(f"⚠️ Erro ao salvar cache do telefone: {e}")
+
+def send_to_whatsapp(contact_id, message, validation=None):
     """
     Envia mensagem para WhatsApp via API existente
     Usa validação prévia para identificar o número correto (com ou sem 9 após DDD)
@@ -351,6 +411,7 @@ def send_to_whatsapp(contact_id, message):
     Args:
         contact_id: ID do contato (formato: 55XXXXXXXXXXX ou texto do e-mail)
         message: Mensagem a enviar
+        validation: Resultado de validate_phone_with_whatsapp já obtido (opcional)
         
     Returns:
         tuple: (success, error_message)
@@ -360,8 +421,11 @@ def send_to_whatsapp(contact_id, message):
         clean_number = contact_id.replace('@c.us', '').replace('@g.us', '')
         
         # Validar número com WhatsApp (gera candidatos e testa qual é válido)
-        print(f"🔍 Validando número de telefone: {clean_number}")
-        valid_number, validation_info = validate_phone_with_whatsapp(clean_number)
+        if validation:
+            valid_number, validation_info = validation
+        else:
+            print(f"🔍 Validando número de telefone: {clean_number}")
+            valid_number, validation_info = validate_phone_with_whatsapp(clean_number)
         
         if not valid_number:
             error_msg = validation_info.get('error', 'Número inválido')
@@ -382,13 +446,16 @@ def send_to_whatsapp(contact_id, message):
                 print(f"🔧 Tentativa {idx + 1}/{len(all_valid_numbers)}: número {candidate_number}")
                 print(f"{'='*60}")
                 
-                # Preparar o contato (criar LID se necessário)
-                print(f"🔧 Preparando contato {candidate_number}...")
-                prepare_success, prepare_error = prepare_whatsapp_contact(candidate_number)
-                
-                if not prepare_success:
-                    # Se falhar ao preparar, tentar enviar mesmo assim (pode já ter LID)
-                    print(f"⚠️ Aviso ao preparar contato: {prepare_error}. Tentando enviar mesmo assim...")
+                # Preparar o contato (criar LID se necessário) - dispensado se a validação já preparou
+                if candidate_number in validation_info.get('prepared', []):
+                    print(f"✓ Contato {candidate_number} já preparado na validação")
+                else:
+                    print(f"🔧 Preparando contato {candidate_number}...")
+                    prepare_success, prepare_error = prepare_whatsapp_contact(candidate_number)
+                    
+                    if not prepare_success:
+                        # Se falhar ao preparar, tentar enviar mesmo assim (pode já ter LID)
+                        print(f"⚠️ Aviso ao preparar contato: {prepare_error}. Tentando enviar mesmo assim...")
                 
                 # Formatar ID do contato (adicionar @c.us)
                 contact_id_formatted = f"{candidate_number}@c.us"
@@ -444,6 +511,7 @@ def send_to_whatsapp(contact_id, message):
                     # Consideramos OK apenas se entregue confirmado
                     if success and is_delivered:
                         print(f"✅ Mensagem ENTREGUE (dois ticks) para {candidate_number} (ack={ack}, delivered={delivered})")
+                        remember_delivered_number(validation_info, candidate_number, all_valid_numbers)
                         return True, None
                     
                     # Se não foi entregue, tentar próximo candidato ou retry
@@ -484,6 +552,7 @@ def send_to_whatsapp(contact_id, message):
                                     
                                     if retry_result.get('success', False) and retry_is_delivered:
                                         print(f"✅ Mensagem entregue após retry de preparação para {candidate_number}")
+                                        remember_delivered_number(validation_info, candidate_number, all_valid_numbers)
                                         return True, None
                     
                     # Se chegou aqui, não foi entregue (success pode ser True mas delivered=False/None ou ack < 1)
@@ -536,6 +605,9 @@ def send_to_whatsapp(contact_id, message):
         print(f"   Candidatos testados: {len(all_valid_numbers)}")
         print(f"   Último erro: {last_error}")
         print(f"{'='*60}\n")
+        if validation_info.get('cached'):
+            # Número em cache não funcionou: validar de novo no próximo e-mail
+            email_db.invalidate_phone_resolution(validation_info.get('normalized'))
         return False, last_error or 'Falha ao enviar para todos os candidatos válidos'
     except requests.exceptions.RequestException as e:
         error_msg = str(e)
@@ -560,8 +632,8 @@ def process_email(message):
     metadata = gmail_service.get_message_metadata(message)
     email_body = gmail_service.get_message_body(message)
     
-    # Extrair informações do e-mail
-    extracted_info = extract_email_info(email_body)
+    # Extrair informações do e-mail (reaproveita a extração da triagem de duplicatas)
+    extracted_info = extract_email_info(email_body, message_id=metadata.get('id'))
     
     # Log de debug para verificar extração
     print(f"📧 Informações extraídas: name={extracted_info.get('name')}, code={extracted_info.get('code')}, phone={extracted_info.get('phone')}, empresa={extracted_info.get('empresa')}, telefone_vendedor={extracted_info.get('telefone_vendedor')}")
@@ -598,11 +670,63 @@ def process_email(message):
         'authorization_link': authorization_link
     }
 
+def ingest_message(message):
+    """
+    Estágio de ingestão: filtra um e-mail do Gmail e salva no banco como pendente
+    O envio fica a cargo do worker de entrega (delivery_worker)
+    
+    Args:
+        message: Objeto de mensagem do Gmail API
+        
+    Returns:
+        str: 'saved', 'known' (já está no banco), 'ignored' (assunto), 'duplicate' ou 'invalid'
+    """
+    metadata = gmail_service.get_message_metadata(message)
+    message_id = metadata.get('id')
+    subject = metadata.get('subject', '').strip()
+    
+    # Verificar se o assunto contém "Erro de Login Whatsapp"
+    if EMAIL_SUBJECT_FILTER not in subject:
+        print(f"⏭️ E-mail ignorado - assunto não corresponde: {subject[:50]}...")
+        return 'ignored'
+    
+    # E-mail já salvo: enviado ou já na fila de entrega (índice em memória, sem consultar o banco)
+    if email_db.is_known_message_id(message_id):
+        return 'known'
+    
+    # Chave de duplicata: code + phone (telefone do cliente)
+    email_body_preview = gmail_service.get_message_body(message)
+    extracted_info_preview = extract_email_info(email_body_preview, message_id=message_id)
+    code_preview = extracted_info_preview.get('code', '')
+    phone_preview = extracted_info_preview.get('phone', '')  # Telefone do cliente
+    
+    if code_preview and phone_preview:
+        already_sent = email_db.check_already_sent_by_client_and_phone(
+            code=code_preview,
+            phone=phone_preview,
+            exclude_message_id=message_id
+        )
+        if already_sent:
+            print(f"⏭️ DUPLICATA: E-mail já enviado para code={code_preview}, phone={phone_preview} (telefone do cliente)")
+            print(f"   E-mail anterior: message_id={already_sent.get('message_id')}, data={already_sent.get('date_received')}")
+            return 'duplicate'
+    
+    processed = process_email(message)
+    if not processed:
+        return 'invalid'
+    
+    print(f"📥 E-mail salvo na fila de entrega: {message_id} (Assunto: {subject[:50]}...)")
+    delivery_wakeup.set()
+    return 'saved'
+
 def monitor_emails():
     """
-    Loop principal de monitoramento de e-mails
+    Loop de ingestão: busca e-mails novos no Gmail e salva como pendentes
+    
+    Não envia nada nem aplica a simulação humana; o intervalo entre consultas
+    ao Gmail não depende do tamanho da fila de entrega.
     """
-    global monitor_running, last_check_time
+    global last_check_time
     
     print("📧 Monitor de e-mails iniciado")
     
@@ -613,447 +737,346 @@ def monitor_emails():
                 time.sleep(60)
                 continue
             
+            # Notificações que chegarem durante esta sincronização disparam a próxima
+            sync_wakeup.clear()
+            ensure_gmail_watch()
+            
             # Atualizar timestamp ANTES de buscar (para evitar processar o mesmo e-mail duas vezes)
             current_check_time = datetime.now()
             
-            # Buscar apenas e-mails novos desde a última verificação
-            if last_check_time:
-                print(f"🔍 Buscando e-mails desde: {last_check_time.strftime('%Y-%m-%d %H:%M:%S')}")
-            else:
-                print(f"🔍 Primeira verificação - buscando e-mails dos últimos 7 dias")
-            
-            new_messages = gmail_service.get_new_messages(last_check_time)
-            
-            # FILTRAR e-mails que já foram processados e enviados
-            # Isso evita processar novamente e-mails que já foram enviados
-            filtered_messages = []
-            skipped_count = 0
-            for msg in new_messages:
-                msg_metadata = gmail_service.get_message_metadata(msg)
-                msg_id = msg_metadata.get('id')
-                
-                # Verificar se já foi processado e enviado
-                existing = email_db.get_email_by_message_id(msg_id)
-                if existing and existing.get('enviado_whatsapp') == 1:
-                    skipped_count += 1
-                    continue
-                
-                filtered_messages.append(msg)
-            
-            new_messages = filtered_messages
-            
-            if new_messages:
-                print(f"📬 {len(new_messages)} nova(s) mensagem(ns) encontrada(s) (após filtrar {skipped_count} já enviado(s))")
-                print(f"⏱️ Simulação humana ativada:")
-                print(f"   • Primeira mensagem: {HUMAN_DELAY_FIRST_MIN}-{HUMAN_DELAY_FIRST_MAX}s")
-                print(f"   • Mensagens subsequentes: {HUMAN_DELAY_SUBSEQUENT_MIN}-{HUMAN_DELAY_SUBSEQUENT_MAX}s")
-            else:
-                if skipped_count > 0:
-                    print(f"✅ Nenhum e-mail novo encontrado (todos os {skipped_count} e-mail(s) já foram enviados)")
-                else:
-                    print(f"✅ Nenhum e-mail novo encontrado")
-            
-            # Resetar contador de envios para esta verificação
-            global email_send_count
-            email_send_count = 0
+            new_history_id = None
+            fetch_errors = 0
+            try:
+                new_messages, new_history_id = fetch_gmail_messages()
+            except MessageFetchError as e:
+                # Processar as que vieram; as que falharam voltam na próxima sincronização
+                print(f"⚠️ {e}")
+                new_messages = e.messages
+                fetch_errors = len(e.failed_ids)
             
+            counts = {'saved': 0, 'known': 0, 'ignored': 0, 'duplicate': 0, 'invalid': 0, 'error': fetch_errors}
             for message in new_messages:
                 try:
-                    # Obter metadata para verificar assunto e message_id
-                    metadata = gmail_service.get_message_metadata(message)
-                    message_id = metadata.get('id')
-                    subject = metadata.get('subject', '').strip()
-                    
-                    # VERIFICAÇÃO INICIAL CRÍTICA: Verificar por message_id ANTES de qualquer processamento
-                    # Isso evita processar o mesmo e-mail múltiplas vezes
-                    existing_check = email_db.get_email_by_message_id(message_id)
-                    if existing_check and existing_check.get('enviado_whatsapp') == 1:
-                        print(f"⏭️ E-mail já enviado (verificação inicial) - ignorando: {message_id}")
-                        print(f"   Assunto: {subject[:50]}...")
-                        print(f"   Status no banco: enviado_whatsapp={existing_check.get('enviado_whatsapp')}, data_envio={existing_check.get('data_envio')}")
-                        continue
-                    
-                    # Verificar se o assunto contém "Erro de Login Whatsapp"
-                    if 'Erro de Login Whatsapp' not in subject:
-                        print(f"⏭️ E-mail ignorado - assunto não corresponde: {subject[:50]}...")
-                        continue
-                    
-                    # Usar lock para evitar processamento simultâneo
-                    with processing_lock:
-                        # Verificar se já está sendo processado
-                        if message_id in emails_being_processed:
-                            print(f"⏭️ E-mail já está sendo processado - ignorando: {message_id}")
-                            continue
-                        
-                        # Verificar se o e-mail já foi processado e enviado
-                        existing_email = email_db.get_email_by_message_id(message_id)
-                        if existing_email:
-                            if existing_email.get('enviado_whatsapp') == 1:
-                                print(f"⏭️ E-mail já enviado anteriormente - ignorando: {message_id} (Assunto: {subject[:50]}...)")
-                                continue
-                        
-                        # VERIFICAÇÃO PRINCIPAL: Extrair code e phone (telefone do cliente) para verificar duplicatas
-                        # Chave de validação: code + phone (telefone do cliente)
-                        email_body_preview = gmail_service.get_message_body(message)
-                        extracted_info_preview = extract_email_info(email_body_preview)
-                        code_preview = extracted_info_preview.get('code', '')
-                        phone_preview = extracted_info_preview.get('phone', '')  # Telefone do cliente
-                        
-                        print(f"🔍 Verificando duplicata: code={code_preview}, phone={phone_preview} (telefone do cliente)")
-                        
-                        # Verificar se já foi enviado para este cliente + telefone do cliente
-                        if code_preview and phone_preview:
-                            already_sent = email_db.check_already_sent_by_client_and_phone(
-                                code=code_preview,
-                                phone=phone_preview,
-                                exclude_message_id=message_id
-                            )
-                            
-                            if already_sent:
-                                print(f"⏭️ DUPLICATA: E-mail já enviado para code={code_preview}, phone={phone_preview} (telefone do cliente)")
-                                print(f"   E-mail anterior: message_id={already_sent.get('message_id')}, data={already_sent.get('date_received')}")
-                                continue
-                            else:
-                                print(f"✅ Nenhum e-mail duplicado encontrado para code={code_preview}, phone={phone_preview}")
-                        else:
-                            if not code_preview:
-                                print(f"⚠️ Code não encontrado no e-mail, pulando verificação de duplicata")
-                            if not phone_preview:
-                                print(f"⚠️ Telefone do cliente não encontrado no e-mail, pulando verificação de duplicata")
-                        
-                        # Marcar como sendo processado
-                        emails_being_processed.add(message_id)
-                    
-                    try:
-                        # Verificar novamente ANTES de processar (double-check)
-                        existing_email = email_db.get_email_by_message_id(message_id)
-                        if existing_email and existing_email.get('enviado_whatsapp') == 1:
-                            print(f"⏭️ E-mail foi enviado enquanto estava na fila - ignorando: {message_id}")
-                            emails_being_processed.discard(message_id)
-                            continue
-                        
-                        # Se já existe mas não foi enviado, verificar se outro e-mail do mesmo cliente + telefone do cliente já foi enviado
-                        if existing_email:
-                            existing_code = existing_email.get('code', '')
-                            existing_phone = existing_email.get('phone', '')  # Telefone do cliente
-                            
-                            # VERIFICAÇÃO CRÍTICA: Verificar se está sendo processado/enviado (updated_at recente)
-                            # Se o updated_at foi atualizado recentemente (últimos 5 minutos), significa que está sendo processado
-                            if existing_email.get('updated_at'):
-                                try:
-                                    updated_at_str = existing_email.get('updated_at')
-                                    if isinstance(updated_at_str, str):
-                                        # Tentar parsear a data
-                                        try:
-                                            if 'T' in updated_at_str:
-                                                updated_at = datetime.fromisoformat(updated_at_str.replace('Z', '+00:00'))
-                                            else:
-                                                updated_at = datetime.strptime(updated_at_str, '%Y-%m-%d %H:%M:%S')
-                                        except:
-                                            updated_at = None
-                                    else:
-                                        updated_at = None
-                                    
-                                    if updated_at:
-                                        # Remover timezone se existir para comparação
-                                        if updated_at.tzinfo:
-                                            updated_at = updated_at.replace(tzinfo=None)
-                                        
-                                        time_diff = (datetime.now() - updated_at).total_seconds()
-                                        if time_diff < 300:  # 5 minutos
-                                            print(f"⏭️ E-mail está sendo processado/enviado (updated_at há {int(time_diff)}s) - ignorando: {message_id}")
-                                            emails_being_processed.discard(message_id)
-                                            continue
-                                except Exception as e:
-                                    print(f"⚠️ Erro ao verificar updated_at: {e}")
-                            
-                            if existing_code and existing_phone:
-                                already_sent_existing = email_db.check_already_sent_by_client_and_phone(
-                                    code=existing_code,
-                                    phone=existing_phone,
-                                    exclude_message_id=message_id
-                                )
-                                
-                                if already_sent_existing:
-                                    print(f"⏭️ DUPLICATA: E-mail já enviado para code={existing_code}, phone={existing_phone} (telefone do cliente)")
-                                    print(f"   E-mail anterior: message_id={already_sent_existing.get('message_id')}")
-                                    emails_being_processed.discard(message_id)
-                                    continue
-                            
-                            # VERIFICAÇÃO CRÍTICA: Verificar se está sendo processado/enviado (updated_at recente)
-                            # Se o updated_at foi atualizado recentemente (últimos 5 minutos), significa que está sendo processado
-                            should_skip = False
-                            if existing_email.get('updated_at'):
-                                try:
-                                    updated_at_str = existing_email.get('updated_at')
-                                    if isinstance(updated_at_str, str):
-                                        # Tentar parsear a data
-                                        try:
-                                            if 'T' in updated_at_str:
-                                                updated_at = datetime.fromisoformat(updated_at_str.replace('Z', '+00:00'))
-                                            else:
-                                                updated_at = datetime.strptime(updated_at_str, '%Y-%m-%d %H:%M:%S')
-                                        except:
-                                            updated_at = None
-                                    else:
-                                        updated_at = None
-                                    
-                                    if updated_at:
-                                        # Remover timezone se existir para comparação
-                                        if updated_at.tzinfo:
-                                            updated_at = updated_at.replace(tzinfo=None)
-                                        
-                                        time_diff = (datetime.now() - updated_at).total_seconds()
-                                        if time_diff < 300:  # 5 minutos
-                                            print(f"⏭️ E-mail está sendo processado/enviado (updated_at há {int(time_diff)}s) - ignorando: {message_id}")
-                                            emails_being_processed.discard(message_id)
-                                            should_skip = True
-                                except Exception as e:
-                                    print(f"⚠️ Erro ao verificar updated_at: {e}")
-                            
-                            if should_skip:
-                                continue
-                            
-                            print(f"🔄 E-mail já processado mas não enviado - tentando enviar novamente: {message_id}")
-                            contact_id = existing_email.get('telefone_vendedor')
-                            whatsapp_msg = existing_email.get('whatsapp_message')
-                            
-                            if contact_id and whatsapp_msg:
-                                # Marcar como "enviando" no banco ANTES de qualquer verificação (para evitar envios simultâneos)
-                                # Isso cria uma "reserva" no banco indicando que este e-mail está sendo enviado
-                                email_db.mark_as_processing(message_id)
-                                
-                                # VERIFICAÇÃO ULTRA-RIGOROSA: Verificar UMA ÚLTIMA VEZ por code + phone ANTES de enviar
-                                existing_code_final = existing_email.get('code', '')
-                                existing_phone_final = existing_email.get('phone', '')  # Telefone do cliente
-                                
-                                if existing_code_final and existing_phone_final:
-                                    ultra_final_check = email_db.check_already_sent_by_client_and_phone(
-                                        code=existing_code_final,
-                                        phone=existing_phone_final,
-                                        exclude_message_id=message_id
-                                    )
-                                    
-                                    if ultra_final_check:
-                                        print(f"⏭️ DUPLICATA (verificação ultra-final): E-mail já enviado para code={existing_code_final}, phone={existing_phone_final}")
-                                        emails_being_processed.discard(message_id)
-                                        continue
-                                
-                                # Aplicar delay de simulação humana (apenas para mensagens subsequentes)
-                                if email_send_count > 0:
-                                    delay = get_human_delay(is_first_message=False)
-                                    print(f"⏳ Aguardando {delay}s (simulação humana - mensagem subsequente)...")
-                                    time.sleep(delay)
-                                
-                                print(f"📤 Enviando para WhatsApp: {contact_id}")
-                                success, error = send_to_whatsapp(contact_id, whatsapp_msg)
-                                email_send_count += 1
-                                
-                                if success:
-                                    # Marcar como enviado IMEDIATAMENTE após sucesso
-                                    email_db.mark_as_sent(message_id, success=True)
-                                    
-                                    # VERIFICAÇÃO FINAL: Confirmar que foi marcado como enviado
-                                    verification = email_db.get_email_by_message_id(message_id)
-                                    if verification and verification.get('enviado_whatsapp') == 1:
-                                        print(f"✅ E-mail enviado com sucesso para {contact_id}")
-                                        print(f"   ✅ Confirmado no banco: message_id={message_id}, enviado_whatsapp={verification.get('enviado_whatsapp')}")
-                                    else:
-                                        print(f"⚠️ ATENÇÃO: E-mail enviado mas não confirmado no banco!")
-                                        print(f"   message_id={message_id}, verification={verification}")
-                                else:
-                                    email_db.mark_as_sent(message_id, success=False, error=error)
-                                    print(f"❌ Erro ao enviar: {error}")
-                            else:
-                                print(f"⚠️ E-mail existente sem dados completos - reprocessando...")
-                                # Reprocessar se não tiver dados completos
-                                processed = process_email(message)
-                                if processed:
-                                    # Verificar se já foi enviado para este cliente + telefone do cliente ANTES de enviar
-                                    reprocessed_code = processed['extracted_info'].get('code', '')
-                                    reprocessed_phone = processed['extracted_info'].get('phone', '')  # Telefone do cliente
-                                    
-                                    if reprocessed_code and reprocessed_phone:
-                                        already_sent_reprocessed = email_db.check_already_sent_by_client_and_phone(
-                                            code=reprocessed_code,
-                                            phone=reprocessed_phone,
-                                            exclude_message_id=processed['message_id']
-                                        )
-                                        
-                                        if already_sent_reprocessed:
-                                            print(f"⏭️ DUPLICATA (reprocessamento): E-mail já enviado para code={reprocessed_code}, phone={reprocessed_phone} (telefone do cliente)")
-                                            print(f"   E-mail anterior: message_id={already_sent_reprocessed.get('message_id')}")
-                                            emails_being_processed.discard(message_id)
-                                            continue
-                                    
-                                    # VERIFICAÇÃO ULTRA-RIGOROSA: Verificar UMA ÚLTIMA VEZ por code + phone ANTES de enviar
-                                    if reprocessed_code and reprocessed_phone:
-                                        ultra_final_reprocessed = email_db.check_already_sent_by_client_and_phone(
-                                            code=reprocessed_code,
-                                            phone=reprocessed_phone,
-                                            exclude_message_id=processed['message_id']
-                                        )
-                                        
-                                        if ultra_final_reprocessed:
-                                            print(f"⏭️ DUPLICATA (verificação ultra-final - reprocessamento): E-mail já enviado para code={reprocessed_code}, phone={reprocessed_phone}")
-                                            emails_being_processed.discard(message_id)
-                                            continue
-                                    
-                                    # Marcar como "enviando" no banco ANTES de enviar
-                                    email_db.mark_as_processing(processed['message_id'])
-                                    
-                                    contact_id = processed['extracted_info'].get('telefone_vendedor')
-                                    whatsapp_msg = processed['whatsapp_message']
-                                    
-                                    # Aplicar delay de simulação humana (apenas para mensagens subsequentes)
-                                    if email_send_count > 0:
-                                        delay = get_human_delay(is_first_message=False)
-                                        print(f"⏳ Aguardando {delay}s (simulação humana - mensagem subsequente)...")
-                                        time.sleep(delay)
-                                    
-                                    print(f"📤 Enviando para WhatsApp: {contact_id}")
-                                    success, error = send_to_whatsapp(contact_id, whatsapp_msg)
-                                    email_send_count += 1
-                                    
-                                    if success:
-                                        # Marcar como enviado IMEDIATAMENTE após sucesso
-                                        email_db.mark_as_sent(processed['message_id'], success=True)
-                                        
-                                        # VERIFICAÇÃO FINAL: Confirmar que foi marcado como enviado
-                                        verification = email_db.get_email_by_message_id(processed['message_id'])
-                                        if verification and verification.get('enviado_whatsapp') == 1:
-                                            print(f"✅ E-mail enviado com sucesso para {contact_id}")
-                                            print(f"   ✅ Confirmado no banco: message_id={processed['message_id']}, enviado_whatsapp={verification.get('enviado_whatsapp')}")
-                                        else:
-                                            print(f"⚠️ ATENÇÃO: E-mail enviado mas não confirmado no banco!")
-                                            print(f"   message_id={processed['message_id']}, verification={verification}")
-                                    else:
-                                        email_db.mark_as_sent(processed['message_id'], success=False, error=error)
-                                        print(f"❌ Erro ao enviar: {error}")
-                        else:
-                            # Processar e-mail novo
-                            processed = process_email(message)
-                            
-                            if processed:
-                                # Marcar como processando IMEDIATAMENTE após salvar no banco
-                                # Isso ajuda outras threads a identificar que este e-mail está sendo processado
-                                email_db.mark_as_processing(processed['message_id'])
-                                
-                                # Verificar NOVAMENTE antes de enviar (triple-check por message_id)
-                                final_check = email_db.get_email_by_message_id(processed['message_id'])
-                                if final_check and final_check.get('enviado_whatsapp') == 1:
-                                    print(f"⏭️ E-mail foi enviado durante o processamento - ignorando: {processed['message_id']}")
-                                    emails_being_processed.discard(message_id)
-                                    continue
-                                
-                                # VERIFICAÇÃO CRÍTICA: Verificar por code + phone (telefone do cliente) ANTES de enviar
-                                processed_code = processed['extracted_info'].get('code', '')
-                                processed_phone = processed['extracted_info'].get('phone', '')  # Telefone do cliente
-                                
-                                if processed_code and processed_phone:
-                                    already_sent_client = email_db.check_already_sent_by_client_and_phone(
-                                        code=processed_code,
-                                        phone=processed_phone,
-                                        exclude_message_id=processed['message_id']
-                                    )
-                                    
-                                    if already_sent_client:
-                                        print(f"⏭️ DUPLICATA: E-mail já enviado para code={processed_code}, phone={processed_phone} (telefone do cliente)")
-                                        print(f"   E-mail anterior: message_id={already_sent_client.get('message_id')}")
-                                        emails_being_processed.discard(message_id)
-                                        continue
-                                
-                                # VERIFICAÇÃO FINAL: Verificar novamente por code + phone ANTES de enviar
-                                # (pode ter sido salvo enquanto estava processando)
-                                if processed_code and processed_phone:
-                                    final_client_check = email_db.check_already_sent_by_client_and_phone(
-                                        code=processed_code,
-                                        phone=processed_phone,
-                                        exclude_message_id=processed['message_id']
-                                    )
-                                    
-                                    if final_client_check:
-                                        print(f"⏭️ DUPLICATA (verificação final): E-mail já enviado para code={processed_code}, phone={processed_phone} (telefone do cliente)")
-                                        print(f"   E-mail anterior: message_id={final_client_check.get('message_id')}")
-                                        emails_being_processed.discard(message_id)
-                                        continue
-                                
-                                # VERIFICAÇÃO ULTRA-RIGOROSA: Verificar UMA ÚLTIMA VEZ por code + phone ANTES de enviar
-                                # Isso evita que dois e-mails sejam enviados simultaneamente
-                                if processed_code and processed_phone:
-                                    ultra_final_check = email_db.check_already_sent_by_client_and_phone(
-                                        code=processed_code,
-                                        phone=processed_phone,
-                                        exclude_message_id=processed['message_id']
-                                    )
-                                    
-                                    if ultra_final_check:
-                                        print(f"⏭️ DUPLICATA (verificação ultra-final): E-mail já enviado para code={processed_code}, phone={processed_phone}")
-                                        print(f"   E-mail anterior: message_id={ultra_final_check.get('message_id')}")
-                                        emails_being_processed.discard(message_id)
-                                        continue
-                                
-                                # Marcar como "enviando" no banco ANTES de enviar (para evitar envios simultâneos)
-                                # Isso cria uma "reserva" no banco indicando que este e-mail está sendo enviado
-                                email_db.mark_as_processing(processed['message_id'])
-                                
-                                # Enviar para WhatsApp
-                                contact_id = processed['extracted_info'].get('telefone_vendedor')
-                                whatsapp_msg = processed['whatsapp_message']
-                                
-                                # Aplicar delay de simulação humana (apenas para mensagens subsequentes)
-                                if email_send_count > 0:
-                                    delay = get_human_delay(is_first_message=False)
-                                    print(f"⏳ Aguardando {delay}s (simulação humana - mensagem subsequente)...")
-                                    time.sleep(delay)
-                                else:
-                                    print(f"📤 Primeira mensagem - sem delay (simulação humana)")
-                                
-                                print(f"📤 Enviando para WhatsApp: {contact_id}")
-                                success, error = send_to_whatsapp(contact_id, whatsapp_msg)
-                                email_send_count += 1
-                                
-                                if success:
-                                    # Marcar como enviado IMEDIATAMENTE após sucesso
-                                    email_db.mark_as_sent(processed['message_id'], success=True)
-                                    
-                                    # VERIFICAÇÃO FINAL: Confirmar que foi marcado como enviado
-                                    verification = email_db.get_email_by_message_id(processed['message_id'])
-                                    if verification and verification.get('enviado_whatsapp') == 1:
-                                        print(f"✅ E-mail enviado com sucesso para {contact_id}")
-                                        print(f"   ✅ Confirmado no banco: message_id={processed['message_id']}, enviado_whatsapp={verification.get('enviado_whatsapp')}")
-                                    else:
-                                        print(f"⚠️ ATENÇÃO: E-mail enviado mas não confirmado no banco!")
-                                        print(f"   message_id={processed['message_id']}, verification={verification}")
-                                else:
-                                    email_db.mark_as_sent(processed['message_id'], success=False, error=error)
-                                    print(f"❌ Erro ao enviar: {error}")
-                    finally:
-                        # Sempre remover do set de processamento, mesmo em caso de erro
-                        emails_being_processed.discard(message_id)
-                
+                    counts[ingest_message(message)] += 1
                 except Exception as e:
+                    counts['error'] += 1
                     print(f"❌ Erro ao processar e-mail: {e}")
-                    # Garantir que remove do set mesmo em caso de erro
-                    try:
-                        metadata = gmail_service.get_message_metadata(message)
-                        message_id = metadata.get('id')
-                        emails_being_processed.discard(message_id)
-                    except:
-                        pass
-                    continue
             
-            # Atualizar timestamp da última verificação
-            last_check_time = current_check_time
-            print(f"✅ Verificação concluída. Próxima verificação em {CHECK_INTERVAL} segundos...")
+            if counts['saved']:
+                print(f"📬 {counts['saved']} novo(s) e-mail(s) na fila de entrega")
+            else:
+                print(f"✅ Nenhum e-mail novo encontrado")
+            if new_messages or counts['error']:
+                print(f"   • Já no banco: {counts['known']} | Duplicatas: {counts['duplicate']} | "
+                      f"Ignorados: {counts['ignored']} | Inválidos: {counts['invalid']} | Erros: {counts['error']}")
+            
+            # Avançar o historyId (e a data da última verificação) só quando todas as mensagens
+            # foram baixadas e salvas (com erro, a próxima sincronização repete o intervalo;
+            # as já salvas caem em 'known')
+            if counts['error'] == 0:
+                if new_history_id:
+                    email_db.set_sync_state(GMAIL_HISTORY_KEY, new_history_id)
+                last_check_time = current_check_time
+            if maintenance_due():
+                run_email_maintenance()
             
-            # Aguardar antes da próxima verificação
-            time.sleep(CHECK_INTERVAL)
+            # Com push ativo a consulta periódica é só uma garantia; uma notificação acorda o monitor antes
+            interval = GMAIL_PUSH_FALLBACK_INTERVAL if push_active() else CHECK_INTERVAL
+            print(f"✅ Verificação concluída. Próxima verificação em {interval} segundos (ou na próxima notificação)...")
+            sync_wakeup.wait(interval)
         
         except Exception as e:
             print(f"❌ Erro no monitor: {e}")
             time.sleep(60)
 
+def fetch_gmail_messages():
+    """
+    Busca as mensagens novas no Gmail (incremental pelo historyId ou pela data da última verificação)
+    
+    Returns:
+        tuple: (mensagens completas, novo historyId ou None)
+        
+    Raises:
+        MessageFetchError: Alguma mensagem não foi baixada
+    """
+    new_history_id = None
+    if GMAIL_INCREMENTAL_SYNC:
+        # Sincronização incremental: apenas mensagens adicionadas desde o historyId salvo
+        history_id = email_db.get_sync_state(GMAIL_HISTORY_KEY)
+        if history_id:
+            print(f"🔍 Sincronização incremental desde historyId={history_id}")
+        else:
+            print(f"🔍 Sem historyId salvo - sincronização completa (últimos 7 dias)")
+        new_messages, new_history_id, _ = gmail_service.sync_new_messages(
+            history_id=history_id,
+            last_check_date=last_check_time if history_id else None,
+            get_known_ids=email_db.get_known_message_ids,
+            subject_filter=EMAIL_SUBJECT_FILTER
+        )
+    else:
+        # Buscar apenas e-mails novos desde a última verificação
+        if last_check_time:
+            print(f"🔍 Buscando e-mails desde: {last_check_time.strftime('%Y-%m-%d %H:%M:%S')}")
+        else:
+            print(f"🔍 Primeira verificação - buscando e-mails dos últimos 7 dias")
+        
+        new_messages = gmail_service.get_new_messages(
+            last_check_time,
+            get_known_ids=email_db.get_known_message_ids,
+            subject_filter=EMAIL_SUBJECT_FILTER
+        )
+    
+    return new_messages, new_history_id
+
+def push_active():
+    """Retorna True se o Gmail está enviando notificações push (watch válido ou notificação recente)"""
+    now = time.time()
+    if push_state['watch_expiration'] and push_state['watch_expiration'] > now:
+        return True
+    last = push_state['last_notification_at']
+    return bool(last and now - last < GMAIL_PUSH_IDLE_SECONDS)
+
+def ensure_gmail_watch():
+    """Registra (ou renova, a um dia de expirar) as notificações push do Gmail se GMAIL_PUSH_TOPIC estiver configurado"""
+    if not GMAIL_PUSH_TOPIC:
+        return
+    expiration = push_state['watch_expiration']
+    if expiration and expiration - time.time() > 24 * 3600:
+        return
+    
+    result = gmail_service.watch(GMAIL_PUSH_TOPIC)
+    if result and result.get('expiration'):
+        push_state['watch_expiration'] = int(result['expiration']) / 1000
+        print(f"🔔 Notificações push registradas em {GMAIL_PUSH_TOPIC} "
+              f"(expira em {datetime.fromtimestamp(push_state['watch_expiration']).strftime('%d/%m %H:%M')})")
+    else:
+        print(f"⚠️ Não foi possível registrar notificações push - mantendo consulta a cada {CHECK_INTERVAL}s")
+
+def parse_push_notification(payload):
+    """
+    Lê uma notificação do Gmail no formato de push do Pub/Sub
+    {"message": {"data": base64({"emailAddress", "historyId"}), "messageId", ...}, "subscription"}
+    
+    Args:
+        payload: Corpo JSON da requisição
+        
+    Returns:
+        dict: {'emailAddress', 'historyId'} ou None se inválida
+    """
+    message = payload.get('message') if isinstance(payload, dict) else None
+    if not isinstance(message, dict) or not message.get('data'):
+        return None
+    try:
+        data = json.loads(base64.b64decode(message['data']).decode('utf-8'))
+        return {'emailAddress': data.get('emailAddress'), 'historyId': int(data['historyId'])}
+    except (ValueError, KeyError, TypeError):
+        return None
+
+def maintenance_due():
+    """Retorna True se a manutenção do banco está atrasada (horário salvo em sync_state)"""
+    if EMAIL_MAINTENANCE_INTERVAL_HOURS <= 0:
+        return False
+    last_run = email_db.get_sync_state(MAINTENANCE_KEY)
+    if not last_run:
+        return True
+    try:
+        return datetime.now() - datetime.fromisoformat(last_run) >= timedelta(hours=EMAIL_MAINTENANCE_INTERVAL_HOURS)
+    except ValueError:
+        return True
+
+def run_email_maintenance():
+    """
+    Manutenção do emails_sent.db: arquiva o conteúdo dos e-mails fora da janela de
+    retenção e compacta o banco (incremental_vacuum, ANALYZE, checkpoint do WAL)
+    
+    Returns:
+        dict: Resultado do arquivamento e da compactação
+    """
+    print("🧹 Manutenção do banco de e-mails...")
+    result = {
+        'archive': email_db.archive_old_emails(max_attempts=EMAIL_DELIVERY_MAX_ATTEMPTS),
+        'compact': email_db.compact()
+    }
+    email_db.set_sync_state(MAINTENANCE_KEY, datetime.now().isoformat(timespec='seconds'))
+    compact = result['compact']
+    print(f"✅ Manutenção concluída: {result['archive']['arquivados']} arquivado(s), "
+          f"{compact['bytes_antes'] // 1024} KB -> {compact['bytes_depois'] // 1024} KB")
+    return result
+
+def wait_delivery_slot(send_at, until_empty=False):
+    """
+    Aguarda o horário reservado no delivery_pacer sem ficar parado em sleep
+    
+    A espera usa delivery_wakeup, sinalizado também ao parar o monitor.
+    
+    Args:
+        send_at: Horário (time.monotonic) retornado por delivery_pacer.reserve
+        until_empty: Drenando a fila por /gmail/process-pending (não depende do monitor)
+        
+    Returns:
+        bool: False se o monitor foi parado durante a espera
+    """
+    wait = send_at - time.monotonic()
+    if wait <= 0:
+        return monitor_running or until_empty
+    
+    print(f"⏳ Aguardando {int(wait)}s (simulação humana - ritmo x{delivery_pacer.slowdown:.1f})...")
+    while monitor_running or until_empty:
+        remaining = send_at - time.monotonic()
+        if remaining <= 0:
+            break
+        delivery_wakeup.wait(remaining)
+        delivery_wakeup.clear()
+    return monitor_running or until_empty
+
+def paced_send(contact_id, message, validation=None):
+    """
+    Envia ao WhatsApp e informa o resultado e o tempo até o ACK ao delivery_pacer
+    
+    Args:
+        contact_id: Telefone do vendedor
+        message: Mensagem a enviar
+        validation: Resultado de validate_phone_with_whatsapp já obtido (opcional)
+        
+    Returns:
+        tuple: (success, error_message)
+    """
+    started = time.monotonic()
+    try:
+        success, error = send_to_whatsapp(contact_id, message, validation=validation)
+    except Exception as e:
+        success, error = False, str(e)
+    # Número inválido não é sinal de excesso de envios: não desacelera o ritmo
+    penalize = not str(error or '').startswith('Número inválido')
+    delivery_pacer.record_result(contact_id, success, time.monotonic() - started, penalize=penalize)
+    return success, error
+
+def deliver_claimed_email(email, until_empty=False):
+    """
+    Estágio de entrega: envia ao WhatsApp um e-mail já reservado (claim) por este worker
+    
+    A reserva no banco (claimed_by/lease_until) garante que nenhum outro worker, nem de
+    outro processo, envia o mesmo e-mail ou outro do mesmo cliente (code + phone) ao mesmo tempo.
+    
+    Args:
+        email: Registro do banco retornado por claim_next_email
+        until_empty: Repassado a wait_delivery_slot (worker drenando a fila com o monitor parado)
+    """
+    message_id = email.get('message_id')
+    contact_id = email.get('telefone_vendedor')
+    whatsapp_msg = email.get('whatsapp_message')
+    
+    if not wait_delivery_slot(delivery_pacer.reserve(contact_id), until_empty):
+        # Monitor parado durante a espera: devolver o e-mail para a fila
+        email_db.release_email(message_id, DELIVERY_WORKER_ID)
+        return
+    
+    print(f"📤 Enviando para WhatsApp: {contact_id}")
+    success, error = paced_send(contact_id, whatsapp_msg)
+    
+    if success:
+        # Marcar como enviado IMEDIATAMENTE após sucesso (também libera a reserva)
+        if email_db.mark_as_sent(message_id, success=True, worker_id=DELIVERY_WORKER_ID):
+            print(f"✅ E-mail enviado com sucesso para {contact_id}")
+        else:
+            print(f"⚠️ ATENÇÃO: E-mail enviado mas não confirmado no banco (reserva expirada?)! message_id={message_id}")
+        delivery_state['enviados'] += 1
+        return
+    
+    delivery_state['falhas'] += 1
+    attempts = (email.get('tentativas') or 0) + 1
+    if attempts >= EMAIL_DELIVERY_MAX_ATTEMPTS:
+        email_db.mark_as_sent(message_id, success=False, error=error, worker_id=DELIVERY_WORKER_ID)
+        print(f"❌ Erro ao enviar: {error} - tentativas esgotadas ({attempts}/{EMAIL_DELIVERY_MAX_ATTEMPTS})")
+    else:
+        # A reserva passa a valer até o horário da próxima tentativa
+        backoff = min(EMAIL_DELIVERY_RETRY_BACKOFF * (2 ** (attempts - 1)), 3600)
+        email_db.mark_as_sent(message_id, success=False, error=error, retry_in=backoff, worker_id=DELIVERY_WORKER_ID)
+        print(f"❌ Erro ao enviar: {error} - nova tentativa em {backoff}s ({attempts}/{EMAIL_DELIVERY_MAX_ATTEMPTS})")
+
+def delivery_worker(until_empty=False):
+    """
+    Loop de entrega: drena os e-mails pendentes do banco com o próprio ritmo
+    (delivery_pacer, tentativas limitadas), independente da consulta ao Gmail
+    
+    Cada e-mail é reservado com claim_next_email antes do envio, então vários
+    workers (threads ou processos) podem drenar a mesma fila sem envios duplicados.
+    O worker só reserva um e-mail quando o próximo horário de envio chega e pula os
+    vendedores ainda no intervalo entre mensagens, então nenhum e-mail fica preso a
+    ele durante a espera e um vendedor não atrasa a fila dos outros.
+    
+    Args:
+        until_empty: Continua mesmo com o monitor parado e termina quando não houver
+                     mais e-mail a enviar (usado por /gmail/process-pending)
+    """
+    global delivery_thread
+    print(f"📤 Worker de entrega iniciado ({DELIVERY_WORKER_ID})")
+    
+    while monitor_running or until_empty:
+        try:
+            wait = delivery_pacer.delay()
+            if wait > 0:
+                # Intervalo desde o último envio (acorda antes se o monitor for parado)
+                delivery_wakeup.wait(wait)
+                delivery_wakeup.clear()
+                continue
+            
+            busy = delivery_pacer.busy_destinations()
+            email = email_db.claim_next_email(
+                worker_id=DELIVERY_WORKER_ID,
+                lease_seconds=EMAIL_DELIVERY_LEASE_SECONDS,
+                max_attempts=EMAIL_DELIVERY_MAX_ATTEMPTS,
+                skip_contacts=list(busy)
+            )
+            if email:
+                deliver_claimed_email(email, until_empty)
+            elif until_empty and not busy:
+                with delivery_thread_lock:
+                    if not monitor_running:
+                        # Fila drenada e monitor parado: liberar para o próximo início
+                        delivery_thread = None
+                        break
+            else:
+                # Fila vazia (ou só aguardando nova tentativa/intervalo de vendedor): esperar novo e-mail
+                # da ingestão ou o próximo vendedor liberar
+                delivery_wakeup.wait(min([EMAIL_DELIVERY_IDLE_INTERVAL] + list(busy.values())))
+                delivery_wakeup.clear()
+        
+        except Exception as e:
+            print(f"❌ Erro no worker de entrega: {e}")
+            time.sleep(30)
+    
+    print("📤 Worker de entrega parado")
+
+def start_monitor_threads():
+    """Inicia as threads de ingestão (Gmail) e de entrega (WhatsApp)"""
+    global monitor_thread, monitor_running
+    
+    monitor_running = True
+    if monitor_thread is None or not monitor_thread.is_alive():
+        monitor_thread = threading.Thread(target=monitor_emails, daemon=True)
+        monitor_thread.start()
+    start_delivery_thread()
+
+def start_delivery_thread(until_empty=False):
+    """
+    Inicia a thread de entrega se ainda não estiver rodando
+    
+    Args:
+        until_empty: Repassado a delivery_worker (drenar a fila com o monitor parado)
+    
+    Returns:
+        bool: True se uma nova thread foi iniciada
+    """
+    global delivery_thread
+    
+    with delivery_thread_lock:
+        if delivery_thread is not None and delivery_thread.is_alive():
+            return False
+        delivery_thread = threading.Thread(target=delivery_worker, args=(until_empty,), daemon=True)
+        delivery_thread.start()
+        return True
+
 @app.route('/gmail/connect', methods=['POST'])
 def connect_gmail():
     """Inicia processo de autenticação Gmail"""
@@ -1106,10 +1129,13 @@ def connect_gmail():
 @app.route('/health', methods=['GET'])
 def health_check():
     """Endpoint de health check"""
+    # Não consulta o Gmail: responde na hora, inclusive enquanto a conexão está em andamento
     return jsonify({
         'status': 'ok',
         'service': 'Gmail Monitor API',
-        'port': GMAIL_MONITOR_PORT
+        'port': GMAIL_MONITOR_PORT,
+        'gmail': gmail_service.state,
+        'monitor_running': monitor_running
     })
 
 @app.route('/gmail/status', methods=['GET'])
@@ -1122,16 +1148,19 @@ def gmail_status():
         profile = gmail_service.get_profile()
         email = profile.get('emailAddress', '') if profile else ''
     
+    refresh_in = gmail_service.seconds_until_refresh() if is_authenticated else None
     return jsonify({
         'authenticated': is_authenticated,
-        'email': email
+        'email': email,
+        'state': gmail_service.state,
+        'error': gmail_service.last_error,
+        'token_refresh_in': int(refresh_in) if refresh_in is not None else None,
+        'token_refreshed_at': gmail_service.token_refreshed_at.isoformat() if gmail_service.token_refreshed_at else None
     })
 
 @app.route('/gmail/start-monitor', methods=['POST'])
 def start_monitor():
     """Inicia monitoramento de e-mails"""
-    global monitor_thread, monitor_running
-    
     if not gmail_service.is_authenticated():
         return jsonify({
             'success': False,
@@ -1148,9 +1177,7 @@ def start_monitor():
     data = request.get_json() or {}
     interval = data.get('interval', CHECK_INTERVAL)
     
-    monitor_running = True
-    monitor_thread = threading.Thread(target=monitor_emails, daemon=True)
-    monitor_thread.start()
+    start_monitor_threads()
     
     return jsonify({
         'success': True,
@@ -1164,6 +1191,8 @@ def stop_monitor():
     global monitor_running
     
     monitor_running = False
+    delivery_wakeup.set()
+    sync_wakeup.set()
     
     return jsonify({
         'success': True,
@@ -1176,13 +1205,66 @@ def monitor_status():
     global last_check_time
     
     stats = email_db.get_statistics()
+    pacing = delivery_pacer.get_stats()
     
     return jsonify({
         'running': monitor_running,
         'last_check': last_check_time.isoformat() if last_check_time else None,
-        'statistics': stats
+        'statistics': stats,
+        'delivery': {
+            'running': bool(delivery_thread and delivery_thread.is_alive()),
+            'worker_id': DELIVERY_WORKER_ID,
+            'next_send_in': int(pacing['proximo_envio_em']),
+            'sent': delivery_state['enviados'],
+            'failed': delivery_state['falhas'],
+            'max_attempts': EMAIL_DELIVERY_MAX_ATTEMPTS,
+            'pacing': pacing
+        },
+        'push': {
+            'active': push_active(),
+            'topic': GMAIL_PUSH_TOPIC or None,
+            'watch_expiration': datetime.fromtimestamp(push_state['watch_expiration']).isoformat() if push_state['watch_expiration'] else None,
+            'last_notification': datetime.fromtimestamp(push_state['last_notification_at']).isoformat() if push_state['last_notification_at'] else None,
+            'last_history_id': push_state['last_history_id'],
+            'notifications': push_state['notifications'],
+            'syncs_triggered': push_state['syncs_triggered']
+        }
     })
 
+@app.route('/gmail/push', methods=['POST'])
+def gmail_push():
+    """
+    Webhook das notificações push do Gmail (assinatura push do Pub/Sub)
+    
+    Responde na hora (o Pub/Sub reenvia se não receber 2xx) e só acorda o monitor,
+    que faz a sincronização incremental a partir do historyId salvo.
+    """
+    if GMAIL_PUSH_TOKEN and request.args.get('token') != GMAIL_PUSH_TOKEN:
+        return jsonify({
+            'success': False,
+            'error': 'Token inválido'
+        }), 403
+    
+    notification = parse_push_notification(request.get_json(silent=True))
+    if not notification:
+        return jsonify({
+            'success': False,
+            'error': 'Notificação inválida'
+        }), 400
+    
+    push_state['notifications'] += 1
+    push_state['last_notification_at'] = time.time()
+    push_state['last_history_id'] = notification['historyId']
+    
+    # Notificação antiga ou repetida (já coberta pela última sincronização): nada a fazer
+    saved_history_id = email_db.get_sync_state(GMAIL_HISTORY_KEY)
+    if saved_history_id and notification['historyId'] <= int(saved_history_id):
+        return '', 204
+    
+    push_state['syncs_triggered'] += 1
+    sync_wakeup.set()
+    return '', 204
+
 @app.route('/gmail/pending-emails', methods=['GET'])
 def get_pending_emails():
     """Retorna lista de e-mails pendentes"""
@@ -1202,53 +1284,163 @@ def get_pending_emails():
 
 @app.route('/gmail/process-pending', methods=['POST'])
 def process_pending():
-    """Processa e-mails pendentes"""
+    """
+    Envia os e-mails pendentes pelo worker de entrega
+    
+    O envio não acontece nesta requisição: os e-mails completos ficam com o
+    worker de entrega (iniciado para drenar a fila se o monitor estiver parado),
+    que respeita o ritmo do delivery_pacer. A resposta traz a previsão de duração.
+    """
     pending = email_db.get_pending_emails()
     
     results = {
-        'success': [],
+        'queued': [],
         'failed': [],
         'total': len(pending)
     }
+    contatos = []
     
     for email in pending:
-        try:
-            contact_id = email.get('telefone_vendedor')
-            whatsapp_msg = email.get('whatsapp_message')
-            
-            if not contact_id or not whatsapp_msg:
-                results['failed'].append({
-                    'message_id': email.get('message_id'),
-                    'error': 'Dados incompletos'
-                })
-                continue
-            
-            # Enviar para WhatsApp
-            success, error = send_to_whatsapp(contact_id, whatsapp_msg)
-            
-            if success:
-                email_db.mark_as_sent(email.get('message_id'), success=True)
-                results['success'].append({
-                    'message_id': email.get('message_id'),
-                    'contact_id': contact_id
-                })
-            else:
-                email_db.mark_as_sent(email.get('message_id'), success=False, error=error)
-                results['failed'].append({
-                    'message_id': email.get('message_id'),
-                    'error': error
-                })
-        
-        except Exception as e:
+        if not email.get('telefone_vendedor') or not email.get('whatsapp_message'):
             results['failed'].append({
                 'message_id': email.get('message_id'),
-                'error': str(e)
+                'error': 'Dados incompletos'
             })
+        elif (email.get('tentativas') or 0) >= EMAIL_DELIVERY_MAX_ATTEMPTS:
+            results['failed'].append({
+                'message_id': email.get('message_id'),
+                'error': 'Tentativas esgotadas (use /gmail/process-pending-bulk)'
+            })
+        else:
+            results['queued'].append(email.get('message_id'))
+            contatos.append(email.get('telefone_vendedor'))
+    
+    previsao = 0
+    if results['queued']:
+        start_delivery_thread(until_empty=True)
+        delivery_wakeup.set()
+        previsao = round(delivery_pacer.plan(contatos)[-1], 1)
     
     return jsonify({
         'success': True,
+        'message': f"{len(results['queued'])} e-mail(s) encaminhado(s) ao worker de entrega",
+        'previsao_segundos': previsao,
         'results': results
-    })
+    }), 202
+
+def bulk_process_pending():
+    """
+    Reprocessamento em lote dos e-mails pendentes, com progresso a cada etapa
+    
+    1. Lê todos os pendentes em uma consulta e agrupa por telefone_vendedor
+    2. Valida todos os telefones distintos em paralelo antes de enviar
+    3. Envia uma mensagem consolidada por vendedor no ritmo do delivery_pacer,
+       reservando os e-mails do grupo só quando o horário do envio chega
+    
+    Yields:
+        dict: Eventos de progresso ('inicio', 'validado', 'aguardando', 'enviado', 'falha', 'fim');
+              'inicio' traz a previsão de duração calculada pelo agendador
+    """
+    pending = email_db.get_pending_emails()
+    groups = OrderedDict()
+    incompletos = []
+    for email in pending:
+        contact_id = email.get('telefone_vendedor')
+        if not contact_id or not email.get('whatsapp_message'):
+            incompletos.append(email.get('message_id'))
+            continue
+        groups.setdefault(contact_id, []).append(email)
+    
+    yield {
+        'event': 'inicio',
+        'pendentes': len(pending),
+        'vendedores': len(groups),
+        'incompletos': incompletos,
+        'previsao_segundos': int((delivery_pacer.plan(list(groups)) or [0])[-1])
+    }
+    
+    # Validação de todos os telefones distintos em paralelo (o cache de telefones também é preenchido)
+    validations = {}
+    if groups:
+        with ThreadPoolExecutor(max_workers=max(1, EMAIL_BULK_VALIDATION_WORKERS),
+                                thread_name_prefix='validacao') as executor:
+            futures = {executor.submit(validate_phone_with_whatsapp, contact_id): contact_id for contact_id in groups}
+            for future in as_completed(futures):
+                contact_id = futures[future]
+                try:
+                    validations[contact_id] = future.result()
+                except Exception as e:
+                    validations[contact_id] = (None, {'error': str(e), 'original': contact_id})
+                valid_number, validation_info = validations[contact_id]
+                yield {
+                    'event': 'validado',
+                    'telefone_vendedor': contact_id,
+                    'numero': valid_number,
+                    'metodo': validation_info.get('method'),
+                    'erro': validation_info.get('error')
+                }
+    
+    resumo = {'enviados': 0, 'falhas': 0, 'em_uso': 0}
+    for contact_id, emails in groups.items():
+        # Esperar o horário do envio antes de reservar o grupo: a reserva (lease) cobre só o
+        # envio e não expira durante a espera, quando o worker de entrega poderia pegar os e-mails
+        send_at = delivery_pacer.reserve(contact_id)
+        delay = send_at - time.monotonic()
+        if delay > 0:
+            yield {'event': 'aguardando', 'segundos': int(delay), 'telefone_vendedor': contact_id}
+            time.sleep(max(0, send_at - time.monotonic()))
+        
+        # Reservar o grupo: e-mails com o worker de entrega ficam fora da mensagem consolidada
+        message_ids = email_db.claim_emails([e['message_id'] for e in emails], BULK_WORKER_ID,
+                                            EMAIL_DELIVERY_LEASE_SECONDS)
+        resumo['em_uso'] += len(emails) - len(message_ids)
+        if not message_ids:
+            continue
+        emails = [e for e in emails if e['message_id'] in message_ids]
+        
+        try:
+            message = format_consolidated_whatsapp_message(emails)
+            success, error = paced_send(contact_id, message, validation=validations.get(contact_id))
+        except Exception as e:
+            success, error = False, str(e)
+        
+        for message_id in message_ids:
+            email_db.mark_as_sent(message_id, success=success, error=None if success else error,
+                                  worker_id=BULK_WORKER_ID)
+        if success:
+            resumo['enviados'] += len(message_ids)
+        else:
+            resumo['falhas'] += len(message_ids)
+        yield {
+            'event': 'enviado' if success else 'falha',
+            'telefone_vendedor': contact_id,
+            'message_ids': message_ids,
+            'erro': error
+        }
+    
+    yield dict(resumo, event='fim')
+
+@app.route('/gmail/process-pending-bulk', methods=['POST'])
+def process_pending_bulk():
+    """
+    Reprocessa os pendentes em lote (uma mensagem por vendedor)
+    
+    A resposta é um fluxo NDJSON: uma linha JSON por evento de progresso.
+    """
+    def generate():
+        # Trava tomada dentro do fluxo: liberada mesmo se o cliente desconectar
+        if not bulk_lock.acquire(blocking=False):
+            yield json.dumps({'event': 'erro', 'erro': 'Reprocessamento em lote já em andamento'}, ensure_ascii=False) + '\n'
+            return
+        try:
+            for event in bulk_process_pending():
+                yield json.dumps(event, ensure_ascii=False) + '\n'
+        except Exception as e:
+            yield json.dumps({'event': 'erro', 'erro': str(e)}, ensure_ascii=False) + '\n'
+        finally:
+            bulk_lock.release()
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
 @app.route('/gmail/clean-pending', methods=['POST'])
 def clean_pending_emails():
@@ -1332,22 +1524,72 @@ def delete_all_pending():
 
 @app.route('/gmail/history', methods=['GET'])
 def get_history():
-    """Retorna histórico de e-mails"""
-    limit = request.args.get('limit', 100, type=int)
-    offset = request.args.get('offset', 0, type=int)
+    """
+    Retorna histórico de e-mails (mais recentes primeiro), sem os corpos
     
-    emails = email_db.get_all_emails(limit=limit, offset=offset)
+    Query params:
+        limit: E-mails por página (máximo 500)
+        cursor: next_cursor da resposta anterior para a próxima página
+        status: enviado | pendente (opcional)
+    """
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 500)
+    cursor = request.args.get('cursor') or None
+    status = request.args.get('status') or None
     
-    # Converter para formato JSON serializável
-    for email in emails:
-        for key, value in email.items():
-            if isinstance(value, (int, float)) and value is None:
-                email[key] = None
+    try:
+        emails, next_cursor = email_db.get_email_history(limit=limit, cursor=cursor, status=status)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     
     return jsonify({
         'success': True,
         'count': len(emails),
-        'emails': emails
+        'emails': emails,
+        'next_cursor': next_cursor
+    })
+
+@app.route('/gmail/email/<message_id>', methods=['GET'])
+def get_email_detail(message_id):
+    """Retorna um e-mail completo (corpo, mensagem do WhatsApp, link)"""
+    email = email_db.get_email_by_message_id(message_id)
+    if not email:
+        return jsonify({
+            'success': False,
+            'error': 'E-mail não encontrado'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'email': email
+    })
+
+@app.route('/gmail/db-stats', methods=['GET'])
+def get_db_stats():
+    """Retorna tamanho do banco de e-mails, por tabela/índice, e dos arquivos de arquivamento"""
+    stats = email_db.get_storage_stats()
+    stats['ultima_manutencao'] = email_db.get_sync_state(MAINTENANCE_KEY)
+    return jsonify({
+        'success': True,
+        'stats': stats
+    })
+
+@app.route('/gmail/maintenance', methods=['POST'])
+def run_maintenance():
+    """Executa agora o arquivamento e a compactação do banco de e-mails"""
+    try:
+        result = run_email_maintenance()
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+    
+    return jsonify({
+        'success': True,
+        'result': result
     })
 
 @app.route('/gmail/test-email', methods=['POST'])
@@ -1376,38 +1618,28 @@ def test_email():
 
 def auto_connect_and_start():
     """
-    Conecta automaticamente ao Gmail e inicia o monitoramento
-    """
-    print("\n" + "="*60)
-    print("🔐 Tentando conectar automaticamente ao Gmail...")
-    print("="*60)
+    Conecta automaticamente ao Gmail e inicia o monitoramento, em segundo plano
     
+    A renovação do token e a construção do serviço não atrasam o app.run: o /health
+    responde logo após o início, e o monitor começa quando a conexão termina.
+    """
     # Tentar autenticar se já tiver token
-    if os.path.exists('token.json'):
-        try:
-            authenticated = gmail_service.authenticate()
-            if authenticated:
-                print("✅ Gmail conectado automaticamente!")
-                
-                # Iniciar monitoramento automaticamente
-                global monitor_thread, monitor_running
-                if not monitor_running:
-                    print("📧 Iniciando monitoramento automaticamente...")
-                    monitor_running = True
-                    monitor_thread = threading.Thread(target=monitor_emails, daemon=True)
-                    monitor_thread.start()
-                    print("✅ Monitoramento iniciado automaticamente!")
-                else:
-                    print("ℹ️ Monitoramento já está em execução")
-            else:
-                print("⚠️ Não foi possível conectar automaticamente. Use o botão 'Conectar Gmail' na interface.")
-        except Exception as e:
-            print(f"⚠️ Erro ao conectar automaticamente: {e}")
-            print("ℹ️ Use o botão 'Conectar Gmail' na interface para autenticar.")
-    else:
+    if not os.path.exists('token.json') and not os.environ.get('GMAIL_REFRESH_TOKEN'):
         print("ℹ️ Token não encontrado. Use o botão 'Conectar Gmail' na interface para autenticar pela primeira vez.")
+        return
+    
+    def on_connected():
+        print("✅ Gmail conectado automaticamente!")
+        # Iniciar monitoramento automaticamente
+        if not monitor_running:
+            print("📧 Iniciando monitoramento automaticamente...")
+            start_monitor_threads()
+            print("✅ Monitoramento iniciado automaticamente!")
+        else:
+            print("ℹ️ Monitoramento já está em execução")
     
-    print("="*60 + "\n")
+    print("🔐 Conectando ao Gmail em segundo plano...")
+    gmail_service.connect_in_background(on_ready=on_connected)
 
 if __name__ == '__main__':
     # Configuração para produção vs desenvolvimento
@@ -1420,7 +1652,7 @@ if __name__ == '__main__':
     print(f"📱 WhatsApp API: {WHATSAPP_API_URL}")
     print(f"🌐 URL: http://{host}:{port}")
     
-    # Tentar conectar automaticamente e iniciar monitoramento
+    # Conectar ao Gmail e iniciar o monitoramento em segundo plano (não atrasa o servidor)
     auto_connect_and_start()
     
     app.run(host=host, port=port, debug=debug)
@@ -6,16 +6,38 @@ Serviço de Integração com Gmail API
 import os
 import base64
 import json
+import threading
 from datetime import datetime, timedelta
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build, build_from_document
 from googleapiclient.errors import HttpError
 
 # Escopos necessários para acessar Gmail
 SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
 
+GMAIL_BATCH_SIZE = 50  # Requisições por chamada batch (o Gmail recomenda no máximo 50)
+METADATA_HEADERS = ['Subject', 'From', 'Date', 'To']  # Cabeçalhos da etapa format='metadata'
+GMAIL_TOKEN_REFRESH_MARGIN = int(os.getenv('GMAIL_TOKEN_REFRESH_MARGIN', '300'))  # Renovar o token N segundos antes de expirar
+GMAIL_DISCOVERY_CACHE = os.getenv('GMAIL_DISCOVERY_CACHE', 'gmail_discovery.json')  # Documento de descoberta salvo (bibliotecas sem static_discovery)
+
+class HistoryExpiredError(Exception):
+    """historyId antigo demais (404 em users.history.list): é necessária sincronização completa"""
+    pass
+
+class MessageFetchError(Exception):
+    """Mensagens que não puderam ser baixadas nem na nova tentativa individual
+    
+    Attributes:
+        messages: Mensagens baixadas com sucesso (podem ser processadas normalmente)
+        failed_ids: IDs que falharam (a sincronização não pode avançar o historyId)
+    """
+    def __init__(self, messages, failed_ids):
+        super().__init__(f"{len(failed_ids)} mensagem(ns) não baixada(s): {', '.join(failed_ids[:5])}")
+        self.messages = messages
+        self.failed_ids = failed_ids
+
 class GmailService:
     def __init__(self, credentials_file='credentials.json', token_file='token.json'):
         """
@@ -30,13 +52,25 @@ class GmailService:
         self.service = None
         self.creds = None
         
+        # Conexão em segundo plano e renovação antecipada do token
+        self.state = 'desconectado'  # desconectado | conectando | conectado | erro
+        self.last_error = None
+        self.token_refreshed_at = None
+        self.refresh_lock = threading.Lock()
+        self.refresh_stop = threading.Event()
+        self.refresh_thread = None
+        
         # Criar credentials.json a partir de variáveis de ambiente se não existir
         self._create_credentials_from_env()
     
-    def authenticate(self):
+    def authenticate(self, interactive=True):
         """
         Autentica e obtém credenciais do Gmail
         
+        Args:
+            interactive: False para nunca abrir o fluxo OAuth2 no navegador
+                         (conexão automática em segundo plano)
+        
         Returns:
             bool: True se autenticado com sucesso
         """
@@ -76,6 +110,9 @@ class GmailService:
                 except Exception as e:
                     print(f"Erro ao renovar token: {e}")
                     return False
+            elif not interactive:
+                print("⚠️ Token ausente ou inválido - autorização manual necessária ('Conectar Gmail')")
+                return False
             else:
                 # Fazer fluxo de autenticação OAuth2
                 if not os.path.exists(self.credentials_file):
@@ -115,16 +152,153 @@ class GmailService:
                     raise Exception(f"Erro na autenticação OAuth2: {str(e)}. Certifique-se de que o arquivo credentials.json está correto e que a Gmail API está habilitada no Google Cloud Console.")
             
             # Salvar credenciais para próxima vez
-            with open(self.token_file, 'w') as token:
-                token.write(self.creds.to_json())
+            self._save_token()
         
         # Construir serviço Gmail
         try:
-            self.service = build('gmail', 'v1', credentials=self.creds)
-            return True
+            self.service = self._build_service()
         except HttpError as error:
             print(f'Erro ao construir serviço Gmail: {error}')
             return False
+        
+        self.state = 'conectado'
+        self.last_error = None
+        self.start_token_refresher()
+        return True
+    
+    def _save_token(self):
+        """Grava o token atual em token_file (reaproveitado no próximo início)"""
+        try:
+            with open(self.token_file, 'w') as token:
+                token.write(self.creds.to_json())
+        except OSError as e:
+            print(f"⚠️ Erro ao salvar token: {e}")
+    
+    def _build_service(self):
+        """
+        Constrói o cliente da Gmail API sem buscar o documento de descoberta na rede
+        
+        Usa o documento embutido na biblioteca (static_discovery). Versões antigas do
+        google-api-python-client não têm o documento embutido: a primeira construção
+        busca o documento e o salva em GMAIL_DISCOVERY_CACHE para as próximas.
+        """
+        if GMAIL_DISCOVERY_CACHE and os.path.exists(GMAIL_DISCOVERY_CACHE):
+            try:
+                with open(GMAIL_DISCOVERY_CACHE, 'r', encoding='utf-8') as f:
+                    return build_from_document(f.read(), credentials=self.creds)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Documento de descoberta salvo inválido, reconstruindo: {e}")
+        
+        try:
+            return build('gmail', 'v1', credentials=self.creds, static_discovery=True, cache_discovery=False)
+        except TypeError:
+            # google-api-python-client < 2.0: sem static_discovery
+            service = build('gmail', 'v1', credentials=self.creds, cache_discovery=False)
+        
+        if GMAIL_DISCOVERY_CACHE:
+            try:
+                with open(GMAIL_DISCOVERY_CACHE, 'w', encoding='utf-8') as f:
+                    json.dump(service._rootDesc, f)
+            except (OSError, AttributeError, TypeError) as e:
+                print(f"⚠️ Não foi possível salvar o documento de descoberta: {e}")
+        return service
+    
+    def connect_in_background(self, on_ready=None):
+        """
+        Autentica e constrói o serviço em uma thread, sem bloquear o início do servidor
+        
+        Só usa o token salvo ou GMAIL_REFRESH_TOKEN (nunca abre o fluxo OAuth2).
+        
+        Args:
+            on_ready: Função chamada sem argumentos após conectar (ex: iniciar o monitor)
+            
+        Returns:
+            threading.Thread: Thread da conexão
+        """
+        def connect():
+            self.state = 'conectando'
+            try:
+                connected = self.authenticate(interactive=False)
+            except Exception as e:
+                connected = False
+                self.last_error = str(e)
+            if not connected:
+                self.state = 'erro' if self.last_error else 'desconectado'
+                return
+            if on_ready:
+                try:
+                    on_ready()
+                except Exception as e:
+                    print(f"⚠️ Erro após conectar ao Gmail: {e}")
+        
+        self.state = 'conectando'
+        thread = threading.Thread(target=connect, name='gmail-connect', daemon=True)
+        thread.start()
+        return thread
+    
+    def seconds_until_refresh(self):
+        """
+        Segundos até a renovação antecipada do token (GMAIL_TOKEN_REFRESH_MARGIN antes de expirar)
+        
+        Returns:
+            float: 0 se o token já deve ser renovado; None se não há como renovar
+        """
+        if not self.creds or not self.creds.refresh_token:
+            return None
+        if not self.creds.expiry:
+            return 0 if not self.creds.token else None
+        # expiry das credenciais do google-auth é UTC sem fuso
+        remaining = (self.creds.expiry - datetime.utcnow()).total_seconds()
+        return max(0.0, remaining - GMAIL_TOKEN_REFRESH_MARGIN)
+    
+    def refresh_token(self, force=False):
+        """
+        Renova o token de acesso se estiver perto de expirar (ou sempre, com force)
+        
+        Returns:
+            bool: True se o token está válido após a chamada
+        """
+        with self.refresh_lock:
+            if not self.creds or not self.creds.refresh_token:
+                return bool(self.creds and self.creds.valid)
+            if not force and self.seconds_until_refresh():
+                return True
+            try:
+                self.creds.refresh(Request())
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"⚠️ Erro ao renovar token do Gmail: {e}")
+                return False
+            self.token_refreshed_at = datetime.now()
+            self._save_token()
+            return True
+    
+    def start_token_refresher(self):
+        """Inicia (uma vez) a thread que renova o token antes de expirar"""
+        if self.refresh_thread and self.refresh_thread.is_alive():
+            return
+        self.refresh_stop.clear()
+        self.refresh_thread = threading.Thread(target=self._token_refresh_loop, name='gmail-token', daemon=True)
+        self.refresh_thread.start()
+    
+    def _token_refresh_loop(self):
+        """Dorme até GMAIL_TOKEN_REFRESH_MARGIN antes da expiração e renova o token"""
+        while not self.refresh_stop.is_set():
+            wait = self.seconds_until_refresh()
+            if wait is None:
+                return  # Credenciais sem refresh token: nada a renovar
+            if wait > 0:
+                if self.refresh_stop.wait(wait):
+                    return
+                continue
+            if self.refresh_token():
+                expiry = self.creds.expiry.isoformat(timespec='seconds') if self.creds.expiry else '?'
+                print(f"🔑 Token do Gmail renovado antecipadamente (expira {expiry} UTC)")
+                if self.seconds_until_refresh() != 0:
+                    continue
+            # Falha na renovação (ou token com validade menor que a margem): tentar de novo em 1 minuto
+            if self.refresh_stop.wait(60):
+                return
     
     def _create_credentials_from_env(self):
         """Cria credentials.json a partir de variáveis de ambiente se não existir"""
@@ -217,12 +391,20 @@ class GmailService:
             print(f'Erro ao listar mensagens: {error}')
             return []
     
-    def get_message(self, message_id):
+    def _message_request(self, message_id, format='full'):
+        """Monta a requisição messages.get (format='metadata' traz só os cabeçalhos usados)"""
+        params = {'userId': 'me', 'id': message_id, 'format': format}
+        if format == 'metadata':
+            params['metadataHeaders'] = METADATA_HEADERS
+        return self.service.users().messages().get(**params)
+    
+    def get_message(self, message_id, format='full'):
         """
-        Obtém uma mensagem completa pelo ID
+        Obtém uma mensagem pelo ID
         
         Args:
             message_id: ID da mensagem
+            format: 'full' (corpo completo) ou 'metadata' (apenas cabeçalhos)
             
         Returns:
             dict: Dados da mensagem (id, threadId, snippet, payload, etc)
@@ -231,11 +413,7 @@ class GmailService:
             return None
         
         try:
-            message = self.service.users().messages().get(
-                userId='me',
-                id=message_id,
-                format='full'
-            ).execute()
+            message = self._message_request(message_id, format).execute()
             
             return message
         except HttpError as error:
@@ -315,15 +493,20 @@ class GmailService:
         
         return metadata
     
-    def get_new_messages(self, last_check_date=None):
+    def get_new_messages(self, last_check_date=None, get_known_ids=None, subject_filter=None):
         """
         Obtém novas mensagens desde a última verificação
         
         Args:
             last_check_date: Data da última verificação (datetime)
+            get_known_ids: Função (lista de IDs) -> set de IDs já processados, que não são baixados
+            subject_filter: Trecho obrigatório no assunto (verificado antes de baixar o corpo)
             
         Returns:
             list: Lista de mensagens completas
+            
+        Raises:
+            MessageFetchError: Alguma mensagem não foi baixada (traz as que foram)
         """
         if not self.is_authenticated():
             return []
@@ -339,11 +522,225 @@ class GmailService:
             after_date=last_check_date
         )
         
-        messages = []
-        for msg_id in message_ids:
-            message = self.get_message(msg_id)
+        return self.fetch_new_messages(message_ids, get_known_ids, subject_filter)
+    
+    def get_messages(self, message_ids, format='full', failed_ids=None):
+        """
+        Obtém várias mensagens com requisições batch (até GMAIL_BATCH_SIZE por chamada HTTP)
+        
+        Args:
+            message_ids: Lista de IDs de mensagens
+            format: 'full' (corpo completo) ou 'metadata' (apenas cabeçalhos)
+            failed_ids: Lista que recebe os IDs que falharam também na nova tentativa (opcional)
+            
+        Returns:
+            list: Mensagens na ordem dos IDs (as que falharem são omitidas)
+        """
+        message_ids = list(dict.fromkeys(message_ids))
+        if not message_ids or not self.is_authenticated():
+            return []
+        
+        results = {}
+        failed = []
+        
+        def callback(request_id, response, exception):
+            if exception is not None:
+                failed.append(request_id)
+            else:
+                results[request_id] = response
+        
+        for start in range(0, len(message_ids), GMAIL_BATCH_SIZE):
+            chunk = message_ids[start:start + GMAIL_BATCH_SIZE]
+            batch = self.service.new_batch_http_request(callback=callback)
+            for msg_id in chunk:
+                batch.add(self._message_request(msg_id, format), request_id=msg_id)
+            try:
+                batch.execute()
+            except HttpError as error:
+                print(f'Erro na requisição batch: {error}')
+                failed.extend(msg_id for msg_id in chunk if msg_id not in results and msg_id not in failed)
+        
+        # Falhas dentro do lote (ex: limite de taxa): nova tentativa individual
+        for msg_id in failed:
+            message = self.get_message(msg_id, format)
             if message:
-                messages.append(message)
+                results[msg_id] = message
+            elif failed_ids is not None:
+                failed_ids.append(msg_id)
         
+        return [results[msg_id] for msg_id in message_ids if msg_id in results]
+    
+    def fetch_new_messages(self, message_ids, get_known_ids=None, subject_filter=None):
+        """
+        Baixa mensagens em etapas: descarta IDs já processados, filtra pelo assunto
+        com format='metadata' e só então busca o corpo (format='full') das restantes
+        
+        Args:
+            message_ids: Lista de IDs de mensagens
+            get_known_ids: Função (lista de IDs) -> set de IDs já processados
+            subject_filter: Trecho obrigatório no assunto (None = sem filtro)
+            
+        Returns:
+            list: Lista de mensagens completas
+            
+        Raises:
+            MessageFetchError: Alguma mensagem não foi baixada (traz as que foram)
+        """
+        message_ids = list(dict.fromkeys(message_ids))
+        total = len(message_ids)
+        failed_ids = []
+        
+        if get_known_ids and message_ids:
+            known = get_known_ids(message_ids)
+            message_ids = [msg_id for msg_id in message_ids if msg_id not in known]
+        skipped_known = total - len(message_ids)
+        
+        skipped_subject = 0
+        if subject_filter and message_ids:
+            headers = self.get_messages(message_ids, format='metadata', failed_ids=failed_ids)
+            matching = [
+                msg['id'] for msg in headers
+                if subject_filter in self.get_message_metadata(msg).get('subject', '')
+            ]
+            skipped_subject = len(headers) - len(matching)
+            message_ids = matching
+        
+        messages = self.get_messages(message_ids, failed_ids=failed_ids)
+        if total:
+            print(f"📨 {total} mensagem(ns): {skipped_known} já processada(s), "
+                  f"{skipped_subject} fora do assunto, {len(messages)} baixada(s)")
+        if failed_ids:
+            raise MessageFetchError(messages, failed_ids)
         return messages
+    
+    def get_history_id(self):
+        """
+        Obtém o historyId atual da caixa de e-mail (ponto de partida da sincronização incremental)
+        
+        Returns:
+            str: historyId ou None
+        """
+        profile = self.get_profile()
+        return str(profile['historyId']) if profile and profile.get('historyId') else None
+    
+    def watch(self, topic_name, label_ids=None):
+        """
+        Registra notificações push da caixa (users.watch) em um tópico do Cloud Pub/Sub
+        O registro expira em até 7 dias e precisa ser renovado
+        
+        Args:
+            topic_name: Tópico (projects/<projeto>/topics/<tópico>) com permissão de publicação para o Gmail
+            label_ids: Rótulos observados (padrão: INBOX)
+            
+        Returns:
+            dict: {'historyId', 'expiration' (ms desde epoch)} ou None em caso de erro
+        """
+        if not self.is_authenticated():
+            return None
+        
+        try:
+            return self.service.users().watch(userId='me', body={
+                'topicName': topic_name,
+                'labelIds': label_ids or ['INBOX'],
+                'labelFilterBehavior': 'include'
+            }).execute()
+        except HttpError as error:
+            print(f'Erro ao registrar notificações push: {error}')
+            return None
+    
+    def stop_watch(self):
+        """Cancela as notificações push registradas por watch"""
+        if not self.is_authenticated():
+            return
+        
+        try:
+            self.service.users().stop(userId='me').execute()
+        except HttpError as error:
+            print(f'Erro ao cancelar notificações push: {error}')
+    
+    def list_history(self, start_history_id):
+        """
+        Lista as mensagens adicionadas à caixa desde um historyId (users.history.list)
+        
+        Args:
+            start_history_id: historyId da última sincronização
+            
+        Returns:
+            tuple: (lista de IDs de mensagens novas na caixa de entrada, historyId mais recente)
+            
+        Raises:
+            HistoryExpiredError: Se o historyId não está mais disponível no Gmail (404)
+        """
+        message_ids = []
+        seen = set()
+        latest_history_id = str(start_history_id)
+        page_token = None
+        
+        while True:
+            params = {
+                'userId': 'me',
+                'startHistoryId': start_history_id,
+                'historyTypes': ['messageAdded']
+            }
+            if page_token:
+                params['pageToken'] = page_token
+            
+            try:
+                results = self.service.users().history().list(**params).execute()
+            except HttpError as error:
+                if error.resp.status == 404:
+                    raise HistoryExpiredError(f'historyId {start_history_id} expirado')
+                raise
+            
+            for record in results.get('history', []):
+                for added in record.get('messagesAdded', []):
+                    message = added.get('message', {})
+                    labels = message.get('labelIds', [])
+                    # Mesmo critério da busca completa: caixa de entrada ou não lido (ignora enviados/rascunhos)
+                    if 'INBOX' not in labels and 'UNREAD' not in labels:
+                        continue
+                    msg_id = message.get('id')
+                    if msg_id and msg_id not in seen:
+                        seen.add(msg_id)
+                        message_ids.append(msg_id)
+            
+            if results.get('historyId'):
+                latest_history_id = str(results['historyId'])
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+        
+        return message_ids, latest_history_id
+    
+    def sync_new_messages(self, history_id=None, last_check_date=None, get_known_ids=None, subject_filter=None):
+        """
+        Sincronização incremental: usa o histórico do Gmail a partir do historyId salvo
+        e cai para a busca completa (get_new_messages) sem historyId ou se ele expirou
+        
+        Args:
+            history_id: historyId da última sincronização (None = sincronização completa)
+            last_check_date: Data da última verificação, usada apenas na sincronização completa
+            get_known_ids: Função (lista de IDs) -> set de IDs já processados, que não são baixados
+            subject_filter: Trecho obrigatório no assunto (verificado antes de baixar o corpo)
+            
+        Returns:
+            tuple: (lista de mensagens completas, novo historyId, True se foi sincronização completa)
+            
+        Raises:
+            MessageFetchError: Alguma mensagem não foi baixada (o historyId não deve avançar)
+        """
+        if not self.is_authenticated():
+            return [], history_id, False
+        
+        if history_id:
+            try:
+                message_ids, new_history_id = self.list_history(history_id)
+                return self.fetch_new_messages(message_ids, get_known_ids, subject_filter), new_history_id, False
+            except HistoryExpiredError as e:
+                print(f"⚠️ {e} - fazendo sincronização completa")
+                last_check_date = None
+        
+        # Obter o historyId ANTES da busca: o que chegar durante a busca entra na próxima sincronização
+        new_history_id = self.get_history_id()
+        return self.get_new_messages(last_check_date, get_known_ids, subject_filter), new_history_id, True
 
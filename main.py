@@ -9,8 +9,6 @@ import sys
 import json
 import base64
 import time
-import queue
-import threading
 import pandas as pd
 import requests
 from datetime import datetime
@@ -26,7 +24,7 @@ try:
         get_image_base64_from_cloudinary,
         get_image_url_from_cloudinary,
         download_file_from_cloudinary,
-        upload_banner_to_cloudinary,
+        upload_banner_bytes_to_cloudinary,
         upload_cache_image_to_cloudinary,
         get_cache_image_from_cloudinary,
         save_template_to_cloudinary,
@@ -39,6 +37,35 @@ except ImportError:
     USE_CLOUDINARY = False
     print('⚠️ cloudinary_storage não encontrado. Usando arquivos locais.')
 
+# Cache de banners renderizados (evita renderizar/enviar banners idênticos)
+from banner_cache import BannerRenderCache, hash_template
+USE_BANNER_CACHE = os.getenv('USE_BANNER_CACHE', 'true').lower() == 'true'
+
+# Estágio de codificação dos banners (JPEG/WebP/AVIF)
+from banner_encoder import BannerEncoder, RenderedBanner
+# Gravar banners em banners/<data>/ (opcional - os envios usam os bytes em memória)
+SAVE_BANNERS_TO_DISK = os.getenv('SAVE_BANNERS_TO_DISK', 'true').lower() == 'true'
+
+# Renderizador dos banners: 'chromium' (HTML no Playwright) ou 'pillow' (compositor sem navegador)
+from banner_compositor import BannerCompositor
+BANNER_RENDERER = os.getenv('BANNER_RENDERER', 'chromium').lower()
+
+# Envio ao WhatsApp com vários workers (ordem preservada por grupo)
+from whatsapp_dispatcher import WhatsAppDispatcher
+# Prontidão do servidor WhatsApp consultada em segundo plano (circuit breaker)
+from whatsapp_health import get_whatsapp_health, is_health_failure
+# Mesmo banner para vários grupos em uma chamada (/send-batch)
+from whatsapp_batch import WhatsAppBatchClient, BatchDelivery
+WHATSAPP_DRAIN_TIMEOUT = float(os.getenv('WHATSAPP_DRAIN_TIMEOUT', '0'))  # 0 = aguardar todos os envios
+
+# Envio ao Telegram em lotes (sendMediaGroup) com lotes paralelos e novas tentativas em 429
+from telegram_delivery import TelegramDelivery
+
+# Outbox persistente dos envios (WhatsApp/Telegram): permite retomar envios sem renderizar de novo
+from delivery_outbox import DeliveryOutbox
+USE_DELIVERY_OUTBOX = os.getenv('USE_DELIVERY_OUTBOX', 'true').lower() == 'true'
+OUTBOX_RESUME_BATCH = int(os.getenv('OUTBOX_RESUME_BATCH', '100'))
+
 # Configurar encoding UTF-8 para Windows
 if sys.platform == 'win32':
     try:
@@ -113,14 +140,41 @@ class BannerGenerator:
         self.playwright = None
         self.browser = None
         self.image_existence_cache = {}  # Cache de verificação de imagens
+        self.image_source_versions = {}  # ETag/Last-Modified das imagens do servidor (chave do cache de banners)
+        self.resolved_product_images = {}  # Imagem resolvida por código na execução atual
         self.local_images_cache = {}  # Cache de imagens locais convertidas para base64
         self.whatsapp_session = None  # Sessão HTTP persistente para WhatsApp
         
-        # Fila e thread para envio paralelo ao WhatsApp
-        self.whatsapp_queue = queue.Queue()
-        self.whatsapp_thread = None
-        self.whatsapp_thread_stop = threading.Event()
-        self.whatsapp_thread_running = False
+        # Outbox persistente: cada envio é registrado antes de ser despachado
+        self.outbox = DeliveryOutbox() if USE_DELIVERY_OUTBOX else None
+        
+        # Monitor compartilhado do /health do servidor WhatsApp (substitui a verificação a cada envio)
+        self.whatsapp_health = get_whatsapp_health(WHATSAPP_API_URL)
+        
+        # Estágio de envio ao Telegram (sessão reaproveitada, lotes de até 10 banners)
+        self.telegram = TelegramDelivery(TELEGRAM_API_BASE, TELEGRAM_CHAT_ID) if TELEGRAM_API_BASE and TELEGRAM_CHAT_ID else None
+        
+        # Despachante de envios ao WhatsApp (workers por grupo, ritmo do SendPacer e novas tentativas)
+        self.whatsapp_dispatcher = WhatsAppDispatcher(self.send_to_whatsapp_group_direct,
+                                                      on_result=self.record_whatsapp_result,
+                                                      health=self.whatsapp_health)
+        
+        # Cliente do /send-batch (um banner para vários grupos com uma única transferência da imagem);
+        # os intervalos entre grupos dentro do lote seguem o espaçamento atual do despachante
+        self.whatsapp_batch = WhatsAppBatchClient(WHATSAPP_API_URL, health=self.whatsapp_health,
+                                                  pacer=self.whatsapp_dispatcher.pacer)
+        
+        # Cache de banners renderizados (template + produtos + unidade + datas)
+        self.banner_cache = BannerRenderCache() if USE_BANNER_CACHE else None
+        
+        # Estágio de codificação (formato/qualidade/tamanho via variáveis BANNER_*)
+        self.encoder = BannerEncoder()
+        # Compositor Pillow (BANNER_RENDERER=pillow): dispensa o Chromium nos lotes grandes
+        self.compositor = BannerCompositor(self, BANNER_WIDTH, BANNER_HEIGHT) if BANNER_RENDERER == 'pillow' else None
+        if self.compositor:
+            print('✓ Renderizador de banners: compositor Pillow (sem navegador)')
+        # Pool para gravar em disco e enviar ao Cloudinary enquanto o próximo banner é renderizado
+        self.publish_executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix='banner-publish')
     
     def load_template(self, silent=False):
         """Carrega configuração do template se existir - suporta Cloudinary"""
@@ -433,6 +487,7 @@ class BannerGenerator:
                 unidade = str(row['Unidade']).strip()
                 id_grupo = str(row['id_grupo']).strip()
                 
+                # Vários grupos por unidade: IDs separados por ';' (ex: 123@g.us;456@g.us)
                 if unidade and id_grupo and id_grupo.lower() != 'nan':
                     unidade_to_group[unidade] = id_grupo
             
@@ -446,6 +501,13 @@ class BannerGenerator:
         
         return unidade_to_group
     
+    def get_unidade_groups(self, unidade):
+        """Lista de grupos do WhatsApp da unidade (id_grupo aceita vários IDs separados por ';')"""
+        id_grupo = self.unidade_to_group.get(unidade)
+        if not id_grupo:
+            return []
+        return list(dict.fromkeys(g.strip() for g in str(id_grupo).replace(',', ';').split(';') if g.strip()))
+    
     def get_imagem_container_bg_color(self):
         """Obtém cor de fundo do container de imagem do produto com opacidade"""
         bg_color_hex = self.get_template_value('produto-imagem-container-bg-color', '#FFFFFF')
@@ -678,6 +740,8 @@ class BannerGenerator:
                 content_type = response.headers.get('Content-Type', '')
                 if 'application/json' not in content_type:
                     result = url
+                    self.image_source_versions[codigo] = (response.headers.get('ETag')
+                                                          or response.headers.get('Last-Modified') or '')
         except:
             pass
         
@@ -918,8 +982,11 @@ class BannerGenerator:
         def process_single_image(produto):
             """Processa imagem de um único produto"""
             codigo = int(produto['Código'])
+            if codigo in self.resolved_product_images:
+                return codigo, self.resolved_product_images[codigo]
             try:
                 imagem_url = self.get_product_image_with_background_removed(codigo, use_cache=True)
+                self.resolved_product_images[codigo] = imagem_url
                 return codigo, imagem_url
             except Exception as e:
                 print(f'  ⚠ Erro ao processar imagem do produto {codigo}: {e}')
@@ -945,6 +1012,22 @@ class BannerGenerator:
         
         return results
     
+    def get_product_image_signature(self, codigo, imagem):
+        """Identifica a imagem usada por um produto (entra na chave do cache de banners)
+        
+        Args:
+            codigo: Código do produto
+            imagem: Imagem resolvida por process_images_in_parallel (data URI ou URL)
+            
+        Returns:
+            str: Hash do conteúdo (data URI) ou URL + ETag/Last-Modified do servidor
+        """
+        import hashlib
+        imagem = str(imagem or '')
+        if imagem.startswith('data:'):
+            return hashlib.sha256(imagem.encode('utf-8')).hexdigest()
+        return f"{imagem}|{self.image_source_versions.get(codigo, '')}"
+    
     def preprocess_all_images(self, progress_callback=None):
         """Pré-processa todas as imagens da tabela de preços"""
         print('\n' + '='*60)
@@ -1082,6 +1165,31 @@ class BannerGenerator:
         
         return f'polygon({", ".join(points)})'
     
+    def build_footer_lines(self, unidade, nome_empresa=None, data_inicio='', data_fim=''):
+        """Monta as duas linhas do rodapé do banner (usado pelo HTML e pelo compositor Pillow)
+        
+        Returns:
+            tuple: (linha com unidade e período, linha com as condições)
+        """
+        nome_empresa_display = (nome_empresa or '').strip()
+        if not nome_empresa_display:
+            nome_empresa_display = unidade
+
+        periodo_part = ''
+        if data_inicio and data_fim:
+            periodo_part = f'de {data_inicio} a {data_fim}'
+        elif data_inicio:
+            periodo_part = f'a partir de {data_inicio}'
+        elif data_fim:
+            periodo_part = f'até {data_fim}'
+
+        line1 = f'Promoção válida apenas para a unidade de {nome_empresa_display}'
+        if periodo_part:
+            line1 += f', {periodo_part}'
+        line1 += ' ou enquanto durarem os estoques.'
+        line2 = '*Promoção não acumulativa com outros itens promocionais. Condições não estendidas a clientes com acordos comerciais.'
+        return line1, line2
+    
     def generate_html_banner(self, produtos, unidade, nome_empresa=None, data_inicio='', data_fim=''):
         """Gera HTML do banner para os 3 produtos"""
         # Carregar imagens locais
@@ -1739,23 +1847,7 @@ class BannerGenerator:
         call_action_style_parts.append(f'object-fit: contain')
         call_action_style = '; '.join(call_action_style_parts) + ';'
 
-        nome_empresa_display = (nome_empresa or '').strip()
-        if not nome_empresa_display:
-            nome_empresa_display = unidade
-
-        periodo_part = ''
-        if data_inicio and data_fim:
-            periodo_part = f'de {data_inicio} a {data_fim}'
-        elif data_inicio:
-            periodo_part = f'a partir de {data_inicio}'
-        elif data_fim:
-            periodo_part = f'até {data_fim}'
-
-        line1 = f'Promoção válida apenas para a unidade de {nome_empresa_display}'
-        if periodo_part:
-            line1 += f', {periodo_part}'
-        line1 += ' ou enquanto durarem os estoques.'
-        line2 = '*Promoção não acumulativa com outros itens promocionais. Condições não estendidas a clientes com acordos comerciais.'
+        line1, line2 = self.build_footer_lines(unidade, nome_empresa, data_inicio, data_fim)
 
         line1_html = escape(line1)
         line2_html = escape(line2)
@@ -2119,201 +2211,505 @@ body {{ margin: 0; padding: 0; width: {BANNER_WIDTH}px; height: {BANNER_HEIGHT}p
         except:
             pass
     
-    def html_to_image(self, html_content, output_path):
-        """Converte HTML para imagem JPEG usando Playwright (otimizado - reutiliza navegador)"""
+    def render_screenshot(self, html_content):
+        """Renderiza o HTML no Playwright e retorna o screenshot bruto em memória (PNG)
+        
+        Args:
+            html_content: HTML completo do banner
+            
+        Returns:
+            bytes: Screenshot PNG sem perdas (a compressão final fica com o BannerEncoder)
+        """
         # Garantir que navegador está inicializado
         self.initialize_browser()
         
-        try:
+        def capturar():
             # Criar nova página (navegador já está aberto)
             page = self.browser.new_page(viewport={'width': BANNER_WIDTH, 'height': BANNER_HEIGHT})
-            # Usar 'domcontentloaded' ao invés de 'networkidle' para ser mais rápido
-            page.set_content(html_content, wait_until='domcontentloaded')
-            # Reduzir timeout de 2000ms para 500ms
-            page.wait_for_timeout(500)
-            page.screenshot(path=output_path, type='jpeg', quality=90)
-            page.close()  # Fecha apenas a página, não o navegador
+            try:
+                # Usar 'domcontentloaded' ao invés de 'networkidle' para ser mais rápido
+                page.set_content(html_content, wait_until='domcontentloaded')
+                # Reduzir timeout de 2000ms para 500ms
+                page.wait_for_timeout(500)
+                return page.screenshot(type='png')
+            finally:
+                page.close()  # Fecha apenas a página, não o navegador
+        
+        try:
+            return capturar()
         except Exception as e:
             # Se navegador desconectou, tentar reinicializar e tentar novamente
             if 'Target closed' in str(e) or 'Browser closed' in str(e):
                 print('  ⚠ Navegador desconectado, reinicializando...')
                 self.close_browser()
                 self.initialize_browser()
-                page = self.browser.new_page(viewport={'width': BANNER_WIDTH, 'height': BANNER_HEIGHT})
-                page.set_content(html_content, wait_until='domcontentloaded')
-                page.wait_for_timeout(500)
-                page.screenshot(path=output_path, type='jpeg', quality=90)
-                page.close()
-            else:
-                raise Exception(f'Erro ao converter HTML para imagem: {e}')
+                return capturar()
+            raise Exception(f'Erro ao converter HTML para imagem: {e}')
+    
+    def render_banner(self, html_content, output_path):
+        """Renderiza e codifica o banner inteiramente em memória
+        
+        O screenshot bruto é codificado no pool do BannerEncoder (JPEG progressivo,
+        WebP ou AVIF, com limite de tamanho e versões reduzidas opcionais).
+        Nada é gravado em disco aqui.
+        
+        Args:
+            html_content: HTML completo do banner
+            output_path: Caminho pretendido (define o nome do arquivo)
+            
+        Returns:
+            RenderedBanner: Banner em memória
+        """
+        raw_screenshot = self.render_screenshot(html_content)
+        return self.finish_encoded_banner(self.encoder.encode(raw_screenshot), output_path)
+    
+    def compose_banner(self, produtos, unidade, nome_empresa, data_inicio, data_fim, output_path):
+        """Renderiza o banner com o compositor Pillow (sem navegador) e codifica em memória
+        
+        Args:
+            produtos: Lista de produtos do banner
+            unidade: Nome da unidade
+            nome_empresa: Nome exibido no rodapé
+            data_inicio: Data de início formatada
+            data_fim: Data de fim formatada
+            output_path: Caminho pretendido (define o nome do arquivo)
+            
+        Returns:
+            RenderedBanner: Banner em memória
+        """
+        image = self.compositor.render(produtos, unidade, nome_empresa, data_inicio, data_fim)
+        return self.finish_encoded_banner(self.encoder.encode_image(image), output_path)
+    
+    def finish_encoded_banner(self, encoded, output_path):
+        """Registra o resultado da codificação e cria o RenderedBanner"""
+        principal = encoded['main']
+        print(f'  🗜️ Codificado em {principal.output_format.upper()} q={principal.quality}: {principal.size / 1024:.0f}KB')
+        if len(encoded) > 1:
+            larguras = ', '.join(f'{k}px' for k in encoded if k != 'main')
+            print(f'  🗜️ Versões reduzidas: {larguras}')
+        return self.encoder.to_banner(encoded, output_path)
+    
+    def persist_banner(self, banner, output_path):
+        """Grava o banner em disco (uma única vez)
+        
+        Returns:
+            str: Caminho do arquivo gravado
+        """
+        if banner.path:
+            return banner.path
+        return self.encoder.write_banner(banner, output_path)
+    
+    def html_to_image(self, html_content, output_path):
+        """Converte HTML para imagem e grava em disco (compatibilidade)
+        
+        Args:
+            html_content: HTML completo do banner
+            output_path: Caminho desejado (a extensão é ajustada ao formato de saída)
+            
+        Returns:
+            str: Caminho do arquivo principal gravado
+        """
+        banner = self.render_banner(html_content, output_path)
+        return self.persist_banner(banner, output_path)
+    
+    def publish_banner(self, banner, output_path, unidade, data_atual, sequencia):
+        """Dispara em paralelo a gravação em disco (opcional) e o upload ao Cloudinary
+        
+        Ambos usam os bytes em memória do banner; nenhum destino relê o arquivo.
+        
+        Args:
+            banner: RenderedBanner
+            output_path: Caminho para gravação em disco
+            unidade: Nome da unidade
+            data_atual: Data no formato DD-MM-YYYY
+            sequencia: Número sequencial do banner
+            
+        Returns:
+            dict: {'disk': Future, 'cloudinary': Future} (somente as etapas disparadas)
+        """
+        futures = {}
+        if SAVE_BANNERS_TO_DISK and not banner.path:
+            futures['disk'] = self.publish_executor.submit(self.persist_banner, banner, output_path)
+        if USE_CLOUDINARY and not banner.url:
+            futures['cloudinary'] = self.publish_executor.submit(
+                upload_banner_bytes_to_cloudinary, banner.data, unidade, data_atual, sequencia
+            )
+        return futures
+    
+    def wait_banner_publications(self, publicacoes, unidade=None):
+        """Aguarda gravações/uploads disparados por publish_banner() e registra no cache
+        (o índice do cache é gravado uma vez, ao final)
+        
+        Args:
+            publicacoes: Lista de (banner, futures, cache_key)
+            unidade: Unidade dos banners (informativo para o cache)
+        """
+        for banner, futures, cache_key in publicacoes:
+            if 'disk' in futures:
+                try:
+                    print(f'  💾 Banner salvo: {futures["disk"].result()}')
+                except Exception as e:
+                    print(f'  ⚠ Erro ao salvar banner {banner.filename} em disco: {e}')
+            if 'cloudinary' in futures:
+                try:
+                    url = futures['cloudinary'].result()
+                    if url:
+                        banner.url = url
+                        print(f'  ✅ Banner enviado para Cloudinary: {url}')
+                except Exception as e:
+                    print(f'  ⚠ Erro ao enviar banner para Cloudinary: {e}')
+            if self.banner_cache and cache_key and (banner.path or banner.url):
+                self.banner_cache.put(cache_key, path=banner.path, url=banner.url, unidade=unidade)
+            if self.outbox and (banner.path or banner.url):
+                try:
+                    self.outbox.attach_location(banner, path=banner.path, url=banner.url)
+                except Exception as e:
+                    print(f'  ⚠ Erro ao atualizar outbox: {e}')
+        if self.banner_cache:
+            self.banner_cache.flush()
+    
+    def load_banner(self, image):
+        """Normaliza um banner: aceita RenderedBanner ou caminho de arquivo
+        
+        Returns:
+            RenderedBanner ou None se o arquivo não existir
+        """
+        if isinstance(image, RenderedBanner):
+            return image
+        if not image or not os.path.exists(image):
+            print(f'  ⚠ Arquivo não encontrado: {image}')
+            return None
+        return RenderedBanner.from_file(image)
+    
+    def send_banner_to_telegram(self, banner):
+        """Envia um banner ao chat do Telegram (sendPhoto com novas tentativas)
+        
+        Args:
+            banner: RenderedBanner
+            
+        Returns:
+            tuple: (sucesso, mensagem de erro ou None)
+        """
+        sucesso, erro, _ = self.telegram.send_batch([banner], banner.filename)
+        return sucesso, erro
     
     def send_to_telegram(self, image_paths):
-        if not TELEGRAM_API_BASE or not TELEGRAM_CHAT_ID:
+        """Envia banners ao Telegram em lotes de até 10 (sendMediaGroup), com lotes em paralelo
+        
+        Args:
+            image_paths: Lista de RenderedBanner (bytes em memória) ou caminhos de arquivo
+        """
+        if not self.telegram:
             print('⚠ Integração com Telegram não configurada. Pulando envio.')
             return
         if not image_paths:
             print('⚠ Nenhuma imagem para enviar ao Telegram.')
             return
-        for image_path in image_paths:
-            try:
-                print(f'  🔄 Enviando {image_path} ao Telegram...')
-                with open(image_path, 'rb') as photo_file:
-                    response = requests.post(
-                        f"{TELEGRAM_API_BASE}/sendPhoto",
-                        data={'chat_id': TELEGRAM_CHAT_ID, 'caption': os.path.basename(image_path)},
-                        files={'photo': photo_file}
-                    )
-                if response.status_code == 200:
-                    resp_json = response.json()
-                    if resp_json.get('ok'):
-                        print(f'  📤 Enviado ao Telegram: {image_path}')
-                    else:
-                        print(f"  ⚠ Telegram retornou erro para {image_path}: {resp_json}")
-                else:
-                    print(f"  ⚠ Falha HTTP {response.status_code} ao enviar {image_path}: {response.text}")
-            except Exception as exc:
-                print(f'  ⚠ Erro ao enviar {image_path} ao Telegram: {exc}')
-
-    def worker_thread_whatsapp(self):
-        """Thread worker que processa a fila de envios ao WhatsApp"""
-        print('📤 Thread de envio WhatsApp iniciada (processamento paralelo)')
-        
-        while not self.whatsapp_thread_stop.is_set():
-            try:
-                # Pegar item da fila com timeout para verificar periodicamente se deve parar
-                try:
-                    item = self.whatsapp_queue.get(timeout=1)
-                except queue.Empty:
-                    continue
-                
-                # None é o sinal de parada
-                if item is None:
-                    break
-                
-                image_path, group_id = item
-                
-                # Enviar ao WhatsApp
-                if self.send_to_whatsapp_group_direct(image_path, group_id):
-                    print(f'  ✅ Banner enviado (thread): {os.path.basename(image_path)}')
-                else:
-                    print(f'  ⚠ Falha ao enviar (thread): {os.path.basename(image_path)}')
-                
-                # Marcar tarefa como concluída
-                self.whatsapp_queue.task_done()
-                
-            except Exception as e:
-                print(f'  ⚠ Erro na thread de envio WhatsApp: {e}')
-                import traceback
-                traceback.print_exc()
+        banners = []
+        delivery_ids = []
+        for image in image_paths:
+            banner = self.load_banner(image)
+            if banner is None:
+                continue
+            delivery_id = None
+            if self.outbox:
                 try:
-                    self.whatsapp_queue.task_done()
-                except:
-                    pass
-        
-        print('📤 Thread de envio WhatsApp finalizada')
-        self.whatsapp_thread_running = False
+                    delivery_id = self.outbox.add(banner, 'telegram', TELEGRAM_CHAT_ID)
+                except Exception as e:
+                    print(f'  ⚠ Erro ao registrar envio no outbox: {e}')
+            banners.append(banner)
+            delivery_ids.append(delivery_id)
+        self.deliver_telegram(banners, delivery_ids)
     
-    def start_whatsapp_thread(self):
-        """Inicia a thread de envio ao WhatsApp"""
-        if self.whatsapp_thread_running:
-            return
+    def deliver_telegram(self, banners, delivery_ids=None):
+        """Envia banners pelo estágio do Telegram e grava cada resultado no outbox
         
-        self.whatsapp_thread_stop.clear()
-        self.whatsapp_thread_running = True
-        self.whatsapp_thread = threading.Thread(target=self.worker_thread_whatsapp, daemon=True)
-        self.whatsapp_thread.start()
-        print('✓ Thread de envio WhatsApp iniciada')
+        Returns:
+            int: Quantidade de banners com falha
+        """
+        delivery_ids = delivery_ids or [None] * len(banners)
+        
+        def registrar(index, sucesso, erro, tentativas):
+            self.record_outbox_result(delivery_ids[index], sucesso, tentativas, erro)
+        
+        inicio = time.time()
+        resultados = self.telegram.send(banners, on_result=registrar)
+        falhas = sum(1 for _, sucesso, _ in resultados if not sucesso)
+        stats = self.telegram.get_stats()
+        print(f'  ✓ Telegram: {len(banners) - falhas}/{len(banners)} banner(s) em {time.time() - inicio:.1f}s '
+              f"(latência média por lote: {stats['latencia_media']:.1f}s)")
+        return falhas
+
+    def record_outbox_result(self, delivery_id, success, attempts=1, error=None):
+        """Registra no outbox o resultado de um envio (ignora se o outbox estiver desativado)"""
+        if not self.outbox or delivery_id is None:
+            return
+        try:
+            if success:
+                registrado = self.outbox.mark_sent(delivery_id, attempts)
+            else:
+                registrado = self.outbox.mark_failed(delivery_id, error, attempts)
+            if not registrado:
+                print(f'  ⚠ Envio {delivery_id} não está mais reservado por este processo (reserva expirada): '
+                      'resultado não gravado no outbox')
+        except Exception as e:
+            print(f'  ⚠ Erro ao atualizar outbox (envio {delivery_id}): {e}')
     
-    def stop_whatsapp_thread(self):
-        """Para a thread de envio ao WhatsApp"""
-        if not self.whatsapp_thread_running:
+    def record_whatsapp_result(self, delivery_id, success, attempts, error):
+        """Callback do despachante WhatsApp: grava o resultado final de cada envio
+        
+        Para lotes (BatchDelivery) grava o resultado de cada grupo separadamente.
+        """
+        if isinstance(delivery_id, BatchDelivery):
+            batch = delivery_id
+            for group_id, batch_delivery_id in batch.delivery_ids.items():
+                sucesso, erro = batch.results.get(group_id, (False, error))
+                self.record_outbox_result(batch_delivery_id, sucesso, attempts, erro or error)
             return
+        self.record_outbox_result(delivery_id, success, attempts, error)
+    
+    def resume_outbox(self, destinations=None, retry_failed=False, progress_callback=None):
+        """Retoma envios pendentes do outbox (ex: após reinício) sem renderizar os banners
         
-        print('⏳ Finalizando thread de envio WhatsApp...')
-        self.whatsapp_thread_stop.set()
-        # Enviar sinal de parada na fila
-        try:
-            self.whatsapp_queue.put(None)
-        except:
-            pass
+        Args:
+            destinations: Lista de destinos ('whatsapp', 'telegram') ou None para todos
+            retry_failed: Também reenviar envios que falharam definitivamente
+            progress_callback: Função (opcao, progresso, tarefa, detalhes) para acompanhar o andamento
+            
+        Returns:
+            dict: Métricas do outbox após a retomada
+        """
+        if not self.outbox:
+            print('⚠ Outbox desativado (USE_DELIVERY_OUTBOX=false). Nada a retomar.')
+            return {}
         
-        # Aguardar thread terminar (com timeout)
-        if self.whatsapp_thread and self.whatsapp_thread.is_alive():
-            self.whatsapp_thread.join(timeout=10)
+        def update_progress(progresso, tarefa, detalhes=None):
+            if progress_callback:
+                progress_callback('outbox', progresso, tarefa, detalhes or {})
+        
+        # Destinos sem canal disponível ficam pendentes no outbox (reivindicá-los só os devolveria à fila)
+        indisponiveis = {'whatsapp': not WHATSAPP_ENABLED, 'telegram': not self.telegram}
+        motivos = {'whatsapp': 'WhatsApp desativado', 'telegram': 'Telegram não configurado'}
+        for destino in destinations or list(indisponiveis):
+            if indisponiveis.get(destino):
+                print(f'  ⚠ {motivos[destino]}: envios para {destino} continuam pendentes no outbox')
+        destinations = [destino for destino in (destinations or list(indisponiveis)) if not indisponiveis.get(destino)]
+        if not destinations:
+            print('⚠ Nenhum destino disponível para retomar envios do outbox.')
+            return self.outbox.get_metrics()
+        
+        if retry_failed:
+            reabertos = self.outbox.requeue_failed(destinations)
+            print(f'🔁 {reabertos} envio(s) com falha reaberto(s) no outbox')
+        
+        print('📬 Retomando envios do outbox...')
+        update_progress(5, 'Retomando envios pendentes do outbox...')
+        total = 0
+        whatsapp_enviados = 0
+        telegram_falhas = 0
+        while True:
+            lote = self.outbox.claim(destinations, limit=OUTBOX_RESUME_BATCH)
+            if not lote:
+                break
+            banners = {}  # banner_hash -> RenderedBanner (carregado uma vez por lote)
+            whatsapp_por_banner = {}  # banner_hash -> [envios]
+            telegram_banners, telegram_ids = [], []
+            for delivery in lote:
+                total += 1
+                destino = delivery['destination']
+                banner_hash = delivery['banner_hash']
+                if banner_hash not in banners:
+                    try:
+                        banners[banner_hash] = self.outbox.load_banner(delivery)
+                    except Exception as e:
+                        banners[banner_hash] = None
+                        print(f'  ⚠ Erro ao carregar banner {delivery["filename"]}: {e}')
+                banner = banners[banner_hash]
+                if banner is None:
+                    self.outbox.mark_failed(delivery['id'], 'banner indisponível (bytes, arquivo e URL)', 0)
+                    continue
+                if destino == 'whatsapp':
+                    whatsapp_por_banner.setdefault(banner_hash, []).append(delivery)
+                elif destino == 'telegram':
+                    telegram_banners.append(banner)
+                    telegram_ids.append(delivery['id'])
+            
+            if telegram_banners:
+                telegram_falhas += self.deliver_telegram(telegram_banners, telegram_ids)
+            
+            # Envios do mesmo banner para grupos diferentes seguem em um único lote
+            for banner_hash, envios in whatsapp_por_banner.items():
+                while envios:
+                    delivery_ids = {}
+                    restantes = []
+                    for delivery in envios:
+                        if delivery['target'] in delivery_ids:
+                            restantes.append(delivery)
+                        else:
+                            delivery_ids[delivery['target']] = delivery['id']
+                    self.submit_whatsapp_delivery(banners[banner_hash], list(delivery_ids), delivery_ids)
+                    whatsapp_enviados += len(delivery_ids)
+                    envios = restantes
+            update_progress(50, f'{total} envio(s) retomado(s)...', {'total': total})
+        
+        if whatsapp_enviados and self.whatsapp_thread_running:
+            print(f'⏳ Aguardando {whatsapp_enviados} envio(s) ao WhatsApp...')
+            update_progress(70, f'Aguardando envio WhatsApp ({whatsapp_enviados} banner(s))...')
+            self.whatsapp_dispatcher.wait_until_idle(
+                timeout=WHATSAPP_DRAIN_TIMEOUT or None,
+                progress_callback=lambda restantes: update_progress(
+                    70, f'Aguardando envio WhatsApp ({restantes} banner(s) restantes)...')
+            )
+            self.stop_whatsapp_thread(wait=False)
+        
+        removidos = self.outbox.purge()
+        metricas = self.outbox.get_metrics()
+        print(f'✅ Outbox: {total} envio(s) retomado(s), {telegram_falhas} falha(s) no Telegram, '
+              f"{metricas['totais']['pending']} pendente(s), {metricas['totais']['failed']} com falha")
+        if removidos['deliveries']:
+            print(f"  🧹 {removidos['deliveries']} envio(s) antigo(s) removido(s) do outbox")
+        update_progress(100, 'Retomada do outbox concluída!', {'retomados': total, 'outbox': metricas})
+        return metricas
+
+    @property
+    def whatsapp_thread_running(self):
+        """Indica se o despachante de envios ao WhatsApp está ativo"""
+        return self.whatsapp_dispatcher.running
+    
+    def start_whatsapp_thread(self):
+        """Inicia os workers de envio ao WhatsApp e o monitor do /health"""
+        self.whatsapp_health.start()
+        self.whatsapp_dispatcher.start()
+    
+    def stop_whatsapp_thread(self, wait=True, timeout=None):
+        """Para os workers de envio ao WhatsApp
         
-        # Aguardar fila esvaziar
-        try:
-            self.whatsapp_queue.join()
-        except:
-            pass
+        Args:
+            wait: Aguarda os envios pendentes antes de parar
+            timeout: Tempo máximo de espera em segundos (None = sem limite)
+        """
+        if not self.whatsapp_dispatcher.running:
+            return
         
-        self.whatsapp_thread_running = False
-        print('✓ Thread de envio WhatsApp finalizada')
+        print('⏳ Finalizando envio WhatsApp...')
+        self.whatsapp_dispatcher.stop(wait=wait, timeout=timeout)
+        self.whatsapp_health.stop()
+        stats = self.whatsapp_dispatcher.get_stats()
+        print(f"✓ Envio WhatsApp finalizado: {stats['enviados']} enviado(s), {stats['falhas']} falha(s), {stats['retentativas']} nova(s) tentativa(s)")
     
     def cleanup(self):
-        """Limpa recursos ao finalizar (fecha navegador e para thread WhatsApp)"""
+        """Limpa recursos ao finalizar (fecha navegador, para thread WhatsApp e pool de codificação)"""
         self.close_browser()
         self.stop_whatsapp_thread()
+        self.encoder.shutdown()
+        self.publish_executor.shutdown(wait=True)
     
-    def enqueue_whatsapp_send(self, image_path, group_id):
-        """Adiciona um banner à fila de envio ao WhatsApp"""
+    def enqueue_whatsapp_send(self, image, group_id, unidade=None):
+        """Adiciona um banner à fila de envio ao WhatsApp (registrando no outbox)
+        
+        Args:
+            image: RenderedBanner (bytes em memória) ou caminho do arquivo
+            group_id: ID do grupo do WhatsApp ou lista de grupos (enviada em lote via /send-batch)
+            unidade: Unidade do banner (informativo no outbox)
+        """
         if not WHATSAPP_ENABLED:
             return False
         
         try:
-            self.whatsapp_queue.put((image_path, group_id))
-            return True
+            group_ids = list(group_id) if isinstance(group_id, (list, tuple)) else [group_id]
+            delivery_ids = {}
+            if self.outbox:
+                try:
+                    for gid in group_ids:
+                        delivery_ids[gid] = self.outbox.add(image, 'whatsapp', gid, unidade)
+                except Exception as e:
+                    print(f'  ⚠ Erro ao registrar envio no outbox: {e}')
+            return self.submit_whatsapp_delivery(image, group_ids, delivery_ids)
         except Exception as e:
             print(f'  ⚠ Erro ao adicionar à fila WhatsApp: {e}')
             return False
     
+    def submit_whatsapp_delivery(self, image, group_ids, delivery_ids=None):
+        """Entrega um banner ao despachante: um grupo = envio simples, vários grupos = um lote
+        
+        Args:
+            image: RenderedBanner ou caminho do arquivo
+            group_ids: Lista de IDs de grupos
+            delivery_ids: {group_id: ID no outbox}
+        """
+        delivery_ids = delivery_ids or {}
+        if len(group_ids) == 1:
+            return self.whatsapp_dispatcher.submit(image, group_ids[0], job_id=delivery_ids.get(group_ids[0]))
+        batch = BatchDelivery(image, group_ids, delivery_ids)
+        return self.whatsapp_dispatcher.submit(batch, tuple(batch.pending), job_id=batch)
+    
+    def get_whatsapp_caption(self):
+        """Legenda dos banners no WhatsApp (template ou link padrão)"""
+        caption_text = self.get_template_value('banner-caption', '').strip()
+        if not caption_text:
+            caption_text = f'Compre no WhatsApp - {WHATSAPP_LINK}'
+        return caption_text
+    
+    def send_whatsapp_batch(self, batch):
+        """Envia um banner aos grupos ainda pendentes do lote com uma única chamada /send-batch
+        
+        Args:
+            batch: BatchDelivery
+            
+        Returns:
+            bool: True se todos os grupos do lote receberam o banner
+        """
+        resultados = self.whatsapp_batch.send(batch.banner, batch.pending, self.get_whatsapp_caption())
+        for group_id, (sucesso, erro) in resultados.items():
+            if sucesso:
+                print(f'  ✅ Enviado ao grupo {group_id}: {batch.filename}')
+            else:
+                print(f'  ⚠ Falha ao enviar {batch.filename} ao grupo {group_id}: {erro}')
+        return batch.apply(resultados)
+    
     def send_to_whatsapp_group_direct(self, image_path, group_id):
-        """Envia uma imagem para um grupo do WhatsApp via servidor Node.js (chamada direta)"""
+        """Envia uma imagem para um grupo do WhatsApp via servidor Node.js (chamada direta)
+        
+        Args:
+            image_path: RenderedBanner (enviado em base64, sem depender do disco), caminho do arquivo
+                        ou BatchDelivery (um banner para vários grupos)
+            group_id: ID do grupo do WhatsApp
+        """
         if not WHATSAPP_ENABLED:
             return False
         
-        # Verificar se o arquivo existe
-        if not os.path.exists(image_path):
-            print(f'  ⚠ Arquivo não encontrado: {image_path}')
+        if isinstance(image_path, BatchDelivery):
+            return self.send_whatsapp_batch(image_path)
+        
+        if isinstance(image_path, RenderedBanner):
+            banner = image_path
+            image_payload = {
+                'imageBase64': banner.base64,
+                'mimeType': banner.mime_type,
+                'filename': banner.filename
+            }
+            image_name = banner.filename
+        else:
+            # Verificar se o arquivo existe
+            if not os.path.exists(image_path):
+                print(f'  ⚠ Arquivo não encontrado: {image_path}')
+                return False
+            image_payload = {'imagePath': os.path.abspath(image_path)}
+            image_name = os.path.basename(image_path)
+        
+        # Circuito aberto (servidor fora do ar ou reconectando): falhar rápido sem chamar o servidor
+        if not self.whatsapp_health.allow_request():
             return False
         
         try:
-            # Verificar servidor
-            server_ready = False
-            if hasattr(self, '_whatsapp_ready') and self._whatsapp_ready:
-                server_ready = True
-            else:
-                try:
-                    response = requests.get(f'{WHATSAPP_API_URL}/health', timeout=5)
-                    if response.status_code == 200:
-                        health_data = response.json()
-                        if health_data.get('status') == 'ready':
-                            server_ready = True
-                            self._whatsapp_ready = True
-                        else:
-                            self._whatsapp_ready = False
-                    else:
-                        self._whatsapp_ready = False
-                except Exception as e:
-                    self._whatsapp_ready = False
-            
-            if not server_ready:
-                return False
-
-            # Preparar caminho absoluto
-            abs_path = os.path.abspath(image_path)
-            
-            # Obter legenda do template ou usar padrão
-            caption_text = self.get_template_value('banner-caption', '').strip()
-            if not caption_text:
-                caption_text = f'Compre no WhatsApp - {WHATSAPP_LINK}'
+            caption_text = self.get_whatsapp_caption()
             
             # Enviar para grupo
             response = requests.post(
                 f'{WHATSAPP_API_URL}/send-image-to-group',
                 json={
                     'groupId': group_id,
-                    'imagePath': abs_path,
+                    **image_payload,
                     'caption': caption_text
                 },
                 timeout=30
@@ -2322,15 +2718,20 @@ body {{ margin: 0; padding: 0; width: {BANNER_WIDTH}px; height: {BANNER_HEIGHT}p
             if response.status_code == 200:
                 result = response.json()
                 if result.get('success'):
+                    self.whatsapp_health.record_success()
                     group_name = result.get('groupName', 'Grupo')
-                    print(f'  ✅ Enviado ao grupo "{group_name}": {os.path.basename(image_path)}')
+                    print(f'  ✅ Enviado ao grupo "{group_name}": {image_name}')
                     return True
                 else:
+                    self.whatsapp_health.record_failure(result.get('error'), health_failure=False)
                     return False
             else:
+                self.whatsapp_health.record_failure(f'HTTP {response.status_code}',
+                                                    health_failure=is_health_failure(response.status_code))
                 return False
                 
         except Exception as exc:
+            self.whatsapp_health.record_failure(str(exc), health_failure=is_health_failure(exc=exc))
             return False
     
     def send_to_whatsapp_group(self, image_path, group_id):
@@ -2349,49 +2750,23 @@ body {{ margin: 0; padding: 0; width: {BANNER_WIDTH}px; height: {BANNER_HEIGHT}p
             print(f'  ⚠ Arquivo não encontrado: {image_path}')
             return False
         
+        # Preparar caminho absoluto
+        abs_path = os.path.abspath(image_path)
+        
+        # Verificar novamente se o arquivo existe (com caminho absoluto)
+        if not os.path.exists(abs_path):
+            print(f'  ⚠ Arquivo não encontrado (absoluto): {abs_path}')
+            return False
+        
+        # Estado do servidor vem do monitor (/health em cache); circuito aberto = falhar rápido
+        if not self.whatsapp_health.allow_request():
+            status = self.whatsapp_health.get_status()
+            print(f'  ⚠ Servidor WhatsApp não está pronto: {status["message"] or status["state"]}')
+            print('  💡 Aguarde a autenticação do WhatsApp (escaneie o QR Code) ou verifique se o servidor está rodando: start-whatsapp-server.bat')
+            return False
+        
         try:
-            # Verificar servidor a cada tentativa (mas cachear o resultado se estiver OK)
-            server_ready = False
-            if hasattr(self, '_whatsapp_ready') and self._whatsapp_ready:
-                server_ready = True
-            else:
-                try:
-                    response = requests.get(f'{WHATSAPP_API_URL}/health', timeout=5)
-                    if response.status_code == 200:
-                        health_data = response.json()
-                        if health_data.get('status') == 'ready':
-                            server_ready = True
-                            self._whatsapp_ready = True
-                        else:
-                            print(f'  ⚠ Servidor WhatsApp não está pronto: {health_data.get("message")}')
-                            print('  💡 Aguarde a autenticação do WhatsApp (escaneie o QR Code)')
-                            self._whatsapp_ready = False
-                    else:
-                        print(f'  ⚠ Servidor WhatsApp respondeu com código: {response.status_code}')
-                        self._whatsapp_ready = False
-                except requests.exceptions.ConnectionError:
-                    print('  ⚠ Não foi possível conectar ao servidor WhatsApp!')
-                    print('  💡 Certifique-se de que o servidor está rodando: start-whatsapp-server.bat')
-                    self._whatsapp_ready = False
-                except Exception as e:
-                    print(f'  ⚠ Erro ao verificar servidor WhatsApp: {e}')
-                    self._whatsapp_ready = False
-            
-            if not server_ready:
-                return False
-
-            # Preparar caminho absoluto
-            abs_path = os.path.abspath(image_path)
-            
-            # Verificar novamente se o arquivo existe (com caminho absoluto)
-            if not os.path.exists(abs_path):
-                print(f'  ⚠ Arquivo não encontrado (absoluto): {abs_path}')
-                return False
-            
-            # Obter legenda do template ou usar padrão
-            caption_text = self.get_template_value('banner-caption', '').strip()
-            if not caption_text:
-                caption_text = f'Compre no WhatsApp - {WHATSAPP_LINK}'
+            caption_text = self.get_whatsapp_caption()
             
             # Enviar imagem
             print(f'  🔄 Enviando {os.path.basename(image_path)} ao WhatsApp...')
@@ -2408,28 +2783,31 @@ body {{ margin: 0; padding: 0; width: {BANNER_WIDTH}px; height: {BANNER_HEIGHT}p
                 if response.status_code == 200:
                     result = response.json()
                     if result.get('success'):
+                        self.whatsapp_health.record_success()
                         print(f'  ✅ Enviado ao WhatsApp com sucesso: {os.path.basename(image_path)}')
                         return True
                     else:
                         error_msg = result.get('error', 'Erro desconhecido')
                         print(f'  ⚠ Erro ao enviar ao WhatsApp: {error_msg}')
-                        # Se houver erro, marcar servidor como não pronto para próxima verificação
-                        self._whatsapp_ready = False
+                        self.whatsapp_health.record_failure(error_msg, health_failure=False)
                         return False
                 else:
                     print(f'  ⚠ Falha HTTP {response.status_code} ao enviar ao WhatsApp')
                     print(f'  📄 Resposta: {response.text[:200]}')
-                    self._whatsapp_ready = False
+                    self.whatsapp_health.record_failure(f'HTTP {response.status_code}',
+                                                        health_failure=is_health_failure(response.status_code))
                     return False
-            except requests.exceptions.Timeout:
+            except requests.exceptions.Timeout as exc:
                 print('  ⚠ Timeout ao enviar ao WhatsApp (servidor pode estar ocupado)')
+                self.whatsapp_health.record_failure('timeout', health_failure=is_health_failure(exc=exc))
                 return False
-            except requests.exceptions.ConnectionError:
+            except requests.exceptions.ConnectionError as exc:
                 print('  ⚠ Erro de conexão ao enviar ao WhatsApp')
-                self._whatsapp_ready = False
+                self.whatsapp_health.record_failure('erro de conexão', health_failure=is_health_failure(exc=exc))
                 return False
                 
         except Exception as exc:
+            self.whatsapp_health.record_failure(str(exc), health_failure=False)
             print(f'  ⚠ Erro inesperado ao enviar ao WhatsApp: {exc}')
             import traceback
             traceback.print_exc()
@@ -2466,7 +2844,177 @@ body {{ margin: 0; padding: 0; width: {BANNER_WIDTH}px; height: {BANNER_HEIGHT}p
             traceback.print_exc()
             return False
 
-    def generate_banners(self, progress_callback=None):
+    def get_assets_signature(self):
+        """Assinatura dos arquivos de imagem/fonte usados no banner
+        
+        Usa nome, tamanho e data de modificação (sem ler o conteúdo) para que
+        trocar um logo, fundo, bandeira ou fonte invalide o cache de banners.
+        
+        Returns:
+            str: Hash SHA-256 da lista de arquivos
+        """
+        import hashlib
+        arquivos = []
+        for pasta in (self.images_folder, 'Bandeira', 'Fontes'):
+            if not os.path.isdir(pasta):
+                continue
+            for raiz, _, nomes in os.walk(pasta):
+                for nome in sorted(nomes):
+                    caminho = os.path.join(raiz, nome)
+                    try:
+                        info = os.stat(caminho)
+                        arquivos.append(f'{caminho}|{info.st_size}|{int(info.st_mtime)}')
+                    except OSError:
+                        continue
+        return hashlib.sha256('\n'.join(sorted(arquivos)).encode('utf-8')).hexdigest()
+
+    def restore_cached_banner(self, cached_banner, output_path):
+        """Recupera um banner do cache para a memória
+        
+        Usa o arquivo local se ainda existir (uma leitura); caso contrário baixa
+        pela URL do Cloudinary (a gravação em disco fica com publish_banner()).
+        
+        Args:
+            cached_banner: Entrada retornada por BannerRenderCache.get()
+            output_path: Caminho pretendido do banner (define o nome do arquivo baixado)
+            
+        Returns:
+            RenderedBanner ou None se não foi possível recuperar
+        """
+        cached_path = cached_banner.get('path')
+        cached_url = cached_banner.get('url')
+        
+        if cached_path and os.path.exists(cached_path):
+            try:
+                return RenderedBanner.from_file(cached_path, url=cached_url)
+            except Exception as e:
+                print(f'  ⚠ Erro ao ler banner do cache ({cached_path}): {e}')
+        
+        if cached_url:
+            try:
+                response = requests.get(cached_url, timeout=30)
+                response.raise_for_status()
+                mime_type = response.headers.get('Content-Type', 'image/jpeg').split(';')[0].strip()
+                extensao = os.path.splitext(cached_url.split('?')[0])[1] or self.encoder.extension
+                filename = os.path.splitext(os.path.basename(output_path))[0] + extensao
+                print(f'  ☁️ Banner do cache baixado do Cloudinary: {filename}')
+                return RenderedBanner(filename, response.content, mime_type, url=cached_url)
+            except Exception as e:
+                print(f'  ⚠ Erro ao baixar banner do cache ({cached_url}): {e}')
+        
+        return None
+
+    def build_unidade_index(self, df):
+        """Cria índice Unidade -> rótulos das linhas do DataFrame
+        
+        Evita filtrar a tabela inteira (df['Unidade'] == unidade) a cada banner.
+        
+        Args:
+            df: DataFrame já normalizado da tabela de preços
+            
+        Returns:
+            dict: {unidade: [índices das linhas]} na ordem em que as unidades aparecem no CSV
+        """
+        return {unidade: list(indices) for unidade, indices in df.groupby('Unidade', sort=False).groups.items()}
+
+    def parse_product_codes(self, codigos):
+        """Converte a lista de códigos informada para inteiros (inválidos são ignorados)"""
+        codigos_validos = set()
+        for codigo in codigos or []:
+            try:
+                codigos_validos.add(int(str(codigo).strip()))
+            except ValueError:
+                print(f'  ⚠ Código de produto inválido ignorado: {codigo}')
+        return codigos_validos
+
+    def filter_rows_for_regeneration(self, df, unidades=None, codigos=None):
+        """Restringe a tabela (ainda sem normalizar) às unidades envolvidas na regeneração
+        
+        Roda antes da conversão de preços e do cálculo de desconto, para que a
+        regeneração seletiva não processe a tabela inteira. Com códigos, as
+        unidades que contêm esses produtos são mantidas por completo, já que
+        os banners delas agrupam outros produtos.
+        
+        Args:
+            df: DataFrame lido do CSV (colunas de texto já sem espaços nas pontas)
+            unidades: Lista de unidades (None = todas)
+            codigos: Lista de códigos de produto (None = todos das unidades)
+            
+        Returns:
+            DataFrame: Linhas das unidades selecionadas (índices originais preservados)
+        """
+        # Comparação sem diferenciar maiúsculas/minúsculas e espaços nas pontas
+        chaves_unidade = df['Unidade'].astype(str).str.strip().str.casefold()
+        mascara = pd.Series(True, index=df.index)
+        if unidades:
+            unidades_csv = set(chaves_unidade)
+            alvo = set()
+            for unidade in unidades:
+                chave = str(unidade).strip().casefold()
+                if chave in unidades_csv:
+                    alvo.add(chave)
+                else:
+                    print(f'  ⚠ Unidade não encontrada no CSV: {unidade}')
+            mascara &= chaves_unidade.isin(alvo)
+        if codigos:
+            codigos_csv = pd.to_numeric(df['Código'].astype(str).str.strip(), errors='coerce')
+            unidades_com_codigo = set(chaves_unidade[mascara & codigos_csv.isin(self.parse_product_codes(codigos))])
+            mascara &= chaves_unidade.isin(unidades_com_codigo)
+        return df[mascara]
+
+    def select_rows_for_regeneration(self, df, unidade_index, codigos=None):
+        """Seleciona as linhas que devem ser regeneradas a partir do índice de unidades
+        
+        Sem códigos, todas as linhas das unidades são regeneradas. Com códigos,
+        são selecionados os banners que contêm esses produtos, com todos os
+        produtos de cada um. Os banners são reconstruídos como numa geração
+        completa: produtos com imagem da unidade, por desconto decrescente,
+        em grupos de 3.
+        
+        Args:
+            df: DataFrame normalizado (apenas unidades de filter_rows_for_regeneration)
+            unidade_index: Índice retornado por build_unidade_index()
+            codigos: Lista de códigos de produto (None = todos da unidade)
+            
+        Returns:
+            list: Índices das linhas selecionadas
+        """
+        if not codigos:
+            return [idx for indices in unidade_index.values() for idx in indices]
+        
+        codigos_validos = self.parse_product_codes(codigos)
+        indices = []
+        for unidade, indices_unidade in unidade_index.items():
+            df_linhas = df.loc[indices_unidade].sort_values('Desconto %', ascending=False, kind='mergesort')
+            com_imagem = [idx for idx, codigo in zip(df_linhas.index, df_linhas['Código'])
+                          if self.check_image_exists(int(codigo))]
+            for inicio in range(0, len(com_imagem), 3):
+                banner = com_imagem[inicio:inicio + 3]
+                if df.loc[banner, 'Código'].isin(codigos_validos).any():
+                    indices.extend(banner)
+        return indices
+
+    def regenerate_banners(self, unidades=None, codigos=None, progress_callback=None):
+        """Regenera banners apenas das unidades e/ou códigos informados
+        
+        As linhas selecionadas são geradas novamente mesmo que já estejam com Gerado = 'Sim'.
+        Com códigos, cada banner que contém um dos produtos é regenerado com todos os seus produtos.
+        O cache de banners não é consultado (a correção pode envolver imagens de produto),
+        mas os banners gerados são registrados nele.
+        
+        Args:
+            unidades: Lista de unidades a regenerar
+            codigos: Lista de códigos de produto a regenerar
+            progress_callback: Mesmo callback de generate_banners()
+            
+        Returns:
+            list: Caminhos dos banners gerados
+        """
+        if not unidades and not codigos:
+            raise ValueError('Informe ao menos uma unidade ou um código de produto para regenerar')
+        return self.generate_banners(progress_callback=progress_callback, unidades=unidades, codigos=codigos, use_cache=False)
+
+    def generate_banners(self, progress_callback=None, unidades=None, codigos=None, use_cache=True):
         """Gera banners para todas as unidades, marcando itens processados no CSV
         
         Args:
@@ -2475,7 +3023,24 @@ body {{ margin: 0; padding: 0; width: {BANNER_WIDTH}px; height: {BANNER_HEIGHT}p
                               progresso: 0-100
                               tarefa: string descritiva
                               detalhes: dict com informações adicionais
+            unidades: Lista opcional de unidades para regeneração seletiva
+            codigos: Lista opcional de códigos de produto para regeneração seletiva
+                     (banners com esses produtos são regenerados mesmo se Gerado = 'Sim')
+            use_cache: Se True, reutiliza banners idênticos já renderizados (cache_banners/)
+            
+        Returns:
+            list: Caminho (ou URL, se SAVE_BANNERS_TO_DISK=false) de cada banner gerado nesta execução
         """
+        filtro_unidades = unidades
+        filtro_codigos = codigos
+        regeneracao_seletiva = bool(filtro_unidades or filtro_codigos)
+        
+        # Imagens dos produtos são resolvidas de novo a cada execução: uma foto
+        # trocada muda a chave do cache de banners
+        self.resolved_product_images = {}
+        self.image_existence_cache = {}
+        self.image_source_versions = {}
+        
         def update_progress(opcao, progresso, tarefa, detalhes=None):
             """Helper para atualizar progresso"""
             if progress_callback:
@@ -2660,6 +3225,20 @@ body {{ margin: 0; padding: 0; width: {BANNER_WIDTH}px; height: {BANNER_HEIGHT}p
 
         # Resetar índice para garantir índices sequenciais
         df = df.reset_index(drop=True)
+        
+        # Regeneração seletiva: normalizar e calcular desconto só das unidades envolvidas.
+        # A tabela completa (df_csv) é mantida para salvar o CSV com o Gerado atualizado
+        df_csv = None
+        if regeneracao_seletiva:
+            df_csv = df
+            df = self.filter_rows_for_regeneration(df_csv, filtro_unidades, filtro_codigos).copy()
+            print(f'  🎯 {len(df)} de {len(df_csv)} registro(s) nas unidades selecionadas')
+            if df.empty:
+                print('⚠ Nenhuma linha do CSV corresponde aos filtros informados. Nada a regenerar.')
+                update_progress('complete', 100, 'Nenhuma linha corresponde aos filtros informados', {
+                    'total_banners_gerados': 0
+                })
+                return []
 
         def parse_number(value):
             if pd.isna(value):
@@ -2689,6 +3268,13 @@ body {{ margin: 0; padding: 0; width: {BANNER_WIDTH}px; height: {BANNER_HEIGHT}p
         df['Gerado'] = df['Gerado'].astype(str).str.strip()
         df['Gerado'] = df['Gerado'].apply(lambda x: 'Sim' if str(x).lower() in ('sim', 'yes', '1', 'true', 'x', '✓', 's') else 'Não')
 
+        def salvar_csv():
+            """Salva o CSV; na regeneração seletiva grava o Gerado de volta na tabela completa"""
+            if df_csv is None:
+                return self.save_csv_with_format(df, CSV_FILE, csv_sep, csv_encoding)
+            df_csv.loc[df.index, 'Gerado'] = df['Gerado']
+            return self.save_csv_with_format(df_csv, CSV_FILE, csv_sep, csv_encoding)
+
         print(f'✓ Tabela lida: {len(df)} registros encontrados')
         itens_nao_gerados = len(df[df['Gerado'] == 'Não'])
         itens_gerados = len(df[df['Gerado'] == 'Sim'])
@@ -2697,7 +3283,32 @@ body {{ margin: 0; padding: 0; width: {BANNER_WIDTH}px; height: {BANNER_HEIGHT}p
 
         df['Desconto %'] = df.apply(lambda row: self.calculate_discount_percentage(row['Preço Comercial'], row['Preço Promocional']), axis=1)
 
-        unidades = df['Unidade'].unique()
+        # Índice por unidade: cada unidade lê apenas as próprias linhas
+        unidade_index = self.build_unidade_index(df)
+        indices_selecionados = None
+        
+        if regeneracao_seletiva:
+            print('\n🎯 Regeneração seletiva solicitada')
+            if filtro_unidades:
+                print(f'  Unidades: {", ".join(str(u) for u in filtro_unidades)}')
+            if filtro_codigos:
+                print(f'  Códigos: {", ".join(str(c) for c in filtro_codigos)}')
+            
+            selecionados = self.select_rows_for_regeneration(df, unidade_index, filtro_codigos)
+            if not selecionados:
+                print('⚠ Nenhuma linha do CSV corresponde aos filtros informados. Nada a regenerar.')
+                update_progress('complete', 100, 'Nenhuma linha corresponde aos filtros informados', {
+                    'total_banners_gerados': 0
+                })
+                return []
+            
+            # Linhas selecionadas voltam a ficar pendentes (ignorando o Gerado atual)
+            df.loc[selecionados, 'Gerado'] = 'Não'
+            indices_selecionados = set(selecionados)
+            unidades = list(dict.fromkeys(df.loc[selecionados, 'Unidade']))
+            print(f'✓ {len(selecionados)} linha(s) selecionada(s) em {len(unidades)} unidade(s)')
+        else:
+            unidades = list(unidade_index.keys())
         print(f'✓ {len(unidades)} unidades encontradas')
         
         update_progress('read_csv', 10, f'CSV processado: {len(df)} registros, {len(unidades)} unidades', {
@@ -2707,17 +3318,32 @@ body {{ margin: 0; padding: 0; width: {BANNER_WIDTH}px; height: {BANNER_HEIGHT}p
             'itens_gerados': itens_gerados
         })
 
-        generated_paths = []
+        generated_banners = []  # Banners em memória (RenderedBanner)
+        banners_do_cache = 0
         data_atual = datetime.now().strftime('%d-%m-%Y')
+        
+        # Chave do cache de banners: template + assets + dimensões
+        template_hash = hash_template(self.template_config)
+        cache_extra = {
+            'assets': self.get_assets_signature(),
+            'width': BANNER_WIDTH,
+            'height': BANNER_HEIGHT,
+            'format': self.encoder.output_format,
+            'quality': self.encoder.quality,
+            'max_bytes': self.encoder.max_bytes,
+            'renderer': BANNER_RENDERER
+        }
+        if self.compositor:
+            self.compositor.sync_assets(cache_extra['assets'])
         output_dir = os.path.join('banners', data_atual)
         os.makedirs(output_dir, exist_ok=True)
         
         total_unidades = len(unidades)
         unidade_atual = 0
         
-        # Iniciar thread de envio WhatsApp para processamento paralelo
+        # Iniciar workers de envio WhatsApp para processamento paralelo
         if WHATSAPP_ENABLED:
-            print('🚀 Iniciando thread de envio WhatsApp (processamento paralelo)...')
+            print('🚀 Iniciando envio WhatsApp em paralelo (workers por grupo)...')
             self.start_whatsapp_thread()
 
         def format_date_display(value):
@@ -2734,6 +3360,16 @@ body {{ margin: 0; padding: 0; width: {BANNER_WIDTH}px; height: {BANNER_HEIGHT}p
             except Exception:
                 return value_str
 
+        def linhas_pendentes(unidade):
+            """Linhas não geradas da unidade (via índice), ordenadas por desconto"""
+            indices = unidade_index.get(unidade, [])
+            if indices_selecionados is not None:
+                indices = [idx for idx in indices if idx in indices_selecionados]
+            df_linhas = df.loc[indices]
+            df_linhas = df_linhas[df_linhas['Gerado'] == 'Não'].copy()
+            # Ordenação estável: os mesmos produtos formam os mesmos banners (ver select_rows_for_regeneration)
+            return df_linhas.sort_values('Desconto %', ascending=False, kind='mergesort')
+
         for unidade in unidades:
             unidade_atual += 1
             progresso_base = 10 + (unidade_atual - 1) * (85 / total_unidades) if total_unidades > 0 else 10
@@ -2745,18 +3381,19 @@ body {{ margin: 0; padding: 0; width: {BANNER_WIDTH}px; height: {BANNER_HEIGHT}p
                 'total_unidades': total_unidades
             })
             
-            df_unidade = df[(df['Unidade'] == unidade) & (df['Gerado'] == 'Não')].copy()
+            df_unidade = linhas_pendentes(unidade)
             
             if len(df_unidade) == 0:
                 print(f'  ⚠ Unidade {unidade}: todos os itens já foram gerados. Pulando...')
                 continue
-
-            df_unidade = df_unidade.sort_values('Desconto %', ascending=False)
             
             total_itens_unidade = len(df_unidade)
             banner_sequencia = 1
             total_banners_gerados = 0
             unidade_banners = []  # Lista para armazenar banners desta unidade
+            publicacoes_unidade = []  # Gravações/uploads em andamento desta unidade
+            group_id_unidade = self.get_unidade_groups(unidade)
+            enqueued_count = 0
 
             # Primeiro, marcar produtos sem imagem como gerados para evitar loop infinito
             produtos_sem_imagem = []
@@ -2771,10 +3408,9 @@ body {{ margin: 0; padding: 0; width: {BANNER_WIDTH}px; height: {BANNER_HEIGHT}p
                 for idx in produtos_sem_imagem:
                     df.loc[idx, 'Gerado'] = 'Sim'
                 # Salvar CSV após marcar produtos sem imagem
-                self.save_csv_with_format(df, CSV_FILE, csv_sep, csv_encoding)
+                salvar_csv()
                 # Atualizar df_unidade
-                df_unidade = df[(df['Unidade'] == unidade) & (df['Gerado'] == 'Não')].copy()
-                df_unidade = df_unidade.sort_values('Desconto %', ascending=False)
+                df_unidade = linhas_pendentes(unidade)
 
             # Loop para gerar múltiplos banners até esgotar os itens
             while len(df_unidade) > 0:
@@ -2837,7 +3473,7 @@ body {{ margin: 0; padding: 0; width: {BANNER_WIDTH}px; height: {BANNER_HEIGHT}p
                     'total_produtos': len(produtos_validos)
                 })
                 
-                # Processar imagens em paralelo (otimização)
+                # Processar imagens em paralelo (otimização); a imagem resolvida também entra na chave do cache
                 print(f'  🖼️ Processando {len(produtos_validos)} imagem(ns) de produto(s) em paralelo...')
                 update_progress('process_images', progresso_banner + 2, f'Processando {len(produtos_validos)} imagem(ns) em paralelo...', {
                     'total_imagens': len(produtos_validos),
@@ -2851,29 +3487,59 @@ body {{ margin: 0; padding: 0; width: {BANNER_WIDTH}px; height: {BANNER_HEIGHT}p
                     if codigo in imagens_processadas:
                         produto['_imagem_url_processada'] = imagens_processadas[codigo]
                 
-                update_progress('process_banner', progresso_banner + 3, f'Gerando HTML do banner #{banner_sequencia}...', {
-                    'banner_sequencia': banner_sequencia
-                })
-                html = self.generate_html_banner(produtos_validos, unidade, nome_empresa_val, data_inicio, data_fim)
-
-                print(f'  📸 Convertendo para JPEG: {filename}')
-                update_progress('process_banner', progresso_banner + 4, f'Convertendo banner #{banner_sequencia} para imagem...', {
-                    'banner_sequencia': banner_sequencia,
-                    'filename': filename
-                })
-                self.html_to_image(html, output_path)
-                print(f'  ✅ Banner salvo: {output_path}')
-                generated_paths.append(output_path)
+                # Verificar cache de banners renderizados (mesmo template + mesmas entradas e imagens)
+                cache_key = None
+                banner = None
+                if self.banner_cache:
+                    imagens_assinatura = {
+                        str(codigo): self.get_product_image_signature(codigo, imagem)
+                        for codigo, imagem in imagens_processadas.items()
+                    }
+                    cache_key = self.banner_cache.make_key(
+                        template_hash, produtos_validos, unidade, nome_empresa_val, data_inicio, data_fim,
+                        extra=dict(cache_extra, imagens=imagens_assinatura)
+                    )
+                    cached_banner = self.banner_cache.get(cache_key) if use_cache else None
+                    if cached_banner:
+                        banner = self.restore_cached_banner(cached_banner, output_path)
                 
-                # Upload para Cloudinary se habilitado
-                if USE_CLOUDINARY:
-                    try:
-                        banner_url = upload_banner_to_cloudinary(output_path, unidade, data_atual, banner_sequencia)
-                        if banner_url:
-                            print(f'  ✅ Banner enviado para Cloudinary: {banner_url}')
-                    except Exception as e:
-                        print(f'  ⚠ Erro ao enviar banner para Cloudinary: {e}')
-                unidade_banners.append(output_path)  # Adicionar à lista da unidade
+                if banner:
+                    print(f'  ♻️ Banner idêntico encontrado no cache, renderização ignorada: {banner.location}')
+                    banners_do_cache += 1
+                else:
+                    if self.compositor:
+                        print(f'  🧩 Compondo banner com Pillow: {filename}')
+                        update_progress('process_banner', progresso_banner + 4, f'Compondo banner #{banner_sequencia} (Pillow)...', {
+                            'banner_sequencia': banner_sequencia,
+                            'filename': filename
+                        })
+                        try:
+                            banner = self.compose_banner(produtos_validos, unidade, nome_empresa_val, data_inicio, data_fim, output_path)
+                        except Exception as e:
+                            print(f'  ⚠ Erro no compositor Pillow: {e}. Usando Chromium para este banner...')
+                    if banner is None:
+                        update_progress('process_banner', progresso_banner + 3, f'Gerando HTML do banner #{banner_sequencia}...', {
+                            'banner_sequencia': banner_sequencia
+                        })
+                        html = self.generate_html_banner(produtos_validos, unidade, nome_empresa_val, data_inicio, data_fim)
+
+                        print(f'  📸 Convertendo para imagem: {filename}')
+                        update_progress('process_banner', progresso_banner + 4, f'Convertendo banner #{banner_sequencia} para imagem...', {
+                            'banner_sequencia': banner_sequencia,
+                            'filename': filename
+                        })
+                        banner = self.render_banner(html, output_path)
+                    print(f'  ✅ Banner renderizado em memória: {banner.filename}')
+                generated_banners.append(banner)
+                
+                # Disco (opcional) e Cloudinary em paralelo, a partir dos bytes em memória
+                # (banners do cache já têm URL e/ou arquivo)
+                publicacoes_unidade.append((banner, self.publish_banner(banner, output_path, unidade, data_atual, banner_sequencia), cache_key))
+                
+                # Fila do WhatsApp recebe o banner em memória imediatamente
+                if group_id_unidade and self.enqueue_whatsapp_send(banner, group_id_unidade, unidade):
+                    enqueued_count += 1
+                unidade_banners.append(banner)  # Adicionar à lista da unidade
                 total_banners_gerados += 1
 
                 update_progress('process_banner', progresso_banner + 5, f'Banner #{banner_sequencia} concluído!', {
@@ -2892,14 +3558,13 @@ body {{ margin: 0; padding: 0; width: {BANNER_WIDTH}px; height: {BANNER_HEIGHT}p
                     update_progress('save', progresso_banner + 5, f'Salvando progresso no CSV...', {
                         'itens_marcados': len(indices_para_marcar)
                     })
-                if self.save_csv_with_format(df, CSV_FILE, csv_sep, csv_encoding):
+                if salvar_csv():
                         print(f'  💾 CSV atualizado (lote): {len(indices_para_marcar)} item(ns) marcado(s) como gerado(s)')
                 else:
                     print(f'  ⚠ Aviso: não foi possível salvar CSV após banner #{banner_sequencia}')
 
                 # Atualizar df_unidade removendo itens já processados
-                df_unidade = df[(df['Unidade'] == unidade) & (df['Gerado'] == 'Não')].copy()
-                df_unidade = df_unidade.sort_values('Desconto %', ascending=False)
+                df_unidade = linhas_pendentes(unidade)
                 
                 banner_sequencia += 1
 
@@ -2909,17 +3574,13 @@ body {{ margin: 0; padding: 0; width: {BANNER_WIDTH}px; height: {BANNER_HEIGHT}p
                 'banners_gerados': total_banners_gerados
             })
             
-            # Adicionar banners à fila de envio WhatsApp (processamento paralelo)
-            if unidade in self.unidade_to_group:
-                group_id = self.unidade_to_group[unidade]
-                
+            # Aguardar gravações/uploads da unidade e registrar no cache
+            self.wait_banner_publications(publicacoes_unidade, unidade)
+            
+            # Banners já foram para a fila de envio WhatsApp assim que renderizados (processamento paralelo)
+            if group_id_unidade:
                 if unidade_banners:
-                    print(f'\n  📱 Adicionando {len(unidade_banners)} banner(s) à fila de envio para o grupo da unidade {unidade}...')
-                    enqueued_count = 0
-                    for banner_path in unidade_banners:
-                        if self.enqueue_whatsapp_send(banner_path, group_id):
-                            enqueued_count += 1
-                    
+                    print(f'\n  📱 {len(unidade_banners)} banner(s) da unidade {unidade} encaminhado(s) para o grupo...')
                     if enqueued_count > 0:
                         print(f'  ✅ {enqueued_count} banner(s) adicionado(s) à fila de envio (processamento paralelo)')
                     else:
@@ -2931,62 +3592,86 @@ body {{ margin: 0; padding: 0; width: {BANNER_WIDTH}px; height: {BANNER_HEIGHT}p
             
             # Salvar CSV final da unidade (garantir que está salvo)
             if total_banners_gerados > 0:
-                self.save_csv_with_format(df, CSV_FILE, csv_sep, csv_encoding)
+                salvar_csv()
 
         # Fechar navegador ao final de tudo (otimização - liberar recursos)
         update_progress('complete', 93, 'Finalizando geração e aguardando envios WhatsApp...', {})
         self.close_browser()
         print('  ✓ Navegador Playwright fechado')
         
-        # Aguardar fila de envio WhatsApp esvaziar
+        # Aguardar a conclusão dos envios WhatsApp (sucesso ou falha definitiva de cada banner)
         if WHATSAPP_ENABLED and self.whatsapp_thread_running:
-            print(f'\n⏳ Aguardando envio de banners ao WhatsApp ({self.whatsapp_queue.qsize()} banner(s) na fila)...')
-            update_progress('complete', 95, f'Aguardando envio WhatsApp ({self.whatsapp_queue.qsize()} banner(s) na fila)...', {})
+            pendentes = self.whatsapp_dispatcher.pending
+            print(f'\n⏳ Aguardando envio de banners ao WhatsApp ({pendentes} banner(s) pendente(s))...')
+            update_progress('complete', 95, f'Aguardando envio WhatsApp ({pendentes} banner(s) pendente(s))...', {})
+            
+            def progresso_envio(restantes):
+                print(f'  ⏳ Aguardando... {restantes} banner(s) ainda pendente(s)...')
+                update_progress('complete', 95, f'Aguardando envio WhatsApp ({restantes} banner(s) restantes)...', {})
             
-            # Aguardar fila esvaziar (com timeout máximo)
             try:
-                # Aguardar até a fila esvaziar ou timeout de 5 minutos
-                timeout_count = 0
-                max_timeout = 300  # 5 minutos
-                while not self.whatsapp_queue.empty() and timeout_count < max_timeout:
-                    time.sleep(1)
-                    timeout_count += 1
-                    if timeout_count % 10 == 0:
-                        queue_size = self.whatsapp_queue.qsize()
-                        print(f'  ⏳ Aguardando... {queue_size} banner(s) ainda na fila...')
-                        update_progress('complete', 95, f'Aguardando envio WhatsApp ({queue_size} banner(s) restantes)...', {})
-                
-                if self.whatsapp_queue.empty():
+                concluido = self.whatsapp_dispatcher.wait_until_idle(
+                    timeout=WHATSAPP_DRAIN_TIMEOUT or None,
+                    progress_callback=progresso_envio
+                )
+                if concluido:
                     print(f'  ✅ Todos os banners foram processados pela fila de envio!')
                 else:
-                    print(f'  ⚠ Timeout: ainda há {self.whatsapp_queue.qsize()} banner(s) na fila')
+                    print(f'  ⚠ Timeout: ainda há {self.whatsapp_dispatcher.pending} banner(s) pendente(s)')
             except Exception as e:
                 print(f'  ⚠ Erro ao aguardar fila WhatsApp: {e}')
             
-            # Parar thread de envio
-            self.stop_whatsapp_thread()
+            # Parar workers de envio
+            self.stop_whatsapp_thread(wait=False)
 
-        if generated_paths:
-            update_progress('complete', 97, f'Enviando {len(generated_paths)} banner(s) ao Telegram...', {
-                'total_banners': len(generated_paths)
+        if generated_banners:
+            update_progress('complete', 97, f'Enviando {len(generated_banners)} banner(s) ao Telegram...', {
+                'total_banners': len(generated_banners)
             })
-            print(f'\n📨 Enviando {len(generated_paths)} banner(s) ao Telegram...')
-            self.send_to_telegram(generated_paths)
+            print(f'\n📨 Enviando {len(generated_banners)} banner(s) ao Telegram...')
+            self.send_to_telegram(generated_banners)
         else:
             print('\n⚠ Nenhum banner gerado, envio ao Telegram não realizado.')
 
         total_gerados = len(df[df['Gerado'] == 'Sim'])
         total_nao_gerados = len(df[df['Gerado'] == 'Não'])
         print(f'\n✅ Geração concluída!')
-        print(f'  📊 Total de banners gerados nesta execução: {len(generated_paths)}')
+        print(f'  📊 Total de banners gerados nesta execução: {len(generated_banners)}')
+        if banners_do_cache:
+            print(f'  ♻️ Banners reaproveitados do cache: {banners_do_cache}')
         print(f'  📊 Itens marcados como gerados: {total_gerados}')
         print(f'  📊 Itens ainda não gerados: {total_nao_gerados}')
         
         update_progress('complete', 100, 'Geração concluída com sucesso!', {
-            'total_banners_gerados': len(generated_paths),
+            'total_banners_gerados': len(generated_banners),
             'total_itens_gerados': total_gerados,
-            'total_itens_nao_gerados': total_nao_gerados
+            'total_itens_nao_gerados': total_nao_gerados,
+            'banners_do_cache': banners_do_cache
         })
+        
+        return [banner.location for banner in generated_banners]
+
+
+def parse_cli_list(argv, option):
+    """Lê uma opção de lista da linha de comando (--opcao A,B ou --opcao=A,B)
+    
+    Args:
+        argv: Lista de argumentos (sys.argv)
+        option: Nome da opção, ex: '--unidades'
+        
+    Returns:
+        list: Valores separados por vírgula ou None se a opção não foi informada
+    """
+    for i, arg in enumerate(argv):
+        valor = None
+        if arg == option and i + 1 < len(argv):
+            valor = argv[i + 1]
+        elif arg.startswith(option + '='):
+            valor = arg[len(option) + 1:]
+        if valor is not None:
+            itens = [item.strip() for item in valor.split(',') if item.strip()]
+            return itens or None
+    return None
 
 
 if __name__ == '__main__':
@@ -2998,7 +3683,8 @@ if __name__ == '__main__':
                 test_path = sys.argv[2]
             else:
                 banners_dir = Path('banners')
-                candidates = sorted(banners_dir.glob('**/*.jpg'), key=lambda p: p.stat().st_mtime, reverse=True)
+                candidates = [p for ext in ('jpg', 'webp', 'avif') for p in banners_dir.glob(f'**/*.{ext}')]
+                candidates = sorted(candidates, key=lambda p: p.stat().st_mtime, reverse=True)
                 test_path = str(candidates[0]) if candidates else None
             if not test_path:
                 print('❌ Nenhum arquivo para enviar no teste.')
@@ -3009,6 +3695,18 @@ if __name__ == '__main__':
             print(f"🔍 Enviando teste para o Telegram: {test_path}")
             generator.send_to_telegram([test_path])
             sys.exit(0)
+        # Retomar envios do outbox: python main.py --resume-outbox [--destinos whatsapp,telegram] [--reenviar-falhas]
+        if '--resume-outbox' in sys.argv:
+            generator.resume_outbox(destinations=parse_cli_list(sys.argv, '--destinos'),
+                                    retry_failed='--reenviar-falhas' in sys.argv)
+            generator.cleanup()
+            sys.exit(0)
+        # Regeneração seletiva: python main.py --unidades "Loja A,Loja B" --codigos 123,456
+        cli_unidades = parse_cli_list(sys.argv, '--unidades')
+        cli_codigos = parse_cli_list(sys.argv, '--codigos')
+        if cli_unidades or cli_codigos:
+            generator.regenerate_banners(unidades=cli_unidades, codigos=cli_codigos)
+            sys.exit(0)
         generator.generate_banners()
     except KeyboardInterrupt:
         print('\n⚠ Geração interrompida pelo usuário')
@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Agendador de envios ao WhatsApp (ritmo global + por destinatário)
+Usado pelo monitor de e-mails (gmail-monitor-api.py) e pelo despachante de
+banners (whatsapp_dispatcher.py). Cada envio reserva um horário calculado na
+hora da reserva a partir de:
+  - balde de fichas global (N envios por minuto, com rajada)
+  - intervalo humano entre envios consecutivos (mínimo + variação aleatória)
+  - intervalo mínimo entre envios ao mesmo destinatário
+O ritmo se adapta ao resultado dos envios: falhas e confirmações (ACK) lentas
+espaçam os próximos envios; envios rápidos e bem-sucedidos voltam ao normal.
+Como o horário é calculado antes, quem chama decide como esperar (Event.wait,
+fila ordenada por horário) em vez de deixar uma thread parada em sleep.
+"""
+import os
+import time
+import random
+import threading
+
+# Adaptação ao resultado dos envios (compartilhada por todos os agendadores)
+SEND_PACER_MAX_SLOWDOWN = float(os.getenv('SEND_PACER_MAX_SLOWDOWN', '4'))  # espaçamento máximo (x o normal)
+SEND_PACER_FAILURE_FACTOR = float(os.getenv('SEND_PACER_FAILURE_FACTOR', '1.5'))  # multiplica o espaçamento a cada falha
+SEND_PACER_RECOVERY_FACTOR = float(os.getenv('SEND_PACER_RECOVERY_FACTOR', '0.9'))  # volta ao normal a cada envio rápido
+SEND_PACER_LATENCY_TARGET = float(os.getenv('SEND_PACER_LATENCY_TARGET', '15'))  # ACK acima disso (s) conta como lentidão
+SEND_PACER_MAX_DESTINATIONS = 4096  # destinatários lembrados antes de descartar os ociosos
+
+
+class _Destination:
+    """Estado de um destinatário: horário liberado e falhas seguidas"""
+
+    __slots__ = ('ready_at', 'failures')
+
+    def __init__(self):
+        self.ready_at = 0.0
+        self.failures = 0
+
+
+class SendPacer:
+    """Calcula o horário de cada envio respeitando os limites global e por destinatário"""
+
+    def __init__(self, rate_per_minute=0, burst=1, min_gap=0, jitter=0, destination_interval=0,
+                 max_slowdown=None, latency_target=None, name='envios'):
+        """
+        Args:
+            rate_per_minute: Envios por minuto no balde global (0 = sem limite)
+            burst: Envios liberados de uma vez com o balde cheio
+            min_gap: Segundos mínimos entre dois envios consecutivos (simulação humana)
+            jitter: Segundos aleatórios somados ao min_gap (0 a jitter)
+            destination_interval: Segundos mínimos entre envios ao mesmo destinatário
+            max_slowdown: Espaçamento máximo após falhas/lentidão (padrão: SEND_PACER_MAX_SLOWDOWN)
+            latency_target: ACK mais lento que isso espaça os envios (padrão: SEND_PACER_LATENCY_TARGET; 0 = ignora)
+            name: Nome usado nos logs
+        """
+        self.rate_interval = 60.0 / rate_per_minute if rate_per_minute and rate_per_minute > 0 else 0
+        self.burst = max(1, int(burst or 1))
+        self.min_gap = max(0.0, min_gap or 0)
+        self.jitter = max(0.0, jitter or 0)
+        self.destination_interval = max(0.0, destination_interval or 0)
+        self.max_slowdown = max(1.0, SEND_PACER_MAX_SLOWDOWN if max_slowdown is None else max_slowdown)
+        self.latency_target = SEND_PACER_LATENCY_TARGET if latency_target is None else latency_target
+        self.name = name
+
+        self.lock = threading.Lock()
+        self.tat = 0.0  # horário teórico da próxima ficha (GCRA)
+        self.gap_ready_at = 0.0  # fim do intervalo humano desde o último envio
+        self.next_gap = self._draw_gap()  # intervalo sorteado para depois do próximo envio
+        self.destinations = {}  # destino -> _Destination
+        self.slowdown = 1.0
+        self.latency_avg = None
+        self.stats = {'reservas': 0, 'sucessos': 0, 'falhas': 0}
+
+    def _draw_gap(self):
+        return self.min_gap + (random.uniform(0, self.jitter) if self.jitter else 0)
+
+    @staticmethod
+    def _keys(destination):
+        """Destinatários de um envio: tupla = lote (cada um conta separado), None = nenhum"""
+        if destination is None:
+            return ()
+        return destination if isinstance(destination, tuple) else (destination,)
+
+    def _slot(self, now, destination, count):
+        """Primeiro horário que respeita todos os limites. Chamar com o lock adquirido"""
+        send_at = max(now, self.gap_ready_at)
+        if self.rate_interval:
+            # Balde de fichas na forma GCRA: até `burst` envios adiantados em relação ao ritmo
+            tolerance = self.rate_interval * (self.burst - max(1, count))
+            send_at = max(send_at, self.tat - max(0.0, tolerance))
+        for key in self._keys(destination):
+            state = self.destinations.get(key)
+            if state is not None:
+                send_at = max(send_at, state.ready_at)
+        return send_at
+
+    def reserve(self, destination=None, count=1):
+        """
+        Reserva o próximo horário de envio (não bloqueia)
+
+        Args:
+            destination: Destinatário (contato ou grupo), tupla de destinatários de um lote
+                         ou None = só limites globais
+            count: Mensagens do envio (lote para vários grupos consome várias fichas)
+
+        Returns:
+            float: Horário em time.monotonic() a partir do qual o envio pode sair
+        """
+        with self.lock:
+            now = time.monotonic()
+            send_at = self._slot(now, destination, count)
+            if self.rate_interval:
+                self.tat = max(self.tat, send_at) + self.rate_interval * count * self.slowdown
+            self.gap_ready_at = send_at + self.next_gap * self.slowdown
+            if self.destination_interval:
+                for key in self._keys(destination):
+                    state = self._destination(key, now)
+                    state.ready_at = send_at + self._destination_interval(state)
+            self.stats['reservas'] += 1
+            return send_at
+
+    def plan(self, destinations):
+        """
+        Horários previstos para uma sequência de envios, sem reservar
+
+        Args:
+            destinations: Lista de destinatários na ordem de envio
+
+        Returns:
+            list: Segundos a partir de agora até cada envio (o sorteio da variação é estimado pela média)
+        """
+        with self.lock:
+            now = time.monotonic()
+            tat, gap_ready_at = self.tat, self.gap_ready_at
+            ready = {}
+            gap = (self.min_gap + self.jitter / 2) * self.slowdown
+            previsao = []
+            for destination in destinations:
+                send_at = max(now, gap_ready_at)
+                if self.rate_interval:
+                    send_at = max(send_at, tat - self.rate_interval * (self.burst - 1))
+                    tat = max(tat, send_at) + self.rate_interval * self.slowdown
+                if destination is not None:
+                    state = self.destinations.get(destination)
+                    send_at = max(send_at, ready.get(destination, state.ready_at if state else 0.0))
+                    if self.destination_interval:
+                        ready[destination] = send_at + self.destination_interval * self.slowdown
+                gap_ready_at = send_at + gap
+                previsao.append(send_at - now)
+            return previsao
+
+    def ready_at(self, destination):
+        """Horário (time.monotonic) a partir do qual o destinatário (ou todos os do lote) pode receber de novo"""
+        with self.lock:
+            states = [self.destinations.get(key) for key in self._keys(destination)]
+            return max([state.ready_at for state in states if state] or [0.0])
+
+    def busy_destinations(self):
+        """
+        Destinatários ainda dentro do intervalo desde o último envio
+
+        Returns:
+            dict: {destinatário: segundos até liberar}
+        """
+        with self.lock:
+            now = time.monotonic()
+            return {destination: state.ready_at - now for destination, state in self.destinations.items()
+                    if state.ready_at > now}
+
+    def delay(self, destination=None, count=1):
+        """Segundos até o próximo envio liberado para o destinatário (0 = pode enviar agora)"""
+        with self.lock:
+            now = time.monotonic()
+            return max(0.0, self._slot(now, destination, count) - now)
+
+    def pause(self, seconds):
+        """Suspende todos os envios por alguns segundos (ex: retry_after de um 429)"""
+        with self.lock:
+            self.gap_ready_at = max(self.gap_ready_at, time.monotonic() + seconds)
+
+    def record_result(self, destination, success, latency=None, penalize=True):
+        """
+        Registra o resultado de um envio reservado e ajusta o ritmo
+
+        O intervalo humano e o do destinatário passam a contar do fim do envio
+        (como antes do agendador, quando a espera começava após o ACK).
+
+        Args:
+            destination: Destinatário usado em reserve()
+            success: True se o envio foi confirmado
+            latency: Segundos entre o pedido e a confirmação (ACK)
+            penalize: False para falhas que não têm relação com o ritmo (ex: número inválido)
+        """
+        with self.lock:
+            now = time.monotonic()
+            if latency is not None:
+                self.latency_avg = latency if self.latency_avg is None else 0.7 * self.latency_avg + 0.3 * latency
+            slow = bool(self.latency_target) and latency is not None and latency > self.latency_target
+
+            if success:
+                self.stats['sucessos'] += 1
+                if slow:
+                    self.slowdown = min(self.max_slowdown, self.slowdown * 1.2)
+                else:
+                    self.slowdown = max(1.0, self.slowdown * SEND_PACER_RECOVERY_FACTOR)
+            else:
+                self.stats['falhas'] += 1
+                if penalize:
+                    self.slowdown = min(self.max_slowdown, self.slowdown * SEND_PACER_FAILURE_FACTOR)
+
+            self.next_gap = self._draw_gap()
+            self.gap_ready_at = max(self.gap_ready_at, now + self.next_gap * self.slowdown)
+            if self.destination_interval:
+                for key in self._keys(destination):
+                    state = self._destination(key, now)
+                    state.failures = 0 if success or not penalize else state.failures + 1
+                    state.ready_at = max(state.ready_at, now + self._destination_interval(state))
+
+    def _destination(self, destination, now):
+        """Estado do destinatário (criado se preciso). Chamar com o lock adquirido"""
+        state = self.destinations.get(destination)
+        if state is None:
+            if len(self.destinations) >= SEND_PACER_MAX_DESTINATIONS:
+                self.destinations = {key: value for key, value in self.destinations.items()
+                                     if value.ready_at > now or value.failures}
+            state = self.destinations[destination] = _Destination()
+        return state
+
+    def _destination_interval(self, state):
+        """Intervalo do destinatário com o espaçamento atual e as falhas seguidas dele"""
+        return min(self.destination_interval * self.slowdown * (2 ** state.failures),
+                   self.destination_interval * self.max_slowdown * 4)
+
+    def get_stats(self):
+        """Retorna o estado do agendador"""
+        with self.lock:
+            now = time.monotonic()
+            return dict(self.stats,
+                        nome=self.name,
+                        espacamento=round(self.slowdown, 2),
+                        latencia_media=round(self.latency_avg, 2) if self.latency_avg is not None else None,
+                        proximo_envio_em=round(max(0.0, self._slot(now, None, 1) - now), 1),
+                        destinatarios=len(self.destinations))
+
+
+def wait_until(send_at, stop_event=None):
+    """
+    Espera até o horário reservado
+
+    Args:
+        send_at: Horário retornado por SendPacer.reserve
+        stop_event: threading.Event que interrompe a espera
+
+    Returns:
+        bool: False se stop_event foi sinalizado antes do horário
+    """
+    wait = send_at - time.monotonic()
+    if wait <= 0:
+        return not (stop_event is not None and stop_event.is_set())
+    if stop_event is not None:
+        return not stop_event.wait(wait)
+    time.sleep(wait)
+    return True
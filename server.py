@@ -46,6 +46,10 @@ execution_state = {
 execution_lock = threading.Lock()
 execution_thread = None
 
+# Outbox consultado por /outbox/metrics (criado na primeira consulta e reaproveitado)
+outbox = None
+outbox_lock = threading.Lock()
+
 def log_message(message):
     """Adiciona uma mensagem aos logs"""
     with execution_lock:
@@ -80,8 +84,15 @@ def progress_callback(opcao, progresso, tarefa, detalhes):
             execution_state['stats']['total_banners'] = detalhes.get('total_banners_gerados', 0)
             execution_state['stats']['itens_processados'] = detalhes.get('total_itens_gerados', 0)
 
-def run_generator():
-    """Executa o gerador de banners em uma thread separada"""
+def run_generator(unidades=None, codigos=None, resume_outbox=None):
+    """Executa o gerador de banners em uma thread separada
+    
+    Args:
+        unidades: Lista opcional de unidades (regeneração seletiva)
+        codigos: Lista opcional de códigos de produto (regeneração seletiva)
+        resume_outbox: Dict {'destinos': [...], 'reenviar_falhas': bool} para apenas
+                       retomar os envios do outbox, sem gerar banners
+    """
     global execution_state, execution_thread
     
     try:
@@ -151,8 +162,19 @@ def run_generator():
                 execution_state['progress'] = 5
                 execution_state['task'] = 'Lendo planilha CSV...'
             
-            log_message('📊 Lendo planilha de preços...')
-            generator.generate_banners(progress_callback=progress_callback)
+            if resume_outbox is not None:
+                log_message('📬 Retomando envios pendentes do outbox...')
+                generator.resume_outbox(destinations=resume_outbox.get('destinos'),
+                                        retry_failed=resume_outbox.get('reenviar_falhas', False),
+                                        progress_callback=progress_callback)
+                generator.cleanup()
+            elif unidades or codigos:
+                log_message('📊 Lendo planilha de preços...')
+                log_message(f'🎯 Regeneração seletiva - unidades: {unidades or "todas"} | códigos: {codigos or "todos"}')
+                generator.regenerate_banners(unidades=unidades, codigos=codigos, progress_callback=progress_callback)
+            else:
+                log_message('📊 Lendo planilha de preços...')
+                generator.generate_banners(progress_callback=progress_callback)
             
             with execution_lock:
                 execution_state['progress'] = 100
@@ -215,6 +237,95 @@ def execute():
     
     return jsonify({'status': 'started', 'message': 'Execução iniciada'})
 
+def parse_list_param(value):
+    """Normaliza parâmetro de lista (lista JSON ou string separada por vírgulas)"""
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    itens = [str(item).strip() for item in value if str(item).strip()]
+    return itens or None
+
+@app.route('/regenerate', methods=['POST'])
+def regenerate():
+    """Regenera banners apenas para as unidades e/ou códigos de produto informados
+    
+    Body JSON: {"unidades": ["Loja A"], "codigos": [123, 456]}
+    """
+    global execution_thread
+    
+    data = request.get_json(silent=True) or {}
+    unidades = parse_list_param(data.get('unidades'))
+    codigos = parse_list_param(data.get('codigos'))
+    
+    if not unidades and not codigos:
+        return jsonify({'status': 'error', 'error': 'Informe "unidades" e/ou "codigos" para regenerar'}), 400
+    
+    with execution_lock:
+        if execution_state['status'] == 'running':
+            return jsonify({'status': 'error', 'error': 'Execução já está em andamento'}), 400
+        
+        # Resetar estado
+        execution_state['status'] = 'idle'
+        execution_state['progress'] = 0
+        execution_state['task'] = ''
+        execution_state['logs'] = []
+        execution_state['error'] = None
+    
+    execution_thread = threading.Thread(target=run_generator, kwargs={'unidades': unidades, 'codigos': codigos}, daemon=True)
+    execution_thread.start()
+    
+    return jsonify({
+        'status': 'started',
+        'message': 'Regeneração iniciada',
+        'unidades': unidades,
+        'codigos': codigos
+    })
+
+@app.route('/outbox/metrics', methods=['GET'])
+def outbox_metrics():
+    """Retorna as métricas do outbox de envios (pendentes, enviados, falhas por destino)"""
+    global outbox
+    
+    try:
+        with outbox_lock:
+            if outbox is None:
+                from delivery_outbox import DeliveryOutbox
+                outbox = DeliveryOutbox()
+        return jsonify({'status': 'success', 'outbox': outbox.get_metrics()})
+    except Exception as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 500
+
+@app.route('/outbox/resume', methods=['POST'])
+def outbox_resume():
+    """Retoma os envios pendentes do outbox sem renderizar os banners novamente
+    
+    Body JSON (opcional): {"destinos": ["whatsapp", "telegram"], "reenviar_falhas": true}
+    """
+    global execution_thread
+    
+    data = request.get_json(silent=True) or {}
+    opcoes = {
+        'destinos': parse_list_param(data.get('destinos')),
+        'reenviar_falhas': bool(data.get('reenviar_falhas', False))
+    }
+    
+    with execution_lock:
+        if execution_state['status'] == 'running':
+            return jsonify({'status': 'error', 'error': 'Execução já está em andamento'}), 400
+        
+        # Resetar estado
+        execution_state['status'] = 'idle'
+        execution_state['progress'] = 0
+        execution_state['task'] = ''
+        execution_state['logs'] = []
+        execution_state['error'] = None
+    
+    execution_thread = threading.Thread(target=run_generator, kwargs={'resume_outbox': opcoes}, daemon=True)
+    execution_thread.start()
+    
+    return jsonify({'status': 'started', 'message': 'Retomada do outbox iniciada', **opcoes})
+
 @app.route('/status', methods=['GET'])
 def status():
     """Retorna o status atual da execução"""
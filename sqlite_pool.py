@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Pool de conexões SQLite (modo WAL)
+As conexões são abertas uma vez e reaproveitadas entre chamadas e threads
+(monitor, worker de entrega, requisições Flask) em vez de abrir e fechar o
+arquivo a cada consulta. Cada conexão usa:
+  - journal_mode=WAL: leituras não bloqueiam a escrita (e vice-versa)
+  - synchronous=NORMAL: commit sem fsync a cada transação (seguro em WAL)
+  - busy_timeout: espera o lock em vez de falhar com "database is locked"
+  - cache de comandos preparados do sqlite3 (cached_statements), que só
+    rende quando a conexão sobrevive entre chamadas
+"""
+import os
+import queue
+import sqlite3
+import threading
+
+# Configuração (variáveis de ambiente)
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL').upper()  # OFF | NORMAL | FULL
+SQLITE_CACHED_STATEMENTS = int(os.getenv('SQLITE_CACHED_STATEMENTS', '256'))
+SQLITE_POOL_SIZE = int(os.getenv('SQLITE_POOL_SIZE', '8'))  # conexões ociosas mantidas abertas (0 = sem pool)
+
+_SYNCHRONOUS_VALUES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+
+class SQLitePool:
+    """Conexões reaproveitáveis para um arquivo SQLite
+
+    Uso:
+        conn = pool.acquire()
+        try:
+            ...
+            conn.commit()
+        finally:
+            pool.release(conn)
+    """
+
+    def __init__(self, db_path, size=None, row_factory=sqlite3.Row):
+        """
+        Args:
+            db_path: Caminho do arquivo SQLite
+            size: Conexões ociosas mantidas no pool (padrão: SQLITE_POOL_SIZE; 0 = abrir/fechar a cada uso)
+            row_factory: row_factory aplicado a cada conexão entregue
+        """
+        self.db_path = str(db_path)
+        self.size = SQLITE_POOL_SIZE if size is None else max(0, size)
+        self.row_factory = row_factory
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.opened = 0
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=SQLITE_BUSY_TIMEOUT_MS / 1000.0,
+            cached_statements=SQLITE_CACHED_STATEMENTS,
+            check_same_thread=False  # a conexão troca de thread, mas nunca é usada por duas ao mesmo tempo
+        )
+        conn.execute(f'PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}')
+        conn.execute('PRAGMA journal_mode = WAL')
+        synchronous = SQLITE_SYNCHRONOUS if SQLITE_SYNCHRONOUS in _SYNCHRONOUS_VALUES else 'NORMAL'
+        conn.execute(f'PRAGMA synchronous = {synchronous}')
+        with self.lock:
+            self.opened += 1
+        return conn
+
+    def acquire(self):
+        """Retorna uma conexão livre (do pool ou nova)"""
+        try:
+            conn = self.idle.get_nowait()
+        except queue.Empty:
+            conn = self._open()
+        conn.row_factory = self.row_factory
+        return conn
+
+    def release(self, conn):
+        """Devolve a conexão ao pool (desfaz transação deixada aberta; fecha se o pool estiver cheio)"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._close(conn)
+            return
+        if self.idle.qsize() < self.size:
+            self.idle.put(conn)
+        else:
+            self._close(conn)
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self.lock:
+            self.opened -= 1
+
+    def close_all(self):
+        """Fecha as conexões ociosas"""
+        while True:
+            try:
+                self._close(self.idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def get_stats(self):
+        """Retorna conexões abertas e ociosas"""
+        with self.lock:
+            return {'abertas': self.opened, 'ociosas': self.idle.qsize(), 'tamanho_pool': self.size}
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Envio de banners ao Telegram em lotes (sendMediaGroup)
+Até 10 banners por requisição, lotes enviados em paralelo respeitando o
+limite de requisições, novas tentativas em 429 usando o retry_after do
+Telegram e sessão HTTP reaproveitada. Os banners são enviados a partir dos
+bytes em memória (RenderedBanner), sem reabrir os arquivos.
+"""
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from send_pacer import SendPacer, wait_until
+
+# Configuração (variáveis de ambiente)
+TELEGRAM_MEDIA_GROUP_SIZE = min(10, max(1, int(os.getenv('TELEGRAM_MEDIA_GROUP_SIZE', '10'))))  # limite do Telegram: 10
+TELEGRAM_WORKERS = int(os.getenv('TELEGRAM_WORKERS', '3'))
+TELEGRAM_RATE_PER_MINUTE = float(os.getenv('TELEGRAM_RATE_PER_MINUTE', '20'))  # requisições por minuto no mesmo chat
+TELEGRAM_MAX_ATTEMPTS = int(os.getenv('TELEGRAM_MAX_ATTEMPTS', '4'))
+TELEGRAM_TIMEOUT = float(os.getenv('TELEGRAM_TIMEOUT', '60'))
+
+
+class TelegramDelivery:
+    """Estágio de envio ao Telegram: lotes sendMediaGroup em paralelo"""
+
+    def __init__(self, api_base, chat_id, workers=None, batch_size=None, rate_per_minute=None,
+                 max_attempts=None, timeout=None):
+        """
+        Args:
+            api_base: URL da API do bot (https://api.telegram.org/bot<token>)
+            chat_id: Chat de destino
+            workers: Lotes enviados em paralelo (padrão: TELEGRAM_WORKERS)
+            batch_size: Banners por sendMediaGroup (máximo 10)
+            rate_per_minute: Limite de requisições por minuto (0 = sem limite)
+            max_attempts: Tentativas por lote
+            timeout: Timeout de cada requisição em segundos
+        """
+        self.api_base = api_base
+        self.chat_id = chat_id
+        self.workers = max(1, workers or TELEGRAM_WORKERS)
+        self.batch_size = min(10, max(1, batch_size or TELEGRAM_MEDIA_GROUP_SIZE))
+        self.pacer = SendPacer(rate_per_minute=TELEGRAM_RATE_PER_MINUTE if rate_per_minute is None else rate_per_minute,
+                               name='telegram')
+        self.max_attempts = max(1, max_attempts or TELEGRAM_MAX_ATTEMPTS)
+        self.timeout = TELEGRAM_TIMEOUT if timeout is None else timeout
+
+        # Sessão com pool do tamanho do número de workers
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.stats_lock = threading.Lock()
+        self.stats = {'lotes': 0, 'enviados': 0, 'falhas': 0, 'retentativas': 0, 'latencia_total': 0.0}
+
+    def _post(self, banners):
+        """Uma requisição: sendPhoto (1 banner) ou sendMediaGroup (2 a 10)"""
+        if len(banners) == 1:
+            banner = banners[0]
+            return self.session.post(
+                f'{self.api_base}/sendPhoto',
+                data={'chat_id': self.chat_id, 'caption': banner.filename},
+                files={'photo': (banner.filename, banner.data, banner.mime_type)},
+                timeout=self.timeout
+            )
+        media = []
+        files = {}
+        for index, banner in enumerate(banners):
+            nome = f'photo{index}'
+            media.append({'type': 'photo', 'media': f'attach://{nome}', 'caption': banner.filename})
+            files[nome] = (banner.filename, banner.data, banner.mime_type)
+        return self.session.post(
+            f'{self.api_base}/sendMediaGroup',
+            data={'chat_id': self.chat_id, 'media': json.dumps(media)},
+            files=files,
+            timeout=self.timeout
+        )
+
+    def send_batch(self, banners, label=''):
+        """
+        Envia um lote com novas tentativas (429 respeita retry_after; 5xx/rede com backoff)
+
+        Args:
+            banners: Lista de RenderedBanner (até batch_size)
+            label: Identificação do lote nos logs
+
+        Returns:
+            tuple: (sucesso, erro ou None, tentativas)
+        """
+        erro = None
+        inicio = time.time()
+        for tentativa in range(1, self.max_attempts + 1):
+            # Todos os lotes vão para o mesmo chat: esperar o horário reservado (que já inclui a
+            # pausa de um 429) não atrasa nenhum outro destino
+            wait_until(self.pacer.reserve())
+            try:
+                response = self._post(banners)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                erro = f'erro de conexão: {e}'
+                if tentativa < self.max_attempts:
+                    with self.stats_lock:
+                        self.stats['retentativas'] += 1
+                    time.sleep(min(2 ** tentativa, 30))
+                continue
+
+            if response.status_code == 200 and response.json().get('ok'):
+                latencia = time.time() - inicio
+                with self.stats_lock:
+                    self.stats['lotes'] += 1
+                    self.stats['enviados'] += len(banners)
+                    self.stats['latencia_total'] += latencia
+                print(f'  📤 Telegram {label}: {len(banners)} banner(s) em {latencia:.1f}s')
+                return True, None, tentativa
+
+            try:
+                resp_json = response.json()
+            except ValueError:
+                resp_json = {}
+            erro = resp_json.get('description') or f'HTTP {response.status_code}: {response.text[:200]}'
+
+            if response.status_code == 429:
+                retry_after = (resp_json.get('parameters') or {}).get('retry_after', 5)
+                print(f'  ⏳ Telegram {label}: limite atingido, aguardando {retry_after}s')
+                # 429 pausa todos os lotes até o retry_after informado pelo Telegram
+                self.pacer.pause(float(retry_after) + 0.5)
+            elif response.status_code >= 500:
+                if tentativa < self.max_attempts:
+                    time.sleep(min(2 ** tentativa, 30))
+            else:
+                # 400/403: requisição inválida (arquivo, chat) - não adianta repetir
+                break
+            with self.stats_lock:
+                self.stats['retentativas'] += 1
+
+        with self.stats_lock:
+            self.stats['falhas'] += len(banners)
+        print(f'  ⚠ Telegram {label}: falha ao enviar {len(banners)} banner(s): {erro}')
+        return False, erro, tentativa
+
+    def send(self, banners, on_result=None):
+        """
+        Envia banners em lotes paralelos
+
+        Args:
+            banners: Lista de RenderedBanner
+            on_result: Função (índice, sucesso, erro, tentativas) chamada para cada banner
+
+        Returns:
+            list: (banner, sucesso, erro) na mesma ordem da entrada
+        """
+        if not banners:
+            return []
+        resultados = [None] * len(banners)
+        lotes = [list(range(i, min(i + self.batch_size, len(banners))))
+                 for i in range(0, len(banners), self.batch_size)]
+
+        def enviar_lote(numero, indices):
+            label = f'lote {numero}/{len(lotes)}'
+            try:
+                sucesso, erro, tentativas = self.send_batch([banners[i] for i in indices], label)
+            except Exception as e:
+                sucesso, erro, tentativas = False, str(e), 1
+            for i in indices:
+                resultados[i] = (banners[i], sucesso, erro)
+                if on_result:
+                    on_result(i, sucesso, erro, tentativas)
+
+        workers = min(self.workers, len(lotes))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='telegram') as executor:
+            futures = [executor.submit(enviar_lote, numero, indices) for numero, indices in enumerate(lotes, 1)]
+            for future in futures:
+                future.result()
+        return resultados
+
+    def get_stats(self):
+        """Retorna contadores e latência média por lote"""
+        with self.stats_lock:
+            stats = dict(self.stats)
+        stats['latencia_media'] = stats.pop('latencia_total') / stats['lotes'] if stats['lotes'] else 0.0
+        return stats
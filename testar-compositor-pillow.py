@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Teste de paridade entre o compositor Pillow e a renderização no Chromium
+
+Renderiza o mesmo banner (mesmos produtos, unidade e template) pelos dois
+caminhos, compara pixel a pixel com ImageChops e grava as imagens e o mapa
+de diferenças em banners/comparacao-compositor/.
+
+Uso:
+    python testar-compositor-pillow.py [--unidade BAU] [--limite 8.0]
+
+Sai com código 1 se a diferença média passar do limite (padrão: 8.0 em 0-255).
+"""
+import io
+import os
+import sys
+import csv
+import time
+
+# Adicionar o diretório atual ao path para importar main
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image, ImageChops, ImageStat
+
+OUTPUT_FOLDER = os.path.join('banners', 'comparacao-compositor')
+PIXEL_THRESHOLD = 32  # Diferença (0-255) a partir da qual o pixel conta como divergente
+
+PRODUTOS_EXEMPLO = [
+    {'Código': 2, 'Nome': 'PRODUTO DE TESTE COM NOME LONGO PARA QUEBRA DE LINHA', 'Preço Comercial': 39.90,
+     'Preço Promocional': 29.90, 'Unidade de Medida': 'KG', 'Bandeira': ''},
+    {'Código': 3, 'Nome': 'PRODUTO DE TESTE', 'Preço Comercial': 19.90,
+     'Preço Promocional': 17.49, 'Unidade de Medida': '', 'Bandeira': ''},
+    {'Código': 4, 'Nome': 'OUTRO PRODUTO', 'Preço Comercial': 9.99,
+     'Preço Promocional': 9.79, 'Unidade de Medida': 'UN', 'Bandeira': ''}
+]
+
+
+def parse_args(argv):
+    """Lê --unidade e --limite da linha de comando"""
+    args = {'unidade': None, 'limite': 8.0}
+    for i, arg in enumerate(argv):
+        if arg == '--unidade' and i + 1 < len(argv):
+            args['unidade'] = argv[i + 1]
+        elif arg == '--limite' and i + 1 < len(argv):
+            args['limite'] = float(argv[i + 1])
+    return args
+
+
+def carregar_produtos(csv_file, unidade=None):
+    """Lê até 3 produtos de uma unidade da tabela de preços (sem pandas)
+
+    Returns:
+        tuple: (unidade, nome_empresa, data_inicio, data_fim, produtos)
+    """
+    for encoding in ('utf-8-sig', 'latin1'):
+        try:
+            with open(csv_file, 'r', encoding=encoding, newline='') as f:
+                amostra = f.read(4096)
+                f.seek(0)
+                dialect = csv.Sniffer().sniff(amostra, delimiters='\t;,')
+                linhas = [{(k or '').strip(): (v or '').strip() for k, v in row.items()}
+                          for row in csv.DictReader(f, dialect=dialect)]
+            break
+        except (UnicodeDecodeError, csv.Error, OSError):
+            linhas = []
+    linhas = [l for l in linhas if l.get('Código') and l.get('Unidade')]
+    if unidade:
+        linhas = [l for l in linhas if l['Unidade'] == unidade]
+    if not linhas:
+        return unidade or 'TESTE', '', '', '', PRODUTOS_EXEMPLO
+
+    unidade = linhas[0]['Unidade']
+    produtos = []
+    for linha in [l for l in linhas if l['Unidade'] == unidade][:3]:
+        try:
+            linha['Código'] = int(float(linha['Código']))
+            linha['Preço Comercial'] = float(linha['Preço Comercial'].replace(',', '.'))
+            linha['Preço Promocional'] = float(linha['Preço Promocional'].replace(',', '.'))
+            produtos.append(linha)
+        except (KeyError, ValueError):
+            continue
+    primeira = linhas[0]
+    return unidade, primeira.get('Nome Empresa', ''), primeira.get('Início', ''), primeira.get('Fim', ''), produtos or PRODUTOS_EXEMPLO
+
+
+def comparar(imagem_chromium, imagem_pillow):
+    """Compara as duas imagens
+
+    Returns:
+        tuple: (diferença média 0-255, % de pixels divergentes, imagem de diferença)
+    """
+    if imagem_pillow.size != imagem_chromium.size:
+        imagem_pillow = imagem_pillow.resize(imagem_chromium.size)
+    diff = ImageChops.difference(imagem_chromium, imagem_pillow)
+    media = sum(ImageStat.Stat(diff).mean) / 3.0
+    cinza = diff.convert('L')
+    histograma = cinza.histogram()
+    divergentes = sum(histograma[PIXEL_THRESHOLD:])
+    percentual = divergentes * 100.0 / (cinza.width * cinza.height)
+    # Realçar as diferenças para inspeção visual
+    mapa = cinza.point(lambda v: 255 if v >= PIXEL_THRESHOLD else v * 4)
+    return media, percentual, mapa
+
+
+if __name__ == '__main__':
+    args = parse_args(sys.argv[1:])
+    try:
+        from main import BannerGenerator, BANNER_WIDTH, BANNER_HEIGHT, CSV_FILE
+        from banner_compositor import BannerCompositor
+
+        print('=' * 60)
+        print('TESTE DE PARIDADE: COMPOSITOR PILLOW x CHROMIUM')
+        print('=' * 60)
+
+        generator = BannerGenerator()
+        compositor = generator.compositor or BannerCompositor(generator, BANNER_WIDTH, BANNER_HEIGHT)
+        unidade, nome_empresa, data_inicio, data_fim, produtos = carregar_produtos(CSV_FILE, args['unidade'])
+        print(f'Unidade: {unidade} | Produtos: {", ".join(str(p["Código"]) for p in produtos)}')
+
+        # Mesma imagem de produto para os dois renderizadores
+        imagens = generator.process_images_in_parallel(produtos, max_workers=3)
+        for produto in produtos:
+            produto['_imagem_url_processada'] = imagens.get(int(produto['Código']))
+
+        inicio = time.time()
+        html = generator.generate_html_banner(produtos, unidade, nome_empresa, data_inicio, data_fim)
+        imagem_chromium = Image.open(io.BytesIO(generator.render_screenshot(html))).convert('RGB')
+        tempo_chromium = time.time() - inicio
+
+        inicio = time.time()
+        imagem_pillow = compositor.render(produtos, unidade, nome_empresa, data_inicio, data_fim)
+        tempo_pillow = time.time() - inicio
+
+        # Segunda composição: mede o ganho das camadas/fontes em cache
+        inicio = time.time()
+        compositor.render(produtos, unidade, nome_empresa, data_inicio, data_fim)
+        tempo_pillow_cache = time.time() - inicio
+
+        media, percentual, mapa = comparar(imagem_chromium, imagem_pillow)
+
+        os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+        imagem_chromium.save(os.path.join(OUTPUT_FOLDER, f'{unidade}-chromium.png'))
+        imagem_pillow.save(os.path.join(OUTPUT_FOLDER, f'{unidade}-pillow.png'))
+        mapa.save(os.path.join(OUTPUT_FOLDER, f'{unidade}-diferenca.png'))
+
+        print()
+        print('-' * 60)
+        print(f'⏱️ Chromium: {tempo_chromium * 1000:.0f} ms')
+        print(f'⏱️ Pillow (1ª composição): {tempo_pillow * 1000:.0f} ms')
+        print(f'⏱️ Pillow (com cache): {tempo_pillow_cache * 1000:.0f} ms')
+        print(f'📊 Diferença média por canal: {media:.2f} (limite: {args["limite"]:.2f})')
+        print(f'📊 Pixels divergentes (>= {PIXEL_THRESHOLD}): {percentual:.2f}%')
+        print(f'📁 Imagens salvas em: {OUTPUT_FOLDER}')
+        print('-' * 60)
+
+        generator.cleanup()
+
+        if media > args['limite']:
+            print('❌ Compositor Pillow acima do limite de diferença')
+            sys.exit(1)
+        print('✅ Compositor Pillow dentro do limite de diferença')
+
+    except Exception as e:
+        print(f'❌ Erro ao executar teste: {e}')
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Notificador falso do Gmail (push via Pub/Sub) para testar a ingestão por eventos
+sem os serviços do Google
+
+Modos:
+  python testar-gmail-push.py [--url URL] [--history-id N] [--email E] [--token T] [--vezes N] [--intervalo S]
+      Envia notificações no formato da assinatura push do Pub/Sub para um
+      gmail-monitor-api.py em execução (o monitor sincroniza com o Gmail real).
+
+  python testar-gmail-push.py --local [--vezes N]
+      Fluxo completo em processo, sem Gmail nem WhatsApp: carrega o gmail-monitor-api.py
+      com uma caixa de e-mail falsa (histórico com historyId) em um banco temporário,
+      entrega e-mails na caixa, notifica o webhook /gmail/push e mede quanto tempo o
+      e-mail leva para entrar na fila de entrega.
+"""
+import os
+import sys
+import json
+import time
+import base64
+import shutil
+import tempfile
+import importlib.util
+from datetime import datetime
+
+import requests
+
+PASTA = os.path.dirname(os.path.abspath(__file__))
+
+CORPO_EXEMPLO = """Prezado, JOAO SILVA,
+
+O(A) Patiocanoagrill Cliente: PATIO GRILL - CNPJ: 27.765.542/0001-01 - Cod Cliente: {code} - Telefone utilizado: (88) 9779-{final}
+
+Encaminhe esse e-mail para vendermais@friboi.com.br com sua autorização para que possamos te ajudar com o ajuste do telefone
+
+Telefone do Vendedor: (85) 98162-2927
+"""
+
+
+def parse_args(argv):
+    """Lê as opções da linha de comando"""
+    args = {'url': 'http://localhost:5001/gmail/push', 'history-id': None, 'email': 'monitor@exemplo.com',
+            'token': os.environ.get('GMAIL_PUSH_TOKEN', ''), 'vezes': 1, 'intervalo': 1.0, 'local': False}
+    i = 0
+    while i < len(argv):
+        nome = argv[i][2:] if argv[i].startswith('--') else None
+        if nome == 'local':
+            args['local'] = True
+        elif nome in args and i + 1 < len(argv):
+            valor = argv[i + 1]
+            args[nome] = int(valor) if nome in ('history-id', 'vezes') else float(valor) if nome == 'intervalo' else valor
+            i += 1
+        i += 1
+    return args
+
+
+def montar_notificacao(history_id, email):
+    """Corpo enviado pelo Pub/Sub a uma assinatura push quando o Gmail publica uma mudança"""
+    data = json.dumps({'emailAddress': email, 'historyId': history_id}).encode('utf-8')
+    return {
+        'message': {
+            'data': base64.b64encode(data).decode('ascii'),
+            'messageId': str(int(time.time() * 1000)),
+            'publishTime': datetime.utcnow().isoformat(timespec='milliseconds') + 'Z'
+        },
+        'subscription': 'projects/local/subscriptions/gmail-push-falso'
+    }
+
+
+def notificar_servidor(args):
+    """Envia notificações a um servidor em execução"""
+    url = args['url'] + (f"?token={args['token']}" if args['token'] else '')
+    history_id = args['history-id'] or int(time.time())
+    for numero in range(args['vezes']):
+        inicio = time.time()
+        response = requests.post(url, json=montar_notificacao(history_id + numero, args['email']), timeout=10)
+        print(f"🔔 historyId={history_id + numero} -> HTTP {response.status_code} em {(time.time() - inicio) * 1000:.0f} ms")
+        if numero < args['vezes'] - 1:
+            time.sleep(args['intervalo'])
+
+
+class CaixaFalsa:
+    """Caixa de e-mail em memória com a interface do GmailService usada pelo monitor"""
+
+    def __init__(self):
+        self.mensagens = []
+        self.history_id = 1000
+
+    def is_authenticated(self):
+        return True
+
+    def watch(self, topic_name, label_ids=None):
+        return None
+
+    def entregar(self, subject, body):
+        """Adiciona um e-mail à caixa e retorna (message_id, historyId da mudança)"""
+        self.history_id += 1
+        message_id = f'falso{self.history_id}'
+        self.mensagens.append({'id': message_id, 'threadId': message_id, 'historyId': self.history_id,
+                               'subject': subject, 'body': body,
+                               'date': datetime.now().astimezone().strftime('%a, %d %b %Y %H:%M:%S %z')})
+        return message_id, self.history_id
+
+    def sync_new_messages(self, history_id=None, last_check_date=None, get_known_ids=None, subject_filter=None):
+        inicio = int(history_id) if history_id else 0
+        novas = [m for m in self.mensagens if m['historyId'] > inicio]
+        conhecidas = get_known_ids([m['id'] for m in novas]) if get_known_ids else set()
+        novas = [m for m in novas if m['id'] not in conhecidas
+                 and (not subject_filter or subject_filter in m['subject'])]
+        return novas, str(self.history_id), not history_id
+
+    def get_message_metadata(self, message):
+        return {'id': message['id'], 'threadId': message['threadId'], 'subject': message['subject'],
+                'from': 'alertas@exemplo.com', 'date': message['date']}
+
+    def get_message_body(self, message):
+        return message['body']
+
+
+def fluxo_local(args):
+    """Ingestão por push de ponta a ponta em processo (banco temporário, sem Gmail/WhatsApp)"""
+    pasta = tempfile.mkdtemp(prefix='gmail-push-')
+    os.chdir(pasta)  # emails_sent.db e credentials.json ficam na pasta temporária
+    sys.path.insert(0, PASTA)
+    spec = importlib.util.spec_from_file_location('gmail_monitor_api', os.path.join(PASTA, 'gmail-monitor-api.py'))
+    api = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(api)
+
+    caixa = CaixaFalsa()
+    enviados = []
+    api.gmail_service = caixa
+    api.send_to_whatsapp = lambda contact_id, message, validation=None: (enviados.append(contact_id) or True, None)
+    api.CHECK_INTERVAL = 3600  # sem push, o próximo e-mail só seria visto daqui a 1 hora
+    api.EMAIL_MAINTENANCE_INTERVAL_HOURS = 0
+    api.GMAIL_PUSH_TOKEN = ''
+    client = api.app.test_client()
+
+    try:
+        print('=' * 60)
+        print('TESTE DE INGESTÃO POR PUSH (caixa falsa, sem Google)')
+        print('=' * 60)
+        api.start_monitor_threads()
+        while not api.email_db.get_sync_state(api.GMAIL_HISTORY_KEY):
+            time.sleep(0.1)
+        print(f'✅ Primeira sincronização concluída (historyId={api.email_db.get_sync_state(api.GMAIL_HISTORY_KEY)})')
+
+        latencias = []
+        for numero in range(args['vezes']):
+            message_id, history_id = caixa.entregar('Erro de Login Whatsapp',
+                                                    CORPO_EXEMPLO.format(code=3051288 + numero, final=f'{7542 + numero:04d}'))
+            inicio = time.time()
+            response = client.post('/gmail/push', json=montar_notificacao(history_id, args['email']))
+            while not api.email_db.is_known_message_id(message_id) and time.time() - inicio < 10:
+                time.sleep(0.01)
+            latencia = time.time() - inicio
+            if api.email_db.is_known_message_id(message_id):
+                latencias.append(latencia)
+                print(f'📥 {message_id}: HTTP {response.status_code}, na fila em {latencia * 1000:.0f} ms')
+            else:
+                print(f'❌ {message_id}: não entrou na fila em 10s (HTTP {response.status_code})')
+
+        # Notificação repetida (historyId já sincronizado) não dispara nova sincronização
+        disparos = api.push_state['syncs_triggered']
+        client.post('/gmail/push', json=montar_notificacao(caixa.history_id, args['email']))
+        repetida_ok = api.push_state['syncs_triggered'] == disparos
+        print(f"{'✅' if repetida_ok else '❌'} Notificação repetida ignorada")
+
+        invalida = client.post('/gmail/push', json={'message': {}})
+        print(f"{'✅' if invalida.status_code == 400 else '❌'} Notificação inválida rejeitada (HTTP {invalida.status_code})")
+
+        print()
+        print('-' * 60)
+        if latencias:
+            print(f'Latência média notificação -> fila: {sum(latencias) / len(latencias) * 1000:.0f} ms '
+                  f'({len(latencias)}/{args["vezes"]} e-mail(s); sem push: até {api.CHECK_INTERVAL}s)')
+        print('-' * 60)
+        sucesso = len(latencias) == args['vezes'] and repetida_ok and invalida.status_code == 400
+    finally:
+        api.monitor_running = False
+        api.sync_wakeup.set()
+        api.delivery_wakeup.set()
+        os.chdir(PASTA)
+        shutil.rmtree(pasta, ignore_errors=True)
+    return sucesso
+
+
+if __name__ == '__main__':
+    args = parse_args(sys.argv[1:])
+    if args['local']:
+        sys.exit(0 if fluxo_local(args) else 1)
+    notificar_servidor(args)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Teste da manutenção do emails_sent.db (arquivamento + compactação)
+
+Cria um banco temporário com e-mails antigos enviados, pendentes e com as
+tentativas esgotadas, executa o arquivamento como o monitor faz e confere que:
+  - e-mails enviados e com tentativas esgotadas são arquivados
+  - e-mails pendentes continuam completos e podem ser reservados para envio
+
+Uso:
+    python testar-manutencao-emails.py
+"""
+import io
+import os
+import sys
+import shutil
+import tempfile
+import contextlib
+from datetime import datetime, timedelta
+
+# Adicionar o diretório atual ao path para importar email_database
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from email_database import EmailDatabase
+
+MAX_TENTATIVAS = 5
+
+
+def salvar(db, message_id, dias, code):
+    """Salva um e-mail recebido há `dias` dias"""
+    data = (datetime.now() - timedelta(days=dias)).strftime('%a, %d %b %Y %H:%M:%S -0300')
+    info = {'code': code, 'phone': f'889977{code}', 'telefone_vendedor': f'55859816{code}'}
+    db.save_email(message_id, 't', 'Erro de Login Whatsapp', 'monitor@exemplo.com', data,
+                  'corpo do e-mail', info, f'mensagem {message_id}', 'https://exemplo.com')
+
+
+def executar(pasta):
+    db = EmailDatabase(os.path.join(pasta, 'emails.db'))
+    with contextlib.redirect_stdout(io.StringIO()):
+        salvar(db, 'enviado', 90, '1001')
+        salvar(db, 'pendente', 90, '1002')
+        salvar(db, 'esgotado', 90, '1003')
+        salvar(db, 'recente', 1, '1004')
+        db.mark_as_sent('enviado', success=True)
+        for _ in range(MAX_TENTATIVAS):
+            db.mark_as_sent('esgotado', success=False, error='falha de teste')
+
+        resultado = db.archive_old_emails(retention_days=30, archive_dir=os.path.join(pasta, 'arquivo'),
+                                          max_attempts=MAX_TENTATIVAS)
+
+    verificacoes = [
+        ('2 e-mails arquivados (enviado + tentativas esgotadas)', resultado['arquivados'] == 2),
+        ('enviado arquivado', db.get_email_by_message_id('enviado').get('archived_at') is not None),
+        ('esgotado arquivado', db.get_email_by_message_id('esgotado').get('archived_at') is not None),
+        ('pendente antigo mantido completo', db.get_email_by_message_id('pendente').get('whatsapp_message')
+         == 'mensagem pendente'),
+        ('recente mantido', db.get_email_by_message_id('recente').get('archived_at') is None),
+    ]
+    with contextlib.redirect_stdout(io.StringIO()):
+        reservados = {(db.claim_next_email('teste', max_attempts=MAX_TENTATIVAS) or {}).get('message_id')
+                      for _ in range(3)}
+    verificacoes.append(('pendente antigo ainda pode ser enviado', 'pendente' in reservados))
+
+    for nome, ok in verificacoes:
+        print(f"{'✅' if ok else '❌'} {nome}")
+    db.pool.close_all()
+    return all(ok for _, ok in verificacoes)
+
+
+if __name__ == '__main__':
+    pasta = tempfile.mkdtemp(prefix='manutencao-emails-')
+    try:
+        print('=' * 60)
+        print('TESTE DA MANUTENÇÃO DO BANCO DE E-MAILS')
+        print('=' * 60)
+        sucesso = executar(pasta)
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+    sys.exit(0 if sucesso else 1)
@@ -20,7 +20,8 @@ app.use((req, res, next) => {
     next();
 });
 
-app.use(express.json());
+// Limite maior para aceitar imagens enviadas em memória (imageBase64)
+app.use(express.json({ limit: '25mb' }));
 
 // Número do WhatsApp para enviar (formato: 5534999499430@c.us)
 const WHATSAPP_NUMBER = process.env.WHATSAPP_NUMBER || '5534999499430@c.us';
@@ -29,6 +30,48 @@ const WHATSAPP_LINK = 'wa.me/551151944697?text=oi';
 let client = null;
 let isReady = false;
 
+// Determinar o tipo MIME pela extensão do arquivo
+function getMimeType(fileName) {
+    const ext = path.extname(fileName || '').toLowerCase();
+    if (ext === '.png') {
+        return 'image/png';
+    } else if (ext === '.gif') {
+        return 'image/gif';
+    } else if (ext === '.webp') {
+        return 'image/webp';
+    }
+    return 'image/jpeg';
+}
+
+// Montar MessageMedia a partir da imagem enviada em memória (imageBase64 + mimeType + filename)
+// ou de um arquivo local (imagePath). Retorna { media, fileName } ou { error, status }
+function buildMediaFromRequest({ imagePath, imageBase64, mimeType, filename }) {
+    if (imageBase64) {
+        const fileName = filename || 'banner.jpg';
+        return {
+            media: new MessageMedia(mimeType || getMimeType(fileName), imageBase64, fileName),
+            fileName
+        };
+    }
+
+    if (!imagePath) {
+        return { error: 'Caminho da imagem não fornecido', status: 400 };
+    }
+
+    // Verificar se o arquivo existe
+    if (!fs.existsSync(imagePath)) {
+        return { error: `Arquivo não encontrado: ${imagePath}`, status: 404 };
+    }
+
+    // Ler a imagem
+    const base64Image = fs.readFileSync(imagePath).toString('base64');
+    const fileName = path.basename(imagePath);
+    return {
+        media: new MessageMedia(getMimeType(fileName), base64Image, fileName),
+        fileName
+    };
+}
+
 // Inicializar cliente WhatsApp
 function initializeWhatsApp() {
     console.log('🚀 Iniciando cliente WhatsApp...');
@@ -162,48 +205,27 @@ app.post('/send-image', async (req, res) => {
             });
         }
 
-        const { imagePath, caption } = req.body;
-
-        if (!imagePath) {
-            return res.status(400).json({
-                success: false,
-                error: 'Caminho da imagem não fornecido'
-            });
-        }
+        const { imagePath, imageBase64, mimeType, filename, caption } = req.body;
 
-        // Verificar se o arquivo existe
-        if (!fs.existsSync(imagePath)) {
-            return res.status(404).json({
+        // Imagem em memória (imageBase64) ou arquivo local (imagePath)
+        const { media, fileName, error, status } = buildMediaFromRequest({ imagePath, imageBase64, mimeType, filename });
+        if (error) {
+            return res.status(status).json({
                 success: false,
-                error: `Arquivo não encontrado: ${imagePath}`
+                error
             });
         }
 
-        // Ler a imagem
-        const imageBuffer = fs.readFileSync(imagePath);
-        const base64Image = imageBuffer.toString('base64');
-        
-        // Determinar o tipo MIME baseado na extensão
-        const ext = path.extname(imagePath).toLowerCase();
-        let mimeType = 'image/jpeg';
-        if (ext === '.png') {
-            mimeType = 'image/png';
-        } else if (ext === '.gif') {
-            mimeType = 'image/gif';
-        }
-
-        const media = new MessageMedia(mimeType, base64Image, path.basename(imagePath));
-
         // Usar a legenda recebida (já vem completa do Python)
         // Se não houver legenda, usar apenas o link padrão
         const finalCaption = caption || `Compre no WhatsApp - ${WHATSAPP_LINK}`;
 
         // Enviar mensagem
-        console.log(`📤 Enviando imagem: ${path.basename(imagePath)} para ${WHATSAPP_NUMBER}`);
+        console.log(`📤 Enviando imagem: ${fileName} para ${WHATSAPP_NUMBER}`);
         const chat = await client.getChatById(WHATSAPP_NUMBER);
         await chat.sendMessage(media, { caption: finalCaption });
 
-        console.log(`✅ Imagem enviada com sucesso: ${path.basename(imagePath)}`);
+        console.log(`✅ Imagem enviada com sucesso: ${fileName}`);
 
         res.json({
             success: true,
@@ -504,7 +526,7 @@ app.post('/send-image-to-group', async (req, res) => {
             });
         }
 
-        const { groupId, imagePath, caption } = req.body;
+        const { groupId, imagePath, imageBase64, mimeType, filename, caption } = req.body;
 
         if (!groupId) {
             return res.status(400).json({
@@ -513,41 +535,20 @@ app.post('/send-image-to-group', async (req, res) => {
             });
         }
 
-        if (!imagePath) {
-            return res.status(400).json({
+        // Imagem em memória (imageBase64) ou arquivo local (imagePath)
+        const { media, fileName, error, status } = buildMediaFromRequest({ imagePath, imageBase64, mimeType, filename });
+        if (error) {
+            return res.status(status).json({
                 success: false,
-                error: 'Caminho da imagem não fornecido'
+                error
             });
         }
 
-        // Verificar se o arquivo existe
-        if (!fs.existsSync(imagePath)) {
-            return res.status(404).json({
-                success: false,
-                error: `Arquivo não encontrado: ${imagePath}`
-            });
-        }
-
-        // Ler a imagem
-        const imageBuffer = fs.readFileSync(imagePath);
-        const base64Image = imageBuffer.toString('base64');
-        
-        // Determinar o tipo MIME
-        const ext = path.extname(imagePath).toLowerCase();
-        let mimeType = 'image/jpeg';
-        if (ext === '.png') {
-            mimeType = 'image/png';
-        } else if (ext === '.gif') {
-            mimeType = 'image/gif';
-        }
-
-        const media = new MessageMedia(mimeType, base64Image, path.basename(imagePath));
-
         // Usar a legenda recebida ou o link padrão
         const finalCaption = caption || `Compre no WhatsApp - ${WHATSAPP_LINK}`;
 
         // Enviar mensagem para o grupo
-        console.log(`📤 Enviando imagem para grupo ${groupId}: ${path.basename(imagePath)}`);
+        console.log(`📤 Enviando imagem para grupo ${groupId}: ${fileName}`);
         const chat = await client.getChatById(groupId);
         await chat.sendMessage(media, { caption: finalCaption });
 
@@ -715,6 +716,8 @@ app.post('/send-image-to-contact', async (req, res) => {
             mimeType = 'image/png';
         } else if (ext === '.gif') {
             mimeType = 'image/gif';
+        } else if (ext === '.webp') {
+            mimeType = 'image/webp';
         }
 
         const media = new MessageMedia(mimeType, base64Image, path.basename(imagePath));
@@ -757,6 +760,9 @@ app.post('/send-batch', async (req, res) => {
         const { 
             recipients, 
             imagePath, 
+            imageBase64,
+            mimeType,
+            filename,
             text, 
             delayFirstMin = 25000, 
             delayFirstMax = 35000,
@@ -771,7 +777,7 @@ app.post('/send-batch', async (req, res) => {
             });
         }
 
-        if (!imagePath && !text) {
+        if (!imagePath && !imageBase64 && !text) {
             return res.status(400).json({
                 success: false,
                 error: 'É necessário fornecer imagem ou texto (ou ambos)'
@@ -789,30 +795,18 @@ app.post('/send-batch', async (req, res) => {
         console.log(`   • Mensagens subsequentes: ${subsequentMin/1000}s - ${subsequentMax/1000}s`);
         console.log(`🎲 Usando aleatoriedade máxima para parecer mais humano`);
 
-        // Verificar se a imagem existe (se fornecida)
+        // Imagem em memória (imageBase64) ou arquivo local (imagePath): carregada uma única vez
+        // e reutilizada para todos os destinatários
         let media = null;
-        if (imagePath) {
-            if (!fs.existsSync(imagePath)) {
-                return res.status(404).json({
+        if (imagePath || imageBase64) {
+            const built = buildMediaFromRequest({ imagePath, imageBase64, mimeType, filename });
+            if (built.error) {
+                return res.status(built.status).json({
                     success: false,
-                    error: `Arquivo não encontrado: ${imagePath}`
+                    error: built.error
                 });
             }
-
-            // Ler a imagem
-            const imageBuffer = fs.readFileSync(imagePath);
-            const base64Image = imageBuffer.toString('base64');
-            
-            // Determinar o tipo MIME
-            const ext = path.extname(imagePath).toLowerCase();
-            let mimeType = 'image/jpeg';
-            if (ext === '.png') {
-                mimeType = 'image/png';
-            } else if (ext === '.gif') {
-                mimeType = 'image/gif';
-            }
-
-            media = new MessageMedia(mimeType, base64Image, path.basename(imagePath));
+            media = built.media;
         }
 
         const results = {
@@ -940,8 +934,10 @@ app.post('/send-batch', async (req, res) => {
                 }
 
                 results.success.push({
+                    index: i,
+                    recipientId: recipient.id,
                     id: formattedId,
-                    name: recipient.name || formattedId,
+                    name: (chat && chat.name) || recipient.name || formattedId,
                     type: recipient.type || 'contact'
                 });
 
@@ -973,6 +969,8 @@ app.post('/send-batch', async (req, res) => {
             } catch (error) {
                 const errorMessage = error.message || error.toString();
                 results.failed.push({
+                    index: i,
+                    recipientId: recipient.id,
                     id: recipient.id,
                     name: recipient.name || recipient.id,
                     type: recipient.type || 'contact',
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Cliente do endpoint /send-batch do servidor WhatsApp (Node.js)
+Uma única chamada envia o mesmo banner para vários grupos: a imagem é
+transferida e convertida em MessageMedia uma vez só, e o resultado de cada
+destinatário é devolvido separadamente ao chamador.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import requests
+
+from whatsapp_health import is_health_failure
+
+# Intervalo entre destinatários dentro do lote (ms; o servidor exige no mínimo 1000)
+WHATSAPP_BATCH_DELAY_MIN = int(os.getenv('WHATSAPP_BATCH_DELAY_MIN', '1500'))
+WHATSAPP_BATCH_DELAY_MAX = int(os.getenv('WHATSAPP_BATCH_DELAY_MAX', '3000'))
+# Timeout da requisição: base + tempo por destinatário (o lote é síncrono no servidor)
+WHATSAPP_BATCH_TIMEOUT = float(os.getenv('WHATSAPP_BATCH_TIMEOUT', '30'))
+
+
+def _is_path(image):
+    """Caminho de arquivo (str/Path) ou banner em memória (RenderedBanner)"""
+    return isinstance(image, (str, os.PathLike))
+
+
+def _normalize_id(group_id):
+    """ID sem sufixo (@g.us/@c.us) para casar resultados de servidores antigos"""
+    return str(group_id).split('@')[0]
+
+
+class BatchDelivery:
+    """Um banner destinado a vários grupos (item do despachante WhatsApp)
+
+    Os grupos que já receberam saem de `pending`, então uma nova tentativa
+    só reenvia para quem falhou.
+    """
+
+    def __init__(self, banner, group_ids, delivery_ids=None):
+        """
+        Args:
+            banner: RenderedBanner ou caminho do arquivo
+            group_ids: Lista de IDs de grupos
+            delivery_ids: {group_id: ID no outbox} (opcional)
+        """
+        self.banner = banner
+        self.pending = list(OrderedDict.fromkeys(group_ids))
+        self.delivery_ids = delivery_ids or {}
+        self.results = {}  # group_id -> (sucesso, erro)
+        self.lock = threading.Lock()
+
+    @property
+    def filename(self):
+        return getattr(self.banner, 'filename', None) or os.path.basename(str(self.banner))
+
+    def apply(self, results):
+        """Registra o resultado de um lote e retira os grupos já atendidos
+
+        Returns:
+            bool: True se todos os grupos já receberam o banner
+        """
+        with self.lock:
+            for group_id, resultado in results.items():
+                self.results[group_id] = resultado
+            self.pending = [g for g in self.pending if not self.results.get(g, (False, None))[0]]
+            return not self.pending
+
+
+class WhatsAppBatchClient:
+    """Envia um banner para vários destinatários via /send-batch"""
+
+    def __init__(self, api_url, session=None, health=None, delay_min=None, delay_max=None, pacer=None):
+        """
+        Args:
+            api_url: URL base do servidor Node.js
+            session: requests.Session reaproveitada (opcional)
+            health: WhatsAppHealthMonitor para o circuit breaker (opcional)
+            delay_min: Intervalo mínimo entre destinatários em ms (padrão: WHATSAPP_BATCH_DELAY_MIN)
+            delay_max: Intervalo máximo entre destinatários em ms (padrão: WHATSAPP_BATCH_DELAY_MAX)
+            pacer: SendPacer cujo espaçamento (falhas/ACK lento) multiplica os intervalos (opcional)
+        """
+        self.api_url = api_url.rstrip('/')
+        self.session = session or requests.Session()
+        self.health = health
+        self.delay_min = max(1000, WHATSAPP_BATCH_DELAY_MIN if delay_min is None else delay_min)
+        self.delay_max = max(self.delay_min, WHATSAPP_BATCH_DELAY_MAX if delay_max is None else delay_max)
+        self.pacer = pacer
+
+    def current_delays(self):
+        """Intervalos (ms) entre destinatários com o espaçamento atual do pacer"""
+        slowdown = self.pacer.slowdown if self.pacer else 1.0
+        return int(self.delay_min * slowdown), int(self.delay_max * slowdown)
+
+    def build_media_payload(self, image):
+        """Campos da imagem para o servidor: base64 em memória ou caminho absoluto"""
+        if _is_path(image):
+            return {'imagePath': os.path.abspath(str(image))}
+        return {'imageBase64': image.base64, 'mimeType': image.mime_type, 'filename': image.filename}
+
+    def send(self, image, group_ids, caption=None):
+        """
+        Envia uma imagem para vários grupos em uma única requisição
+
+        Args:
+            image: RenderedBanner ou caminho do arquivo
+            group_ids: Lista de IDs de grupos
+            caption: Legenda da imagem
+
+        Returns:
+            dict: {group_id: (sucesso, erro ou None)} para cada grupo informado
+        """
+        group_ids = list(OrderedDict.fromkeys(group_ids))
+        if not group_ids:
+            return {}
+        if _is_path(image) and not os.path.exists(str(image)):
+            return {g: (False, f'Arquivo não encontrado: {image}') for g in group_ids}
+
+        if self.health and not self.health.allow_request():
+            return {g: (False, 'servidor WhatsApp não está pronto') for g in group_ids}
+
+        delay_min, delay_max = self.current_delays()
+        payload = {
+            'recipients': [{'id': g, 'type': 'group'} for g in group_ids],
+            **self.build_media_payload(image),
+            'text': caption or '',
+            'delayFirstMin': delay_min,
+            'delayFirstMax': delay_max,
+            'delaySubsequentMin': delay_min,
+            'delaySubsequentMax': delay_max
+        }
+        # O servidor só responde após enviar para todos os destinatários
+        timeout = WHATSAPP_BATCH_TIMEOUT + len(group_ids) * (delay_max / 1000.0 + 15)
+
+        try:
+            response = self.session.post(f'{self.api_url}/send-batch', json=payload, timeout=timeout)
+        except Exception as e:
+            if self.health:
+                self.health.record_failure(str(e), health_failure=is_health_failure(exc=e))
+            return {g: (False, str(e)) for g in group_ids}
+
+        if response.status_code != 200:
+            try:
+                erro = response.json().get('error') or f'HTTP {response.status_code}'
+            except ValueError:
+                erro = f'HTTP {response.status_code}: {response.text[:200]}'
+            if self.health:
+                self.health.record_failure(erro, health_failure=response.status_code >= 500)
+            return {g: (False, erro) for g in group_ids}
+
+        results = response.json().get('results', {})
+        mapped = self._map_results(group_ids, results)
+        if self.health:
+            if any(ok for ok, _ in mapped.values()):
+                self.health.record_success()
+            else:
+                self.health.record_failure('nenhum destinatário recebeu o lote', health_failure=False)
+        return mapped
+
+    def _map_results(self, group_ids, results):
+        """Associa success/failed do servidor aos grupos pedidos (por índice ou ID)"""
+        por_id = {_normalize_id(g): g for g in group_ids}
+        mapped = {}
+        for sucesso, entries in ((True, results.get('success', [])), (False, results.get('failed', []))):
+            for entry in entries:
+                index = entry.get('index')
+                if isinstance(index, int) and 0 <= index < len(group_ids):
+                    group_id = group_ids[index]
+                else:
+                    group_id = por_id.get(_normalize_id(entry.get('recipientId') or entry.get('id', '')))
+                if group_id is not None:
+                    mapped[group_id] = (sucesso, None if sucesso else entry.get('error', 'erro desconhecido'))
+        for group_id in group_ids:
+            mapped.setdefault(group_id, (False, 'destinatário ausente na resposta do servidor'))
+        return mapped
+
+    def deliver(self, entries, caption=None):
+        """
+        Agrupa envios por imagem e faz uma chamada /send-batch por imagem
+
+        Args:
+            entries: Iterável de (imagem, group_id, chave)
+            caption: Legenda das imagens
+
+        Returns:
+            dict: {chave: (sucesso, erro ou None)}
+        """
+        lotes = OrderedDict()  # identificador da imagem -> (imagem, [(group_id, chave)])
+        for image, group_id, key in entries:
+            image_key = os.path.abspath(str(image)) if _is_path(image) else id(image)
+            lotes.setdefault(image_key, (image, []))[1].append((group_id, key))
+
+        resultados = {}
+        for image, destinos in lotes.values():
+            enviados = self.send(image, [g for g, _ in destinos], caption)
+            for group_id, key in destinos:
+                resultados[key] = enviados.get(group_id, (False, 'sem resultado'))
+        return resultados
@@ -0,0 +1,297 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Despachante de envios ao WhatsApp com vários workers
+Os grupos são distribuídos entre os workers por hash do group_id, então a
+ordem dos banners de um mesmo grupo é preservada enquanto grupos diferentes
+são enviados em paralelo. O ritmo (limite global, intervalo por grupo e
+adaptação a falhas/ACK lento) vem do SendPacer compartilhado; grupos ainda
+fora do horário liberado ficam na fila sem ocupar o worker, que escolhe o
+próximo grupo já liberado (limite global e intervalo do grupo). Inclui novas
+tentativas com backoff exponencial e acompanhamento de conclusão
+(wait_until_idle) sem polling da fila.
+"""
+import os
+import time
+import zlib
+import threading
+from collections import OrderedDict, deque
+
+from send_pacer import SendPacer, wait_until
+
+# Configuração (variáveis de ambiente)
+WHATSAPP_WORKERS = int(os.getenv('WHATSAPP_WORKERS', '3'))
+WHATSAPP_RATE_PER_MINUTE = float(os.getenv('WHATSAPP_RATE_PER_MINUTE', '0'))  # 0 = sem limite global
+WHATSAPP_GROUP_INTERVAL = float(os.getenv('WHATSAPP_GROUP_INTERVAL', '0'))  # segundos entre envios ao mesmo grupo
+WHATSAPP_RATE_BURST = int(os.getenv('WHATSAPP_RATE_BURST', '1'))  # envios liberados de uma vez com o limite global
+WHATSAPP_SEND_JITTER = float(os.getenv('WHATSAPP_SEND_JITTER', '0'))  # segundos aleatórios (0 a N) entre envios consecutivos
+WHATSAPP_MAX_ATTEMPTS = int(os.getenv('WHATSAPP_MAX_ATTEMPTS', '3'))
+WHATSAPP_RETRY_BACKOFF = float(os.getenv('WHATSAPP_RETRY_BACKOFF', '5'))  # segundos (dobra a cada tentativa)
+WHATSAPP_RETRY_BACKOFF_MAX = float(os.getenv('WHATSAPP_RETRY_BACKOFF_MAX', '60'))
+WHATSAPP_PARK_TIMEOUT = float(os.getenv('WHATSAPP_PARK_TIMEOUT', '300'))  # espera máxima com o cliente fora do ar
+
+
+class _Job:
+    """Envio pendente (banner + grupo)"""
+
+    def __init__(self, item, group_id, job_id=None):
+        self.item = item
+        self.group_id = group_id
+        self.job_id = job_id
+        self.attempts = 0
+        self.last_error = None
+
+
+class _Shard:
+    """Fila de um worker: uma fila FIFO por grupo + horário liberado de cada grupo"""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.groups = OrderedDict()  # group_id -> deque de _Job
+        self.ready_at = {}  # group_id -> time.monotonic() a partir do qual pode enviar
+        self.thread = None
+
+    def next_job(self, now, pacer=None):
+        """Próximo job com horário de envio já liberado (round-robin entre os grupos).
+        Chamar com o lock adquirido
+
+        Args:
+            now: time.monotonic()
+            pacer: SendPacer com os limites global e de cada grupo (opcional)
+
+        Returns:
+            tuple: (_Job ou None, segundos até o próximo grupo liberar ou None)
+        """
+        wait = None
+        for group_id, jobs in self.groups.items():
+            delay = self.ready_at.get(group_id, 0) - now  # backoff de nova tentativa
+            if delay <= 0 and pacer is not None:
+                delay = pacer.delay(group_id, len(group_id) if isinstance(group_id, tuple) else 1)
+            if delay <= 0:
+                self.groups.move_to_end(group_id)  # Round-robin: grupo vai para o fim
+                return jobs[0], None
+            wait = delay if wait is None else min(wait, delay)
+        return None, wait
+
+
+class WhatsAppDispatcher:
+    """Despachante de envios com N workers e ordem preservada por grupo"""
+
+    def __init__(self, send_func, workers=None, rate_per_minute=None, group_interval=None,
+                 max_attempts=None, retry_backoff=None, retry_backoff_max=None, on_result=None,
+                 health=None, park_timeout=None, pacer=None):
+        """Inicializa o despachante
+
+        Args:
+            send_func: Função (item, group_id) -> bool que faz o envio
+            workers: Número de workers (padrão: WHATSAPP_WORKERS)
+            rate_per_minute: Limite global de envios por minuto (0 = sem limite)
+            group_interval: Intervalo mínimo em segundos entre envios ao mesmo grupo
+            max_attempts: Tentativas por envio antes de desistir
+            retry_backoff: Espera inicial antes de tentar de novo (dobra a cada falha)
+            retry_backoff_max: Espera máxima entre tentativas
+            on_result: Função (job_id, sucesso, tentativas, erro) chamada ao finalizar
+                       cada envio (ex: registrar o resultado no outbox)
+            health: WhatsAppHealthMonitor; com o circuito aberto os workers ficam
+                    estacionados (sem gastar tentativas) até o cliente voltar
+            park_timeout: Espera máxima estacionado antes de tentar mesmo assim
+            pacer: SendPacer compartilhado (padrão: um novo com rate_per_minute/group_interval)
+        """
+        self.send_func = send_func
+        self.on_result = on_result
+        self.health = health
+        self.park_timeout = WHATSAPP_PARK_TIMEOUT if park_timeout is None else park_timeout
+        self.workers = max(1, workers or WHATSAPP_WORKERS)
+        self.group_interval = WHATSAPP_GROUP_INTERVAL if group_interval is None else group_interval
+        self.pacer = pacer or SendPacer(
+            rate_per_minute=WHATSAPP_RATE_PER_MINUTE if rate_per_minute is None else rate_per_minute,
+            burst=WHATSAPP_RATE_BURST, jitter=WHATSAPP_SEND_JITTER,
+            destination_interval=self.group_interval, name='whatsapp-banners')
+        self.max_attempts = max(1, max_attempts or WHATSAPP_MAX_ATTEMPTS)
+        self.retry_backoff = WHATSAPP_RETRY_BACKOFF if retry_backoff is None else retry_backoff
+        self.retry_backoff_max = WHATSAPP_RETRY_BACKOFF_MAX if retry_backoff_max is None else retry_backoff_max
+
+        self.shards = []
+        self.stop_event = threading.Event()
+        self.running = False
+        self.state_lock = threading.Lock()
+
+        # Acompanhamento de conclusão: envios aceitos e ainda não finalizados
+        self.idle_cond = threading.Condition()
+        self.outstanding = 0
+        self.stats = {'enviados': 0, 'falhas': 0, 'retentativas': 0}
+
+    def shard_for(self, group_id):
+        """Índice do worker responsável pelo grupo (estável entre execuções)"""
+        return zlib.crc32(str(group_id).encode('utf-8')) % self.workers
+
+    def start(self):
+        """Inicia os workers (idempotente)"""
+        with self.state_lock:
+            if self.running:
+                return
+            self.stop_event.clear()
+            self.shards = [_Shard() for _ in range(self.workers)]
+            for index, shard in enumerate(self.shards):
+                shard.thread = threading.Thread(target=self._worker, args=(index, shard),
+                                                name=f'whatsapp-worker-{index}', daemon=True)
+                shard.thread.start()
+            self.running = True
+        print(f'✓ Despachante WhatsApp iniciado: {self.workers} worker(s), até {self.max_attempts} tentativa(s) por envio')
+
+    def submit(self, item, group_id, job_id=None):
+        """Adiciona um envio à fila do grupo
+
+        Args:
+            item: Banner (RenderedBanner ou caminho) repassado a send_func
+            group_id: ID do grupo do WhatsApp
+            job_id: Identificador repassado a on_result (ex: ID no outbox)
+
+        Returns:
+            bool: True se o envio foi aceito
+        """
+        if not self.running:
+            self.start()
+        shard = self.shards[self.shard_for(group_id)]
+        with self.idle_cond:
+            self.outstanding += 1
+        with shard.cond:
+            shard.groups.setdefault(group_id, deque()).append(_Job(item, group_id, job_id))
+            shard.cond.notify()
+        return True
+
+    @property
+    def pending(self):
+        """Envios aceitos e ainda não finalizados (na fila ou em andamento)"""
+        with self.idle_cond:
+            return self.outstanding
+
+    def _finish(self, job, success):
+        if self.on_result:
+            try:
+                self.on_result(job.job_id, success, job.attempts, job.last_error)
+            except Exception as e:
+                print(f'  ⚠ Erro ao registrar resultado do envio: {e}')
+        with self.idle_cond:
+            self.outstanding -= 1
+            self.stats['enviados' if success else 'falhas'] += 1
+            if self.outstanding <= 0:
+                self.idle_cond.notify_all()
+
+    def _worker(self, index, shard):
+        """Loop do worker: envia um job por vez, respeitando limites e backoff"""
+        while not self.stop_event.is_set():
+            with shard.cond:
+                job, wait = shard.next_job(time.monotonic(), self.pacer)
+                if job is None:
+                    shard.cond.wait(timeout=wait if wait is not None else 1.0)
+                    continue
+
+            # Cliente WhatsApp reconectando: aguardar em vez de queimar tentativas
+            if self.health and not self.health.wait_until_available(self.park_timeout, self.stop_event):
+                if self.stop_event.is_set():
+                    break
+
+            # Lote (vários grupos em um /send-batch) consome uma ficha e o intervalo de cada grupo.
+            # next_job só entrega jobs já liberados: a espera aqui só acontece se outro worker
+            # reservou o horário nesse meio tempo (no máximo um intervalo global)
+            count = len(job.group_id) if isinstance(job.group_id, tuple) else 1
+            if not wait_until(self.pacer.reserve(job.group_id, count), self.stop_event):
+                break
+
+            job.attempts += 1
+            started = time.monotonic()
+            try:
+                success = bool(self.send_func(job.item, job.group_id))
+                job.last_error = None if success else 'envio não confirmado'
+            except Exception as e:
+                success = False
+                job.last_error = str(e)
+            self.pacer.record_result(job.group_id, success, (time.monotonic() - started) / count)
+
+            nome = getattr(job.item, 'filename', None) or os.path.basename(str(job.item))
+            with shard.cond:
+                now = time.monotonic()
+                if success or job.attempts >= self.max_attempts:
+                    jobs = shard.groups.get(job.group_id)
+                    if jobs:
+                        jobs.popleft()
+                        if not jobs:
+                            del shard.groups[job.group_id]
+                    shard.ready_at.pop(job.group_id, None)  # intervalo do grupo fica com o pacer
+                    finished = True
+                else:
+                    delay = min(self.retry_backoff * (2 ** (job.attempts - 1)), self.retry_backoff_max)
+                    shard.ready_at[job.group_id] = now + delay
+                    finished = False
+
+            if success:
+                print(f'  ✅ Banner enviado (worker {index}): {nome}')
+                self._finish(job, True)
+            elif finished:
+                print(f'  ❌ Falha definitiva após {job.attempts} tentativa(s) (worker {index}): {nome} - {job.last_error}')
+                self._finish(job, False)
+            else:
+                with self.idle_cond:
+                    self.stats['retentativas'] += 1
+                print(f'  🔁 Falha ao enviar {nome} (tentativa {job.attempts}/{self.max_attempts}): '
+                      f'{job.last_error}. Nova tentativa em {delay:.0f}s')
+
+    def wait_until_idle(self, timeout=None, progress_callback=None, progress_interval=10):
+        """Aguarda todos os envios aceitos terminarem (sucesso ou falha definitiva)
+
+        Args:
+            timeout: Tempo máximo em segundos (None = sem limite)
+            progress_callback: Função (pendentes) chamada a cada progress_interval segundos
+            progress_interval: Intervalo entre chamadas do progress_callback
+
+        Returns:
+            bool: True se não há mais envios pendentes
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.idle_cond:
+            while self.outstanding > 0:
+                wait = progress_interval
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    wait = min(wait, remaining)
+                if not self.idle_cond.wait(timeout=wait) and progress_callback and self.outstanding > 0:
+                    progress_callback(self.outstanding)
+            return True
+
+    def stop(self, wait=True, timeout=None):
+        """Para os workers
+
+        Args:
+            wait: Aguarda os envios pendentes antes de parar
+            timeout: Tempo máximo de espera pelos pendentes (None = sem limite)
+        """
+        with self.state_lock:
+            if not self.running:
+                return
+        if wait:
+            self.wait_until_idle(timeout)
+        self.stop_event.set()
+        for shard in self.shards:
+            with shard.cond:
+                shard.cond.notify_all()
+        for shard in self.shards:
+            if shard.thread and shard.thread.is_alive():
+                shard.thread.join(timeout=10)
+        with self.state_lock:
+            self.running = False
+        descartados = self.pending
+        if descartados:
+            print(f'  ⚠ Despachante WhatsApp parado com {descartados} envio(s) pendente(s)')
+            with self.idle_cond:
+                self.outstanding = 0
+                self.idle_cond.notify_all()
+
+    def get_stats(self):
+        """Retorna contadores de envio"""
+        with self.idle_cond:
+            stats = dict(self.stats, pendentes=self.outstanding, workers=self.workers)
+        stats['ritmo'] = self.pacer.get_stats()
+        return stats
@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Monitor de saúde do servidor WhatsApp (Node.js) com circuit breaker
+Um único monitor por URL consulta /health em segundo plano e mantém o
+resultado em cache (TTL). Os envios consultam o circuito em vez de chamar
+/health a cada banner:
+  - closed:    cliente pronto, envios liberados
+  - open:      cliente fora do ar/reconectando, envios falham na hora (ou aguardam)
+  - half-open: após o tempo de espera, um único envio de teste é liberado
+"""
+import os
+import time
+import threading
+
+import requests
+
+# Configuração (variáveis de ambiente)
+WHATSAPP_HEALTH_INTERVAL = float(os.getenv('WHATSAPP_HEALTH_INTERVAL', '10'))  # segundos entre consultas ao /health
+WHATSAPP_HEALTH_TTL = float(os.getenv('WHATSAPP_HEALTH_TTL', '30'))  # validade do último resultado
+WHATSAPP_CIRCUIT_FAILURES = int(os.getenv('WHATSAPP_CIRCUIT_FAILURES', '3'))  # falhas seguidas para abrir o circuito
+WHATSAPP_CIRCUIT_OPEN_SECONDS = float(os.getenv('WHATSAPP_CIRCUIT_OPEN_SECONDS', '30'))  # espera antes do envio de teste
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+_monitors = {}
+_monitors_lock = threading.Lock()
+
+
+def is_health_failure(status_code=None, exc=None):
+    """Indica se o erro de um envio reflete indisponibilidade do cliente WhatsApp
+
+    Conexão recusada, timeout e 503/5xx contam para o circuito; erros de
+    negócio (grupo inexistente, arquivo inválido) não.
+    """
+    if exc is not None:
+        return isinstance(exc, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+    return status_code is not None and status_code >= 500
+
+
+class WhatsAppHealthMonitor:
+    """Estado de prontidão do servidor WhatsApp + circuit breaker dos envios"""
+
+    def __init__(self, api_url, interval=None, ttl=None, failure_threshold=None, open_seconds=None):
+        """
+        Args:
+            api_url: URL base do servidor Node.js (ex: http://localhost:3001)
+            interval: Intervalo da consulta em segundo plano (padrão: WHATSAPP_HEALTH_INTERVAL)
+            ttl: Validade do último /health antes de consultar de novo na hora
+            failure_threshold: Falhas de envio seguidas que abrem o circuito
+            open_seconds: Tempo com o circuito aberto antes do envio de teste
+        """
+        self.api_url = api_url.rstrip('/')
+        self.interval = WHATSAPP_HEALTH_INTERVAL if interval is None else interval
+        self.ttl = WHATSAPP_HEALTH_TTL if ttl is None else ttl
+        self.failure_threshold = max(1, failure_threshold or WHATSAPP_CIRCUIT_FAILURES)
+        self.open_seconds = WHATSAPP_CIRCUIT_OPEN_SECONDS if open_seconds is None else open_seconds
+
+        self.cond = threading.Condition()
+        self.state = CLOSED
+        self.ready = None  # None = ainda não consultado
+        self.message = ''
+        self.checked_at = 0.0
+        self.opened_at = 0.0
+        self.failures = 0
+        self.trial_in_flight = False
+        self.session = requests.Session()
+
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.check_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Consulta ao /health
+    # ------------------------------------------------------------------
+    def check(self):
+        """Consulta /health agora e atualiza o circuito
+
+        Returns:
+            bool: True se o cliente WhatsApp está pronto
+        """
+        with self.check_lock:
+            try:
+                response = self.session.get(f'{self.api_url}/health', timeout=5)
+                if response.status_code == 200:
+                    health_data = response.json()
+                    ready = health_data.get('status') == 'ready'
+                    message = health_data.get('message', '')
+                else:
+                    ready, message = False, f'HTTP {response.status_code}'
+            except requests.exceptions.ConnectionError:
+                ready, message = False, 'servidor WhatsApp inacessível'
+            except Exception as e:
+                ready, message = False, str(e)
+            self._update_health(ready, message)
+            return ready
+
+    def _update_health(self, ready, message):
+        with self.cond:
+            mudou = ready != self.ready
+            self.ready = ready
+            self.message = message
+            self.checked_at = time.monotonic()
+            if ready:
+                if self.state == OPEN:
+                    # Cliente voltou: liberar um envio de teste antes de fechar o circuito
+                    self.state = HALF_OPEN
+                    self.trial_in_flight = False
+            elif self.state != OPEN:
+                self._open(message)
+            self.cond.notify_all()
+        if mudou:
+            if ready:
+                print('✓ Servidor WhatsApp pronto')
+            else:
+                print(f'⚠ Servidor WhatsApp indisponível: {message}')
+
+    def _open(self, reason):
+        """Abre o circuito (chamar com o lock adquirido)"""
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.trial_in_flight = False
+        self.message = reason or self.message
+
+    def _refresh_if_stale(self):
+        """Consulta /health na hora se o último resultado passou do TTL (sem thread em segundo plano)"""
+        with self.cond:
+            stale = time.monotonic() - self.checked_at > self.ttl
+        if stale:
+            self.check()
+
+    def _poll(self):
+        while not self.stop_event.is_set():
+            self.check()
+            self.stop_event.wait(self.interval)
+
+    def start(self):
+        """Inicia a consulta periódica em segundo plano (idempotente)"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._poll, name='whatsapp-health', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Para a consulta periódica"""
+        self.stop_event.set()
+        with self.cond:
+            self.cond.notify_all()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=10)
+        self.thread = None
+
+    # ------------------------------------------------------------------
+    # Circuit breaker
+    # ------------------------------------------------------------------
+    def _try_acquire(self, acquire=True):
+        """Decide se um envio pode seguir agora (chamar com o lock adquirido)
+
+        Args:
+            acquire: Reservar o envio de teste quando o circuito está half-open
+        """
+        if self.ready is False:
+            # /health informou que o cliente não está pronto (QR Code, reconexão)
+            return False
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.open_seconds:
+                return False
+            self.state = HALF_OPEN
+            self.trial_in_flight = False
+        # half-open: apenas um envio de teste por vez
+        if self.trial_in_flight:
+            return False
+        if acquire:
+            self.trial_in_flight = True
+        return True
+
+    def allow_request(self):
+        """Verifica (sem bloquear) se um envio pode ser feito agora
+
+        Quem recebe True deve chamar record_success() ou record_failure().
+
+        Returns:
+            bool: False = falhar rápido, o servidor não está pronto
+        """
+        self._refresh_if_stale()
+        with self.cond:
+            return self._try_acquire()
+
+    def wait_until_available(self, timeout=None, stop_event=None):
+        """Estaciona o chamador até o circuito permitir envios (sem reservar o envio de teste)
+
+        Args:
+            timeout: Tempo máximo de espera em segundos (None = sem limite)
+            stop_event: threading.Event que interrompe a espera
+
+        Returns:
+            bool: True se os envios estão liberados
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        avisado = False
+        while True:
+            self._refresh_if_stale()
+            with self.cond:
+                if self._try_acquire(acquire=False):
+                    return True
+                if stop_event is not None and stop_event.is_set():
+                    return False
+                if not avisado:
+                    print(f'  ⏸ Envios WhatsApp em espera: {self.message or "cliente não está pronto"}')
+                    avisado = True
+                wait = self.interval
+                if self.state == OPEN:
+                    wait = min(wait, max(0.1, self.opened_at + self.open_seconds - time.monotonic()))
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    wait = min(wait, remaining)
+                self.cond.wait(timeout=wait)
+
+    def record_success(self):
+        """Registra um envio bem-sucedido (fecha o circuito)"""
+        with self.cond:
+            self.failures = 0
+            self.trial_in_flight = False
+            self.ready = True
+            if self.state != CLOSED:
+                self.state = CLOSED
+                print('✓ Circuito WhatsApp fechado: envios normalizados')
+            self.cond.notify_all()
+
+    def record_failure(self, reason=None, health_failure=True):
+        """Registra um envio com falha
+
+        Args:
+            reason: Descrição do erro
+            health_failure: True se a falha indica cliente indisponível
+                            (conexão, timeout, 503); erros de negócio só liberam o teste
+        """
+        with self.cond:
+            self.trial_in_flight = False
+            if not health_failure:
+                if self.state == HALF_OPEN:
+                    # O servidor respondeu: o cliente está de pé
+                    self.state = CLOSED
+                    self.failures = 0
+                self.cond.notify_all()
+                return
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    print(f'⚠ Circuito WhatsApp aberto por {self.open_seconds:.0f}s: {reason or "falhas seguidas"}')
+                self._open(reason)
+            self.cond.notify_all()
+
+    def get_status(self):
+        """Retorna o estado atual (para logs/endpoints)"""
+        with self.cond:
+            idade = time.monotonic() - self.checked_at if self.checked_at else None
+            return {
+                'state': self.state,
+                'ready': self.ready,
+                'message': self.message,
+                'failures': self.failures,
+                'checked_seconds_ago': round(idade, 1) if idade is not None else None,
+                'polling': bool(self.thread and self.thread.is_alive())
+            }
+
+
+def get_whatsapp_health(api_url):
+    """Retorna o monitor compartilhado para a URL do servidor WhatsApp"""
+    key = api_url.rstrip('/')
+    with _monitors_lock:
+        monitor = _monitors.get(key)
+        if monitor is None:
+            monitor = WhatsAppHealthMonitor(key)
+            _monitors[key] = monitor
+        return monitor